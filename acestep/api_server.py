@@ -3,23 +3,37 @@
 Endpoints:
 - POST /release_task          Create music generation task
 - POST /query_result          Batch query task results
+- POST /cancel_task           Cancel a queued or running task
 - POST /create_random_sample  Generate random music parameters via LLM
 - POST /format_input          Format and enhance lyrics/caption via LLM
 - GET  /v1/models             List available models
+- GET  /metrics               Prometheus metrics (stage latencies, caches, queue)
+- GET  /v1/tasks/{id}/events  Server-sent events with a task's progress
+- WS   /v1/tasks/{id}/ws      The same progress events over a WebSocket
 - GET  /v1/audio              Download audio file
 - GET  /health                Health check
 
 NOTE:
-- In-memory queue and job store -> run uvicorn with workers=1.
+- Default role ("all"): in-memory queue, HTTP and models in one process -> run
+  uvicorn with workers=1. The job store is in memory by default;
+  ACESTEP_JOB_STORE=sqlite persists jobs and re-enqueues queued ones after a restart.
+- Split deployment: ACESTEP_API_ROLE=front runs HTTP-only processes (any number)
+  and ACESTEP_API_ROLE=worker runs model-worker processes; both share the SQLite
+  job store, which is the queue between them.
+- The in-process queue is a fair-share scheduler (acestep/job_scheduler.py):
+  priority classes, weighted fair queuing across tenants and per-tenant quotas.
 """
 
 from __future__ import annotations
 
 import asyncio
 import glob
+import ipaddress
 import json
+import math
 import os
 import random
+import re
 import sys
 import time
 import traceback
@@ -28,23 +42,30 @@ import urllib.parse
 from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
-from dataclasses import dataclass
 from pathlib import Path
-from threading import Lock
-from typing import Any, Dict, List, Literal, Optional
-from uuid import uuid4
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Tuple
 
 try:
     from dotenv import load_dotenv
 except ImportError:  # Optional dependency
     load_dotenv = None  # type: ignore
 
-from fastapi import FastAPI, HTTPException, Request, Depends, Header
+from fastapi import FastAPI, HTTPException, Request, Depends, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
 from starlette.datastructures import UploadFile as StarletteUploadFile
 
+from acestep.cancellation import CancellationToken, cancellation_scope
 from acestep.handler import AceStepHandler
+from acestep.job_cost import JobCostModel
+from acestep.job_dedup import RequestMemo, request_fingerprint
+from acestep.job_events import TERMINAL_EVENTS, JobEventBus
+from acestep.job_scheduler import DEFAULT_TENANT, PRIORITY_CLASSES, FairScheduler, SchedulerFull, parse_weights
+from acestep.job_store import CANCELLED_ERROR, JobStore, SQLiteJobStore
 from acestep.llm_inference import LLMHandler
+from acestep.llm_pool import LLMPoolBusy, LLMRequestPool
+from acestep.metrics import ServerMetrics
+from acestep.model_registry import ModelLoadError, ModelRegistry, ModelSpec
 from acestep.constants import (
     DEFAULT_DIT_INSTRUCTION,
     DEFAULT_LM_INSTRUCTION,
@@ -216,7 +237,10 @@ RESULT_EXPIRE_SECONDS = 7 * 24 * 60 * 60  # 7 days
 TASK_TIMEOUT_SECONDS = 3600  # 1 hour
 JOB_STORE_CLEANUP_INTERVAL = 300  # 5 minutes - interval for cleaning up old jobs
 JOB_STORE_MAX_AGE_SECONDS = 86400  # 24 hours - completed jobs older than this will be cleaned
-STATUS_MAP = {"queued": 0, "running": 0, "succeeded": 1, "failed": 2}
+STATUS_MAP = {"queued": 0, "running": 0, "succeeded": 1, "failed": 2, "cancelled": 2}
+EVENTS_STORE_POLL_SECONDS = 1.0  # progress streams of jobs run by another process follow the job store
+LM_PROGRESS_INTERVAL = 0.5  # how often a running job's LM code count is sampled
+DIFFUSION_STEP_RE = re.compile(r"Diffusion step (\d+)/(\d+)")
 
 LM_DEFAULT_TEMPERATURE = 0.85
 LM_DEFAULT_CFG_SCALE = 2.5
@@ -268,6 +292,7 @@ CUSTOM_EXAMPLE_DATA: List[Dict[str, Any]] = _load_all_examples(sample_mode="cust
 # =============================================================================
 
 _api_key: Optional[str] = None
+_api_key_grants: Dict[str, Tuple[str, str]] = {}  # key -> (tenant, highest priority class)
 
 
 def set_api_key(key: Optional[str]):
@@ -276,18 +301,56 @@ def set_api_key(key: Optional[str]):
     _api_key = key
 
 
+def parse_api_keys(spec: str) -> Dict[str, Tuple[str, str]]:
+    """
+    Parse "key:tenant[:class],..." (ACESTEP_API_KEYS) into key -> (tenant, class);
+    class is the highest priority class the key may submit, "interactive" by default.
+    """
+    grants = {}
+    for item in (spec or "").split(","):
+        parts = [part.strip() for part in item.split(":")]
+        if len(parts) < 2 or not parts[0] or not parts[1]:
+            if item.strip():
+                print("[API Server] Warning: ignoring malformed ACESTEP_API_KEYS entry (expected key:tenant[:class])")
+            continue
+        priority_class = parts[2] if len(parts) > 2 and parts[2] else PRIORITY_CLASSES[0]
+        if priority_class not in PRIORITY_CLASSES:
+            raise ValueError(f"ACESTEP_API_KEYS: class must be one of {list(PRIORITY_CLASSES)}, got {priority_class!r}")
+        grants[parts[0]] = (parts[1], priority_class)
+    return grants
+
+
+def set_api_key_grants(grants: Dict[str, Tuple[str, str]]):
+    """Set the per-tenant API keys (any of them authenticates, like the ACESTEP_API_KEY key)"""
+    global _api_key_grants
+    _api_key_grants = dict(grants)
+
+
+def api_key_grant(token: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(tenant, highest priority class) of an authenticated key, None for the shared key or no auth."""
+    return _api_key_grants.get(token) if token else None
+
+
+def _auth_required() -> bool:
+    return _api_key is not None or bool(_api_key_grants)
+
+
+def _is_valid_key(token: str) -> bool:
+    return (_api_key is not None and token == _api_key) or token in _api_key_grants
+
+
 def verify_token_from_request(body: dict, authorization: Optional[str] = None) -> Optional[str]:
     """
     Verify API key from request body (ai_token) or Authorization header.
     Returns the token if valid, None if no auth required.
     """
-    if _api_key is None:
+    if not _auth_required():
         return None  # No auth required
 
     # Try ai_token from body first
     ai_token = body.get("ai_token") if body else None
     if ai_token:
-        if ai_token == _api_key:
+        if _is_valid_key(ai_token):
             return ai_token
         raise HTTPException(status_code=401, detail="Invalid ai_token")
 
@@ -297,7 +360,7 @@ def verify_token_from_request(body: dict, authorization: Optional[str] = None) -
             token = authorization[7:]
         else:
             token = authorization
-        if token == _api_key:
+        if _is_valid_key(token):
             return token
         raise HTTPException(status_code=401, detail="Invalid API key")
 
@@ -307,7 +370,7 @@ def verify_token_from_request(body: dict, authorization: Optional[str] = None) -
 
 async def verify_api_key(authorization: Optional[str] = Header(None)):
     """Verify API key from Authorization header (legacy, for non-body endpoints)"""
-    if _api_key is None:
+    if not _auth_required():
         return  # No auth required
 
     if not authorization:
@@ -319,7 +382,7 @@ async def verify_api_key(authorization: Optional[str] = Header(None)):
     else:
         token = authorization
 
-    if token != _api_key:
+    if not _is_valid_key(token):
         raise HTTPException(status_code=401, detail="Invalid API key")
 
 # Parameter aliases for request parsing
@@ -474,6 +537,11 @@ class GenerateMusicRequest(BaseModel):
     cfg_interval_start: float = 0.0
     cfg_interval_end: float = 1.0
     infer_method: str = "ode"  # "ode" or "sde" - diffusion inference method
+    step_cache_mode: Optional[str] = None  # None, "interval" or "threshold" - reuse deep DiT blocks across steps
+    step_cache_interval: int = 2
+    step_cache_threshold: float = 0.1
+    lora_adapter: Optional[str] = None  # name of a loaded LoRA adapter (see ACESTEP_LORA_ADAPTERS)
+    lora_scale: Optional[float] = None
     shift: float = Field(
         default=3.0,
         description="Timestep shift factor (range 1.0~5.0, default 3.0). Only effective for base models, not turbo models."
@@ -504,6 +572,10 @@ class GenerateMusicRequest(BaseModel):
     lm_repetition_penalty: float = 1.0
     lm_negative_prompt: str = "NO USER INPUT"
 
+    # Scheduling: "interactive" jobs run before "batch" ones; tenant is resolved by the server
+    priority: str = "interactive"
+    tenant: Optional[str] = None
+
     class Config:
         allow_population_by_field_name = True
         allow_population_by_alias = True
@@ -552,113 +624,6 @@ class JobResponse(BaseModel):
     error: Optional[str] = None
 
 
-@dataclass
-class _JobRecord:
-    job_id: str
-    status: JobStatus
-    created_at: float
-    started_at: Optional[float] = None
-    finished_at: Optional[float] = None
-    result: Optional[Dict[str, Any]] = None
-    error: Optional[str] = None
-    env: str = "development"
-
-
-class _JobStore:
-    def __init__(self, max_age_seconds: int = JOB_STORE_MAX_AGE_SECONDS) -> None:
-        self._lock = Lock()
-        self._jobs: Dict[str, _JobRecord] = {}
-        self._max_age = max_age_seconds
-
-    def create(self) -> _JobRecord:
-        job_id = str(uuid4())
-        rec = _JobRecord(job_id=job_id, status="queued", created_at=time.time())
-        with self._lock:
-            self._jobs[job_id] = rec
-        return rec
-
-    def create_with_id(self, job_id: str, env: str = "development") -> _JobRecord:
-        """Create job record with specified ID"""
-        rec = _JobRecord(
-            job_id=job_id,
-            status="queued",
-            created_at=time.time(),
-            env=env
-        )
-        with self._lock:
-            self._jobs[job_id] = rec
-        return rec
-
-    def get(self, job_id: str) -> Optional[_JobRecord]:
-        with self._lock:
-            return self._jobs.get(job_id)
-
-    def mark_running(self, job_id: str) -> None:
-        with self._lock:
-            rec = self._jobs[job_id]
-            rec.status = "running"
-            rec.started_at = time.time()
-
-    def mark_succeeded(self, job_id: str, result: Dict[str, Any]) -> None:
-        with self._lock:
-            rec = self._jobs[job_id]
-            rec.status = "succeeded"
-            rec.finished_at = time.time()
-            rec.result = result
-            rec.error = None
-
-    def mark_failed(self, job_id: str, error: str) -> None:
-        with self._lock:
-            rec = self._jobs[job_id]
-            rec.status = "failed"
-            rec.finished_at = time.time()
-            rec.result = None
-            rec.error = error
-
-    def cleanup_old_jobs(self, max_age_seconds: Optional[int] = None) -> int:
-        """
-        Clean up completed jobs older than max_age_seconds.
-
-        Only removes jobs with status 'succeeded' or 'failed'.
-        Jobs that are 'queued' or 'running' are never removed.
-
-        Returns the number of jobs removed.
-        """
-        max_age = max_age_seconds if max_age_seconds is not None else self._max_age
-        now = time.time()
-        removed = 0
-
-        with self._lock:
-            to_remove = []
-            for job_id, rec in self._jobs.items():
-                if rec.status in ("succeeded", "failed"):
-                    finish_time = rec.finished_at or rec.created_at
-                    age = now - finish_time
-                    if age > max_age:
-                        to_remove.append(job_id)
-
-            for job_id in to_remove:
-                del self._jobs[job_id]
-                removed += 1
-
-        return removed
-
-    def get_stats(self) -> Dict[str, int]:
-        """Get statistics about jobs in the store."""
-        with self._lock:
-            stats = {
-                "total": len(self._jobs),
-                "queued": 0,
-                "running": 0,
-                "succeeded": 0,
-                "failed": 0,
-            }
-            for rec in self._jobs.values():
-                if rec.status in stats:
-                    stats[rec.status] += 1
-            return stats
-
-
 def _env_bool(name: str, default: bool) -> bool:
     v = os.getenv(name)
     if v is None:
@@ -666,6 +631,11 @@ def _env_bool(name: str, default: bool) -> bool:
     return v.strip().lower() in {"1", "true", "yes", "y", "on"}
 
 
+def _env_list(name: str) -> List[str]:
+    """Comma-separated environment variable as a list of non-empty items."""
+    return [item.strip() for item in os.getenv(name, "").split(",") if item.strip()]
+
+
 def _get_model_name(config_path: str) -> str:
     """
     Extract model name from config_path.
@@ -742,6 +712,27 @@ def _map_status(status: str) -> int:
     return STATUS_MAP.get(status, 2)
 
 
+def _progress_stage(value: float) -> str:
+    """Pipeline stage of a generate_music progress value (LM < 0.51 <= DiT < 0.8 <= VAE decode < 0.99)."""
+    if value < 0.51:
+        return "lm"
+    if value < 0.8:
+        return "dit"
+    if value < 0.99:
+        return "decode"
+    return "saving"
+
+
+def _sse_message(event: Dict[str, Any]) -> str:
+    """Format a job event as a server-sent event (heartbeats as comments)."""
+    if event["type"] == "heartbeat":
+        return ": heartbeat\n\n"
+    lines = [f"id: {event['seq']}"] if event.get("seq") is not None else []
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event, ensure_ascii=False, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
 def _parse_timesteps(s: Optional[str]) -> Optional[List[float]]:
     """Parse comma-separated timesteps string to list of floats."""
     if not s or not s.strip():
@@ -842,19 +833,113 @@ async def _save_upload_to_temp(upload: StarletteUploadFile, *, prefix: str) -> s
     return path
 
 
+def _create_job_store(role: str = "all") -> JobStore:
+    backend = os.getenv("ACESTEP_JOB_STORE", "memory").strip().lower()
+    if role != "all" and backend != "sqlite":
+        print(f"[API Server] Role '{role}' shares jobs across processes: using the SQLite job store")
+        backend = "sqlite"
+    if backend == "sqlite":
+        path = os.getenv("ACESTEP_JOB_STORE_PATH", "").strip() or os.path.join(
+            _get_project_root(), ".cache", "acestep", "jobs.sqlite3"
+        )
+        print(f"[API Server] Using SQLite job store: {path}")
+        return SQLiteJobStore(path, max_age_seconds=JOB_STORE_MAX_AGE_SECONDS)
+    if backend != "memory":
+        print(f"[API Server] Warning: unknown ACESTEP_JOB_STORE '{backend}', using the in-memory job store")
+    return JobStore(max_age_seconds=JOB_STORE_MAX_AGE_SECONDS)
+
+
+def _request_params(req: BaseModel) -> Dict[str, Any]:
+    return req.model_dump() if hasattr(req, "model_dump") else req.dict()
+
+
+def _needs_lm(req: "GenerateMusicRequest") -> bool:
+    """
+    Whether a job runs the 5Hz LM: thinking (audio codes), sample mode or a
+    description (caption/lyrics/metas), use_format, or CoT caption / language.
+    """
+    has_sample_query = bool(req.sample_query and req.sample_query.strip())
+    return bool(req.thinking or req.sample_mode or has_sample_query or req.use_format
+                or req.use_cot_caption or req.use_cot_language)
+
+
+def _checkpoint_bytes(checkpoint_dir: str, *names: str) -> int:
+    """Size of the weight files of checkpoint directories: a model's footprint before it was ever loaded."""
+    total = 0
+    for name in names:
+        for root, _, files in os.walk(os.path.join(checkpoint_dir, name)):
+            total += sum(
+                os.path.getsize(os.path.join(root, f)) for f in files
+                if f.endswith((".safetensors", ".bin", ".pt", ".pth"))
+            )
+    return total
+
+
 def create_app() -> FastAPI:
-    store = _JobStore()
+    # Process role: "all" (HTTP + models), "front" (HTTP only) or "worker" (models, claims jobs from the store)
+    API_ROLE = os.getenv("ACESTEP_API_ROLE", "all").strip().lower()
+    if API_ROLE not in {"all", "front", "worker"}:
+        print(f"[API Server] Warning: unknown ACESTEP_API_ROLE '{API_ROLE}', using 'all'")
+        API_ROLE = "all"
+    WORKER_ID = os.getenv("ACESTEP_WORKER_ID", "worker-0").strip()
+    WORKER_POLL_SECONDS = float(os.getenv("ACESTEP_WORKER_POLL_SECONDS", "0.2"))
+    store = _create_job_store(API_ROLE)
 
     # API Key authentication (from environment variable)
     api_key = os.getenv("ACESTEP_API_KEY", None)
     set_api_key(api_key)
+    # Per-tenant keys: the tenant and priority class of a job come from the key that submitted it
+    set_api_key_grants(parse_api_keys(os.getenv("ACESTEP_API_KEYS", "")))
+    # X-Tenant-ID (and the tenant field) are only taken from these addresses, e.g. an authenticating gateway
+    TRUSTED_PROXIES = [
+        ipaddress.ip_network(entry.strip(), strict=False)
+        for entry in os.getenv("ACESTEP_TRUSTED_PROXIES", "").split(",") if entry.strip()
+    ]
 
     QUEUE_MAXSIZE = int(os.getenv("ACESTEP_QUEUE_MAXSIZE", "200"))
     WORKER_COUNT = int(os.getenv("ACESTEP_QUEUE_WORKERS", "1"))  # Single GPU recommended
 
+    # Fair-share scheduling across tenants (0 = no per-tenant limit)
+    TENANT_WEIGHTS = parse_weights(os.getenv("ACESTEP_TENANT_WEIGHTS", ""))
+    TENANT_MAX_QUEUED = int(os.getenv("ACESTEP_TENANT_MAX_QUEUED", "0"))
+    TENANT_MAX_RUNNING = int(os.getenv("ACESTEP_TENANT_MAX_RUNNING", "0"))
+
     INITIAL_AVG_JOB_SECONDS = float(os.getenv("ACESTEP_AVG_JOB_SECONDS", "5.0"))
     AVG_WINDOW = int(os.getenv("ACESTEP_AVG_WINDOW", "50"))
 
+    # Admission control: interactive jobs predicted to finish later than this are rejected or deferred (0 = off)
+    ETA_SLA_SECONDS = float(os.getenv("ACESTEP_ETA_SLA_SECONDS", "0"))
+    SLA_ACTION = os.getenv("ACESTEP_SLA_ACTION", "reject").strip().lower()  # "reject" | "defer" (run as batch)
+
+    # Fixed-seed requests: attach duplicates to the in-flight job, serve repeats from a result cache
+    DEDUP_ENABLED = _env_bool("ACESTEP_DEDUP", True)
+    RESULT_CACHE_SIZE = int(os.getenv("ACESTEP_RESULT_CACHE_SIZE", "256"))
+
+    # /format_input runs on its own LM thread and queue, apart from music generation
+    FORMAT_QUEUE_MAXSIZE = int(os.getenv("ACESTEP_FORMAT_QUEUE_MAXSIZE", "16"))
+    FORMAT_TIMEOUT_SECONDS = float(os.getenv("ACESTEP_FORMAT_TIMEOUT_SECONDS", "120"))
+    FORMAT_MAX_BATCH = int(os.getenv("ACESTEP_FORMAT_MAX_BATCH", "8"))
+    FORMAT_BATCH_WINDOW_MS = float(os.getenv("ACESTEP_FORMAT_BATCH_WINDOW_MS", "10"))
+
+    # Progress streams (/v1/tasks/{id}/events and /ws)
+    EVENTS_HEARTBEAT_SECONDS = float(os.getenv("ACESTEP_EVENTS_HEARTBEAT_SECONDS", "15"))
+    EVENTS_RETAIN_SECONDS = float(os.getenv("ACESTEP_EVENTS_RETAIN_SECONDS", "300"))
+
+    # DiT / LM handlers load on first use; beyond these budgets (GB, 0 = no limit) the least
+    # recently used ones move to CPU memory, then are dropped
+    MODEL_DEVICE_BUDGET_GB = float(os.getenv("ACESTEP_MODEL_DEVICE_BUDGET_GB", "0"))
+    MODEL_HOST_BUDGET_GB = float(os.getenv("ACESTEP_MODEL_HOST_BUDGET_GB", "0"))
+    MODEL_EVICT_TO_CPU = _env_bool("ACESTEP_MODEL_EVICT_TO_CPU", True)
+    # Queued jobs for loaded models may run ahead of a job that needs a swap by this much predicted work (s)
+    MODEL_GROUP_WINDOW = float(os.getenv("ACESTEP_MODEL_GROUP_WINDOW", "60"))
+    # DiT models requests may choose: ACESTEP_CONFIG_PATH (the default), ..._PATH2, ..._PATH3, ACESTEP_DIT_MODELS
+    DIT_CONFIG_PATHS = list(dict.fromkeys(p for p in [
+        os.getenv("ACESTEP_CONFIG_PATH", "acestep-v15-turbo").strip(),
+        os.getenv("ACESTEP_CONFIG_PATH2", "").strip(),
+        os.getenv("ACESTEP_CONFIG_PATH3", "").strip(),
+        *_env_list("ACESTEP_DIT_MODELS"),
+    ] if p))
+
     def _path_to_audio_url(path: str) -> str:
         """Convert local file path to downloadable relative URL"""
         if not path:
@@ -905,37 +990,34 @@ def create_app() -> FastAPI:
         app.state._init_error = None
         app.state._init_lock = init_lock
 
-        app.state.llm_handler = llm_handler
-        app.state._llm_initialized = False
-        app.state._llm_init_error = None
-        app.state._llm_init_lock = Lock()
+        app.state.llm_handler = llm_handler  # the default LM's handler
 
-        # Multi-model support: secondary DiT handlers
-        handler2 = None
-        handler3 = None
-        config_path2 = os.getenv("ACESTEP_CONFIG_PATH2", "").strip()
-        config_path3 = os.getenv("ACESTEP_CONFIG_PATH3", "").strip()
-        
-        if config_path2:
-            handler2 = AceStepHandler()
-        if config_path3:
-            handler3 = AceStepHandler()
-        
-        app.state.handler2 = handler2
-        app.state.handler3 = handler3
-        app.state._initialized2 = False
-        app.state._initialized3 = False
-        app.state._config_path = os.getenv("ACESTEP_CONFIG_PATH", "acestep-v15-turbo")
-        app.state._config_path2 = config_path2
-        app.state._config_path3 = config_path3
+        # Multi-model support: every DiT and LM handler is registered at startup (below) and loaded on first use
+        app.state.model_registry = ModelRegistry(
+            device_budget=int(MODEL_DEVICE_BUDGET_GB * 1024**3),
+            host_budget=int(MODEL_HOST_BUDGET_GB * 1024**3),
+            offload_to_host=MODEL_EVICT_TO_CPU,
+            on_event=lambda action, name: print(f"[API Server] Model registry: {action} {name}"),
+        )
+        app.state.dit_handlers = {}  # DiT model name -> AceStepHandler
+        app.state.lm_handlers = {}  # LM model name -> LLMHandler
+        app.state._config_path = DIT_CONFIG_PATHS[0]
+        app.state.default_dit = _get_model_name(DIT_CONFIG_PATHS[0])
+        app.state.default_lm = None
 
         max_workers = int(os.getenv("ACESTEP_API_WORKERS", "1"))
         executor = ThreadPoolExecutor(max_workers=max_workers)
 
         # Queue & observability
-        app.state.job_queue = asyncio.Queue(maxsize=QUEUE_MAXSIZE)  # (job_id, req)
-        app.state.pending_ids = deque()  # queued job_ids
-        app.state.pending_lock = asyncio.Lock()
+        app.state.job_queue = FairScheduler(
+            maxsize=QUEUE_MAXSIZE,
+            weights=TENANT_WEIGHTS,
+            max_queued_per_tenant=TENANT_MAX_QUEUED,
+            max_running_per_tenant=TENANT_MAX_RUNNING,
+            # Group queued jobs by the models they need: run the ones for loaded models before a swap
+            prefer=lambda models: app.state.model_registry.resident(*models),
+            group_window=MODEL_GROUP_WINDOW,
+        )  # job_id -> req
 
         # temp files per job (from multipart uploads)
         app.state.job_temp_files = {}  # job_id -> list[path]
@@ -945,10 +1027,32 @@ def create_app() -> FastAPI:
         app.state.stats_lock = asyncio.Lock()
         app.state.recent_durations = deque(maxlen=AVG_WINDOW)
         app.state.avg_job_seconds = INITIAL_AVG_JOB_SECONDS
+        app.state.cost_model = JobCostModel(INITIAL_AVG_JOB_SECONDS, window=AVG_WINDOW)
+        app.state.request_memo = RequestMemo(max_results=RESULT_CACHE_SIZE)
+        app.state.job_events = JobEventBus(retain_seconds=EVENTS_RETAIN_SECONDS)
+        app.state.job_events.bind(asyncio.get_running_loop())
+        app.state.job_tokens = {}  # job_id -> CancellationToken, while the job runs in this process
+        app.state.metrics = ServerMetrics()
 
         app.state.handler = handler
         app.state.executor = executor
         app.state.job_store = store
+
+        def _queue_depth() -> float:
+            return float(app.state.job_queue.qsize() if API_ROLE == "all" else store.count_queued())
+
+        def _running_jobs() -> float:
+            if API_ROLE == "front":
+                return float(store.get_stats()["running"])
+            return float(sum(t["running"] for t in app.state.job_queue.stats()["tenants"].values()))
+
+        app.state.metrics.attach_sources(
+            handlers=lambda: list(app.state.dit_handlers.values()),
+            llm_handlers=lambda: list(app.state.lm_handlers.values()),
+            memo=app.state.request_memo,
+            queue_depth=_queue_depth,
+            running_jobs=_running_jobs,
+        )
         app.state._python_executable = sys.executable
         
         # Temporary directory for saving generated audio files
@@ -963,6 +1067,18 @@ def create_app() -> FastAPI:
         except ImportError:
             app.state.local_cache = None
 
+        def _job_models(req: GenerateMusicRequest) -> Tuple[str, ...]:
+            """Registry names of the models a job runs on: its DiT and, when it needs one, its LM."""
+            dit = req.model if req.model in app.state.dit_handlers else app.state.default_dit
+            if dit != app.state.default_dit and app.state.model_registry.error(f"dit:{dit}"):
+                dit = app.state.default_dit  # failed to load earlier: fall back like an unknown model
+            if not _needs_lm(req):
+                return (f"dit:{dit}",)
+            lm = _get_model_name(req.lm_model_path or "")
+            return (f"dit:{dit}", f"lm:{lm if lm in app.state.lm_handlers else app.state.default_lm}")
+
+        app.state.job_models = _job_models
+
         async def _ensure_initialized() -> None:
             """Check if models are initialized (they should be loaded at startup)."""
             if getattr(app.state, "_init_error", None):
@@ -1055,93 +1171,121 @@ def create_app() -> FastAPI:
             result_key = f"{RESULT_KEY_PREFIX}{job_id}"
             local_cache.set(result_key, result_data, ex=RESULT_EXPIRE_SECONDS)
 
+        async def _publish_queue_positions() -> None:
+            """Push the queue position and ETA of every watched queued job whose position changed."""
+            events: JobEventBus = app.state.job_events
+            for job_id in events.subscribed_jobs():
+                position = app.state.job_queue.position(job_id)
+                snapshot = events.snapshot(job_id) or {}
+                if position > 0 and position != snapshot.get("queue_position"):
+                    eta = await _eta_seconds_for_job(job_id)
+                    events.publish(job_id, "queued", queue_position=position,
+                                   eta_seconds=round(eta, 1) if eta is not None else None)
+
+        app.state.publish_queue_positions = _publish_queue_positions
+
+        def _finish_cancelled(job_id: str, reason: str, run_seconds: Optional[float] = None) -> None:
+            app.state.metrics.observe_job("cancelled", run_seconds)
+            if store.mark_cancelled(job_id, reason):
+                _update_local_cache(job_id, None, "cancelled")
+                app.state.job_events.publish(job_id, "cancelled", error=reason)
+            app.state.request_memo.finish(job_id, None)
+
+        async def _cancel_job(job_id: str) -> Optional[str]:
+            """
+            Cancel a job. Returns "cancelled" (it was queued), "cancelling" (it is
+            running and stops at its next check point), the status of a job that
+            already finished, or None for an unknown job.
+            """
+            q: FairScheduler = app.state.job_queue
+            if API_ROLE == "all":
+                if q.remove(job_id) is not None:
+                    _finish_cancelled(job_id, CANCELLED_ERROR)
+                    await _cleanup_job_temp_files(job_id)
+                    await _publish_queue_positions()
+                    return "cancelled"
+                if job_id in q:
+                    app.state.job_tokens.setdefault(job_id, CancellationToken()).cancel()
+                    return "cancelling"
+                rec = store.get(job_id)
+                return rec.status if rec is not None else None
+            # Split deployment: the store is the queue; the model worker running the job polls for the request
+            status = await asyncio.to_thread(store.request_cancel, job_id)
+            if status == "cancelled":
+                # Repeating this for an already cancelled job is harmless
+                rec = store.get(job_id)
+                _update_local_cache(job_id, None, "cancelled")
+                _discard_temp_files(rec.temp_files if rec is not None else [])
+            return "cancelling" if status == "running" else status
+
+        app.state.cancel_job = _cancel_job
+
         async def _run_one_job(job_id: str, req: GenerateMusicRequest) -> None:
-            job_store: _JobStore = app.state.job_store
+            job_store: JobStore = app.state.job_store
             llm: LLMHandler = app.state.llm_handler
             executor: ThreadPoolExecutor = app.state.executor
 
             await _ensure_initialized()
-            job_store.mark_running(job_id)
-            
-            # Select DiT handler based on user's model choice
-            # Default: use primary handler
-            selected_handler: AceStepHandler = app.state.handler
-            selected_model_name = _get_model_name(app.state._config_path)
-            
-            if req.model:
-                model_matched = False
-                
-                # Check if it matches the second model
-                if app.state.handler2 and getattr(app.state, "_initialized2", False):
-                    model2_name = _get_model_name(app.state._config_path2)
-                    if req.model == model2_name:
-                        selected_handler = app.state.handler2
-                        selected_model_name = model2_name
-                        model_matched = True
-                        print(f"[API Server] Job {job_id}: Using second model: {model2_name}")
-                
-                # Check if it matches the third model
-                if not model_matched and app.state.handler3 and getattr(app.state, "_initialized3", False):
-                    model3_name = _get_model_name(app.state._config_path3)
-                    if req.model == model3_name:
-                        selected_handler = app.state.handler3
-                        selected_model_name = model3_name
-                        model_matched = True
-                        print(f"[API Server] Job {job_id}: Using third model: {model3_name}")
-                
-                if not model_matched:
-                    available_models = [_get_model_name(app.state._config_path)]
-                    if app.state.handler2 and getattr(app.state, "_initialized2", False):
-                        available_models.append(_get_model_name(app.state._config_path2))
-                    if app.state.handler3 and getattr(app.state, "_initialized3", False):
-                        available_models.append(_get_model_name(app.state._config_path3))
-                    print(f"[API Server] Job {job_id}: Model '{req.model}' not found in {available_models}, using primary: {selected_model_name}")
-            
-            # Use selected handler for generation
-            h: AceStepHandler = selected_handler
+            token: CancellationToken = app.state.job_tokens.setdefault(job_id, CancellationToken())
+            if token.cancelled:
+                # Cancelled between dispatch and start
+                _finish_cancelled(job_id, token.reason)
+                return
+            rec = job_store.get(job_id)
+            if not job_store.mark_running(job_id):
+                # Finished elsewhere (e.g. cancelled through another process) since it was dispatched
+                print(f"[API Server] Job {job_id} is already {job_store.get(job_id).status}, not running it")
+                app.state.request_memo.finish(job_id, None)
+                return
+            if rec is not None:
+                app.state.metrics.observe_queue_wait(time.time() - rec.created_at)
+            events: JobEventBus = app.state.job_events
+            events.publish(job_id, "running", queue_position=0, eta_seconds=None)
+            stage = {"name": None}
+
+            def _report_progress(value: Any, desc: Optional[str] = None, **_: Any) -> None:
+                """Gradio-style progress callback for generate_music; runs on the generation thread."""
+                if not isinstance(value, (int, float)):
+                    return
+                fields: Dict[str, Any] = {"stage": _progress_stage(value), "progress": round(float(value), 3), "message": desc}
+                step = DIFFUSION_STEP_RE.match(desc or "")
+                if step:
+                    fields["diffusion_step"], fields["diffusion_steps"] = int(step.group(1)), int(step.group(2))
+                changed = fields["stage"] != stage["name"]
+                stage["name"] = fields["stage"]
+                events.publish_threadsafe(job_id, "stage" if changed else "progress", **fields)
+
+            def _enter_stage(name: str) -> None:
+                stage["name"] = name
+                events.publish_threadsafe(job_id, "stage", stage=name, progress=0.0, message=None)
+
+            async def _sample_lm_codes() -> None:
+                """The LM reports no per-token progress; sample its code counter while the job is in the LM stage."""
+                last = None
+                while True:
+                    await asyncio.sleep(LM_PROGRESS_INTERVAL)
+                    processor = getattr(llm, "constrained_processor", None)
+                    if stage["name"] != "lm" or processor is None or not events.has_subscribers(job_id):
+                        continue
+                    counts = (processor.codes_count, processor.target_codes)
+                    if counts != last:
+                        last = counts
+                        events.publish(job_id, "lm_tokens", lm_codes=counts[0], lm_target_codes=counts[1])
+
+            # Models this job runs on; _generate_cancellable loads or restores them when it starts
+            job_models = _job_models(req)
+            selected_model_name = job_models[0][len("dit:"):]
+            if req.model and req.model != selected_model_name:
+                print(f"[API Server] Job {job_id}: Model '{req.model}' not available in {list(app.state.dit_handlers)}, using primary: {selected_model_name}")
+            elif selected_model_name != app.state.default_dit:
+                print(f"[API Server] Job {job_id}: Using model: {selected_model_name}")
+            h: AceStepHandler = app.state.dit_handlers[selected_model_name]
+            lm_model_name = job_models[1][len("lm:"):] if len(job_models) > 1 else app.state.default_lm
+            llm = app.state.lm_handlers.get(lm_model_name, llm)
 
             def _blocking_generate() -> Dict[str, Any]:
                 """Generate music using unified inference logic from acestep.inference"""
                 
-                def _ensure_llm_ready() -> None:
-                    """Ensure LLM handler is initialized when needed"""
-                    with app.state._llm_init_lock:
-                        initialized = getattr(app.state, "_llm_initialized", False)
-                        had_error = getattr(app.state, "_llm_init_error", None)
-                        if initialized or had_error is not None:
-                            return
-
-                        project_root = _get_project_root()
-                        checkpoint_dir = os.path.join(project_root, "checkpoints")
-                        lm_model_path = (req.lm_model_path or os.getenv("ACESTEP_LM_MODEL_PATH") or "acestep-5Hz-lm-0.6B").strip()
-                        backend = (req.lm_backend or os.getenv("ACESTEP_LM_BACKEND") or "vllm").strip().lower()
-                        if backend not in {"vllm", "pt"}:
-                            backend = "vllm"
-
-                        # Auto-download LM model if not present
-                        lm_model_name = _get_model_name(lm_model_path)
-                        if lm_model_name:
-                            try:
-                                _ensure_model_downloaded(lm_model_name, checkpoint_dir)
-                            except Exception as e:
-                                print(f"[API Server] Warning: Failed to download LM model {lm_model_name}: {e}")
-
-                        lm_device = os.getenv("ACESTEP_LM_DEVICE", os.getenv("ACESTEP_DEVICE", "auto"))
-                        lm_offload = _env_bool("ACESTEP_LM_OFFLOAD_TO_CPU", False)
-
-                        status, ok = llm.initialize(
-                            checkpoint_dir=checkpoint_dir,
-                            lm_model_path=lm_model_path,
-                            backend=backend,
-                            device=lm_device,
-                            offload_to_cpu=lm_offload,
-                            dtype=h.dtype,
-                        )
-                        if not ok:
-                            app.state._llm_init_error = status
-                        else:
-                            app.state._llm_initialized = True
-
                 def _normalize_metas(meta: Dict[str, Any]) -> Dict[str, Any]:
                     """Ensure a stable `metas` dict (keys always present)."""
                     meta = meta or {}
@@ -1163,27 +1307,10 @@ def create_app() -> FastAPI:
                 lm_top_k = req.lm_top_k if req.lm_top_k and req.lm_top_k > 0 else 0
                 lm_top_p = req.lm_top_p if req.lm_top_p and req.lm_top_p < 1.0 else 0.9
 
-                # Determine if LLM is needed
+                # The LM, when _needs_lm(req), was loaded and pinned with the DiT before this runs
                 thinking = bool(req.thinking)
                 sample_mode = bool(req.sample_mode)
                 has_sample_query = bool(req.sample_query and req.sample_query.strip())
-                use_format = bool(req.use_format)
-                use_cot_caption = bool(req.use_cot_caption)
-                use_cot_language = bool(req.use_cot_language)
-                
-                # LLM is needed for:
-                # - thinking mode (LM generates audio codes)
-                # - sample_mode (LM generates random caption/lyrics/metas)
-                # - sample_query/description (LM generates from description)
-                # - use_format (LM enhances caption/lyrics)
-                # - use_cot_caption or use_cot_language (LM enhances metadata)
-                need_llm = thinking or sample_mode or has_sample_query or use_format or use_cot_caption or use_cot_language
-
-                # Ensure LLM is ready if needed
-                if need_llm:
-                    _ensure_llm_ready()
-                    if getattr(app.state, "_llm_init_error", None):
-                        raise RuntimeError(f"5Hz LM init failed: {app.state._llm_init_error}")
 
                 # Handle sample mode or description: generate caption/lyrics/metas via LM
                 caption = req.prompt
@@ -1197,7 +1324,9 @@ def create_app() -> FastAPI:
                 original_prompt = req.prompt or ""
                 original_lyrics = req.lyrics or ""
                 
+                lm_text_ready = False
                 if sample_mode or has_sample_query:
+                    _enter_stage("lm_sample")
                     # Parse description hints from sample_query (if provided)
                     sample_query = req.sample_query if has_sample_query else "NO USER INPUT"
                     parsed_language, parsed_instrumental = _parse_description_hints(sample_query)
@@ -1232,15 +1361,14 @@ def create_app() -> FastAPI:
                     key_scale = sample_result.keyscale
                     time_signature = sample_result.timesignature
                     audio_duration = sample_result.duration
+                    lm_text_ready = True
 
                 # Apply format_sample() if use_format is True and caption/lyrics are provided
                 format_has_duration = False
 
                 if req.use_format and (caption or lyrics):
-                    _ensure_llm_ready()
-                    if getattr(app.state, "_llm_init_error", None):
-                        raise RuntimeError(f"5Hz LM init failed (needed for format): {app.state._llm_init_error}")
-                    
+                    _enter_stage("lm_format")
+
                     # Build user_metadata from request params (matching bot.py behavior)
                     user_metadata_for_format = {}
                     if bpm is not None:
@@ -1278,6 +1406,14 @@ def create_app() -> FastAPI:
                             key_scale = format_result.keyscale
                         if format_result.timesignature:
                             time_signature = format_result.timesignature
+                        lm_text_ready = True
+
+                if lm_text_ready:
+                    # Partial result: the caption and metadata the LM settled on, before any audio exists
+                    events.publish_threadsafe(job_id, "partial", partial={
+                        "caption": caption, "lyrics": lyrics, "bpm": bpm, "keyscale": key_scale,
+                        "timesignature": time_signature, "duration": audio_duration,
+                    })
 
                 # Parse timesteps string to list of floats if provided
                 parsed_timesteps = _parse_timesteps(req.timesteps)
@@ -1316,6 +1452,11 @@ def create_app() -> FastAPI:
                     shift=req.shift,
                     infer_method=req.infer_method,
                     timesteps=parsed_timesteps,
+                    step_cache_mode=req.step_cache_mode,
+                    step_cache_interval=req.step_cache_interval,
+                    step_cache_threshold=req.step_cache_threshold,
+                    lora_adapter=req.lora_adapter,
+                    lora_scale=req.lora_scale,
                     repainting_start=req.repainting_start,
                     repainting_end=req.repainting_end if req.repainting_end else -1,
                     audio_cover_strength=req.audio_cover_strength,
@@ -1343,14 +1484,15 @@ def create_app() -> FastAPI:
                     batch_size=batch_size,
                     allow_lm_batch=req.allow_lm_batch,
                     use_random_seed=req.use_random_seed,
-                    seeds=None,  # Let unified logic handle seed generation
+                    # A fixed seed must reach the handler (it does not fall back to params.seed);
+                    # otherwise let unified logic handle seed generation
+                    seeds=[req.seed] if not req.use_random_seed and req.seed >= 0 else None,
                     audio_format=req.audio_format,
                     constrained_decoding_debug=req.constrained_decoding_debug,
                 )
 
-                # Check LLM initialization status
-                llm_is_initialized = getattr(app.state, "_llm_initialized", False)
-                llm_to_pass = llm if llm_is_initialized else None
+                # Only a pinned LM is passed: an unpinned one may be evicted while this job runs
+                llm_to_pass = llm if len(job_models) > 1 and llm.llm_initialized else None
 
                 # Generate music using unified interface
                 result = generate_music(
@@ -1359,7 +1501,7 @@ def create_app() -> FastAPI:
                     params=params,
                     config=config,
                     save_dir=app.state.temp_audio_dir,
-                    progress=None,
+                    progress=_report_progress,
                 )
 
                 if not result.success:
@@ -1410,6 +1552,7 @@ def create_app() -> FastAPI:
 
                 # Build generation_info using the helper function (like gradio_ui)
                 time_costs = result.extra_outputs.get("time_costs", {})
+                app.state.metrics.observe_time_costs(time_costs)
                 generation_info = _build_generation_info(
                     lm_metadata=lm_metadata,
                     time_costs=time_costs,
@@ -1426,9 +1569,7 @@ def create_app() -> FastAPI:
                         return None
                     return s
 
-                # Get model information
-                lm_model_name = os.getenv("ACESTEP_LM_MODEL_PATH", "acestep-5Hz-lm-0.6B")
-                # Use selected_model_name (set at the beginning of _run_one_job)
+                # Use the model names chosen at the beginning of _run_one_job
                 dit_model_name = selected_model_name
                 
                 return {
@@ -1452,40 +1593,108 @@ def create_app() -> FastAPI:
                     "dit_model": dit_model_name,
                 }
 
+            def _generate_cancellable() -> Dict[str, Any]:
+                # The generation thread's check points (acestep/cancellation.py) watch this job's token
+                with cancellation_scope(token):
+                    # Pins the job's models, loading them (or restoring them from CPU) first if needed
+                    with app.state.model_registry.use(*job_models):
+                        return _blocking_generate()
+
             t0 = time.time()
+            result = None
+            lm_sampler = asyncio.create_task(_sample_lm_codes())
             try:
                 loop = asyncio.get_running_loop()
-                result = await loop.run_in_executor(executor, _blocking_generate)
-                job_store.mark_succeeded(job_id, result)
-
-                # Update local cache
-                _update_local_cache(job_id, result, "succeeded")
-            except Exception:
-                job_store.mark_failed(job_id, traceback.format_exc())
-
-                # Update local cache
-                _update_local_cache(job_id, None, "failed")
+                result = await loop.run_in_executor(executor, _generate_cancellable)
+                if job_store.mark_succeeded(job_id, result):
+                    # Update local cache
+                    _update_local_cache(job_id, result, "succeeded")
+                    events.publish(job_id, "succeeded", stage="done", progress=1.0, message=None, result=result)
+                else:
+                    # A status set meanwhile (cancelled, or failed by a restart's recovery) stays final
+                    print(f"[API Server] Job {job_id} is already {job_store.get(job_id).status}, dropping its result")
+            except Exception as e:
+                result = None
+                if token.cancelled:
+                    # JobCancelled, or an error a cancelled stage surfaced as
+                    _finish_cancelled(job_id, token.reason, time.time() - t0)
+                elif job_store.mark_failed(job_id, traceback.format_exc()):
+                    # Update local cache
+                    _update_local_cache(job_id, None, "failed")
+                    events.publish(job_id, "failed", error=f"{type(e).__name__}: {e}")
             finally:
+                lm_sampler.cancel()
+                app.state.request_memo.finish(job_id, result)
                 dt = max(0.0, time.time() - t0)
-                async with app.state.stats_lock:
-                    app.state.recent_durations.append(dt)
-                    if app.state.recent_durations:
-                        app.state.avg_job_seconds = sum(app.state.recent_durations) / len(app.state.recent_durations)
+                if result is not None or not token.cancelled:
+                    # A run cut short by cancellation says nothing about job durations
+                    app.state.metrics.observe_job("succeeded" if result is not None else "failed", dt)
+                    async with app.state.stats_lock:
+                        app.state.recent_durations.append(dt)
+                        if app.state.recent_durations:
+                            app.state.avg_job_seconds = sum(app.state.recent_durations) / len(app.state.recent_durations)
+                if result is not None:
+                    # Only successful runs say how long this kind of job takes
+                    app.state.cost_model.observe(
+                        req, dt, duration=result.get("duration"), predicted=app.state.job_queue.cost(job_id)
+                    )
 
         async def _queue_worker(worker_idx: int) -> None:
             while True:
                 job_id, req = await app.state.job_queue.get()
+                await _publish_queue_positions()
                 try:
-                    async with app.state.pending_lock:
-                        try:
-                            app.state.pending_ids.remove(job_id)
-                        except ValueError:
-                            pass
-
                     await _run_one_job(job_id, req)
                 finally:
                     await _cleanup_job_temp_files(job_id)
-                    app.state.job_queue.task_done()
+                    app.state.job_queue.task_done(job_id)
+                    app.state.job_tokens.pop(job_id, None)
+                    if app.state.job_slots is not None:
+                        app.state.job_slots.release()
+
+        async def _store_feeder() -> None:
+            """Model-worker role: claim the oldest queued job from the shared store whenever a queue worker is free."""
+            while True:
+                await app.state.job_slots.acquire()
+                try:
+                    rec = None
+                    while rec is None:
+                        rec = await asyncio.to_thread(store.claim_next, WORKER_ID)
+                        if rec is None:
+                            await asyncio.sleep(WORKER_POLL_SECONDS)
+                    req = GenerateMusicRequest(**(rec.params or {}))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    app.state.job_slots.release()
+                    if rec is not None:
+                        store.mark_failed(rec.job_id, f"Invalid job params: {e}")
+                        _update_local_cache(rec.job_id, None, "failed")
+                    else:
+                        print(f"[API Server] Job claim error: {e}")
+                        await asyncio.sleep(WORKER_POLL_SECONDS)
+                    continue
+                if rec.temp_files:
+                    async with app.state.job_temp_files_lock:
+                        app.state.job_temp_files[rec.job_id] = list(rec.temp_files)
+                # Claims are bounded by job_slots, so the local queue never fills
+                app.state.job_queue.put_nowait(
+                    rec.job_id, req, tenant=req.tenant or DEFAULT_TENANT, cost=app.state.cost_model.predict(req),
+                    group=_job_models(req),
+                )
+
+        async def _cancel_watcher() -> None:
+            """Model-worker role: stop this worker's jobs whose cancellation was requested through any process."""
+            while True:
+                await asyncio.sleep(WORKER_POLL_SECONDS)
+                try:
+                    job_ids = await asyncio.to_thread(store.cancel_requested, WORKER_ID)
+                except Exception as e:
+                    print(f"[API Server] Cancel poll error: {e}")
+                    continue
+                for job_id in job_ids:
+                    if job_id in app.state.job_queue:
+                        app.state.job_tokens.setdefault(job_id, CancellationToken()).cancel()
 
         async def _job_store_cleanup_worker() -> None:
             """Background task to periodically clean up old completed jobs."""
@@ -1501,14 +1710,56 @@ def create_app() -> FastAPI:
                 except Exception as e:
                     print(f"[API Server] Job cleanup error: {e}")
 
+        cleanup_task = asyncio.create_task(_job_store_cleanup_worker())
+        app.state.cleanup_task = cleanup_task
+        app.state.api_role = API_ROLE
+
+        if API_ROLE == "front":
+            # HTTP only: /release_task writes to the shared job store, model workers claim from it
+            print(f"[API Server] Front process {os.getpid()}: no models loaded, jobs go to {store.path}")
+            try:
+                yield
+            finally:
+                cleanup_task.cancel()
+                executor.shutdown(wait=False, cancel_futures=True)
+                store.close()
+            return
+
         worker_count = max(1, WORKER_COUNT)
+        # Worker role: one claim slot per queue worker, so jobs stay in the shared store until a worker is free
+        app.state.job_slots = asyncio.Semaphore(worker_count) if API_ROLE == "worker" else None
         workers = [asyncio.create_task(_queue_worker(i)) for i in range(worker_count)]
-        cleanup_task = asyncio.create_task(_job_store_cleanup_worker())
         app.state.worker_tasks = workers
-        app.state.cleanup_task = cleanup_task
+
+        def _run_format(payload: Tuple[str, str, Tuple[Tuple[str, Any], ...], float]) -> Any:
+            caption, lyrics, metadata, temperature = payload
+            try:
+                # Pins the default LM for the call, loading it first if needed
+                with app.state.model_registry.use(f"lm:{app.state.default_lm}") as (lm,):
+                    return format_sample(
+                        llm_handler=lm,
+                        caption=caption,
+                        lyrics=lyrics,
+                        user_metadata=dict(metadata) or None,
+                        temperature=temperature,
+                        use_constrained_decoding=True,
+                    )
+            except ModelLoadError as e:
+                raise HTTPException(status_code=500, detail=f"LLM init failed: {e}")
+
+        format_pool = LLMRequestPool(
+            _run_format,
+            max_queue=FORMAT_QUEUE_MAXSIZE,
+            max_batch=FORMAT_MAX_BATCH,
+            batch_window=FORMAT_BATCH_WINDOW_MS / 1000.0,
+            timeout=FORMAT_TIMEOUT_SECONDS,
+            name="acestep-format",
+        )
+        await format_pool.start()
+        app.state.format_pool = format_pool
 
         # =================================================================
-        # Initialize models at startup (not lazily on first request)
+        # Register models; preload the default ones (the rest load on first request)
         # =================================================================
         print("[API Server] Initializing models at startup...")
 
@@ -1542,7 +1793,6 @@ def create_app() -> FastAPI:
             print("[API Server] No GPU detected, running on CPU")
 
         project_root = _get_project_root()
-        config_path = os.getenv("ACESTEP_CONFIG_PATH", "acestep-v15-turbo")
         device = os.getenv("ACESTEP_DEVICE", "auto")
         use_flash_attention = _env_bool("ACESTEP_USE_FLASH_ATTENTION", True)
 
@@ -1561,97 +1811,67 @@ def create_app() -> FastAPI:
         checkpoint_dir = os.path.join(project_root, "checkpoints")
         os.makedirs(checkpoint_dir, exist_ok=True)
 
-        # Download and initialize primary DiT model
-        dit_model_name = _get_model_name(config_path)
-        if dit_model_name:
-            try:
-                _ensure_model_downloaded(dit_model_name, checkpoint_dir)
-            except Exception as e:
-                print(f"[API Server] Warning: Failed to download DiT model: {e}")
-
-        # Download VAE model
+        # Download VAE model (shared by all DiT models)
         try:
             _ensure_model_downloaded("vae", checkpoint_dir)
         except Exception as e:
             print(f"[API Server] Warning: Failed to download VAE model: {e}")
 
-        print(f"[API Server] Loading primary DiT model: {config_path}")
-        status_msg, ok = handler.initialize_service(
-            project_root=project_root,
-            config_path=config_path,
-            device=device,
-            use_flash_attention=use_flash_attention,
-            compile_model=False,
-            offload_to_cpu=offload_to_cpu,
-            offload_dit_to_cpu=offload_dit_to_cpu,
-        )
-        if not ok:
-            app.state._init_error = status_msg
-            print(f"[API Server] ERROR: Primary model failed to load: {status_msg}")
-            raise RuntimeError(status_msg)
-        app.state._initialized = True
-        print(f"[API Server] Primary model loaded: {_get_model_name(config_path)}")
+        # torch.compile with bucketed shapes and a persistent compile cache
+        compile_model = _env_bool("ACESTEP_COMPILE_MODEL", False)
+        quantization = os.getenv("ACESTEP_QUANTIZATION", "").strip() or None
+        registry: ModelRegistry = app.state.model_registry
 
-        # Initialize secondary model if configured
-        if handler2 and config_path2:
-            model2_name = _get_model_name(config_path2)
-            if model2_name:
+        def _dit_loader(dit_handler: AceStepHandler, dit_config_path: str, primary: bool):
+            def load() -> AceStepHandler:
+                model_name = _get_model_name(dit_config_path)
                 try:
-                    _ensure_model_downloaded(model2_name, checkpoint_dir)
+                    _ensure_model_downloaded(model_name, checkpoint_dir)
                 except Exception as e:
-                    print(f"[API Server] Warning: Failed to download secondary model: {e}")
-
-            print(f"[API Server] Loading secondary DiT model: {config_path2}")
-            try:
-                status_msg2, ok2 = handler2.initialize_service(
+                    print(f"[API Server] Warning: Failed to download DiT model {model_name}: {e}")
+                print(f"[API Server] Loading DiT model: {dit_config_path}")
+                status_msg, ok = dit_handler.initialize_service(
                     project_root=project_root,
-                    config_path=config_path2,
+                    config_path=dit_config_path,
                     device=device,
                     use_flash_attention=use_flash_attention,
-                    compile_model=False,
+                    compile_model=compile_model,
                     offload_to_cpu=offload_to_cpu,
                     offload_dit_to_cpu=offload_dit_to_cpu,
+                    quantization=quantization,
                 )
-                app.state._initialized2 = ok2
-                if ok2:
-                    print(f"[API Server] Secondary model loaded: {model2_name}")
-                else:
-                    print(f"[API Server] Warning: Secondary model failed: {status_msg2}")
-            except Exception as e:
-                print(f"[API Server] Warning: Failed to initialize secondary model: {e}")
-                app.state._initialized2 = False
-
-        # Initialize third model if configured
-        if handler3 and config_path3:
-            model3_name = _get_model_name(config_path3)
-            if model3_name:
-                try:
-                    _ensure_model_downloaded(model3_name, checkpoint_dir)
-                except Exception as e:
-                    print(f"[API Server] Warning: Failed to download third model: {e}")
-
-            print(f"[API Server] Loading third DiT model: {config_path3}")
-            try:
-                status_msg3, ok3 = handler3.initialize_service(
-                    project_root=project_root,
-                    config_path=config_path3,
-                    device=device,
-                    use_flash_attention=use_flash_attention,
-                    compile_model=False,
-                    offload_to_cpu=offload_to_cpu,
-                    offload_dit_to_cpu=offload_dit_to_cpu,
-                )
-                app.state._initialized3 = ok3
-                if ok3:
-                    print(f"[API Server] Third model loaded: {model3_name}")
-                else:
-                    print(f"[API Server] Warning: Third model failed: {status_msg3}")
-            except Exception as e:
-                print(f"[API Server] Warning: Failed to initialize third model: {e}")
-                app.state._initialized3 = False
-
-        # Initialize LLM model based on GPU configuration
-        # Auto-determine whether to initialize LM based on GPU config
+                if not ok:
+                    raise RuntimeError(status_msg)
+                if primary:
+                    # Resident LoRA adapters for per-request selection: "name=path,name2=path2"
+                    for entry in _env_list("ACESTEP_LORA_ADAPTERS"):
+                        adapter_name, _, adapter_path = entry.rpartition("=")
+                        print(f"[API Server] {dit_handler.load_lora(adapter_path, adapter_name=adapter_name or None)}")
+                    if compile_model and _env_bool("ACESTEP_COMPILE_WARMUP", True):
+                        print("[API Server] Warming up compiled DiT for all shape buckets...")
+                        warmup_result = dit_handler.warmup()
+                        print(f"[API Server] Warmup done: {warmup_result['counters']}")
+                print(f"[API Server] DiT model loaded: {model_name}")
+                return dit_handler
+            return load
+
+        for i, dit_config_path in enumerate(DIT_CONFIG_PATHS):
+            model_name = _get_model_name(dit_config_path)
+            dit_handler = handler if i == 0 else AceStepHandler()
+            app.state.dit_handlers[model_name] = dit_handler
+            registry.register(ModelSpec(
+                f"dit:{model_name}",
+                load=_dit_loader(dit_handler, dit_config_path, primary=i == 0),
+                # Every DiT handler holds its own VAE and text encoder
+                size_bytes=_checkpoint_bytes(checkpoint_dir, model_name, "vae", "Qwen3-Embedding-0.6B"),
+                measure=AceStepHandler.memory_footprint,
+                offload=AceStepHandler.offload_models,
+                restore=AceStepHandler.restore_models,
+                release=AceStepHandler.unload,
+            ))
+
+        # LM models: the default (ACESTEP_LM_MODEL_PATH, or the one recommended for this GPU) and ACESTEP_LM_MODELS
+        # Auto-determine whether to preload the LM based on GPU config
         init_llm_env = os.getenv("ACESTEP_INIT_LLM")
         if init_llm_env is not None:
             init_llm = _env_bool("ACESTEP_INIT_LLM", True)
@@ -1659,21 +1879,16 @@ def create_app() -> FastAPI:
             init_llm = gpu_config.init_lm_default
             print(f"[API Server] Auto-setting init_llm={init_llm} based on GPU configuration")
 
+        lm_model_path = os.getenv("ACESTEP_LM_MODEL_PATH", "").strip() or "acestep-5Hz-lm-0.6B"
         if init_llm:
-            print("[API Server] Loading LLM model...")
-
             # Auto-select LM model based on GPU config if not explicitly set
-            lm_model_path_env = os.getenv("ACESTEP_LM_MODEL_PATH", "").strip()
-            if lm_model_path_env:
-                lm_model_path = lm_model_path_env
-            else:
+            if not os.getenv("ACESTEP_LM_MODEL_PATH", "").strip():
                 # Get recommended LM model for this GPU tier
                 recommended_lm = get_recommended_lm_model(gpu_config)
                 if recommended_lm:
                     lm_model_path = recommended_lm
                     print(f"[API Server] Auto-selected LM model: {lm_model_path} based on GPU tier")
                 else:
-                    lm_model_path = "acestep-5Hz-lm-0.6B"
                     print(f"[API Server] Using default LM model: {lm_model_path}")
 
             # Validate LM model is supported for this GPU
@@ -1689,43 +1904,116 @@ def create_app() -> FastAPI:
                     print("[API Server] No supported LM models for this GPU, skipping LM initialization")
                     init_llm = False
 
-        if init_llm:
-            lm_backend = os.getenv("ACESTEP_LM_BACKEND", "vllm").strip().lower()
-            if lm_backend not in {"vllm", "pt"}:
-                lm_backend = "vllm"
-            lm_device = os.getenv("ACESTEP_LM_DEVICE", device)
-
-            # Auto-determine LM offload based on GPU config
-            lm_offload_env = os.getenv("ACESTEP_LM_OFFLOAD_TO_CPU")
-            if lm_offload_env is not None:
-                lm_offload = _env_bool("ACESTEP_LM_OFFLOAD_TO_CPU", False)
-            else:
-                lm_offload = offload_to_cpu
+        lm_backend = os.getenv("ACESTEP_LM_BACKEND", "vllm").strip().lower()
+        if lm_backend not in {"vllm", "pt"}:
+            lm_backend = "vllm"
+        lm_device = os.getenv("ACESTEP_LM_DEVICE", device)
 
-            try:
-                _ensure_model_downloaded(lm_model_path, checkpoint_dir)
-            except Exception as e:
-                print(f"[API Server] Warning: Failed to download LLM model: {e}")
-
-            llm_status, llm_ok = llm_handler.initialize(
-                checkpoint_dir=checkpoint_dir,
-                lm_model_path=lm_model_path,
-                backend=lm_backend,
-                device=lm_device,
-                offload_to_cpu=lm_offload,
-                dtype=handler.dtype,
-            )
-            if llm_ok:
-                app.state._llm_initialized = True
-                print(f"[API Server] LLM model loaded: {lm_model_path}")
-            else:
-                app.state._llm_init_error = llm_status
-                print(f"[API Server] Warning: LLM model failed to load: {llm_status}")
+        # Auto-determine LM offload based on GPU config
+        lm_offload_env = os.getenv("ACESTEP_LM_OFFLOAD_TO_CPU")
+        if lm_offload_env is not None:
+            lm_offload = _env_bool("ACESTEP_LM_OFFLOAD_TO_CPU", False)
         else:
-            print("[API Server] Skipping LLM initialization (disabled or not supported for this GPU)")
-            app.state._llm_initialized = False
+            lm_offload = offload_to_cpu
 
-        print("[API Server] All models initialized successfully!")
+        def _lm_loader(lm: LLMHandler, path: str):
+            def load() -> LLMHandler:
+                try:
+                    _ensure_model_downloaded(path, checkpoint_dir)
+                except Exception as e:
+                    print(f"[API Server] Warning: Failed to download LLM model: {e}")
+                print(f"[API Server] Loading LLM model: {path}")
+                llm_status, llm_ok = lm.initialize(
+                    checkpoint_dir=checkpoint_dir,
+                    lm_model_path=path,
+                    backend=lm_backend,
+                    device=lm_device,
+                    offload_to_cpu=lm_offload,
+                    # Match the primary DiT when it is loaded, else auto-detect from the device
+                    dtype=handler.dtype if handler.model is not None else None,
+                    num_speculative_tokens=int(os.getenv("ACESTEP_LM_SPECULATIVE_TOKENS", "0")),
+                    kv_cache_dtype=os.getenv("ACESTEP_LM_KV_CACHE_DTYPE", "auto"),
+                )
+                if not llm_ok:
+                    raise RuntimeError(f"5Hz LM init failed: {llm_status}")
+                print(f"[API Server] LLM model loaded: {path}")
+                return lm
+            return load
+
+        app.state.default_lm = _get_model_name(lm_model_path)
+        for path in dict.fromkeys([lm_model_path] + _env_list("ACESTEP_LM_MODELS")):
+            model_name = _get_model_name(path)
+            lm = llm_handler if model_name == app.state.default_lm else LLMHandler()
+            app.state.lm_handlers[model_name] = lm
+            registry.register(ModelSpec(
+                f"lm:{model_name}",
+                load=_lm_loader(lm, path),
+                size_bytes=_checkpoint_bytes(checkpoint_dir, path),
+                measure=LLMHandler.memory_footprint,
+                # A nano-vllm engine cannot move to the CPU, and only one can exist per process
+                offload=LLMHandler.offload_model if lm_backend == "pt" else None,
+                restore=LLMHandler.restore_model if lm_backend == "pt" else None,
+                release=LLMHandler.unload,
+                exclusive="nanovllm" if lm_backend == "vllm" else None,
+            ))
+
+        # Preload: ACESTEP_PRELOAD_MODELS (DiT / LM model names), default the default DiT and, if enabled, LM
+        preload = [f"dit:{app.state.default_dit}"] + ([f"lm:{app.state.default_lm}"] if init_llm else [])
+        if _env_list("ACESTEP_PRELOAD_MODELS"):
+            preload = []
+            for name in _env_list("ACESTEP_PRELOAD_MODELS"):
+                kind = "dit" if name in app.state.dit_handlers else "lm" if name in app.state.lm_handlers else None
+                if kind is None:
+                    print(f"[API Server] Warning: ACESTEP_PRELOAD_MODELS names unknown model '{name}'")
+                else:
+                    preload.append(f"{kind}:{name}")
+        for model in preload:
+            try:
+                with registry.use(model):
+                    pass
+            except ModelLoadError as e:
+                if model == f"dit:{app.state.default_dit}":
+                    app.state._init_error = str(e)
+                    print(f"[API Server] ERROR: Primary model failed to load: {e}")
+                    raise RuntimeError(str(e))
+                print(f"[API Server] Warning: {e}")
+        app.state._initialized = True
+        if not init_llm:
+            print("[API Server] LLM not preloaded (disabled or not supported for this GPU); it loads on first use")
+
+        print(f"[API Server] Models registered: {registry.names()}, preloaded: {preload}")
+
+        # Re-enqueue jobs a previous process accepted but never started (persistent stores only).
+        # A model worker only fails its own interrupted jobs; queued ones stay in the shared store.
+        recovered, interrupted = store.recover(worker=WORKER_ID if API_ROLE == "worker" else None)
+        if API_ROLE == "worker":
+            recovered = []
+            workers.append(asyncio.create_task(_store_feeder()))
+            workers.append(asyncio.create_task(_cancel_watcher()))
+            print(f"[API Server] Model worker '{WORKER_ID}' claiming jobs from {store.path}")
+        for job_id in interrupted:
+            _update_local_cache(job_id, None, "failed")
+        for rec in recovered:
+            try:
+                req = GenerateMusicRequest(**(rec.params or {}))
+            except Exception as e:
+                store.mark_failed(rec.job_id, f"Could not restore request after restart: {e}")
+                _update_local_cache(rec.job_id, None, "failed")
+                continue
+            try:
+                app.state.job_queue.put_nowait(
+                    rec.job_id, req, tenant=req.tenant or DEFAULT_TENANT, priority=req.priority,
+                    cost=app.state.cost_model.predict(req), group=_job_models(req),
+                )
+            except (SchedulerFull, ValueError) as e:
+                store.mark_failed(rec.job_id, f"Not re-enqueued after restart: {e}", retryable=True)
+                _update_local_cache(rec.job_id, None, "failed")
+                continue
+            if rec.temp_files:
+                app.state.job_temp_files[rec.job_id] = list(rec.temp_files)
+        if recovered or interrupted:
+            print(f"[API Server] Job store recovery: re-enqueued {app.state.job_queue.qsize()} of {len(recovered)} "
+                  f"queued jobs, {len(interrupted)} interrupted running jobs marked failed (retryable)")
 
         try:
             yield
@@ -1733,28 +2021,110 @@ def create_app() -> FastAPI:
             cleanup_task.cancel()
             for t in workers:
                 t.cancel()
+            await format_pool.stop()
             executor.shutdown(wait=False, cancel_futures=True)
+            if isinstance(store, SQLiteJobStore):
+                store.close()
 
     app = FastAPI(title="ACE-Step API", version="1.0", lifespan=lifespan)
 
     async def _queue_position(job_id: str) -> int:
-        async with app.state.pending_lock:
+        if API_ROLE != "all":
+            # The shared store is SQLite: keep its reads off the event loop
+            return await asyncio.to_thread(store.queue_position, job_id)
+        return app.state.job_queue.position(job_id)
+
+    async def _avg_job_seconds() -> float:
+        if API_ROLE != "all":
+            # Durations are recorded by the model workers; read them back from the shared store
+            avg = await asyncio.to_thread(store.average_duration, AVG_WINDOW)
+            return float(avg) if avg is not None else INITIAL_AVG_JOB_SECONDS
+        async with app.state.stats_lock:
+            return float(getattr(app.state, "avg_job_seconds", INITIAL_AVG_JOB_SECONDS))
+
+    async def _retry_after_seconds(wait_jobs: float) -> int:
+        """Retry-After for a rejected submission: time for wait_jobs completions across the queue workers."""
+        return max(1, math.ceil(wait_jobs * await _avg_job_seconds() / max(1, WORKER_COUNT)))
+
+    def _model_identity(req: GenerateMusicRequest) -> Dict[str, Any]:
+        """What runs a request besides its parameters: DiT model, LoRA adapter (path and scale) and LM."""
+        identity: Dict[str, Any] = {
+            "dit": req.model or _get_model_name(getattr(app.state, "_config_path", "")),
+            "lm": req.lm_model_path or os.getenv("ACESTEP_LM_MODEL_PATH", ""),
+        }
+        handler = getattr(app.state, "handler", None)
+        registry = getattr(handler, "lora_registry", None)
+        if registry is not None:
+            if req.lora_adapter:
+                adapter, scale, enabled = req.lora_adapter, req.lora_scale, True
+            else:
+                adapter, scale, enabled = registry.state()  # the server-wide LoRA applies
+            if adapter and enabled and adapter in registry.adapters:
+                identity["lora"] = {"path": registry.adapters[adapter].path, "scale": scale}
+        return identity
+
+    def _result_files_exist(result: Dict[str, Any]) -> bool:
+        for url in result.get("audio_paths") or []:
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(url).query)
+            path = (query.get("path") or [url])[0]
+            if not os.path.exists(path):
+                return False
+        return True
+
+    def _discard_temp_files(paths: List[str]) -> None:
+        for p in paths:
             try:
-                return list(app.state.pending_ids).index(job_id) + 1
-            except ValueError:
-                return 0
+                os.remove(p)
+            except Exception:
+                pass
+
+    def _is_trusted_proxy(host: Optional[str]) -> bool:
+        try:
+            address = ipaddress.ip_address(host or "")
+        except ValueError:
+            return False
+        return any(address in network for network in TRUSTED_PROXIES)
 
-    async def _eta_seconds_for_position(pos: int) -> Optional[float]:
-        if pos <= 0:
+    def _resolve_scheduling(request: Request, req: GenerateMusicRequest, token: Optional[str]) -> None:
+        """
+        Set req.tenant for fair-share scheduling and cap req.priority.
+
+        Tenant: the X-Tenant-ID header or tenant field when the request comes from a
+        trusted proxy (ACESTEP_TRUSTED_PROXIES), else the tenant of the API key
+        (ACESTEP_API_KEYS), else the client address; what other clients claim is
+        ignored. A key limited to the "batch" class has its jobs run as batch.
+        """
+        client = request.client.host if request.client is not None else None
+        claimed = (request.headers.get("x-tenant-id") or req.tenant or "").strip()
+        grant = api_key_grant(token)
+        if claimed and _is_trusted_proxy(client):
+            tenant = claimed
+        elif grant is not None:
+            tenant = grant[0]
+        else:
+            tenant = client
+        req.tenant = tenant or DEFAULT_TENANT
+        if grant is not None and PRIORITY_CLASSES.index(req.priority) < PRIORITY_CLASSES.index(grant[1]):
+            req.priority = grant[1]
+
+    def _eta_seconds(ahead_cost: float, cost: float) -> float:
+        """Predicted seconds until a job finishes: the work queued ahead of it and left on the running jobs, spread over the workers, then its own run."""
+        return (ahead_cost + app.state.job_queue.running_remaining()) / max(1, WORKER_COUNT) + cost
+
+    async def _eta_seconds_for_job(job_id: str) -> Optional[float]:
+        if API_ROLE != "all":
+            pos = await _queue_position(job_id)
+            return pos * await _avg_job_seconds() if pos > 0 else None
+        q: FairScheduler = app.state.job_queue
+        if q.position(job_id) <= 0:
             return None
-        async with app.state.stats_lock:
-            avg = float(getattr(app.state, "avg_job_seconds", INITIAL_AVG_JOB_SECONDS))
-        return pos * avg
+        return _eta_seconds(q.ahead(job_id)[1], q.cost(job_id))
 
     @app.post("/release_task")
     async def create_music_generate_job(request: Request, authorization: Optional[str] = Header(None)):
         content_type = (request.headers.get("content-type") or "").lower()
         temp_files: list[str] = []
+        token: Optional[str] = None
 
         def _build_request(p: RequestParser, **kwargs) -> GenerateMusicRequest:
             """Build GenerateMusicRequest from parsed parameters."""
@@ -1786,6 +2156,11 @@ def create_app() -> FastAPI:
                 cfg_interval_start=p.float("cfg_interval_start", 0.0),
                 cfg_interval_end=p.float("cfg_interval_end", 1.0),
                 infer_method=p.str("infer_method", "ode"),
+                step_cache_mode=p.str("step_cache_mode") or None,
+                step_cache_interval=p.int("step_cache_interval", 2),
+                step_cache_threshold=p.float("step_cache_threshold", 0.1),
+                lora_adapter=p.str("lora_adapter") or None,
+                lora_scale=p.float("lora_scale"),
                 shift=p.float("shift", 3.0),
                 audio_format=p.str("audio_format", "mp3"),
                 use_tiled_decode=p.bool("use_tiled_decode", True),
@@ -1803,6 +2178,8 @@ def create_app() -> FastAPI:
                 use_cot_language=p.bool("use_cot_language", True),
                 is_format_caption=p.bool("is_format_caption"),
                 allow_lm_batch=p.bool("allow_lm_batch", True),
+                priority=p.str("priority", "interactive"),
+                tenant=p.str("tenant") or None,
                 **kwargs,
             )
 
@@ -1810,20 +2187,20 @@ def create_app() -> FastAPI:
             body = await request.json()
             if not isinstance(body, dict):
                 raise HTTPException(status_code=400, detail="JSON payload must be an object")
-            verify_token_from_request(body, authorization)
+            token = verify_token_from_request(body, authorization)
             req = _build_request(RequestParser(body))
 
         elif content_type.endswith("+json"):
             body = await request.json()
             if not isinstance(body, dict):
                 raise HTTPException(status_code=400, detail="JSON payload must be an object")
-            verify_token_from_request(body, authorization)
+            token = verify_token_from_request(body, authorization)
             req = _build_request(RequestParser(body))
 
         elif content_type.startswith("multipart/form-data"):
             form = await request.form()
             form_dict = {k: v for k, v in form.items() if not hasattr(v, 'read')}
-            verify_token_from_request(form_dict, authorization)
+            token = verify_token_from_request(form_dict, authorization)
 
             # Support both naming conventions: ref_audio/reference_audio, ctx_audio/src_audio
             ref_up = form.get("ref_audio") or form.get("reference_audio")
@@ -1853,7 +2230,7 @@ def create_app() -> FastAPI:
         elif content_type.startswith("application/x-www-form-urlencoded"):
             form = await request.form()
             form_dict = dict(form)
-            verify_token_from_request(form_dict, authorization)
+            token = verify_token_from_request(form_dict, authorization)
             reference_audio_path = str(form.get("ref_audio_path") or form.get("reference_audio_path") or "").strip() or None
             src_audio_path = str(form.get("ctx_audio_path") or form.get("src_audio_path") or "").strip() or None
             req = _build_request(
@@ -1870,7 +2247,7 @@ def create_app() -> FastAPI:
                 try:
                     body = json.loads(raw.decode("utf-8"))
                     if isinstance(body, dict):
-                        verify_token_from_request(body, authorization)
+                        token = verify_token_from_request(body, authorization)
                         req = _build_request(RequestParser(body))
                     else:
                         raise HTTPException(status_code=400, detail="JSON payload must be an object")
@@ -1885,7 +2262,7 @@ def create_app() -> FastAPI:
             elif raw_stripped and b"=" in raw:
                 parsed = urllib.parse.parse_qs(raw.decode("utf-8"), keep_blank_values=True)
                 flat = {k: (v[0] if isinstance(v, list) and v else v) for k, v in parsed.items()}
-                verify_token_from_request(flat, authorization)
+                token = verify_token_from_request(flat, authorization)
                 reference_audio_path = str(flat.get("ref_audio_path") or flat.get("reference_audio_path") or "").strip() or None
                 src_audio_path = str(flat.get("ctx_audio_path") or flat.get("src_audio_path") or "").strip() or None
                 req = _build_request(
@@ -1902,27 +2279,117 @@ def create_app() -> FastAPI:
                     ),
                 )
 
-        rec = store.create()
+        if req.priority not in PRIORITY_CLASSES:
+            raise HTTPException(status_code=400, detail=f"priority must be one of {list(PRIORITY_CLASSES)}")
+        _resolve_scheduling(request, req, token)
+
+        q: FairScheduler = app.state.job_queue
+        fingerprint = None
+        if DEDUP_ENABLED and API_ROLE == "all":
+            # Hashes uploaded audio, so off the event loop
+            fingerprint = await asyncio.to_thread(request_fingerprint, _request_params(req), _model_identity(req))
+        if fingerprint is not None:
+            memo: RequestMemo = app.state.request_memo
+            inflight_id, cached = memo.lookup(fingerprint, is_valid=_result_files_exist)
+            if inflight_id is not None:
+                _discard_temp_files(temp_files)
+                inflight = store.get(inflight_id)
+                return _wrap_response({
+                    "task_id": inflight_id,
+                    "status": inflight.status if inflight else "queued",
+                    "queue_position": q.position(inflight_id),
+                    "deduplicated": True,
+                })
+            if cached is not None:
+                _discard_temp_files(temp_files)
+                rec = store.create(params=_request_params(req))
+                store.mark_succeeded(rec.job_id, cached)
+                return _wrap_response({"task_id": rec.job_id, "status": "succeeded", "queue_position": 0, "cached": True})
 
-        q: asyncio.Queue = app.state.job_queue
-        if q.full():
-            for p in temp_files:
-                try:
-                    os.remove(p)
-                except Exception:
-                    pass
-            raise HTTPException(status_code=429, detail="Server busy: queue is full")
+        cost = app.state.cost_model.predict(req)
+        try:
+            if API_ROLE == "all":
+                q.check(req.tenant)
+                if ETA_SLA_SECONDS > 0 and req.priority == "interactive":
+                    eta = _eta_seconds(q.preview(req.tenant, req.priority, cost)[1], cost)
+                    if eta > ETA_SLA_SECONDS:
+                        if SLA_ACTION != "defer":
+                            raise SchedulerFull(
+                                f"Predicted completion in {eta:.0f}s exceeds the {ETA_SLA_SECONDS:.0f}s limit",
+                                wait_seconds=eta - ETA_SLA_SECONDS,
+                            )
+                        # Deferred: runs as batch, behind every interactive job
+                        req.priority = "batch"
+            elif store.count_queued() >= QUEUE_MAXSIZE:
+                raise SchedulerFull("Server busy: queue is full")
+        except SchedulerFull as e:
+            _discard_temp_files(temp_files)
+            retry_after = (
+                max(1, math.ceil(e.wait_seconds)) if e.wait_seconds is not None
+                else await _retry_after_seconds(e.wait_jobs)
+            )
+            raise HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": str(retry_after)})
 
+        rec = store.create(params=_request_params(req), temp_files=temp_files)
+        if API_ROLE != "all":
+            # Split deployment: the store row is the queue entry; a model worker claims it
+            return _wrap_response({
+                "task_id": rec.job_id,
+                "status": "queued",
+                "queue_position": store.queue_position(rec.job_id),
+                "eta_seconds": await _eta_seconds_for_job(rec.job_id),
+            })
+
+        # No await since check(), so admission cannot have changed; temp files are
+        # registered before the job can finish (a worker awaits the generation first)
+        position = q.put_nowait(
+            rec.job_id, req, tenant=req.tenant, priority=req.priority, cost=cost, group=app.state.job_models(req),
+        )
+        if fingerprint is not None:
+            app.state.request_memo.start(fingerprint, rec.job_id)
+        eta = _eta_seconds(q.ahead(rec.job_id)[1], cost)
+        app.state.job_events.publish(rec.job_id, "queued", queue_position=position, eta_seconds=round(eta, 1),
+                                     priority=req.priority)
         if temp_files:
             async with app.state.job_temp_files_lock:
                 app.state.job_temp_files[rec.job_id] = temp_files
+        # A job admitted ahead of others moves their positions
+        await app.state.publish_queue_positions()
+        return _wrap_response({
+            "task_id": rec.job_id,
+            "status": "queued",
+            "queue_position": position,
+            "eta_seconds": round(eta, 1),
+            "priority": req.priority,
+        })
 
-        async with app.state.pending_lock:
-            app.state.pending_ids.append(rec.job_id)
-            position = len(app.state.pending_ids)
+    @app.post("/cancel_task")
+    async def cancel_task(request: Request, authorization: Optional[str] = Header(None)):
+        """
+        Cancel a queued or running task.
 
-        await q.put((rec.job_id, req))
-        return _wrap_response({"task_id": rec.job_id, "status": "queued", "queue_position": position})
+        A queued task is dropped from the queue at once ("cancelled"). A running
+        task stops at its next check point: before LM phase 2, between LM chunks
+        and decode steps, between diffusion steps or tiled VAE decode windows
+        ("cancelling"; its status becomes "cancelled", or "succeeded" if it
+        finished first). A finished task is left alone and its status returned.
+        """
+        content_type = (request.headers.get("content-type") or "").lower()
+
+        if "json" in content_type:
+            body = await request.json()
+        else:
+            form = await request.form()
+            body = {k: v for k, v in form.items()}
+
+        verify_token_from_request(body, authorization)
+        task_id = str(body.get("task_id") or "").strip()
+        if not task_id:
+            raise HTTPException(status_code=400, detail="task_id is required")
+        status = await app.state.cancel_job(task_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail=f"Task not found: {task_id}")
+        return _wrap_response({"task_id": task_id, "status": status})
 
     @app.post("/query_result")
     async def query_result(request: Request, authorization: Optional[str] = Header(None)):
@@ -2034,6 +2501,98 @@ def create_app() -> FastAPI:
 
         return _wrap_response(data_list)
 
+    async def _task_known(task_id: str) -> bool:
+        if app.state.job_events.snapshot(task_id) is not None:
+            return True
+        return await asyncio.to_thread(store.get, task_id) is not None
+
+    async def _task_events(task_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        A task's progress events, from a snapshot to its final event, with
+        heartbeats in between. Jobs this process runs come from the event bus.
+        Others (jobs run by a model worker process, or finished before this
+        process started) follow the job store: status, queue position and the
+        final result.
+        """
+        bus: JobEventBus = app.state.job_events
+        first = True
+        from_store = False
+        last_state = None
+        last_sent = time.time()
+        async for event in bus.subscribe(task_id, timeout=EVENTS_STORE_POLL_SECONDS):
+            if event is not None:
+                from_store = False
+                first = False
+                last_sent = time.time()
+                yield event
+                continue
+            if first:
+                from_store = True
+            if from_store:
+                # Every subscriber polls; SQLite reads run in a thread so they cannot stall the loop
+                rec = await asyncio.to_thread(store.get, task_id)
+                if rec is None:
+                    yield {"job_id": task_id, "type": "failed", "status": "failed", "error": "Task not found"}
+                    return
+                position = await _queue_position(task_id) if rec.status == "queued" else 0
+                if (rec.status, position) != last_state:
+                    last_state = (rec.status, position)
+                    event = {"job_id": task_id, "type": "snapshot" if first else rec.status, "status": rec.status}
+                    if rec.status in TERMINAL_EVENTS:
+                        error = rec.error.strip().splitlines()[-1] if rec.error else None
+                        yield {**event, "result": rec.result, "error": error}
+                        return
+                    eta = await _eta_seconds_for_job(task_id)
+                    yield {**event, "queue_position": position, "eta_seconds": round(eta, 1) if eta is not None else None}
+                    last_sent = time.time()
+            first = False
+            if time.time() - last_sent >= EVENTS_HEARTBEAT_SECONDS:
+                last_sent = time.time()
+                yield {"job_id": task_id, "type": "heartbeat"}
+
+    @app.get("/v1/tasks/{task_id}/events")
+    async def task_events_sse(task_id: str, ai_token: Optional[str] = None, authorization: Optional[str] = Header(None)):
+        """
+        Stream a task's progress as server-sent events until it finishes.
+
+        EventSource cannot set headers, so the token may also be given as ?ai_token=.
+        """
+        verify_token_from_request({"ai_token": ai_token}, authorization)
+        if not await _task_known(task_id):
+            raise HTTPException(status_code=404, detail=f"Task not found: {task_id}")
+
+        async def _stream():
+            async for event in _task_events(task_id):
+                yield _sse_message(event)
+
+        return StreamingResponse(
+            _stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.websocket("/v1/tasks/{task_id}/ws")
+    async def task_events_ws(websocket: WebSocket, task_id: str):
+        """Stream a task's progress events as JSON messages until it finishes, then close."""
+        try:
+            verify_token_from_request(
+                {"ai_token": websocket.query_params.get("ai_token")}, websocket.headers.get("authorization")
+            )
+        except HTTPException:
+            await websocket.close(code=1008)  # policy violation
+            return
+        if not await _task_known(task_id):
+            await websocket.close(code=4404)
+            return
+        await websocket.accept()
+        try:
+            async for event in _task_events(task_id):
+                await websocket.send_text(json.dumps(event, ensure_ascii=False, default=str))
+            await websocket.close()
+        except (WebSocketDisconnect, RuntimeError):
+            # Client went away; leaving the loop unsubscribes it
+            return
+
     @app.get("/health")
     async def health_check():
         """Health check endpoint for service status."""
@@ -2047,50 +2606,64 @@ def create_app() -> FastAPI:
     async def get_stats(_: None = Depends(verify_api_key)):
         """Get server statistics including job store stats."""
         job_stats = store.get_stats()
-        async with app.state.stats_lock:
-            avg_job_seconds = getattr(app.state, "avg_job_seconds", INITIAL_AVG_JOB_SECONDS)
+        avg_job_seconds = await _avg_job_seconds()
         return _wrap_response({
             "jobs": job_stats,
-            "queue_size": app.state.job_queue.qsize(),
+            "queue_size": app.state.job_queue.qsize() if API_ROLE == "all" else job_stats["queued"],
             "queue_maxsize": QUEUE_MAXSIZE,
             "avg_job_seconds": avg_job_seconds,
+            "role": API_ROLE,
+            "scheduler": app.state.job_queue.stats() if API_ROLE == "all" else None,
+            # Predicted (at admission) vs actual run time of recent jobs
+            "cost_model": app.state.cost_model.stats() if API_ROLE != "front" else None,
+            "dedup": app.state.request_memo.stats() if API_ROLE == "all" else None,
+            "format_pool": app.state.format_pool.stats() if API_ROLE != "front" else None,
+            "events": app.state.job_events.stats(),
+            "models": app.state.model_registry.stats() if API_ROLE != "front" else None,
         })
 
+    @app.get("/metrics")
+    async def metrics_endpoint(_: None = Depends(verify_api_key)):
+        """
+        This process's metrics in the Prometheus text format. In a split
+        deployment scrape every process: model workers have the stage
+        histograms, front processes the queue.
+        """
+        return Response(content=app.state.metrics.render(), media_type=ServerMetrics.CONTENT_TYPE)
+
     @app.get("/v1/models")
     async def list_models(_: None = Depends(verify_api_key)):
-        """List available DiT models."""
+        """List available DiT models (loaded or not) and LM models."""
+        if API_ROLE == "front":
+            # No models in this process: report what the model workers are configured to serve
+            names = [_get_model_name(p) for p in DIT_CONFIG_PATHS]
+            models = [{"name": n, "is_default": i == 0} for i, n in enumerate(names) if n]
+            return _wrap_response({
+                "models": models,
+                "default_model": models[0]["name"] if models else None,
+            })
+
+        registry: ModelRegistry = app.state.model_registry
+        registry_models = registry.stats()["models"]
         models = []
-        
-        # Primary model (always available if initialized)
-        if getattr(app.state, "_initialized", False):
-            primary_model = _get_model_name(app.state._config_path)
-            if primary_model:
-                models.append({
-                    "name": primary_model,
-                    "is_default": True,
-                })
-        
-        # Secondary model
-        if getattr(app.state, "_initialized2", False) and app.state._config_path2:
-            secondary_model = _get_model_name(app.state._config_path2)
-            if secondary_model:
-                models.append({
-                    "name": secondary_model,
-                    "is_default": False,
-                })
-        
-        # Third model
-        if getattr(app.state, "_initialized3", False) and app.state._config_path3:
-            third_model = _get_model_name(app.state._config_path3)
-            if third_model:
-                models.append({
-                    "name": third_model,
-                    "is_default": False,
-                })
-        
+        for name, dit_handler in app.state.dit_handlers.items():
+            info = registry_models[f"dit:{name}"]
+            if info["error"] is not None:
+                continue  # failed to load: requests for it fall back to the default model
+            entry = {"name": name, "is_default": name == app.state.default_dit, "state": info["state"]}
+            if dit_handler.model is not None:
+                entry["lora_adapters"] = dit_handler.get_lora_status()["adapters"]
+            models.append(entry)
+        lm_models = [
+            {"name": name, "is_default": name == app.state.default_lm, "state": registry_models[f"lm:{name}"]["state"]}
+            for name in app.state.lm_handlers
+            if registry_models[f"lm:{name}"]["error"] is None
+        ]
+
         return _wrap_response({
             "models": models,
-            "default_model": models[0]["name"] if models else None,
+            "default_model": app.state.default_dit,
+            "lm_models": lm_models,
         })
 
     @app.post("/create_random_sample")
@@ -2139,46 +2712,8 @@ def create_app() -> FastAPI:
             body = {k: v for k, v in form.items()}
 
         verify_token_from_request(body, authorization)
-        llm: LLMHandler = app.state.llm_handler
-
-        # Initialize LLM if needed
-        with app.state._llm_init_lock:
-            if not getattr(app.state, "_llm_initialized", False):
-                if getattr(app.state, "_llm_init_error", None):
-                    raise HTTPException(status_code=500, detail=f"LLM init failed: {app.state._llm_init_error}")
-
-                project_root = _get_project_root()
-                checkpoint_dir = os.path.join(project_root, "checkpoints")
-                lm_model_path = os.getenv("ACESTEP_LM_MODEL_PATH", "acestep-5Hz-lm-0.6B").strip()
-                backend = os.getenv("ACESTEP_LM_BACKEND", "vllm").strip().lower()
-                if backend not in {"vllm", "pt"}:
-                    backend = "vllm"
-
-                # Auto-download LM model if not present
-                lm_model_name = _get_model_name(lm_model_path)
-                if lm_model_name:
-                    try:
-                        _ensure_model_downloaded(lm_model_name, checkpoint_dir)
-                    except Exception as e:
-                        print(f"[API Server] Warning: Failed to download LM model {lm_model_name}: {e}")
-
-                lm_device = os.getenv("ACESTEP_LM_DEVICE", os.getenv("ACESTEP_DEVICE", "auto"))
-                lm_offload = _env_bool("ACESTEP_LM_OFFLOAD_TO_CPU", False)
-
-                h: AceStepHandler = app.state.handler
-                status, ok = llm.initialize(
-                    checkpoint_dir=checkpoint_dir,
-                    lm_model_path=lm_model_path,
-                    backend=backend,
-                    device=lm_device,
-                    offload_to_cpu=lm_offload,
-                    dtype=h.dtype,
-                )
-                if not ok:
-                    app.state._llm_init_error = status
-                    raise HTTPException(status_code=500, detail=f"LLM init failed: {status}")
-                app.state._llm_initialized = True
-
+        if API_ROLE == "front":
+            raise HTTPException(status_code=503, detail="/format_input needs the LM; send it to a model worker process")
         # Parse parameters
         prompt = body.get("prompt", "") or ""
         lyrics = body.get("lyrics", "") or ""
@@ -2214,17 +2749,22 @@ def create_app() -> FastAPI:
         if language and language != "unknown":
             user_metadata_for_format['language'] = language
 
-        # Call format_sample
+        # Run format_sample on the LM pool thread, off the event loop
+        pool: LLMRequestPool = app.state.format_pool
+        payload = (prompt, lyrics, tuple(sorted(user_metadata_for_format.items())), temperature)
         try:
-            format_result = format_sample(
-                llm_handler=llm,
-                caption=prompt,
-                lyrics=lyrics,
-                user_metadata=user_metadata_for_format if user_metadata_for_format else None,
-                temperature=temperature,
-                use_constrained_decoding=True,
-            )
+            format_result = await pool.submit(payload)
+        except LLMPoolBusy as e:
+            raise HTTPException(status_code=429, detail=str(e),
+                                headers={"Retry-After": str(max(1, math.ceil(pool.retry_after())))})
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail=f"format_input timed out after {FORMAT_TIMEOUT_SECONDS:g}s")
+        except HTTPException:
+            raise
+        except Exception as e:
+            return _wrap_response(None, code=500, error=f"format_sample error: {str(e)}")
 
+        try:
             if not format_result.success:
                 error_msg = format_result.error or format_result.status_message
                 return _wrap_response(None, code=500, error=f"format_sample failed: {error_msg}")
@@ -2303,8 +2843,22 @@ def main() -> None:
         default=os.getenv("ACESTEP_DOWNLOAD_SOURCE", "auto"),
         help="Preferred model download source: auto (default), huggingface, or modelscope",
     )
+    parser.add_argument(
+        "--role",
+        choices=["all", "front", "worker"],
+        default=os.getenv("ACESTEP_API_ROLE", "all"),
+        help="Process role: all (default), front (HTTP only) or worker (model worker); front/worker share the SQLite job store",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=int(os.getenv("ACESTEP_API_PROCESSES", "1")),
+        help="Uvicorn worker processes for --role front (default from ACESTEP_API_PROCESSES or 1)",
+    )
     args = parser.parse_args()
 
+    os.environ["ACESTEP_API_ROLE"] = args.role
+
     # Set API key from command line argument
     if args.api_key:
         os.environ["ACESTEP_API_KEY"] = args.api_key
@@ -2314,13 +2868,17 @@ def main() -> None:
         os.environ["ACESTEP_DOWNLOAD_SOURCE"] = args.download_source
         print(f"Using preferred download source: {args.download_source}")
 
-    # IMPORTANT: in-memory queue/store -> workers MUST be 1
+    # IMPORTANT: in-memory queue/store -> workers MUST be 1. Only HTTP-only front
+    # processes can be replicated; they share the job store with the model worker.
+    processes = max(1, args.processes) if args.role == "front" else 1
+    if args.processes > 1 and args.role != "front":
+        print(f"[API Server] --processes {args.processes} ignored for role '{args.role}' (models load once per process)")
     uvicorn.run(
         "acestep.api_server:app",
         host=str(args.host),
         port=int(args.port),
         reload=False,
-        workers=1,
+        workers=processes,
     )
 
 if __name__ == "__main__":
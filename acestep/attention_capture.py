@@ -0,0 +1,193 @@
+"""
+Record the lyric-alignment cross-attention during generation.
+
+get_lyric_timestamps / get_lyric_scores run the decoder again after generation
+to get cross-attention maps. CrossAttentionRecorder instead wraps the decoder for
+one generate_audio run: on the chosen steps it calls the decoder with attention
+output and the alignment layers config, keeps only the configured (layer, head)
+maps of the conditional rows and hands the usual output back with the
+attentions dropped. Each recording is [Batch, Heads, Tokens, Frames] in host
+memory, Heads being the selected heads in custom_layers_config order, so a 4
+minute song costs Heads * Tokens * Frames values instead of the full per-layer
+attention tensors.
+
+"first" is the sampler's first step (t = 1, pure noise), the input the LM score
+uses. "last" is what timestamps and the DiT score use: the final latent
+re-noised at t = 1 / steps. The sampler never runs the decoder on that input, so
+record_final makes that one decoder call after generation (conditional rows
+only, alignment layers only); LRC and both scores then share it instead of each
+making their own pass. Steps are numbered by timestep (DiffusionStepTracker), and
+the step cache computes recorded steps in full (DiTStepCache compute_steps).
+"""
+
+from typing import Any, Dict, Optional, Sequence
+
+import torch
+import torch.nn as nn
+from loguru import logger
+
+from acestep.module_hooks import DiffusionStepTracker, wrap_forward
+
+# Sampler steps recorded during generation; "last" comes from record_final
+ALIGNMENT_STEPS = {"first": 0}
+
+
+def select_alignment_heads(
+    cross_attentions: Sequence[Optional[torch.Tensor]],
+    custom_layers_config: Dict[int, Sequence[int]],
+    batch: Optional[int] = None,
+) -> Optional[torch.Tensor]:
+    """
+    Configured heads of the decoder's per-layer cross-attention [Rows, Heads, Frames, Tokens]
+    as [Batch, Selected heads, Tokens, Frames]; layer indices count returned (non-None) layers,
+    as in the aligners' head selection.
+    """
+    layers = [attn for attn in cross_attentions if attn is not None]
+    heads = [
+        layers[layer_idx][:batch, head_idx]
+        for layer_idx, head_indices in custom_layers_config.items()
+        for head_idx in head_indices
+        if layer_idx < len(layers) and head_idx < layers[layer_idx].shape[1]
+    ]
+    if not heads:
+        return None
+    return torch.stack(heads, dim=1).transpose(-1, -2)
+
+
+def recording_config(recording: torch.Tensor) -> Dict[int, list]:
+    """Head config that selects every head of a recording viewed as [1, Batch, Heads, Tokens, Frames]."""
+    return {0: list(range(recording.shape[1]))}
+
+
+def _cross_attentions(outputs: Any) -> Optional[Sequence[Optional[torch.Tensor]]]:
+    if isinstance(outputs, (tuple, list)):
+        return outputs[2] if len(outputs) > 2 else None
+    return getattr(outputs, "cross_attentions", None)
+
+
+def _drop_cross_attentions(outputs: Any) -> Any:
+    if isinstance(outputs, tuple) and len(outputs) > 2:
+        return outputs[:2] + (None,) + outputs[3:]
+    return outputs
+
+
+class CrossAttentionRecorder:
+    """
+    Capture the alignment heads' cross-attention on chosen decoder steps.
+
+    Usage:
+        with CrossAttentionRecorder(model.decoder, custom_layers_config, batch, num_steps) as recorder:
+            outputs = model.generate_audio(...)
+        recorder.record_final(outputs["target_latents"], encoder_hidden_states, encoder_attention_mask, context_latents)
+        recorder.recordings["first"], recorder.recordings["last"]  # [batch, heads, tokens, frames]
+    """
+
+    def __init__(
+        self,
+        decoder: nn.Module,
+        custom_layers_config: Dict[int, Sequence[int]],
+        batch: int,
+        num_steps: int,
+        steps: Optional[Dict[str, int]] = None,
+        device: Optional[torch.device] = torch.device("cpu"),
+    ):
+        self.decoder = decoder
+        self.custom_layers_config = custom_layers_config
+        self.batch = batch
+        # Negative steps count from the end, like list indices
+        self.steps = {name: step % num_steps for name, step in (steps or ALIGNMENT_STEPS).items()}
+        self.num_steps = num_steps
+        self.device = device
+        self.step_tracker = DiffusionStepTracker()
+        self.recordings: Dict[str, torch.Tensor] = {}
+        self.recorded_bytes = 0
+        self.full_attention_bytes = 0  # largest attention output the decoder returned on a recorded step
+        self._handle = None
+
+    def _forward(self, original_forward, *args, **kwargs):
+        step = self.step_tracker.update(args, kwargs)
+        # Separate cond / uncond calls share a step; the conditional one comes first
+        names = [name for name, s in self.steps.items() if s == step and name not in self.recordings]
+        if not names:
+            return original_forward(*args, **kwargs)
+        kwargs["output_attentions"] = True
+        kwargs["custom_layers_config"] = self.custom_layers_config
+        outputs = original_forward(*args, **kwargs)
+        self._record(names, outputs, step)
+        return _drop_cross_attentions(outputs)
+
+    def _record(self, names, outputs: Any, step: Any):
+        cross_attentions = _cross_attentions(outputs)
+        if not cross_attentions:
+            logger.warning(f"[CrossAttentionRecorder] Decoder returned no attentions on step {step}")
+            return
+        self.full_attention_bytes = max(
+            self.full_attention_bytes,
+            sum(a.numel() * a.element_size() for a in cross_attentions if a is not None),
+        )
+        # Conditional rows come first in a [cond; uncond] CFG batch
+        selected = select_alignment_heads(cross_attentions, self.custom_layers_config, self.batch)
+        if selected is None:
+            logger.warning(f"[CrossAttentionRecorder] No configured heads in the decoder attentions on step {step}")
+            return
+        if self.device is not None:
+            selected = selected.to(self.device)
+        for name in names:
+            self.recordings[name] = selected
+        self.recorded_bytes += selected.numel() * selected.element_size()
+
+    @torch.no_grad()
+    def record_final(
+        self,
+        latents: torch.Tensor,
+        encoder_hidden_states: torch.Tensor,
+        encoder_attention_mask: torch.Tensor,
+        context_latents: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+        seed: Optional[int] = 42,
+    ):
+        """
+        Record "last": one decoder call on the final latents re-noised at t = 1 / num_steps
+        (xt = t * noise + (1 - t) * latents, seeded noise as in get_lyric_timestamps /
+        get_lyric_scores). Call it after the recorder is removed.
+        """
+        latents = latents[:self.batch]
+        if seed is None:
+            noise = torch.randn_like(latents)
+        else:
+            generator = torch.Generator(device=latents.device).manual_seed(int(seed))
+            noise = torch.randn(latents.shape, generator=generator, device=latents.device, dtype=latents.dtype)
+        t = 1.0 / self.num_steps
+        timestep = torch.full((latents.shape[0],), t, device=latents.device, dtype=latents.dtype)
+        if attention_mask is None:
+            attention_mask = torch.ones(latents.shape[0], latents.shape[1], device=latents.device, dtype=latents.dtype)
+        outputs = self.decoder(
+            hidden_states=t * noise + (1.0 - t) * latents,
+            timestep=timestep,
+            timestep_r=timestep,
+            attention_mask=attention_mask[:self.batch],
+            encoder_hidden_states=encoder_hidden_states[:self.batch],
+            use_cache=False,
+            past_key_values=None,
+            encoder_attention_mask=encoder_attention_mask[:self.batch],
+            context_latents=context_latents[:self.batch],
+            output_attentions=True,
+            custom_layers_config=self.custom_layers_config,
+            enable_early_exit=True,
+        )
+        self._record(["last"], outputs, "final")
+
+    def install(self):
+        self._handle = wrap_forward(self.decoder, self._forward)
+
+    def remove(self):
+        if self._handle is not None:
+            self._handle.remove()
+            self._handle = None
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *exc):
+        self.remove()
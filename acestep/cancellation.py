@@ -0,0 +1,67 @@
+"""
+Cooperative cancellation of a generation job.
+
+The API server creates a CancellationToken per job and binds it to the thread
+that runs the job with cancellation_scope(). Long-running code calls
+check_cancelled() at its stage boundaries (LM phases and chunks, LM decode
+steps, diffusion steps, tiled VAE decode windows), which raises JobCancelled
+once the token is cancelled. Outside a scope check_cancelled() does nothing, so
+the pipeline behaves as before when it is driven by the Gradio UI or the CLI.
+
+Code that holds resources across a check point (e.g. the LM engine's KV cache
+blocks) releases them on the way out, like on any other exception.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class JobCancelled(Exception):
+    """Raised at a check point once the job's token is cancelled."""
+
+
+class CancellationToken:
+    """Thread-safe flag set by cancel() from any thread."""
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+
+    def cancel(self, reason: str = "Cancelled by request") -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def check(self) -> None:
+        if self._event.is_set():
+            raise JobCancelled(self.reason)
+
+
+_local = threading.local()
+
+
+@contextmanager
+def cancellation_scope(token: CancellationToken) -> Iterator[CancellationToken]:
+    """Bind token to the current thread for check_cancelled()."""
+    previous = getattr(_local, "token", None)
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = previous
+
+
+def current_token() -> Optional[CancellationToken]:
+    return getattr(_local, "token", None)
+
+
+def check_cancelled() -> None:
+    """Raise JobCancelled if the current thread's job was cancelled; no-op outside a scope."""
+    token = getattr(_local, "token", None)
+    if token is not None:
+        token.check()
@@ -0,0 +1,120 @@
+"""
+CFG-interval-aware skipping of the unconditional branch for DiT decoder calls.
+
+With classifier-free guidance the generation loop runs the decoder on a fused
+batch of 2B rows per step: B conditional rows followed by B unconditional rows.
+Outside [cfg_interval_start, cfg_interval_end] guidance is not applied, so the
+unconditional half is wasted work. CFGIntervalSkipper wraps the decoder for one
+generation and, on those steps, runs only the conditional half and mirrors its
+output into the unconditional rows. Any guidance formula then reduces to the
+conditional prediction, exactly what a cond-only step computes.
+
+The skipper only acts on fused calls whose first B encoder rows match the
+request's condition; separate cond/uncond calls and cond-only calls pass through.
+Steps are numbered from the calls' timestep (DiffusionStepTracker), not by
+counting calls. A skipped call runs without the decoder's key/value cache,
+which holds 2B rows, and hands the sampler's cache back untouched.
+"""
+
+from typing import Any, Optional
+
+import torch
+import torch.nn as nn
+
+from acestep.module_hooks import DiffusionStepTracker, wrap_forward
+
+
+def cfg_step_in_interval(step: int, num_steps: int, cfg_interval_start: float, cfg_interval_end: float) -> bool:
+    """Whether guidance applies at step (of num_steps): int(n * start) <= step < int(n * end)."""
+    return int(num_steps * cfg_interval_start) <= step < int(num_steps * cfg_interval_end)
+
+
+def _slice_batch(value: Any, fused_batch: int, batch: int) -> Any:
+    if isinstance(value, torch.Tensor) and value.dim() > 0 and value.shape[0] == fused_batch:
+        return value[:batch]
+    return value
+
+
+def _mirror_batch(value: Any, batch: int) -> Any:
+    if isinstance(value, torch.Tensor) and value.dim() > 0 and value.shape[0] == batch:
+        return torch.cat([value, value], dim=0)
+    if isinstance(value, (tuple, list)):
+        return type(value)(_mirror_batch(v, batch) for v in value)
+    return value
+
+
+class CFGIntervalSkipper:
+    """
+    Run cond-only decoder forwards outside the CFG interval.
+
+    Usage:
+        with CFGIntervalSkipper(model.decoder, encoder_hidden_states, num_steps, 0.0, 0.6) as skipper:
+            model.generate_audio(...)
+        skipper.skipped_steps
+    """
+
+    def __init__(
+        self,
+        decoder: nn.Module,
+        cond_encoder_hidden_states: torch.Tensor,
+        num_steps: int,
+        cfg_interval_start: float,
+        cfg_interval_end: float,
+    ):
+        self.decoder = decoder
+        self.cond_encoder_hidden_states = cond_encoder_hidden_states
+        self.batch = cond_encoder_hidden_states.shape[0]
+        self.num_steps = num_steps
+        self.cfg_interval_start = cfg_interval_start
+        self.cfg_interval_end = cfg_interval_end
+        self.steps = DiffusionStepTracker()
+        self.skipped_steps = 0
+        self._fused_layout: Optional[bool] = None
+
+    def _is_fused_call(self, hidden_states: Optional[torch.Tensor], encoder_hidden_states: Optional[torch.Tensor]) -> bool:
+        if not isinstance(hidden_states, torch.Tensor) or hidden_states.shape[0] != 2 * self.batch:
+            return False
+        if self._fused_layout is None:
+            # Check once that rows are [cond; uncond] before trusting the layout
+            self._fused_layout = (
+                isinstance(encoder_hidden_states, torch.Tensor)
+                and encoder_hidden_states.shape[0] == 2 * self.batch
+                and encoder_hidden_states[:self.batch].shape == self.cond_encoder_hidden_states.shape
+                and torch.equal(encoder_hidden_states[:self.batch], self.cond_encoder_hidden_states.to(encoder_hidden_states.device))
+            )
+        return self._fused_layout
+
+    def _forward(self, original_forward, *args, **kwargs):
+        step = self.steps.update(args, kwargs)
+        hidden_states = args[0] if args else kwargs.get("hidden_states")
+        if cfg_step_in_interval(step, self.num_steps, self.cfg_interval_start, self.cfg_interval_end) \
+                or not self._is_fused_call(hidden_states, kwargs.get("encoder_hidden_states")):
+            return original_forward(*args, **kwargs)
+        self.skipped_steps += 1
+        fused_batch = 2 * self.batch
+        # The cache was built for 2B rows: run the B-row call without it, keep the sampler's copy for later steps
+        cache = kwargs.get("past_key_values")
+        if cache is not None:
+            kwargs["past_key_values"] = None
+            kwargs["use_cache"] = False
+        args = tuple(_slice_batch(a, fused_batch, self.batch) for a in args)
+        kwargs = {k: _slice_batch(v, fused_batch, self.batch) for k, v in kwargs.items()}
+        outputs = _mirror_batch(original_forward(*args, **kwargs), self.batch)
+        if cache is not None and isinstance(outputs, tuple) and len(outputs) > 1:
+            outputs = (outputs[0], cache) + outputs[2:]
+        return outputs
+
+    def install(self):
+        self._handle = wrap_forward(self.decoder, self._forward)
+
+    def remove(self):
+        if self._handle is not None:
+            self._handle.remove()
+            self._handle = None
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *exc):
+        self.remove()
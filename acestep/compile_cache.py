@@ -0,0 +1,136 @@
+"""
+Helpers for torch.compile of the DiT/VAE: regional compilation of repeated blocks
+and a persistent on-disk compile cache.
+
+The cache directory is keyed by a hash of the model (config, modeling code and
+weight file sizes) and the torch version, so a pod restart with the same image
+and checkpoint reuses compiled kernels and autotune results instead of
+recompiling.
+"""
+
+import hashlib
+import os
+from typing import Any, Dict, Optional
+
+import torch
+import torch.nn as nn
+from loguru import logger
+
+
+CACHE_ARTIFACTS_FILE = "cache_artifacts.bin"
+
+
+def compute_model_hash(model_path: str) -> str:
+    """Hash a checkpoint directory by config/code contents and weight file names and sizes."""
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(model_path)):
+        path = os.path.join(model_path, name)
+        if not os.path.isfile(path):
+            continue
+        digest.update(name.encode())
+        if name.endswith((".json", ".py")):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        else:
+            # Weights are too large to read at startup; name + size identifies them well enough
+            digest.update(str(os.path.getsize(path)).encode())
+    return digest.hexdigest()[:16]
+
+
+def get_compile_cache_dir(cache_root: str, model_path: str) -> str:
+    """Cache directory for one model + torch version, e.g. <root>/acestep-v15-turbo-<hash>-torch2.7.0."""
+    model_name = os.path.basename(os.path.normpath(model_path))
+    torch_version = torch.__version__.replace("+", "_")
+    return os.path.join(cache_root, f"{model_name}-{compute_model_hash(model_path)}-torch{torch_version}")
+
+
+def enable_compile_cache(cache_dir: str) -> bool:
+    """
+    Point inductor/triton caches at cache_dir and load saved cache artifacts.
+
+    Must run before the first compiled forward. Returns True if saved artifacts were loaded.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ["TORCHINDUCTOR_CACHE_DIR"] = os.path.join(cache_dir, "inductor")
+    os.environ["TRITON_CACHE_DIR"] = os.path.join(cache_dir, "triton")
+    try:
+        import torch._inductor.config as inductor_config
+        inductor_config.fx_graph_cache = True
+        if hasattr(inductor_config, "autotune_local_cache"):
+            inductor_config.autotune_local_cache = True
+    except ImportError:
+        pass
+
+    artifacts_path = os.path.join(cache_dir, CACHE_ARTIFACTS_FILE)
+    load_artifacts = getattr(torch.compiler, "load_cache_artifacts", None)
+    if load_artifacts is None or not os.path.exists(artifacts_path):
+        return False
+    try:
+        with open(artifacts_path, "rb") as f:
+            load_artifacts(f.read())
+        return True
+    except Exception as e:
+        logger.warning(f"[compile_cache] Failed to load cache artifacts from {artifacts_path}: {e}")
+        return False
+
+
+def save_compile_cache(cache_dir: str) -> bool:
+    """Save the compile artifacts produced so far (torch >= 2.7); returns True on success."""
+    save_artifacts = getattr(torch.compiler, "save_cache_artifacts", None)
+    if save_artifacts is None:
+        # Older torch: the inductor/triton directories above are still persisted
+        return False
+    result = save_artifacts()
+    if result is None:
+        return False
+    artifact_bytes, _ = result
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = os.path.join(cache_dir, CACHE_ARTIFACTS_FILE + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(artifact_bytes)
+    os.replace(tmp_path, os.path.join(cache_dir, CACHE_ARTIFACTS_FILE))
+    return True
+
+
+def find_repeated_blocks(module: nn.Module) -> Optional[nn.ModuleList]:
+    """Find the ModuleList of identical blocks holding most of the module's parameters."""
+    best, best_params = None, 0
+    for _, child in module.named_modules():
+        if not isinstance(child, nn.ModuleList) or len(child) < 2:
+            continue
+        if len({type(block) for block in child}) != 1:
+            continue
+        num_params = sum(p.numel() for p in child.parameters())
+        if num_params > best_params:
+            best, best_params = child, num_params
+    return best
+
+
+def compile_repeated_blocks(module: nn.Module, **compile_kwargs) -> int:
+    """
+    Regionally compile the repeated blocks of module in place.
+
+    Every block shares one compiled graph, so compile time is that of a single
+    block instead of the whole network. Returns the number of compiled blocks
+    (0 if no repeated blocks were found).
+    """
+    blocks = find_repeated_blocks(module)
+    if blocks is None:
+        return 0
+    for block in blocks:
+        block.compile(**compile_kwargs)
+    return len(blocks)
+
+
+def get_compile_counters() -> Dict[str, Any]:
+    """Dynamo/inductor counters: graphs compiled and FX graph cache hits/misses."""
+    try:
+        from torch._dynamo.utils import counters
+    except ImportError:
+        return {}
+    return {
+        "unique_graphs": counters["stats"]["unique_graphs"],
+        "frames_compiled": counters["frames"]["ok"],
+        "fx_graph_cache_hits": counters["inductor"]["fxgraph_cache_hit"],
+        "fx_graph_cache_misses": counters["inductor"]["fxgraph_cache_miss"],
+    }
@@ -1,6 +1,6 @@
 
 from enum import Enum, auto
-from typing import Optional, Dict, Any, Tuple, List, Callable, Set
+from typing import Optional, Dict, Any, Tuple, List, Callable, Set, Union
 from loguru import logger
 from transformers import AutoTokenizer
 from transformers.generation.logits_process import LogitsProcessor
@@ -508,6 +508,9 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
         # Precompute audio code token IDs (tokens matching <|audio_code_\d+|>)
         # These should be blocked during caption generation
         self.audio_code_token_ids: Set[int] = set()
+        # Token ID -> code value table ([vocab_size], -1 for non-code tokens), so generated
+        # token IDs can be turned into code tensors without detokenizing
+        self.audio_code_lookup: Optional[torch.Tensor] = None
         self._precompute_audio_code_tokens()
         
         # Precompute audio code mask for efficient blocking (O(1) instead of O(n))
@@ -533,6 +536,7 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
         import re
         audio_code_pattern = re.compile(r'^<\|audio_code_(\d+)\|>$')
         invalid_tokens_count = 0
+        audio_code_lookup = torch.full((self.vocab_size,), -1, dtype=torch.long)
         
         # Iterate through vocabulary to find audio code tokens
         for token_id in range(self.vocab_size):
@@ -545,6 +549,7 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
                     # Only add tokens with valid code values (0-63999)
                     if 0 <= code_value <= MAX_AUDIO_CODE:
                         self.audio_code_token_ids.add(token_id)
+                        audio_code_lookup[token_id] = code_value
                     else:
                         invalid_tokens_count += 1
                         if self.debug:
@@ -552,6 +557,8 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
             except Exception:
                 continue
         
+        self.audio_code_lookup = audio_code_lookup
+        
         if invalid_tokens_count > 0:
             logger.warning(f"Found {invalid_tokens_count} audio code tokens with values outside valid range [0, {MAX_AUDIO_CODE}]")
         
@@ -584,6 +591,27 @@ class MetadataConstrainedLogitsProcessor(LogitsProcessor):
         
         return None
     
+    def token_ids_to_audio_codes(self, token_ids: Union[List[int], torch.Tensor]) -> torch.Tensor:
+        """
+        Map generated token IDs to audio code values.
+        
+        Non-code tokens (reasoning text, EOS, padding) are dropped, so the result
+        is the same code sequence parse_lm_output would extract from the text.
+        
+        Args:
+            token_ids: 1D list or tensor of generated token IDs
+            
+        Returns:
+            1D int64 CPU tensor of code values in [0, MAX_AUDIO_CODE]
+        """
+        token_ids = torch.as_tensor(token_ids, dtype=torch.long).reshape(-1).cpu()
+        if self.audio_code_lookup is None or token_ids.numel() == 0:
+            return torch.empty(0, dtype=torch.long)
+        # Ids outside the tokenizer vocab (padded embedding rows) are never codes
+        in_vocab = (token_ids >= 0) & (token_ids < self.audio_code_lookup.numel())
+        codes = self.audio_code_lookup[token_ids.clamp(0, self.audio_code_lookup.numel() - 1)]
+        return codes[in_vocab & (codes >= 0)]
+    
     def _build_audio_code_mask(self):
         """
         Build a precomputed mask tensor for blocking audio code tokens.
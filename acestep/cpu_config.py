@@ -0,0 +1,176 @@
+"""
+CPU Execution Configuration Module
+Thread, NUMA and precision settings for running the DiT on CPU-only nodes
+
+Environment variables (all optional):
+    ACESTEP_CPU_PRECISION       "int8" (dynamic int8 linear layers, default), "bf16" or "fp32"
+    ACESTEP_CPU_THREADS         Intra-op threads for diffusion (default: usable cores - VAE threads)
+    ACESTEP_CPU_INTEROP_THREADS Inter-op threads (default: 1)
+    ACESTEP_CPU_VAE_THREADS     Intra-op threads of the VAE decode pool (default: usable cores // 4)
+    ACESTEP_CPU_AFFINITY        CPU list to pin the process to, e.g. "0-15,32-47"
+    ACESTEP_CPU_NUMA_NODE       Pin to the CPUs of this NUMA node (ignored if ACESTEP_CPU_AFFINITY is set)
+
+The VAE decode runs on its own single-thread executor, so one request's decode
+overlaps the next request's diffusion when several generations run concurrently
+(e.g. ACESTEP_QUEUE_WORKERS=2 in the API server). Each role sets its own intra-op
+thread count on the thread it runs on: the VAE worker before every decode, the
+diffusion before every decoder call (hold_num_threads). With torch's OpenMP
+backend the count is per thread, so the two really run side by side with their
+own counts; with a process-wide pool, a decode's count never outlives the next
+diffusion step. VAE jobs also run under the submitting job's cancellation token,
+so the tiled decode's check_cancelled() works inside the executor.
+"""
+
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+import torch
+import torch.nn as nn
+from loguru import logger
+
+from acestep.cancellation import cancellation_scope, current_token
+from acestep.module_hooks import ForwardWrapperHandle, wrap_forward
+
+
+CPU_PRECISIONS = ("int8", "bf16", "fp32")
+
+
+@dataclass
+class CPUExecutionConfig:
+    """CPU execution settings for the DiT service"""
+    precision: str  # "int8", "bf16" or "fp32"
+    intra_op_threads: int  # Diffusion (DiT forward) threads
+    inter_op_threads: int
+    vae_threads: int  # Threads of the VAE decode pool
+    cpus: Optional[List[int]]  # CPUs the process is pinned to (None = leave affinity alone)
+
+
+def parse_cpu_list(cpu_list: str) -> List[int]:
+    """Parse a Linux CPU list like "0-3,8,10-11" into sorted CPU ids."""
+    cpus = set()
+    for part in cpu_list.strip().split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def get_numa_node_cpus(node: int) -> List[int]:
+    """CPUs of a NUMA node, from sysfs."""
+    with open(f"/sys/devices/system/node/node{node}/cpulist") as f:
+        return parse_cpu_list(f.read())
+
+
+def cpu_supports_bf16() -> bool:
+    """Whether the CPU has native bf16 matmul (AVX512-BF16 or AMX)."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def _usable_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def get_cpu_execution_config() -> CPUExecutionConfig:
+    """Build the CPU execution config from the environment."""
+    precision = os.environ.get("ACESTEP_CPU_PRECISION", "int8").lower()
+    if precision not in CPU_PRECISIONS:
+        raise ValueError(f"ACESTEP_CPU_PRECISION must be one of {CPU_PRECISIONS}, got {precision!r}")
+    if precision == "bf16" and not cpu_supports_bf16():
+        logger.warning("[cpu_config] CPU has no native bf16 (AVX512-BF16/AMX); bf16 will be slow")
+
+    cpus = None
+    if os.environ.get("ACESTEP_CPU_AFFINITY"):
+        cpus = parse_cpu_list(os.environ["ACESTEP_CPU_AFFINITY"])
+    elif os.environ.get("ACESTEP_CPU_NUMA_NODE"):
+        cpus = get_numa_node_cpus(int(os.environ["ACESTEP_CPU_NUMA_NODE"]))
+    num_cpus = len(cpus) if cpus else len(_usable_cpus())
+
+    vae_threads = int(os.environ.get("ACESTEP_CPU_VAE_THREADS", max(1, num_cpus // 4)))
+    intra_op_threads = int(os.environ.get("ACESTEP_CPU_THREADS", max(1, num_cpus - vae_threads)))
+    inter_op_threads = int(os.environ.get("ACESTEP_CPU_INTEROP_THREADS", 1))
+    return CPUExecutionConfig(
+        precision=precision,
+        intra_op_threads=intra_op_threads,
+        inter_op_threads=inter_op_threads,
+        vae_threads=vae_threads,
+        cpus=cpus,
+    )
+
+
+def apply_cpu_execution_config(config: CPUExecutionConfig):
+    """Pin the process and set torch thread counts. Call before any heavy torch work."""
+    if config.cpus and hasattr(os, "sched_setaffinity"):
+        # Threads created afterwards (OpenMP pools, executors) inherit the mask
+        os.sched_setaffinity(0, config.cpus)
+    torch.set_num_threads(config.intra_op_threads)
+    try:
+        torch.set_num_interop_threads(config.inter_op_threads)
+    except RuntimeError:
+        # Can only be set once, before any inter-op parallel work has started
+        logger.warning("[cpu_config] Inter-op threads already initialized, keeping current setting")
+    logger.info(
+        f"[cpu_config] precision={config.precision}, intra-op threads={config.intra_op_threads}, "
+        f"inter-op threads={config.inter_op_threads}, VAE threads={config.vae_threads}, "
+        f"cpus={'inherited' if not config.cpus else len(config.cpus)}"
+    )
+
+
+def ensure_num_threads(num_threads: int):
+    """Set torch's intra-op thread count for the calling thread, if it differs."""
+    if torch.get_num_threads() != num_threads:
+        torch.set_num_threads(num_threads)
+
+
+def hold_num_threads(module: nn.Module, num_threads: int) -> ForwardWrapperHandle:
+    """Run every forward of module with num_threads intra-op threads, whatever a VAE job set in between."""
+    def forward(original_forward, *args, **kwargs):
+        ensure_num_threads(num_threads)
+        return original_forward(*args, **kwargs)
+
+    ensure_num_threads(num_threads)
+    return wrap_forward(module, forward)
+
+
+class VAEExecutor(ThreadPoolExecutor):
+    """
+    Single-thread executor for VAE decode; each job runs with the VAE intra-op thread
+    count and under the cancellation token of the thread that submitted it.
+    """
+
+    def __init__(self, vae_threads: int):
+        super().__init__(max_workers=1, thread_name_prefix="acestep-vae")
+        self.vae_threads = vae_threads
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        return super().submit(self._run, current_token(), fn, *args, **kwargs)
+
+    def _run(self, token, fn: Callable, *args, **kwargs):
+        ensure_num_threads(self.vae_threads)
+        with cancellation_scope(token) if token is not None else nullcontext():
+            return fn(*args, **kwargs)
+
+
+def create_vae_executor(config: CPUExecutionConfig) -> VAEExecutor:
+    """Executor for VAE decode with the config's VAE thread count."""
+    return VAEExecutor(config.vae_threads)
+
+
+def quantize_linear_dynamic_int8(module: nn.Module) -> nn.Module:
+    """Replace the Linear layers of a float32 module with dynamic int8 ones (fbgemm/onednn), in place."""
+    from torch.ao.quantization import quantize_dynamic
+    return quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8, inplace=True)
@@ -115,6 +115,146 @@ def _backtrace(trace: np.ndarray, N: int, M: int):
     return path[:, path_idx + 1:max_path_len]
 
 
+# ================= Batched / Banded DTW =================
+def sakoe_chiba_bounds(N: int, M: int, band: Optional[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Column range [lo[i], hi[i]] (1-based, inclusive) of each row i = 1..N of the DTW grid.
+
+    Lyrics advance roughly linearly with time, so rows stay within `band * M` frames
+    of the diagonal. Adjacent rows always touch, so a path from (1, 1) to (N, M)
+    exists for any band >= 0. band=None covers the full grid.
+    """
+    rows = np.arange(1, N + 1, dtype=np.int64)
+    if band is None:
+        return np.ones(N, dtype=np.int64), np.full(N, M, dtype=np.int64)
+    radius = int(np.ceil(band * M))
+    lo = np.maximum(1, (rows - 1) * M // N + 1 - radius)
+    hi = np.minimum(M, -(-rows * M // N) + radius)
+    return lo, hi
+
+
+@numba.jit(nopython=True, parallel=True)
+def _dtw_trace_batch(x: np.ndarray, lo: np.ndarray, hi: np.ndarray):
+    """Trace matrices [B, N+1, M+1] for a stack of equally shaped cost matrices; same tie-breaking as dtw_cpu."""
+    B, N, M = x.shape
+    traces = -np.ones((B, N + 1, M + 1), dtype=np.int8)
+    for b in numba.prange(B):
+        cost = np.ones((N + 1, M + 1), dtype=np.float32) * np.inf
+        cost[0, 0] = 0
+        for i in range(1, N + 1):
+            for j in range(lo[i - 1], hi[i - 1] + 1):
+                c0 = cost[i - 1, j - 1]
+                c1 = cost[i - 1, j]
+                c2 = cost[i, j - 1]
+
+                if c0 < c1 and c0 < c2:
+                    c, t = c0, 0
+                elif c1 < c0 and c1 < c2:
+                    c, t = c1, 1
+                else:
+                    c, t = c2, 2
+
+                cost[i, j] = x[b, i - 1, j - 1] + c
+                traces[b, i, j] = t
+    return traces
+
+
+def _dtw_trace_batch_torch(x: torch.Tensor, lo: np.ndarray, hi: np.ndarray) -> torch.Tensor:
+    """
+    Same as _dtw_trace_batch with tensor ops on x's device (anti-diagonal wavefront).
+
+    Cells on one anti-diagonal k = i + j only depend on diagonals k-1 and k-2, so each
+    diagonal is one vectorized update over the batch. Costs are stored skewed,
+    D[b, k, i] = cost[b, i, k - i], which makes every operand a contiguous slice.
+    """
+    B, N, M = x.shape
+    device = x.device
+    K = N + M + 1
+    acc_dtype = torch.promote_types(x.dtype, torch.float32)
+
+    # Skewed, band-masked costs: xs[b, k, i] = x[b, i-1, k-i-1] for in-band cells, else inf
+    k_idx = torch.arange(K, device=device).view(K, 1)
+    i_idx = torch.arange(N + 1, device=device).view(1, N + 1)
+    j_idx = k_idx - i_idx
+    lo_t = torch.as_tensor(np.concatenate([[M + 1], lo]), device=device).view(1, N + 1)
+    hi_t = torch.as_tensor(np.concatenate([[0], hi]), device=device).view(1, N + 1)
+    in_band = (j_idx >= lo_t) & (j_idx <= hi_t)
+    gather = ((i_idx - 1).clamp(min=0) * M + (j_idx - 1).clamp(0, M - 1)).view(-1)
+    xs = x.reshape(B, N * M).to(acc_dtype).index_select(1, gather).view(B, K, N + 1)
+    xs = xs.masked_fill(~in_band, float("inf"))
+
+    # Rows touched by each diagonal (the band makes this a contiguous range)
+    i_first = torch.where(in_band, i_idx, N + 1).min(dim=1).values.cpu().numpy()
+    i_last = torch.where(in_band, i_idx, -1).max(dim=1).values.cpu().numpy()
+
+    D = torch.full((B, K, N + 1), float("inf"), device=device, dtype=torch.float32)
+    D[:, 0, 0] = 0
+    T = torch.full((B, K, N + 1), -1, device=device, dtype=torch.int8)
+    for k in range(2, K):
+        a, z = int(i_first[k]), int(i_last[k])
+        if a > z:
+            continue
+        c0 = D[:, k - 2, a - 1:z]
+        c1 = D[:, k - 1, a - 1:z]
+        c2 = D[:, k - 1, a:z + 1]
+        take0 = (c0 < c1) & (c0 < c2)
+        take1 = ~take0 & (c1 < c0) & (c1 < c2)
+        c = torch.where(take0, c0, torch.where(take1, c1, c2))
+        D[:, k, a:z + 1] = (xs[:, k, a:z + 1] + c.to(acc_dtype)).float()
+        # 0 / 1 / 2 as in dtw_cpu (take0 and take1 are exclusive)
+        T[:, k, a:z + 1] = 2 - take1.to(torch.int8) - 2 * take0.to(torch.int8)
+
+    # Back to grid layout [B, N+1, M+1]: trace[b, i, j] = T[b, i + j, i]
+    rows = torch.arange(N + 1, device=device).view(N + 1, 1)
+    cols = torch.arange(M + 1, device=device).view(1, M + 1)
+    return T[:, rows + cols, rows.expand(N + 1, M + 1)]
+
+
+def dtw_batch(
+    cost_matrices: Union[torch.Tensor, np.ndarray, List[Union[torch.Tensor, np.ndarray]]],
+    band: Optional[float] = None,
+    device: Optional[Union[str, torch.device]] = None,
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    DTW over several cost matrices at once, optionally within a Sakoe-Chiba band.
+
+    Args:
+        cost_matrices: Stack [B, N, M] or list of [N_b, M_b] cost matrices
+        band: Band half-width as a fraction of the frame count (None = full grid)
+        device: Run the wavefront on this torch device; None runs the numba kernel
+            (CPU, one thread per matrix). Tensors already on an accelerator use it.
+
+    Returns:
+        One (text_indices, time_indices) pair per matrix; identical to dtw_cpu when band is None.
+    """
+    if isinstance(cost_matrices, (torch.Tensor, np.ndarray)) and cost_matrices.ndim == 3:
+        cost_matrices = list(cost_matrices)
+    if device is None:
+        device = next((m.device for m in cost_matrices if isinstance(m, torch.Tensor) and m.device.type != "cpu"), None)
+
+    # Matrices of the same shape share one kernel call
+    groups: Dict[Tuple[int, int], List[int]] = {}
+    for idx, m in enumerate(cost_matrices):
+        groups.setdefault(tuple(m.shape), []).append(idx)
+
+    paths: List[Optional[Tuple[np.ndarray, np.ndarray]]] = [None] * len(cost_matrices)
+    for (N, M), indices in groups.items():
+        lo, hi = sakoe_chiba_bounds(N, M, band)
+        if device is not None:
+            stack = torch.stack([torch.as_tensor(cost_matrices[i]) for i in indices]).to(device)
+            traces = _dtw_trace_batch_torch(stack, lo, hi).cpu().numpy()
+        else:
+            stack = np.stack([
+                m.detach().cpu().numpy() if isinstance(m, torch.Tensor) else np.asarray(m)
+                for m in (cost_matrices[i] for i in indices)
+            ])
+            traces = _dtw_trace_batch(stack, lo, hi)
+        for slot, idx in enumerate(indices):
+            path = _backtrace(traces[slot], N, M)
+            paths[idx] = (path[0], path[1])
+    return paths
+
+
 # ================= Utility Functions =================
 def median_filter(x: torch.Tensor, filter_width: int) -> torch.Tensor:
     """
@@ -358,9 +498,20 @@ class MusicStampsAligner:
         Returns:
             List of TokenTimestamp objects
         """
-        n_frames = calc_matrix.shape[-1]
         text_indices, time_indices = dtw_cpu(-calc_matrix.astype(np.float64))
+        return self._timestamps_from_path(
+            text_indices, time_indices, calc_matrix.shape[-1], lyrics_tokens, total_duration_seconds
+        )
 
+    def _timestamps_from_path(
+        self,
+        text_indices: np.ndarray,
+        time_indices: np.ndarray,
+        n_frames: int,
+        lyrics_tokens: List[int],
+        total_duration_seconds: float
+    ) -> List[TokenTimestamp]:
+        """Turn a DTW path over [Tokens, Frames] into per-token timestamps."""
         seconds_per_frame = total_duration_seconds / n_frames
         alignment_results = []
         
@@ -545,6 +696,41 @@ class MusicStampsAligner:
             "lrc_text": lrc_text
         }
 
+    def batch_timestamps_and_lrc(
+        self,
+        calc_matrices: List[np.ndarray],
+        lyrics_tokens_list: List[List[int]],
+        total_duration_seconds: Union[float, List[float]],
+        band: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        get_timestamps_and_lrc for several samples, with one batched DTW call.
+        
+        Args:
+            calc_matrices: Processed attention matrices, one per sample
+            lyrics_tokens_list: Token IDs per sample
+            total_duration_seconds: Audio duration (shared or per sample)
+            band: Sakoe-Chiba band as a fraction of the frames (None = full DTW)
+            
+        Returns:
+            List of dicts like get_timestamps_and_lrc
+        """
+        if not isinstance(total_duration_seconds, (list, tuple)):
+            total_duration_seconds = [total_duration_seconds] * len(calc_matrices)
+        paths = dtw_batch([-m.astype(np.float64) for m in calc_matrices], band=band)
+        results = []
+        for calc_matrix, (text_indices, time_indices), tokens, duration in zip(
+            calc_matrices, paths, lyrics_tokens_list, total_duration_seconds
+        ):
+            token_stamps = self._timestamps_from_path(text_indices, time_indices, calc_matrix.shape[-1], tokens, duration)
+            sentence_stamps = self.sentence_timestamps(token_stamps)
+            results.append({
+                "token_timestamps": token_stamps,
+                "sentence_timestamps": sentence_stamps,
+                "lrc_text": self.format_lrc(sentence_stamps)
+            })
+        return results
+
 
 class MusicLyricScorer:
     """
@@ -811,6 +997,49 @@ class MusicLyricScorer:
 
         return return_dict
 
+    def lyrics_alignment_info_batch(
+            self,
+            attention_matrices: List[Union[torch.Tensor, np.ndarray]],
+            token_ids_list: List[List[int]],
+            custom_config: Dict[int, List[int]],
+            medfilt_width: int = 1,
+            band: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        lyrics_alignment_info for several attention matrices with one batched DTW call.
+
+        Args:
+            attention_matrices: Attention tensors [Layers, Heads, Tokens, Frames], one per sample.
+            token_ids_list: Token IDs per sample.
+            custom_config: Layer/Head configuration.
+            medfilt_width: Median filter width.
+            band: Sakoe-Chiba band as a fraction of the frames (None = full DTW).
+
+        Returns:
+            List of dicts like lyrics_alignment_info (without matrices).
+        """
+        prepared = [self._preprocess_attention(m, custom_config, medfilt_width) for m in attention_matrices]
+        type_masks: Dict[Tuple[int, ...], np.ndarray] = {}
+        for token_ids in token_ids_list:
+            if tuple(token_ids) not in type_masks:
+                type_masks[tuple(token_ids)] = self._generate_token_type_mask(token_ids)
+        valid = [i for i, (calc_matrix, _, _) in enumerate(prepared) if calc_matrix is not None]
+        paths = dtw_batch([-prepared[i][0].astype(np.float32) for i in valid], band=band)
+
+        results: List[Dict[str, Any]] = [
+            {"calc_matrix": None, "error": "No valid attention heads found"} for _ in prepared
+        ]
+        for i, (text_indices, time_indices) in zip(valid, paths):
+            energy_matrix = prepared[i][1]
+            type_mask = type_masks[tuple(token_ids_list[i])]
+            mask = type_mask if len(type_mask) == energy_matrix.shape[0] else np.ones(energy_matrix.shape[0], dtype=np.int32)
+            results[i] = {
+                "path_coords": np.stack([text_indices, time_indices], axis=1),
+                "type_mask": mask,
+                "energy_matrix": energy_matrix
+            }
+        return results
+
     def calculate_score(
             self,
             energy_matrix: Union[torch.Tensor, np.ndarray],
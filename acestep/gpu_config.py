@@ -381,6 +381,26 @@ def print_gpu_config_info(gpu_config: GPUConfig):
     logger.info(f"  - Available LM Models: {gpu_config.available_lm_models or 'None'}")
 
 
+# Durations (seconds) that DiT latent lengths are padded up to when the DiT is compiled,
+# so torch.compile only ever sees a few shapes. The tier's max duration is always the last bucket.
+COMPILE_DURATION_BUCKETS = [30, 60, 120, 180, 240, 360, 480, 600]
+
+
+def get_compile_duration_buckets(gpu_config: GPUConfig, lm_initialized: bool = False) -> List[int]:
+    """
+    Get the compile shape buckets (in seconds) for the current GPU tier.
+    
+    Args:
+        gpu_config: Current GPU configuration
+        lm_initialized: Whether LM is initialized (tiers allow shorter durations with LM)
+        
+    Returns:
+        Sorted list of bucket durations, ending with the tier's max duration
+    """
+    max_duration = gpu_config.max_duration_with_lm if lm_initialized else gpu_config.max_duration_without_lm
+    return [d for d in COMPILE_DURATION_BUCKETS if d < max_duration] + [max_duration]
+
+
 # Global GPU config instance (initialized lazily)
 _global_gpu_config: Optional[GPUConfig] = None
 
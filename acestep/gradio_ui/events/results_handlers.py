@@ -337,6 +337,9 @@ def _build_generation_info(
                 time_lines.append(f"  - VAE Decode: {dit_vae_decode:.2f}s")
             if dit_offload > 0:
                 time_lines.append(f"  - Offload: {dit_offload:.2f}s")
+            if 'dit_condition_cache_hit_rate' in time_costs:
+                cache_status = "hit" if time_costs.get('dit_condition_cache_hit', 0.0) else "miss"
+                time_lines.append(f"  - Condition cache: {cache_status} ({time_costs['dit_condition_cache_hit_rate']:.0%} hit rate)")
             time_lines.append(f"  - Total: {dit_total:.2f}s")
         
         # Post-processing time costs
@@ -560,6 +563,8 @@ def generate_with_progress(
         use_cot_caption=use_cot_caption,
         use_cot_language=use_cot_language,
         use_constrained_decoding=True,
+        # LRC and alignment scores read the attention recorded during generation
+        record_alignment_attention=bool(auto_lrc or auto_score),
     )
     # seed string to list
     if isinstance(seed, str) and seed.strip():
@@ -675,6 +680,7 @@ def generate_with_progress(
     )
     time_module.sleep(0.1)
     
+    batch_lrc_results = None
     for i in range(8):
         if i < len(audios):
             key = audios[i]["key"]
@@ -724,6 +730,11 @@ def generate_with_progress(
                         # 简单校验完整性
                         if any(v is None for v in sample_tensor_data.values()):
                             sample_tensor_data = None
+                        elif result.extra_outputs.get("alignment_attention"):
+                            sample_tensor_data["alignment_attention"] = {
+                                name: recording[i:i + 1]
+                                for name, recording in result.extra_outputs["alignment_attention"].items()
+                            }
 
                 except Exception as e:
                     print(f"[Auto Score] Failed to prepare tensor data for sample {i}: {e}")
@@ -750,30 +761,35 @@ def generate_with_progress(
                     logger.info(f"[auto_lrc] pred_latents: {pred_latents is not None}, encoder_hidden_states: {encoder_hidden_states is not None}, encoder_attention_mask: {encoder_attention_mask is not None}, context_latents: {context_latents is not None}, lyric_token_idss: {lyric_token_idss is not None}")
                     
                     if all(x is not None for x in [pred_latents, encoder_hidden_states, encoder_attention_mask, context_latents, lyric_token_idss]):
-                        # Extract single sample tensors
-                        sample_pred_latent = pred_latents[i:i+1]
-                        sample_encoder_hidden_states = encoder_hidden_states[i:i+1]
-                        sample_encoder_attention_mask = encoder_attention_mask[i:i+1]
-                        sample_context_latents = context_latents[i:i+1]
-                        sample_lyric_token_ids = lyric_token_idss[i:i+1]
-                        
                         # Calculate actual duration
                         actual_duration = audio_duration
                         if actual_duration is None or actual_duration <= 0:
                             latent_length = pred_latents.shape[1]
                             actual_duration = latent_length / 25.0  # 25 Hz latent rate
                         
-                        lrc_result = dit_handler.get_lyric_timestamp(
-                            pred_latent=sample_pred_latent,
-                            encoder_hidden_states=sample_encoder_hidden_states,
-                            encoder_attention_mask=sample_encoder_attention_mask,
-                            context_latents=sample_context_latents,
-                            lyric_token_ids=sample_lyric_token_ids,
-                            total_duration_seconds=float(actual_duration),
-                            vocal_language=vocal_language or "en",
-                            inference_steps=int(inference_steps),
-                            seed=42,
-                        )
+                        # All samples are aligned together on the first one (one decoder
+                        # forward, one batched DTW)
+                        alignment_attention = result.extra_outputs.get("alignment_attention")
+                        if batch_lrc_results is None and alignment_attention:
+                            batch_lrc_results = dit_handler.get_lyric_timestamps_from_recording(
+                                alignment_attention={name: rec[:len(audios)] for name, rec in alignment_attention.items()},
+                                lyric_token_ids=lyric_token_idss[:len(audios)],
+                                total_duration_seconds=float(actual_duration),
+                                vocal_language=vocal_language or "en",
+                            )
+                        if batch_lrc_results is None:
+                            batch_lrc_results = dit_handler.get_lyric_timestamps(
+                                pred_latent=pred_latents[:len(audios)],
+                                encoder_hidden_states=encoder_hidden_states[:len(audios)],
+                                encoder_attention_mask=encoder_attention_mask[:len(audios)],
+                                context_latents=context_latents[:len(audios)],
+                                lyric_token_ids=lyric_token_idss[:len(audios)],
+                                total_duration_seconds=float(actual_duration),
+                                vocal_language=vocal_language or "en",
+                                inference_steps=int(inference_steps),
+                                seed=42,
+                            )
+                        lrc_result = batch_lrc_results[i]
                         
                         logger.info(f"[auto_lrc] LRC result for sample {i + 1}: success={lrc_result.get('success')}")
                         if lrc_result.get("success"):
@@ -1056,16 +1072,23 @@ def calculate_score_handler(
         # DiT alignment scoring (works even without audio codes - for Cover/Repaint modes)
         if has_dit_alignment_data:
             try:
-                align_result = dit_handler.get_lyric_score(
-                    pred_latent=extra_tensor_data.get('pred_latent'),
-                    encoder_hidden_states=extra_tensor_data.get('encoder_hidden_states'),
-                    encoder_attention_mask=extra_tensor_data.get('encoder_attention_mask'),
-                    context_latents=extra_tensor_data.get('context_latents'),
-                    lyric_token_ids=extra_tensor_data.get('lyric_token_ids'),
-                    vocal_language=vocal_language or "en",
-                    inference_steps=int(inference_steps),
-                    seed=42,
-                )
+                if extra_tensor_data.get('alignment_attention'):
+                    align_result = dit_handler.get_lyric_scores_from_recording(
+                        alignment_attention=extra_tensor_data['alignment_attention'],
+                        lyric_token_ids=extra_tensor_data.get('lyric_token_ids'),
+                        vocal_language=vocal_language or "en",
+                    )[0]
+                else:
+                    align_result = dit_handler.get_lyric_score(
+                        pred_latent=extra_tensor_data.get('pred_latent'),
+                        encoder_hidden_states=extra_tensor_data.get('encoder_hidden_states'),
+                        encoder_attention_mask=extra_tensor_data.get('encoder_attention_mask'),
+                        context_latents=extra_tensor_data.get('context_latents'),
+                        lyric_token_ids=extra_tensor_data.get('lyric_token_ids'),
+                        vocal_language=vocal_language or "en",
+                        inference_steps=int(inference_steps),
+                        seed=42,
+                    )
 
                 if align_result.get("success"):
                     lm_align_score = align_result.get("lm_score", 0.0)
@@ -1213,6 +1236,11 @@ def calculate_score_handler_with_selection(
                     # Verify no None values in the sliced dict
                     if any(v is None for v in extra_tensor_data.values()):
                         extra_tensor_data = None
+                    elif extra_outputs.get("alignment_attention"):
+                        extra_tensor_data["alignment_attention"] = {
+                            name: recording[sample_idx_0based:sample_idx_0based + 1]
+                            for name, recording in extra_outputs["alignment_attention"].items()
+                        }
                 except Exception as e:
                     print(f"Error slicing tensor data for score: {e}")
                     extra_tensor_data = None
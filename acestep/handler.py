@@ -16,8 +16,11 @@ import random
 import uuid
 import hashlib
 import json
-from contextlib import contextmanager
-from typing import Optional, Dict, Any, Tuple, List, Union
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import Optional, Dict, Any, Iterable, Tuple, List, Union
 
 import torch
 import torchaudio
@@ -43,11 +46,36 @@ from acestep.constants import (
     DEFAULT_DIT_INSTRUCTION,
 )
 from acestep.dit_alignment_score import MusicStampsAligner, MusicLyricScorer
-from acestep.gpu_config import get_gpu_memory_gb
+from acestep.gpu_config import get_gpu_memory_gb, get_global_gpu_config, get_compile_duration_buckets
+from acestep.compile_cache import (
+    get_compile_cache_dir,
+    enable_compile_cache,
+    save_compile_cache,
+    compile_repeated_blocks,
+    get_compile_counters,
+)
+from acestep.quant_calibration import CALIBRATION_FILE, load_calibration, apply_static_int8, int8_gemm_supported
+from acestep.step_cache import DiTStepCache
+from acestep.cancellation import JobCancelled, check_cancelled, current_token
+from acestep.cfg_interval import CFGIntervalSkipper
+from acestep.attention_capture import CrossAttentionRecorder, recording_config
+from acestep.lora_registry import LoRAAdapterRegistry
+from acestep.module_hooks import wrap_forward
+from acestep.cpu_config import (
+    CPUExecutionConfig,
+    get_cpu_execution_config,
+    apply_cpu_execution_config,
+    create_vae_executor,
+    hold_num_threads,
+    quantize_linear_dynamic_int8,
+)
 
 
 warnings.filterwarnings("ignore")
 
+# (multiplier, offset) pairs of the position weights in AceStepHandler._tensor_fingerprint
+_FINGERPRINT_MULTIPLIERS = ((0x5851F42D4C957F2D, 0x14057B7EF767814F), (0x2545F4914F6CDD1D, 0x1B873593))
+
 
 class AceStepHandler:
     """ACE-Step Business Logic Handler"""
@@ -82,12 +110,47 @@ class AceStepHandler:
         self.offload_to_cpu = False
         self.offload_dit_to_cpu = False
         self.current_offload_cost = 0.0
+        self.offload_bytes_moved = 0  # parameters and buffers moved by _load_model_context, both directions
         
         # LoRA state
         self.lora_loaded = False
         self.use_lora = False
         self.lora_scale = 1.0  # LoRA influence scale (0-1)
-        self._base_decoder = None  # Backup of original decoder
+        # Named adapters attached to one PEFT-wrapped decoder (no base copy); switching
+        # adapter/scale per request holds _lora_lock for the whole generation, so requests
+        # that select adapters run one at a time (only a single batch can mix adapters)
+        self.lora_registry = LoRAAdapterRegistry(
+            max_adapters=int(os.environ.get("ACESTEP_LORA_MAX_ADAPTERS", "4")),
+            offload_inactive=os.environ.get("ACESTEP_LORA_OFFLOAD_INACTIVE", "").lower() in ("1", "true", "yes"),
+        )
+        self._lora_lock = threading.RLock()
+
+        # Detokenized LM hints keyed by code sequence hash (bounded LRU)
+        self._code_latents_cache: "OrderedDict[str, torch.Tensor]" = OrderedDict()
+        self.code_latents_cache_size = 8
+
+        # Memoized model.prepare_condition outputs keyed by a hash of all conditioning inputs
+        # (LRU bounded by bytes); cleared on model reload and LoRA load/unload. The active
+        # adapter/scale is part of the key, so per-request adapter switches keep it warm
+        self._condition_cache: "OrderedDict[str, Tuple[torch.Tensor, torch.Tensor, torch.Tensor]]" = OrderedDict()
+        self._condition_cache_bytes = 0
+        self.condition_cache_max_bytes = int(os.environ.get("ACESTEP_CONDITION_CACHE_MB", "256")) * 1024 * 1024
+        self._condition_cache_hits = 0
+        self._condition_cache_misses = 0
+        self._condition_cache_lock = threading.Lock()
+        # Per-thread condition handed to generate_audio's prepare_condition (_reuse_condition)
+        self._condition_reuse = threading.local()
+
+        # torch.compile state: latent lengths are padded up to these buckets (25Hz frames)
+        # so compiled graphs see a fixed set of shapes; None when not compiling
+        self.latent_length_buckets: Optional[List[int]] = None
+        self.compile_cache_dir: Optional[str] = None
+
+        # CPU execution mode (device == "cpu"): diffusion is serialized by _diffusion_lock while
+        # VAE decodes run on their own executor, so concurrent requests pipeline
+        self.cpu_config: Optional[CPUExecutionConfig] = None
+        self._vae_executor: Optional[ThreadPoolExecutor] = None
+        self._diffusion_lock = threading.Lock()
     
     def get_available_checkpoints(self) -> str:
         """Return project root directory path"""
@@ -132,11 +195,14 @@ class AceStepHandler:
             return False
         return getattr(self.config, 'is_turbo', False)
     
-    def load_lora(self, lora_path: str) -> str:
+    def load_lora(self, lora_path: str, adapter_name: Optional[str] = None) -> str:
         """Load LoRA adapter into the decoder.
         
+        Adapters stay resident side by side; loading one makes it the active adapter.
+        
         Args:
             lora_path: Path to the LoRA adapter directory (containing adapter_config.json)
+            adapter_name: Name to register the adapter under (default: directory name)
             
         Returns:
             Status message
@@ -159,43 +225,32 @@ class AceStepHandler:
             return f"❌ Invalid LoRA adapter: adapter_config.json not found in {lora_path}"
         
         try:
-            from peft import PeftModel, PeftConfig
+            import peft  # noqa: F401
         except ImportError:
             return "❌ PEFT library not installed. Please install with: pip install peft"
         
+        adapter_name = (adapter_name or "").strip() or os.path.basename(os.path.normpath(lora_path))
         try:
-            import copy
-            # Backup base decoder if not already backed up
-            if self._base_decoder is None:
-                self._base_decoder = copy.deepcopy(self.model.decoder)
-                logger.info("Base decoder backed up")
-            else:
-                # Restore base decoder before loading new LoRA
-                self.model.decoder = copy.deepcopy(self._base_decoder)
-                logger.info("Restored base decoder before loading new LoRA")
-            
-            # Load PEFT adapter
-            logger.info(f"Loading LoRA adapter from {lora_path}")
-            self.model.decoder = PeftModel.from_pretrained(
-                self.model.decoder,
-                lora_path,
-                is_trainable=False,
-            )
-            self.model.decoder = self.model.decoder.to(self.device).to(self.dtype)
-            self.model.decoder.eval()
-            
-            self.lora_loaded = True
-            self.use_lora = True  # Enable LoRA by default after loading
+            with self._lora_lock:
+                logger.info(f"Loading LoRA adapter '{adapter_name}' from {lora_path}")
+                self.lora_registry.dtype = self.dtype
+                self.model.decoder = self.lora_registry.load(self.model.decoder, adapter_name, lora_path)
+                self.model.decoder.eval()
+                self._sync_lora_state()
+            self._invalidate_condition_cache("LoRA loaded")
             
             logger.info(f"LoRA adapter loaded successfully from {lora_path}")
-            return f"✅ LoRA loaded from {lora_path}"
+            return f"✅ LoRA '{adapter_name}' loaded from {lora_path}"
             
         except Exception as e:
             logger.exception("Failed to load LoRA adapter")
             return f"❌ Failed to load LoRA: {str(e)}"
     
-    def unload_lora(self) -> str:
-        """Unload LoRA adapter and restore base decoder.
+    def unload_lora(self, adapter_name: Optional[str] = None) -> str:
+        """Unload LoRA adapters and restore the base decoder.
+        
+        Args:
+            adapter_name: Adapter to unload (default: all adapters)
         
         Returns:
             Status message
@@ -203,20 +258,16 @@ class AceStepHandler:
         if not self.lora_loaded:
             return "⚠️ No LoRA adapter loaded."
         
-        if self._base_decoder is None:
-            return "❌ Base decoder backup not found. Cannot restore."
-        
         try:
-            import copy
-            # Restore base decoder
-            self.model.decoder = copy.deepcopy(self._base_decoder)
-            self.model.decoder = self.model.decoder.to(self.device).to(self.dtype)
-            self.model.decoder.eval()
-            
-            self.lora_loaded = False
-            self.use_lora = False
-            self.lora_scale = 1.0  # Reset scale to default
-            
+            with self._lora_lock:
+                self.model.decoder = self.lora_registry.unload(self.model.decoder, adapter_name)
+                self.model.decoder.eval()
+                self._sync_lora_state()
+            self._invalidate_condition_cache("LoRA unloaded")
+            
+            if self.lora_loaded:
+                logger.info(f"LoRA adapter '{adapter_name}' unloaded")
+                return f"✅ LoRA '{adapter_name}' unloaded, active: {self.lora_registry.active}"
             logger.info("LoRA unloaded, base decoder restored")
             return "✅ LoRA unloaded, using base model"
             
@@ -236,19 +287,13 @@ class AceStepHandler:
         if use_lora and not self.lora_loaded:
             return "❌ No LoRA adapter loaded. Please load a LoRA first."
         
-        self.use_lora = use_lora
-        
-        # Use PEFT's enable/disable methods if available
-        if self.lora_loaded and hasattr(self.model.decoder, 'disable_adapter_layers'):
-            try:
-                if use_lora:
-                    self.model.decoder.enable_adapter_layers()
-                    logger.info("LoRA adapter enabled")
-                else:
-                    self.model.decoder.disable_adapter_layers()
-                    logger.info("LoRA adapter disabled")
-            except Exception as e:
-                logger.warning(f"Could not toggle adapter layers: {e}")
+        if self.lora_loaded:
+            with self._lora_lock:
+                self.lora_registry.set_enabled(use_lora)
+                self._sync_lora_state()
+            logger.info(f"LoRA adapter {'enabled' if use_lora else 'disabled'}")
+        else:
+            self.use_lora = use_lora
         
         status = "enabled" if use_lora else "disabled"
         return f"✅ LoRA {status}"
@@ -266,32 +311,11 @@ class AceStepHandler:
             return "⚠️ No LoRA loaded"
         
         # Clamp scale to 0-1 range
-        self.lora_scale = max(0.0, min(1.0, scale))
-        
-        # Iterate through all LoRA layers and set their scaling
-        try:
-            for name, module in self.model.decoder.named_modules():
-                if hasattr(module, 'scaling'):
-                    scaling = module.scaling
-                    # Handle dict-style scaling (adapter_name -> value)
-                    if isinstance(scaling, dict):
-                        # Save original scaling on first call
-                        if not hasattr(module, '_original_scaling'):
-                            module._original_scaling = {k: v for k, v in scaling.items()}
-                        # Apply new scale
-                        for adapter_name in scaling:
-                            module.scaling[adapter_name] = module._original_scaling[adapter_name] * self.lora_scale
-                    # Handle float-style scaling (single value)
-                    elif isinstance(scaling, (int, float)):
-                        if not hasattr(module, '_original_scaling'):
-                            module._original_scaling = scaling
-                        module.scaling = module._original_scaling * self.lora_scale
-            
-            logger.info(f"LoRA scale set to {self.lora_scale:.2f}")
-            return f"✅ LoRA scale: {self.lora_scale:.2f}"
-        except Exception as e:
-            logger.warning(f"Could not set LoRA scale: {e}")
-            return f"⚠️ Scale set to {self.lora_scale:.2f} (partial)"
+        with self._lora_lock:
+            self.lora_registry.set_scale(max(0.0, min(1.0, scale)))
+            self._sync_lora_state()
+        logger.info(f"LoRA scale set to {self.lora_scale:.2f}")
+        return f"✅ LoRA scale: {self.lora_scale:.2f}"
     
     def get_lora_status(self) -> Dict[str, Any]:
         """Get current LoRA status.
@@ -303,7 +327,134 @@ class AceStepHandler:
             "loaded": self.lora_loaded,
             "active": self.use_lora,
             "scale": self.lora_scale,
+            "active_adapter": self.lora_registry.active,
+            "adapters": list(self.lora_registry.adapters),
         }
+
+    def metrics_counters(self) -> Dict[str, int]:
+        """Cumulative counters for the API server's /metrics."""
+        return {
+            "condition_cache_hits": self._condition_cache_hits,
+            "condition_cache_misses": self._condition_cache_misses,
+            "offload_bytes": self.offload_bytes_moved,
+        }
+
+    def memory_footprint(self) -> int:
+        """Bytes of parameters and buffers of the loaded DiT, VAE and text encoder."""
+        seen, total = set(), 0
+        for module in (self.model, self.vae, self.text_encoder):
+            if module is None:
+                continue
+            for t in list(module.parameters()) + list(module.buffers()):
+                if id(t) not in seen:
+                    seen.add(id(t))
+                    total += t.numel() * t.element_size()
+        return total
+
+    def offload_models(self):
+        """Move the DiT, VAE and text encoder to host memory; restore_models() brings them back."""
+        start_time = time.time()
+        for module in (self.model, self.vae, self.text_encoder):
+            if module is not None:
+                self._recursive_to_device(module, "cpu")
+        # Memoized conditions and detokenized hints are device tensors
+        self._invalidate_condition_cache("models offloaded")
+        self._code_latents_cache.clear()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        elif hasattr(torch, "xpu") and torch.xpu.is_available():
+            torch.xpu.empty_cache()
+        self.offload_bytes_moved += self.memory_footprint()
+        logger.info(f"[offload_models] Models moved to CPU in {time.time() - start_time:.2f}s")
+
+    def restore_models(self):
+        """Move the models back to the device, where the offload settings keep them between calls."""
+        if self.model is None:
+            return
+        start_time = time.time()
+        if not (self.offload_to_cpu and self.offload_dit_to_cpu):
+            self._recursive_to_device(self.model, self.device, self.dtype)
+        if not self.offload_to_cpu:
+            self._recursive_to_device(self.vae, self.device, self._get_vae_dtype())
+            self._recursive_to_device(self.text_encoder, self.device, self.dtype)
+        self._ensure_silence_latent_on_device()
+        self.offload_bytes_moved += self.memory_footprint()
+        logger.info(f"[restore_models] Models moved to {self.device} in {time.time() - start_time:.2f}s")
+
+    def unload(self):
+        """Free the models; initialize_service() loads them again. Resident LoRA adapters are dropped too."""
+        self.model = self.config = None
+        self.vae = None
+        self.text_encoder = self.text_tokenizer = None
+        self.lora_registry = LoRAAdapterRegistry(
+            dtype=self.lora_registry.dtype,
+            max_adapters=self.lora_registry.max_adapters,
+            offload_inactive=self.lora_registry.offload_inactive,
+        )
+        self._sync_lora_state()
+        self._invalidate_condition_cache("models unloaded")
+        self._code_latents_cache.clear()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        elif hasattr(torch, "xpu") and torch.xpu.is_available():
+            torch.xpu.empty_cache()
+        logger.info("[unload] Models released")
+
+    def _sync_lora_state(self):
+        """Mirror the registry into the lora_* attributes the UI reads."""
+        self.lora_loaded = len(self.lora_registry) > 0
+        self.use_lora = self.lora_loaded and self.lora_registry.enabled
+        self.lora_scale = self.lora_registry.scale
+
+    @contextmanager
+    def _lora_request_context(
+        self,
+        adapter_name: Optional[Union[str, List[Optional[str]]]] = None,
+        scale: Optional[Union[float, List[float]]] = None,
+    ):
+        """
+        Hold the decoder's LoRA state for one generation, optionally switching adapter/scale.
+
+        A list of adapter names (one per batch item, None = no LoRA) runs a mixed-adapter
+        batch instead of switching the global adapter; a list of scales with a single
+        adapter name is broadcast to one row per scale. The previous adapter, scale and
+        enabled flag are restored afterwards. Without loaded adapters this is a no-op
+        (and selecting an adapter is an error).
+
+        The lock is held for the whole generation: concurrent generate_music calls on
+        this handler run one after another while adapters are loaded, even with the same
+        adapter. Requests for different adapters are not merged into one mixed batch.
+        """
+        if not self.lora_loaded:
+            requested = adapter_name if isinstance(adapter_name, list) else [adapter_name]
+            if any(requested):
+                raise ValueError(f"LoRA adapter {adapter_name!r} is not loaded")
+            yield
+            return
+        with self._lora_lock:
+            if isinstance(scale, list) and not isinstance(adapter_name, list):
+                # Per-item scales for one adapter (None = the current one): a mixed batch of that adapter
+                if not adapter_name:
+                    active, _, enabled = self.lora_registry.state()
+                    adapter_name = active if enabled else None
+                adapter_name = [adapter_name] * len(scale)
+            if isinstance(adapter_name, list):
+                scales = scale if isinstance(scale, list) else [1.0 if scale is None else scale] * len(adapter_name)
+                with self.lora_registry.mixed_batch(adapter_name, scales):
+                    yield
+                return
+            previous = self.lora_registry.state()
+            try:
+                if adapter_name:
+                    self.lora_registry.activate(adapter_name, scale=1.0 if scale is None else scale)
+                    self.lora_registry.set_enabled(True)
+                elif scale is not None:
+                    self.lora_registry.set_scale(scale)
+                yield
+            finally:
+                active, previous_scale, enabled = previous
+                self.lora_registry.activate(active, previous_scale)
+                self.lora_registry.set_enabled(enabled)
     
     def initialize_service(
         self,
@@ -328,6 +479,8 @@ class AceStepHandler:
             compile_model: Whether to use torch.compile to optimize the model
             offload_to_cpu: Whether to offload models to CPU when not in use
             offload_dit_to_cpu: Whether to offload DiT model to CPU when not in use (only effective if offload_to_cpu is True)
+            quantization: torchao mode ("int8_weight_only", "fp8_weight_only", "w8a8_dynamic"; requires compile_model)
+                or "w8a8_static" (calibrated static int8 for the DiT and VAE decoders)
             prefer_source: Preferred download source ("huggingface", "modelscope", or None for auto-detect)
 
         Returns:
@@ -351,8 +504,20 @@ class AceStepHandler:
             self.offload_dit_to_cpu = offload_dit_to_cpu
             # Set dtype based on device: bfloat16 for cuda, float32 for cpu
             self.dtype = torch.bfloat16 if device in ["cuda","xpu"] else torch.float32
+            if self._vae_executor is not None:
+                self._vae_executor.shutdown(wait=True)
+                self._vae_executor = None
+            if device == "cpu":
+                self.cpu_config = get_cpu_execution_config()
+                apply_cpu_execution_config(self.cpu_config)
+                if self.cpu_config.precision == "bf16":
+                    self.dtype = torch.bfloat16
+                self._vae_executor = create_vae_executor(self.cpu_config)
+            else:
+                self.cpu_config = None
             self.quantization = quantization
-            if self.quantization is not None:
+            if self.quantization is not None and self.quantization != "w8a8_static":
+                # torchao modes; w8a8_static uses the calibration saved next to the checkpoint
                 assert compile_model, "Quantization requires compile_model to be True"
                 try:
                     import torchao
@@ -384,130 +549,51 @@ class AceStepHandler:
                     return f"❌ Failed to download DiT model '{config_path}': {msg}", False
                 logger.info(f"[initialize_service] {msg}")
 
-            # 1. Load main model
+            # Cached detokenized hints and conditions belong to the previous model
+            self._code_latents_cache.clear()
+            self._invalidate_condition_cache("model reload")
+            # Adapters were attached to the previous decoder
+            self.lora_registry = LoRAAdapterRegistry(
+                max_adapters=self.lora_registry.max_adapters,
+                offload_inactive=self.lora_registry.offload_inactive,
+            )
+            self._sync_lora_state()
             # config_path is relative path (e.g., "acestep-v15-turbo"), concatenate to checkpoints directory
             acestep_v15_checkpoint_path = os.path.join(checkpoint_dir, config_path)
-            if os.path.exists(acestep_v15_checkpoint_path):
-                # Determine attention implementation
-                if use_flash_attention and self.is_flash_attention_available():
-                    attn_implementation = "flash_attention_2"
-                    self.dtype = torch.bfloat16
-                else:
-                    attn_implementation = "sdpa"
-
-                try:
-                    logger.info(f"[initialize_service] Attempting to load model with attention implementation: {attn_implementation}")
-                    self.model = AutoModel.from_pretrained(
-                        acestep_v15_checkpoint_path, 
-                        trust_remote_code=True, 
-                        attn_implementation=attn_implementation,
-                        dtype="bfloat16"
-                    )
-                except Exception as e:
-                    logger.warning(f"[initialize_service] Failed to load model with {attn_implementation}: {e}")
-                    if attn_implementation == "sdpa":
-                        logger.info("[initialize_service] Falling back to eager attention")
-                        attn_implementation = "eager"
-                        self.model = AutoModel.from_pretrained(
-                            acestep_v15_checkpoint_path, 
-                            trust_remote_code=True, 
-                            attn_implementation=attn_implementation
-                        )
-                    else:
-                        raise e
-
-                self.model.config._attn_implementation = attn_implementation
-                self.config = self.model.config
-                # Move model to device and set dtype
-                if not self.offload_to_cpu:
-                    self.model = self.model.to(device).to(self.dtype)
-                else:
-                    # If offload_to_cpu is True, check if we should keep DiT on GPU
-                    if not self.offload_dit_to_cpu:
-                        logger.info(f"[initialize_service] Keeping main model on {device} (persistent)")
-                        self.model = self.model.to(device).to(self.dtype)
-                    else:
-                        self.model = self.model.to("cpu").to(self.dtype)
-                self.model.eval()
-                
-                if compile_model:
-                    # Add __len__ method to model to support torch.compile
-                    # torch.compile's dynamo requires this method for introspection
-                    # Note: This modifies the model class, affecting all instances
-                    if not hasattr(self.model.__class__, '__len__'):
-                        def _model_len(model_self):
-                            """Return 0 as default length for torch.compile compatibility"""
-                            return 0
-                        self.model.__class__.__len__ = _model_len
-                    
-                    self.model = torch.compile(self.model)
-                    
-                    if self.quantization is not None:
-                        from torchao.quantization import quantize_
-                        if self.quantization == "int8_weight_only":
-                            from torchao.quantization import Int8WeightOnlyConfig
-                            quant_config = Int8WeightOnlyConfig()
-                        elif self.quantization == "fp8_weight_only":
-                            from torchao.quantization import Float8WeightOnlyConfig
-                            quant_config = Float8WeightOnlyConfig()
-                        elif self.quantization == "w8a8_dynamic":
-                            from torchao.quantization import Int8DynamicActivationInt8WeightConfig, MappingType
-                            quant_config = Int8DynamicActivationInt8WeightConfig(act_mapping_type=MappingType.ASYMMETRIC)
-                        else:
-                            raise ValueError(f"Unsupported quantization type: {self.quantization}")
-                        
-                        quantize_(self.model, quant_config)
-                        logger.info(f"[initialize_service] DiT quantized with: {self.quantization}")
-                    
-                    
-                silence_latent_path = os.path.join(acestep_v15_checkpoint_path, "silence_latent.pt")
-                if os.path.exists(silence_latent_path):
-                    self.silence_latent = torch.load(silence_latent_path).transpose(1, 2)
-                    # Always keep silence_latent on GPU - it's used in many places outside model context
-                    # and is small enough that it won't significantly impact VRAM
-                    self.silence_latent = self.silence_latent.to(device).to(self.dtype)
-                else:
-                    raise FileNotFoundError(f"Silence latent not found at {silence_latent_path}")
-            else:
-                raise FileNotFoundError(f"ACE-Step V1.5 checkpoint not found at {acestep_v15_checkpoint_path}")
-            
-            # 2. Load VAE
             vae_checkpoint_path = os.path.join(checkpoint_dir, "vae")
-            if os.path.exists(vae_checkpoint_path):
-                self.vae = AutoencoderOobleck.from_pretrained(vae_checkpoint_path)
-                # Use bfloat16 for VAE on GPU, otherwise use self.dtype (float32 on CPU)
-                vae_dtype = self._get_vae_dtype(device)
-                if not self.offload_to_cpu:
-                    self.vae = self.vae.to(device).to(vae_dtype)
-                else:
-                    self.vae = self.vae.to("cpu").to(vae_dtype)
-                self.vae.eval()
-            else:
+            text_encoder_path = os.path.join(checkpoint_dir, "Qwen3-Embedding-0.6B")
+            if not os.path.exists(acestep_v15_checkpoint_path):
+                raise FileNotFoundError(f"ACE-Step V1.5 checkpoint not found at {acestep_v15_checkpoint_path}")
+            if not os.path.exists(vae_checkpoint_path):
                 raise FileNotFoundError(f"VAE checkpoint not found at {vae_checkpoint_path}")
+            if not os.path.exists(text_encoder_path):
+                raise FileNotFoundError(f"Text encoder not found at {text_encoder_path}")
 
             if compile_model:
-                # Add __len__ method to VAE to support torch.compile if needed
-                # Note: This modifies the VAE class, affecting all instances
-                if not hasattr(self.vae.__class__, '__len__'):
-                    def _vae_len(vae_self):
-                        """Return 0 as default length for torch.compile compatibility"""
-                        return 0
-                    self.vae.__class__.__len__ = _vae_len
-                
-                self.vae = torch.compile(self.vae)
-            
-            # 3. Load text encoder and tokenizer
-            text_encoder_path = os.path.join(checkpoint_dir, "Qwen3-Embedding-0.6B")
-            if os.path.exists(text_encoder_path):
-                self.text_tokenizer = AutoTokenizer.from_pretrained(text_encoder_path)
-                self.text_encoder = AutoModel.from_pretrained(text_encoder_path)
-                if not self.offload_to_cpu:
-                    self.text_encoder = self.text_encoder.to(device).to(self.dtype)
-                else:
-                    self.text_encoder = self.text_encoder.to("cpu").to(self.dtype)
-                self.text_encoder.eval()
+                # Persistent compile cache keyed by model hash + torch version; must be set up
+                # before anything is compiled
+                cache_root = os.environ.get("ACESTEP_COMPILE_CACHE_DIR", os.path.join(checkpoint_dir, ".compile_cache"))
+                self.compile_cache_dir = get_compile_cache_dir(cache_root, acestep_v15_checkpoint_path)
+                cache_loaded = enable_compile_cache(self.compile_cache_dir)
+                logger.info(f"[initialize_service] Compile cache: {self.compile_cache_dir} (artifacts loaded: {cache_loaded})")
+                self.latent_length_buckets = [
+                    duration * 25 for duration in get_compile_duration_buckets(get_global_gpu_config())
+                ]
             else:
-                raise FileNotFoundError(f"Text encoder not found at {text_encoder_path}")
+                self.compile_cache_dir = None
+                self.latent_length_buckets = None
+
+            # Determine attention implementation (and dtype) before any component loads
+            if use_flash_attention and self.is_flash_attention_available():
+                attn_implementation = "flash_attention_2"
+                self.dtype = torch.bfloat16
+            else:
+                attn_implementation = "sdpa"
+
+            self._load_components(
+                acestep_v15_checkpoint_path, vae_checkpoint_path, text_encoder_path,
+                device, attn_implementation, compile_model,
+            )
 
             # Determine actual attention implementation used
             actual_attn = getattr(self.config, "_attn_implementation", "eager")
@@ -529,6 +615,287 @@ class AceStepHandler:
             logger.exception("[initialize_service] Error initializing model")
             return error_msg, False
     
+    def _load_components(
+        self,
+        dit_checkpoint_path: str,
+        vae_checkpoint_path: str,
+        text_encoder_path: str,
+        device: str,
+        attn_implementation: str,
+        compile_model: bool,
+    ):
+        """
+        Load the DiT (plus silence latent), VAE and text encoder.
+
+        Only the weight file reads run in parallel. The modules are built one
+        after another because from_pretrained temporarily changes process-wide
+        state (no_init_weights, init_empty_weights, the default dtype), and
+        overlapping loads can leave meta or wrong-dtype parameters.
+        """
+        load_start = time.time()
+        prefetched = self._prefetch_weight_files([dit_checkpoint_path, vae_checkpoint_path, text_encoder_path])
+        prefetch_time = time.time() - load_start
+
+        load_times = {}
+
+        def _timed(name, fn, *args):
+            t0 = time.time()
+            result = fn(*args)
+            load_times[name] = time.time() - t0
+            return result
+
+        self.model, self.silence_latent = _timed(
+            "dit", self._load_dit_model, dit_checkpoint_path, device, attn_implementation, compile_model
+        )
+        self.config = self.model.config
+        self.vae = _timed("vae", self._load_vae, vae_checkpoint_path, device, compile_model)
+        self.text_tokenizer, self.text_encoder = _timed(
+            "text_encoder", self._load_text_encoder, text_encoder_path, device
+        )
+        logger.info(
+            f"[initialize_service] Read {prefetched / 2**30:.2f} GB of weights in {prefetch_time:.2f}s, then loaded "
+            f"DiT in {load_times['dit']:.2f}s, VAE in {load_times['vae']:.2f}s, "
+            f"text encoder in {load_times['text_encoder']:.2f}s (wall {time.time() - load_start:.2f}s)"
+        )
+
+    @staticmethod
+    def _prefetch_weight_files(paths: List[str], num_workers: Optional[int] = None,
+                               chunk_bytes: int = 16 * 2**20) -> int:
+        """
+        Read the .safetensors files under paths in parallel chunks, so the
+        from_pretrained calls that follow map them from the page cache instead
+        of the disk. Returns the bytes read. The reads release the GIL and
+        touch no torch state.
+        """
+        chunks = []
+        for path in paths:
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith(".safetensors"):
+                        file = os.path.join(root, name)
+                        size = os.path.getsize(file)
+                        chunks.extend((file, offset, min(chunk_bytes, size - offset))
+                                      for offset in range(0, size, chunk_bytes))
+        if not chunks:
+            return 0
+        if num_workers is None:
+            num_workers = min(8, os.cpu_count() or 1)
+        buffers = threading.local()
+
+        def read(chunk) -> int:
+            file, offset, length = chunk
+            buffer = getattr(buffers, "buffer", None)
+            if buffer is None:
+                buffer = buffers.buffer = bytearray(chunk_bytes)
+            with open(file, "rb") as f:
+                f.seek(offset)
+                return f.readinto(memoryview(buffer)[:length])
+
+        with ThreadPoolExecutor(max_workers=max(1, num_workers), thread_name_prefix="acestep-prefetch") as executor:
+            return sum(executor.map(read, chunks))
+
+    def _load_dit_model(self, checkpoint_path: str, device: str, attn_implementation: str, compile_model: bool):
+        """Load the DiT model and its silence latent; returns (model, silence_latent)."""
+        try:
+            logger.info(f"[initialize_service] Attempting to load model with attention implementation: {attn_implementation}")
+            model = AutoModel.from_pretrained(
+                checkpoint_path, 
+                trust_remote_code=True, 
+                attn_implementation=attn_implementation,
+                dtype="bfloat16"
+            )
+        except Exception as e:
+            logger.warning(f"[initialize_service] Failed to load model with {attn_implementation}: {e}")
+            if attn_implementation == "sdpa":
+                logger.info("[initialize_service] Falling back to eager attention")
+                attn_implementation = "eager"
+                model = AutoModel.from_pretrained(
+                    checkpoint_path, 
+                    trust_remote_code=True, 
+                    attn_implementation=attn_implementation
+                )
+            else:
+                raise e
+
+        model.config._attn_implementation = attn_implementation
+        # Move model to device and set dtype
+        if not self.offload_to_cpu:
+            model = model.to(device).to(self.dtype)
+        else:
+            # If offload_to_cpu is True, check if we should keep DiT on GPU
+            if not self.offload_dit_to_cpu:
+                logger.info(f"[initialize_service] Keeping main model on {device} (persistent)")
+                model = model.to(device).to(self.dtype)
+            else:
+                model = model.to("cpu").to(self.dtype)
+        model.eval()
+
+        if self.quantization == "w8a8_static":
+            self._apply_static_quantization(getattr(model, "decoder", model), checkpoint_path, "DiT", device, required=True)
+        elif self.cpu_config is not None and self.cpu_config.precision == "int8" and self.quantization is None:
+            # The decoder runs once per diffusion step; condition encoders run once per request
+            quantize_linear_dynamic_int8(getattr(model, "decoder", model))
+            logger.info("[initialize_service] DiT decoder linear layers quantized to dynamic int8 for CPU")
+
+        if compile_model:
+            if self.quantization is not None and self.quantization != "w8a8_static":
+                from torchao.quantization import quantize_
+                if self.quantization == "int8_weight_only":
+                    from torchao.quantization import Int8WeightOnlyConfig
+                    quant_config = Int8WeightOnlyConfig()
+                elif self.quantization == "fp8_weight_only":
+                    from torchao.quantization import Float8WeightOnlyConfig
+                    quant_config = Float8WeightOnlyConfig()
+                elif self.quantization == "w8a8_dynamic":
+                    from torchao.quantization import Int8DynamicActivationInt8WeightConfig, MappingType
+                    quant_config = Int8DynamicActivationInt8WeightConfig(act_mapping_type=MappingType.ASYMMETRIC)
+                else:
+                    raise ValueError(f"Unsupported quantization type: {self.quantization}")
+                
+                quantize_(model, quant_config)
+                logger.info(f"[initialize_service] DiT quantized with: {self.quantization}")
+
+            # Regional compilation: the repeated decoder blocks share one compiled graph, and
+            # bucketed latent lengths keep the set of static shapes small
+            decoder = getattr(model, "decoder", model)
+            num_compiled = compile_repeated_blocks(decoder, dynamic=False)
+            if num_compiled > 0:
+                logger.info(f"[initialize_service] Regionally compiled {num_compiled} DiT decoder blocks")
+            else:
+                # Add __len__ method to model to support torch.compile
+                # torch.compile's dynamo requires this method for introspection
+                # Note: This modifies the model class, affecting all instances
+                if not hasattr(model.__class__, '__len__'):
+                    def _model_len(model_self):
+                        """Return 0 as default length for torch.compile compatibility"""
+                        return 0
+                    model.__class__.__len__ = _model_len
+                
+                model = torch.compile(model)
+            
+        silence_latent_path = os.path.join(checkpoint_path, "silence_latent.pt")
+        if not os.path.exists(silence_latent_path):
+            raise FileNotFoundError(f"Silence latent not found at {silence_latent_path}")
+        silence_latent = torch.load(silence_latent_path).transpose(1, 2)
+        # Always keep silence_latent on GPU - it's used in many places outside model context
+        # and is small enough that it won't significantly impact VRAM
+        silence_latent = silence_latent.to(device).to(self.dtype)
+        return model, silence_latent
+
+    def _load_vae(self, vae_checkpoint_path: str, device: str, compile_model: bool):
+        """Load the VAE."""
+        vae = AutoencoderOobleck.from_pretrained(vae_checkpoint_path)
+        # Use bfloat16 for VAE on GPU, otherwise use self.dtype (float32 on CPU)
+        vae_dtype = self._get_vae_dtype(device)
+        if not self.offload_to_cpu:
+            vae = vae.to(device).to(vae_dtype)
+        else:
+            vae = vae.to("cpu").to(vae_dtype)
+        vae.eval()
+
+        if self.quantization == "w8a8_static":
+            # Only the decoder runs per request; encoding (cover/repaint sources) stays in float
+            self._apply_static_quantization(vae.decoder, vae_checkpoint_path, "VAE", device, required=False)
+
+        if compile_model:
+            # Add __len__ method to VAE to support torch.compile if needed
+            # Note: This modifies the VAE class, affecting all instances
+            if not hasattr(vae.__class__, '__len__'):
+                def _vae_len(vae_self):
+                    """Return 0 as default length for torch.compile compatibility"""
+                    return 0
+                vae.__class__.__len__ = _vae_len
+            
+            vae = torch.compile(vae)
+        return vae
+
+    def _apply_static_quantization(self, module, checkpoint_path: str, component: str, device: str, required: bool):
+        """Apply static int8 (W8A8) from the calibration saved next to the checkpoint."""
+        if not int8_gemm_supported(device):
+            # The int8 layers would run as fp32 math on this device: slower and larger than float
+            logger.warning(
+                f"[initialize_service] No int8 GEMM (torch._int_mm) on {device}; "
+                f"w8a8_static skipped, {component} stays in {self.dtype}"
+            )
+            return
+        calibration = load_calibration(checkpoint_path)
+        if calibration is None:
+            message = (
+                f"No {CALIBRATION_FILE} for the {component} in {checkpoint_path}; "
+                f"run scripts/calibrate_quantization.py first"
+            )
+            if required:
+                raise FileNotFoundError(message)
+            logger.warning(f"[initialize_service] {message}. {component} stays unquantized")
+            return
+        num_layers = apply_static_int8(module, calibration["act_absmax"], calibration["alpha"])
+        logger.info(
+            f"[initialize_service] {component} quantized with w8a8_static: {num_layers} layers "
+            f"(calibration metrics: {calibration.get('metrics', {})})"
+        )
+
+    def _load_text_encoder(self, text_encoder_path: str, device: str):
+        """Load the text encoder; returns (tokenizer, encoder)."""
+        text_tokenizer = AutoTokenizer.from_pretrained(text_encoder_path)
+        text_encoder = AutoModel.from_pretrained(text_encoder_path)
+        if not self.offload_to_cpu:
+            text_encoder = text_encoder.to(device).to(self.dtype)
+        else:
+            text_encoder = text_encoder.to("cpu").to(self.dtype)
+        text_encoder.eval()
+        return text_tokenizer, text_encoder
+
+    def warmup(
+        self,
+        buckets: Optional[List[int]] = None,
+        batch_sizes: Optional[List[int]] = None,
+        inference_steps: int = 1,
+    ) -> Dict[str, Any]:
+        """
+        Compile the DiT/VAE for each shape bucket ahead of the first request.
+
+        Runs a one-step dummy generation per (bucket, batch size) and saves the compile
+        cache, so later pod starts load kernels instead of recompiling.
+
+        Args:
+            buckets: Durations in seconds (default: all compile buckets for this GPU tier)
+            batch_sizes: Batch sizes to compile for (default: [1])
+            inference_steps: Diffusion steps per dummy generation (graphs do not depend on it)
+
+        Returns:
+            Dict with per-shape latencies, compile counters and whether the cache was saved
+        """
+        if self.latent_length_buckets is None:
+            logger.info("[warmup] Model was not compiled, nothing to warm up")
+            return {"latencies": {}, "counters": {}, "cache_saved": False}
+        if buckets is None:
+            buckets = [length // 25 for length in self.latent_length_buckets]
+        batch_sizes = batch_sizes or [1]
+
+        latencies = {}
+        for duration in buckets:
+            for batch_size in batch_sizes:
+                start = time.time()
+                result = self.generate_music(
+                    captions="warmup",
+                    lyrics="[Instrumental]",
+                    inference_steps=inference_steps,
+                    use_random_seed=False,
+                    seed=0,
+                    audio_duration=duration,
+                    batch_size=batch_size,
+                    progress=lambda *args, **kwargs: None,
+                )
+                latencies[f"{duration}s_x{batch_size}"] = time.time() - start
+                if not result.get("success", False):
+                    logger.warning(f"[warmup] Warmup generation failed for {duration}s x{batch_size}: {result.get('error')}")
+                logger.info(f"[warmup] {duration}s x{batch_size}: {latencies[f'{duration}s_x{batch_size}']:.2f}s")
+
+        cache_saved = save_compile_cache(self.compile_cache_dir) if self.compile_cache_dir else False
+        counters = get_compile_counters()
+        logger.info(f"[warmup] Done: compile counters {counters}, cache saved: {cache_saved}")
+        return {"latencies": latencies, "counters": counters, "cache_saved": cache_saved}
+
     def _is_on_target_device(self, tensor, target_device):
         """Check if tensor is on the target device (handles cuda vs cuda:0 comparison)."""
         if tensor is None:
@@ -675,6 +1042,7 @@ class AceStepHandler:
         # Load to GPU
         logger.info(f"[_load_model_context] Loading {model_name} to {self.device}")
         start_time = time.time()
+        model_bytes = sum(t.numel() * t.element_size() for t in list(model.parameters()) + list(model.buffers()))
         if model_name == "vae":
             vae_dtype = self._get_vae_dtype()
             self._recursive_to_device(model, self.device, vae_dtype)
@@ -686,6 +1054,7 @@ class AceStepHandler:
         
         load_time = time.time() - start_time
         self.current_offload_cost += load_time
+        self.offload_bytes_moved += model_bytes
         logger.info(f"[_load_model_context] Loaded {model_name} to {self.device} in {load_time:.4f}s")
 
         try:
@@ -703,6 +1072,7 @@ class AceStepHandler:
             torch.cuda.empty_cache()
             offload_time = time.time() - start_time
             self.current_offload_cost += offload_time
+            self.offload_bytes_moved += model_bytes
             logger.info(f"[_load_model_context] Offloaded {model_name} to CPU in {offload_time:.4f}s")
 
     def process_target_audio(self, audio_file) -> Optional[torch.Tensor]:
@@ -752,40 +1122,119 @@ class AceStepHandler:
             logger.debug(f"[_parse_audio_code_string] Failed to parse audio code string: {e}")
             return []
     
-    def _decode_audio_codes_to_latents(self, code_str: str) -> Optional[torch.Tensor]:
+    @staticmethod
+    def _has_audio_code_hint(hint: Optional[Union[str, torch.Tensor]]) -> bool:
+        """Whether a single audio code hint (serialized string or code tensor) carries any codes."""
+        if hint is None:
+            return False
+        if isinstance(hint, torch.Tensor):
+            return hint.numel() > 0
+        return bool(str(hint).strip())
+
+    def _audio_code_hint_to_tensor(self, hint: Union[str, torch.Tensor]) -> torch.Tensor:
+        """
+        Convert an audio code hint to a 1D int64 tensor of code values.
+        
+        Code tensors (as returned by the LM handler) are used directly; strings are
+        only parsed for hints that came through API/params serialization. Values are
+        clamped to the valid range [0, 63999] either way.
+        """
+        if isinstance(hint, torch.Tensor):
+            code_ids = hint.reshape(-1).to(dtype=torch.long)
+            MAX_AUDIO_CODE = 63999  # Maximum valid audio code value (codebook size = 64000)
+            clamped_count = int(((code_ids < 0) | (code_ids > MAX_AUDIO_CODE)).sum())
+            if clamped_count > 0:
+                logger.warning(f"[_audio_code_hint_to_tensor] Clamped {clamped_count} audio code value(s) to valid range [0, {MAX_AUDIO_CODE}]")
+                code_ids = code_ids.clamp(0, MAX_AUDIO_CODE)
+            return code_ids
+        return torch.tensor(self._parse_audio_code_string(hint), dtype=torch.long)
+
+    def _decode_audio_codes_to_latents(self, code_hint: Union[str, torch.Tensor]) -> Optional[torch.Tensor]:
+        """
+        Convert audio codes (code tensor or serialized string) into 25Hz latents using model quantizer/detokenizer.
+        
+        Single-item form of _decode_audio_codes_to_latents_batch(); returns [1, T_25Hz, D] or None.
+        """
+        return self._decode_audio_codes_to_latents_batch([code_hint])[0]
+    
+    def _decode_audio_codes_to_latents_batch(
+        self,
+        code_hints: List[Optional[Union[str, torch.Tensor]]],
+    ) -> List[Optional[torch.Tensor]]:
         """
-        Convert serialized audio code string into 25Hz latents using model quantizer/detokenizer.
+        Convert a batch of audio code hints into 25Hz latents with one quantizer+detokenizer forward.
         
-        Note: Code values are already clamped to valid range [0, 63999] by _parse_audio_code_string(),
+        Code sequences are right-padded to a common length, decoded together and each
+        result is trimmed back to its own length. The detokenizer expands every 5Hz
+        code within its own window, so padding never changes the real frames. Results
+        are cached by code sequence hash, and identical hints within a batch are
+        decoded once.
+        
+        Note: Code values are already clamped to valid range [0, 63999] by _audio_code_hint_to_tensor(),
         ensuring indices are within the quantizer's codebook size (64000).
+        
+        Returns:
+            One [1, T_25Hz, D] tensor per hint, None for empty hints or when the model is not loaded
         """
+        results: List[Optional[torch.Tensor]] = [None] * len(code_hints)
         if self.model is None or not hasattr(self.model, 'tokenizer') or not hasattr(self.model, 'detokenizer'):
-            return None
-        
-        code_ids = self._parse_audio_code_string(code_str)
-        if len(code_ids) == 0:
-            return None
+            return results
         
-        with self._load_model_context("model"):
+        # key -> (code_ids, batch indices using it)
+        pending: "OrderedDict[str, Tuple[torch.Tensor, List[int]]]" = OrderedDict()
+        for i, hint in enumerate(code_hints):
+            if not self._has_audio_code_hint(hint):
+                continue
+            code_ids = self._audio_code_hint_to_tensor(hint)
+            if code_ids.numel() == 0:
+                continue
+            key = hashlib.sha1(code_ids.cpu().numpy().tobytes()).hexdigest()
+            cached = self._code_latents_cache.get(key)
+            if cached is not None:
+                self._code_latents_cache.move_to_end(key)
+                results[i] = cached
+                continue
+            if key not in pending:
+                pending[key] = (code_ids, [])
+            pending[key][1].append(i)
+        
+        if not pending:
+            return results
+        
+        code_seqs = [code_ids for code_ids, _ in pending.values()]
+        lengths = [int(code_ids.numel()) for code_ids in code_seqs]
+        max_length = max(lengths)
+        # Pad with code 0 (a valid codebook entry); padded frames are trimmed below
+        indices = torch.zeros(len(code_seqs), max_length, dtype=torch.long)
+        for j, code_ids in enumerate(code_seqs):
+            indices[j, :lengths[j]] = code_ids
+        code_mask = torch.arange(max_length).unsqueeze(0) < torch.tensor(lengths).unsqueeze(1)  # [B, T_5Hz]
+        
+        with torch.no_grad(), self._load_model_context("model"):
             quantizer = self.model.tokenizer.quantizer
             detokenizer = self.model.detokenizer
             
-            num_quantizers = getattr(quantizer, "num_quantizers", 1)
-            # Create indices tensor: [T_5Hz]
-            # Note: code_ids are already clamped to [0, 63999] by _parse_audio_code_string()
-            indices = torch.tensor(code_ids, device=self.device, dtype=torch.long)  # [T_5Hz]
-            
-            indices = indices.unsqueeze(0).unsqueeze(-1)  # [1, T_5Hz, 1]
+            indices = indices.to(self.device).unsqueeze(-1)  # [B, T_5Hz, 1]
             
             # Get quantized representation from indices
             # The quantizer expects [batch, T_5Hz] format and handles quantizer dimension internally
             quantized = quantizer.get_output_from_indices(indices)
             if quantized.dtype != self.dtype:
                 quantized = quantized.to(self.dtype)
+            quantized = quantized * code_mask.to(device=quantized.device, dtype=quantized.dtype).unsqueeze(-1)
             
-            # Detokenize to 25Hz: [1, T_5Hz, dim] -> [1, T_25Hz, dim]
+            # Detokenize to 25Hz: [B, T_5Hz, dim] -> [B, T_25Hz, dim]
             lm_hints_25hz = detokenizer(quantized)
-            return lm_hints_25hz
+        
+        upsample = lm_hints_25hz.shape[1] // max_length
+        for j, (key, (_, batch_indices)) in enumerate(pending.items()):
+            hints = lm_hints_25hz[j:j + 1, :lengths[j] * upsample]
+            self._code_latents_cache[key] = hints
+            for i in batch_indices:
+                results[i] = hints
+        while len(self._code_latents_cache) > self.code_latents_cache_size:
+            self._code_latents_cache.popitem(last=False)
+        return results
     
     def _create_default_meta(self) -> str:
         """Create default metadata string."""
@@ -1034,6 +1483,9 @@ class AceStepHandler:
     def _get_vae_dtype(self, device: Optional[str] = None) -> torch.dtype:
         """Get VAE dtype based on device."""
         device = device or self.device
+        if device == "cpu":
+            # bf16 CPU mode only applies to the DiT; the conv-heavy VAE stays in float32
+            return torch.float32
         return torch.bfloat16 if device in ["cuda", "xpu"] else self.dtype
     
     def _format_instruction(self, instruction: str) -> str:
@@ -1069,12 +1521,24 @@ class AceStepHandler:
         
         return audio
     
-    def _normalize_audio_code_hints(self, audio_code_hints: Optional[Union[str, List[str]]], batch_size: int) -> List[Optional[str]]:
-        """Normalize audio_code_hints to list of correct length."""
+    def _normalize_audio_code_hints(
+        self,
+        audio_code_hints: Optional[Union[str, torch.Tensor, List[Optional[Union[str, torch.Tensor]]]]],
+        batch_size: int,
+    ) -> List[Optional[Union[str, torch.Tensor]]]:
+        """Normalize audio_code_hints (code tensors or serialized strings) to list of correct length."""
         if audio_code_hints is None:
             normalized = [None] * batch_size
         elif isinstance(audio_code_hints, str):
             normalized = [audio_code_hints] * batch_size
+        elif isinstance(audio_code_hints, torch.Tensor):
+            # [T] is one hint for every item, [B, T] is one row per item
+            if audio_code_hints.dim() <= 1:
+                normalized = [audio_code_hints] * batch_size
+            else:
+                normalized = list(audio_code_hints[:batch_size])
+                while len(normalized) < batch_size:
+                    normalized.append(None)
         elif len(audio_code_hints) == 1 and batch_size > 1:
             normalized = audio_code_hints * batch_size
         elif len(audio_code_hints) != batch_size:
@@ -1085,8 +1549,11 @@ class AceStepHandler:
         else:
             normalized = list(audio_code_hints)
         
-        # Clean up: convert empty strings to None
-        normalized = [hint if isinstance(hint, str) and hint.strip() else None for hint in normalized]
+        # Clean up: convert empty strings/tensors to None
+        normalized = [
+            hint if isinstance(hint, (str, torch.Tensor)) and self._has_audio_code_hint(hint) else None
+            for hint in normalized
+        ]
         return normalized
     
     def _normalize_instructions(self, instructions: Optional[Union[str, List[str]]], batch_size: int, default: Optional[str] = None) -> List[str]:
@@ -1112,6 +1579,23 @@ class AceStepHandler:
         """Format lyrics text with language header."""
         return f"# Languages\n{language}\n\n# Lyric\n{lyrics}<|endoftext|>"
     
+    def _bucket_latent_length(self, length: int) -> int:
+        """Round a latent length up to the next compile bucket (no-op unless the DiT is compiled)."""
+        if not self.latent_length_buckets:
+            return length
+        # silence_latent provides the padding frames, so buckets cannot exceed it
+        limit = self.silence_latent.shape[1] if self.silence_latent is not None else length
+        for bucket in self.latent_length_buckets:
+            if bucket >= length:
+                return bucket if bucket <= limit else length
+        return length
+
+    def _bucket_token_length(self, length: int, multiple: int) -> int:
+        """Round a text/lyric token length up to a multiple when the DiT is compiled (masked padding)."""
+        if not self.latent_length_buckets:
+            return length
+        return (length + multiple - 1) // multiple * multiple
+
     def _pad_sequences(self, sequences: List[torch.Tensor], max_length: int, pad_value: int = 0) -> torch.Tensor:
         """Pad sequences to same length."""
         return torch.stack([
@@ -1422,9 +1906,9 @@ class AceStepHandler:
 
         has_codes = False
         if isinstance(audio_code_string, list):
-            has_codes = any((c or "").strip() for c in audio_code_string)
+            has_codes = any(self._has_audio_code_hint(c) for c in audio_code_string)
         else:
-            has_codes = bool(audio_code_string and str(audio_code_string).strip())
+            has_codes = self._has_audio_code_hint(audio_code_string)
 
         if has_codes:
             is_cover_task = True
@@ -1603,7 +2087,7 @@ class AceStepHandler:
         repainting_start: Optional[List[float]] = None,
         repainting_end: Optional[List[float]] = None,
         instructions: Optional[List[str]] = None,
-        audio_code_hints: Optional[List[Optional[str]]] = None,
+        audio_code_hints: Optional[List[Optional[Union[str, torch.Tensor]]]] = None,
         audio_cover_strength: float = 1.0,
     ) -> Dict[str, Any]:
         """
@@ -1651,13 +2135,18 @@ class AceStepHandler:
             if target_wavs.device != self.device:
                 target_wavs = target_wavs.to(self.device)
             
+            # Decode all audio code hints in one batched forward; reused for the LM hints below
+            decoded_code_latents = [None] * batch_size
+            if any(hint is not None for hint in audio_code_hints):
+                logger.info(f"[generate_music] Decoding audio codes for {sum(h is not None for h in audio_code_hints)} item(s)...")
+                decoded_code_latents = self._decode_audio_codes_to_latents_batch(audio_code_hints)
+            
             with self._load_model_context("vae"):
                 for i in range(batch_size):
                     code_hint = audio_code_hints[i]
                     # Prefer decoding from provided audio codes
-                    if code_hint:
-                        logger.info(f"[generate_music] Decoding audio codes for item {i}...")
-                        decoded_latents = self._decode_audio_codes_to_latents(code_hint)
+                    if code_hint is not None:
+                        decoded_latents = decoded_code_latents[i]
                         if decoded_latents is not None:
                             decoded_latents = decoded_latents.squeeze(0)
                             target_latents_list.append(decoded_latents)
@@ -1692,6 +2181,9 @@ class AceStepHandler:
             # Pad latents to same length
             max_latent_length = max(latent.shape[0] for latent in target_latents_list)
             max_latent_length = max(128, max_latent_length)
+            # Pad up to the compile bucket; outputs are trimmed back to valid_latent_length
+            valid_latent_length = max_latent_length
+            max_latent_length = self._bucket_latent_length(max_latent_length)
             
             padded_latents = []
             for latent in target_latents_list:
@@ -1827,9 +2319,8 @@ class AceStepHandler:
         precomputed_lm_hints_25Hz_list = []
         for i in range(batch_size):
             if audio_code_hints[i] is not None:
-                # Decode audio codes to 25Hz latents
-                logger.info(f"[generate_music] Decoding audio codes for LM hints for item {i}...")
-                hints = self._decode_audio_codes_to_latents(audio_code_hints[i])
+                # 25Hz latents decoded from the audio codes above
+                hints = decoded_code_latents[i]
                 if hints is not None:
                     # Pad or crop to match max_latent_length
                     if hints.shape[1] < max_latent_length:
@@ -1924,11 +2415,11 @@ class AceStepHandler:
             lyric_attention_masks.append(lyric_attention_mask)
             
         # Pad tokenized sequences
-        max_text_length = max(len(seq) for seq in text_token_idss)
+        max_text_length = self._bucket_token_length(max(len(seq) for seq in text_token_idss), 64)
         padded_text_token_idss = self._pad_sequences(text_token_idss, max_text_length, self.text_tokenizer.pad_token_id)
         padded_text_attention_masks = self._pad_sequences(text_attention_masks, max_text_length, 0)
         
-        max_lyric_length = max(len(seq) for seq in lyric_token_idss)
+        max_lyric_length = self._bucket_token_length(max(len(seq) for seq in lyric_token_idss), 256)
         padded_lyric_token_idss = self._pad_sequences(lyric_token_idss, max_lyric_length, self.text_tokenizer.pad_token_id)
         padded_lyric_attention_masks = self._pad_sequences(lyric_attention_masks, max_lyric_length, 0)
 
@@ -1979,6 +2470,7 @@ class AceStepHandler:
             "target_latents": target_latents,
             "src_latents": src_latents,
             "latent_masks": latent_masks,
+            "valid_latent_length": valid_latent_length,
             "chunk_masks": chunk_masks,
             "spans": spans,
             "text_inputs": text_inputs,
@@ -2063,6 +2555,177 @@ class AceStepHandler:
             lyric_embeddings = self.text_encoder.embed_tokens(lyric_token_ids)
         return lyric_embeddings
 
+    def _invalidate_condition_cache(self, reason: str):
+        """Drop all memoized conditions (the model or its adapters changed)."""
+        if self._condition_cache:
+            logger.info(f"[condition_cache] Cleared {len(self._condition_cache)} entries: {reason}")
+        self._condition_cache.clear()
+        self._condition_cache_bytes = 0
+
+    @staticmethod
+    def _tensor_fingerprint(value: torch.Tensor) -> List[int]:
+        """
+        Content fingerprint of a tensor, computed on its device: two position-weighted sums
+        of its 32-bit words (bytes when the size is not a multiple of 4), wrapping in int64.
+        Only the two sums are copied to the host.
+        """
+        raw = value.detach().contiguous().view(-1).view(torch.uint8)
+        if raw.numel() % 4 == 0 and raw.storage_offset() % 4 == 0:
+            raw = raw.view(torch.int32)
+        words = raw.to(torch.int64)
+        index = torch.arange(words.numel(), device=words.device, dtype=torch.int64)
+        sums = [(words * (index * a + b)).sum() for a, b in _FINGERPRINT_MULTIPLIERS]
+        return torch.stack(sums).tolist()
+
+    @classmethod
+    def _condition_cache_key(cls, *inputs) -> str:
+        """Hash conditioning inputs (tensors by dtype, shape and on-device fingerprint; other values by repr)."""
+        digest = hashlib.sha1()
+        for value in inputs:
+            if isinstance(value, torch.Tensor):
+                digest.update(f"{value.dtype}{tuple(value.shape)}{cls._tensor_fingerprint(value)}".encode())
+            else:
+                digest.update(repr(value).encode())
+        return digest.hexdigest()
+
+    def _prepare_condition_memoized(
+        self,
+        key: str,
+        prepare_fn=None,
+        count_stats: bool = True,
+        **kwargs,
+    ) -> Tuple[Tuple[torch.Tensor, torch.Tensor, torch.Tensor], bool]:
+        """prepare_fn(**kwargs) (default: model.prepare_condition) through the condition cache; returns (outputs, cache_hit)."""
+        with self._condition_cache_lock:
+            cached = self._condition_cache.get(key)
+            if cached is not None:
+                self._condition_cache.move_to_end(key)
+                if count_stats:
+                    self._condition_cache_hits += 1
+            elif count_stats:
+                self._condition_cache_misses += 1
+        if cached is not None:
+            device = next(v.device for v in kwargs.values() if isinstance(v, torch.Tensor))
+            return tuple(t.to(device) for t in cached), True
+
+        outputs = tuple((prepare_fn or self.model.prepare_condition)(**kwargs))
+        # With CPU offload, keep cached conditions in host memory
+        stored = tuple(t.detach().to("cpu") if self.offload_to_cpu else t.detach() for t in outputs)
+        size = sum(t.numel() * t.element_size() for t in stored)
+        if size <= self.condition_cache_max_bytes:
+            with self._condition_cache_lock:
+                if key not in self._condition_cache:
+                    self._condition_cache[key] = stored
+                    self._condition_cache_bytes += size
+                while self._condition_cache_bytes > self.condition_cache_max_bytes:
+                    _, evicted = self._condition_cache.popitem(last=False)
+                    self._condition_cache_bytes -= sum(t.numel() * t.element_size() for t in evicted)
+        return outputs, False
+
+    def _install_condition_reuse(self):
+        """
+        Route model.prepare_condition through _reused_condition, once per model instance.
+        The wrapper stays installed; outside a _reuse_condition scope on the calling thread
+        it is a plain call of the model's own prepare_condition.
+        """
+        model = self.model
+        if getattr(model.__dict__.get("prepare_condition"), "_acestep_condition_reuse", False):
+            return
+        with self._condition_cache_lock:
+            if getattr(model.__dict__.get("prepare_condition"), "_acestep_condition_reuse", False):
+                return
+            original = model.prepare_condition
+
+            def prepare_condition(*args, **kwargs):
+                return self._reused_condition(original, *args, **kwargs)
+
+            prepare_condition._acestep_condition_reuse = True
+            model.prepare_condition = prepare_condition
+
+    def _reused_condition(self, original, *args, **kwargs):
+        scope = getattr(self._condition_reuse, "scope", None)
+        if scope is None or args:
+            return original(*args, **kwargs)
+        condition, text_hidden_states, src_latents = scope
+        if kwargs.get("text_hidden_states") is text_hidden_states and kwargs.get("src_latents") is src_latents:
+            return condition
+        names = sorted(kwargs)
+        key = self._condition_cache_key("inner", self.lora_registry.cache_key(), *names, *(kwargs[name] for name in names))
+        outputs, _ = self._prepare_condition_memoized(key, prepare_fn=original, count_stats=False, **kwargs)
+        return outputs
+
+    @contextmanager
+    def _reuse_condition(self, condition: Tuple[torch.Tensor, torch.Tensor, torch.Tensor], text_hidden_states: torch.Tensor, src_latents: torch.Tensor):
+        """
+        Serve generate_audio's own prepare_condition call from an already computed condition.
+
+        Calls made on this thread with the very same input tensors get that condition.
+        Other keyword calls (e.g. an unconditional or non-cover condition) go through the
+        condition cache keyed by their inputs' contents, which include the request's
+        src_latents, so they are reused only across requests with the same inputs. The
+        model is not patched per request: the scope is thread-local, so concurrent
+        generations each see their own condition.
+        """
+        self._install_condition_reuse()
+        previous = getattr(self._condition_reuse, "scope", None)
+        self._condition_reuse.scope = (condition, text_hidden_states, src_latents)
+        try:
+            yield
+        finally:
+            self._condition_reuse.scope = previous
+
+    @contextmanager
+    def _report_diffusion_steps(self, progress, num_steps: int):
+        """
+        Report each decoder call (one per diffusion step) to a gradio-style progress
+        callback, between the "Generating music" (0.52) and "Decoding audio" (0.8) marks,
+        and check for job cancellation before each one. progress may be None.
+        """
+        calls = 0
+
+        def forward(original_forward, *args, **kwargs):
+            nonlocal calls
+            check_cancelled()
+            outputs = original_forward(*args, **kwargs)
+            calls += 1
+            if progress is not None:
+                step = min(calls, num_steps)
+                progress(0.52 + 0.28 * step / num_steps, desc=f"Diffusion step {step}/{num_steps}")
+            return outputs
+
+        with wrap_forward(self.model.decoder, forward):
+            yield
+
+    def _create_step_cache(
+        self,
+        mode: Optional[str],
+        interval: int,
+        threshold: float,
+        start_block: Optional[int],
+        num_steps: int,
+        compute_steps: Iterable[int] = (),
+    ) -> Optional[DiTStepCache]:
+        """Build the cross-timestep block cache for one generation, or None when disabled."""
+        if not mode:
+            return None
+        if self.latent_length_buckets is not None:
+            # Patched block forwards would be retraced by the compiled graphs
+            logger.warning("[service_generate] Step caching is not supported with compile_model, ignoring")
+            return None
+        try:
+            return DiTStepCache(
+                self.model.decoder,
+                mode=mode,
+                interval=interval,
+                threshold=threshold,
+                start_block=start_block,
+                num_steps=num_steps,
+                compute_steps=compute_steps,
+            )
+        except ValueError as e:
+            logger.warning(f"[service_generate] Step caching disabled: {e}")
+            return None
+
     def preprocess_batch(self, batch):
 
         # step 1: VAE encode latents, target_latents: N x T x d
@@ -2160,9 +2823,15 @@ class AceStepHandler:
         cfg_interval_start: float = 0.0,
         cfg_interval_end: float = 1.0,
         shift: float = 1.0,
-        audio_code_hints: Optional[Union[str, List[str]]] = None,
+        audio_code_hints: Optional[Union[str, torch.Tensor, List[Union[str, torch.Tensor]]]] = None,
         infer_method: str = "ode",
         timesteps: Optional[List[float]] = None,
+        step_cache_mode: Optional[str] = None,
+        step_cache_interval: int = 2,
+        step_cache_threshold: float = 0.1,
+        step_cache_start_block: Optional[int] = None,
+        record_alignment_attention: bool = False,
+        progress=None,
     ) -> Dict[str, Any]:
 
         """
@@ -2187,6 +2856,14 @@ class AceStepHandler:
             use_adg: Whether to use ADG (Adaptive Diffusion Guidance) (default: False)
             cfg_interval_start: Start of CFG interval (0.0-1.0, default: 0.0)
             cfg_interval_end: End of CFG interval (0.0-1.0, default: 1.0)
+            step_cache_mode: Cross-timestep block caching policy, "interval" or "threshold" (default: None, off)
+            step_cache_interval: Recompute interval of the cached blocks in "interval" mode
+            step_cache_threshold: Accumulated relative change that triggers recomputation in "threshold" mode
+            step_cache_start_block: First cached decoder block (default: one third of the depth)
+            record_alignment_attention: Record the alignment heads' cross-attention on the first
+                step and on the final latent re-noised at t = 1/steps (outputs["alignment_attention"])
+                for the *_from_recording methods
+            progress: Gradio-style progress callback, called after every diffusion step (optional)
             
         Returns:
             Dictionary containing:
@@ -2333,9 +3010,29 @@ class AceStepHandler:
         if timesteps is not None:
             generate_kwargs["timesteps"] = torch.tensor(timesteps, dtype=torch.float32)
         logger.info("[service_generate] Generating audio...")
+        # Frames past valid_latent_length are compile-bucket padding: masked out of the condition
+        # and of every decoder call, so a bucketed run matches an unpadded one trimmed to length
+        valid_latent_length = batch.get("valid_latent_length")
+        # Everything prepare_condition depends on; seeds and sampler settings are not part of it
+        condition_key = self._condition_cache_key(
+            self.lora_registry.cache_key(),
+            batch["text_token_idss"],
+            batch["text_attention_masks"],
+            batch["lyric_token_idss"],
+            batch["lyric_attention_masks"],
+            refer_audio_acoustic_hidden_states_packed,
+            refer_audio_order_mask,
+            src_latents,
+            chunk_mask,
+            is_covers,
+            precomputed_lm_hints_25Hz,
+            valid_latent_length,
+        )
         with self._load_model_context("model"):
             # Prepare condition tensors first (for LRC timestamp generation)
-            encoder_hidden_states, encoder_attention_mask, context_latents = self.model.prepare_condition(
+            condition_start = time.time()
+            condition, condition_cache_hit = self._prepare_condition_memoized(
+                condition_key,
                 text_hidden_states=text_hidden_states,
                 text_attention_mask=text_attention_mask,
                 lyric_hidden_states=lyric_hidden_states,
@@ -2343,15 +3040,71 @@ class AceStepHandler:
                 refer_audio_acoustic_hidden_states_packed=refer_audio_acoustic_hidden_states_packed,
                 refer_audio_order_mask=refer_audio_order_mask,
                 hidden_states=src_latents,
-                attention_mask=torch.ones(src_latents.shape[0], src_latents.shape[1], device=src_latents.device, dtype=src_latents.dtype),
+                attention_mask=self._bucket_attention_mask(src_latents, valid_latent_length),
                 silence_latent=self.silence_latent,
                 src_latents=src_latents,
                 chunk_masks=chunk_mask,
                 is_covers=is_covers,
                 precomputed_lm_hints_25Hz=precomputed_lm_hints_25Hz,
             )
-            
-            outputs = self.model.generate_audio(**generate_kwargs)
+            prepare_condition_time = time.time() - condition_start
+            encoder_hidden_states, encoder_attention_mask, context_latents = condition
+
+            num_steps = len(timesteps) if timesteps is not None else infer_steps
+            attention_recorder = None
+            if record_alignment_attention:
+                attention_recorder = CrossAttentionRecorder(
+                    self.model.decoder, self.custom_layers_config, encoder_hidden_states.shape[0], num_steps
+                )
+            step_cache = self._create_step_cache(
+                step_cache_mode,
+                step_cache_interval,
+                step_cache_threshold,
+                step_cache_start_block,
+                num_steps=num_steps,
+                # Recorded steps must not be served from cached block residuals
+                compute_steps=attention_recorder.steps.values() if attention_recorder is not None else (),
+            )
+            cfg_skipper = None
+            if not self.config.is_turbo and guidance_scale > 1.0 and (cfg_interval_start > 0.0 or cfg_interval_end < 1.0):
+                # Outside the CFG interval, run the decoder on the conditional rows only
+                cfg_skipper = CFGIntervalSkipper(
+                    self.model.decoder, encoder_hidden_states, num_steps, cfg_interval_start, cfg_interval_end
+                )
+            step_reporter = (
+                self._report_diffusion_steps(progress, num_steps)
+                if progress is not None or current_token() is not None else None
+            )
+            # The recorder wraps outermost so it sees (and keeps the conditional rows of) every decoder call
+            with self._reuse_condition(condition, text_hidden_states, src_latents), \
+                    self._mask_bucket_padding(valid_latent_length, src_latents.shape[1]), \
+                    step_reporter or nullcontext(), \
+                    step_cache or nullcontext(), cfg_skipper or nullcontext(), attention_recorder or nullcontext():
+                outputs = self.model.generate_audio(**generate_kwargs)
+            if attention_recorder is not None:
+                # "last": the final latent re-noised at t = 1/steps, one pass shared by LRC and scores
+                attention_recorder.record_final(
+                    outputs["target_latents"],
+                    encoder_hidden_states,
+                    encoder_attention_mask,
+                    context_latents,
+                    attention_mask=self._bucket_attention_mask(outputs["target_latents"], valid_latent_length),
+                )
+
+        time_costs = outputs.setdefault("time_costs", {})
+        time_costs["prepare_condition_time_cost"] = prepare_condition_time
+        time_costs["condition_cache_hit"] = float(condition_cache_hit)
+        lookups = self._condition_cache_hits + self._condition_cache_misses
+        time_costs["condition_cache_hit_rate"] = self._condition_cache_hits / lookups if lookups else 0.0
+        if cfg_skipper is not None:
+            time_costs["cfg_uncond_skipped_steps"] = float(cfg_skipper.skipped_steps)
+        if step_cache is not None:
+            time_costs["step_cache_skipped_block_fraction"] = step_cache.stats.skipped_fraction
+            logger.info(
+                f"[service_generate] Step cache ({step_cache.mode}): skipped {step_cache.stats.skipped_steps} of "
+                f"{step_cache.stats.skipped_steps + step_cache.stats.computed_steps} block-range passes, "
+                f"{step_cache.stats.skipped_fraction:.0%} of decoder block FLOPs"
+            )
         
         # Add intermediate information to outputs for extra_outputs
         outputs["src_latents"] = src_latents
@@ -2365,9 +3118,58 @@ class AceStepHandler:
         outputs["encoder_attention_mask"] = encoder_attention_mask
         outputs["context_latents"] = context_latents
         outputs["lyric_token_idss"] = lyric_token_idss
+        if attention_recorder is not None:
+            outputs["alignment_attention"] = attention_recorder.recordings
+            time_costs["alignment_attention_mb"] = attention_recorder.recorded_bytes / 2**20
+        
+        if valid_latent_length is not None:
+            # Drop compile-bucket padding so callers see the requested length
+            for key in ("target_latents", "src_latents", "target_latents_input", "chunk_masks", "latent_masks", "context_latents"):
+                value = outputs.get(key)
+                if isinstance(value, torch.Tensor) and value.dim() >= 2 and value.shape[1] > valid_latent_length:
+                    outputs[key] = value[:, :valid_latent_length]
+            for name, recording in outputs.get("alignment_attention", {}).items():
+                if recording.shape[-1] > valid_latent_length:
+                    outputs["alignment_attention"][name] = recording[..., :valid_latent_length]
         
         return outputs
 
+    @staticmethod
+    def _bucket_attention_mask(latents: torch.Tensor, valid_latent_length: Optional[int]) -> torch.Tensor:
+        """[batch, frames] attention mask of latents that zeroes the compile-bucket padding frames."""
+        mask = torch.ones(latents.shape[0], latents.shape[1], device=latents.device, dtype=latents.dtype)
+        if valid_latent_length is not None:
+            mask[:, valid_latent_length:] = 0
+        return mask
+
+    @contextmanager
+    def _mask_bucket_padding(self, valid_latent_length: Optional[int], padded_length: int):
+        """
+        Give the sampler's decoder calls (decoder(hidden_states, timestep, timestep_r,
+        attention_mask, ...)) a mask without the compile-bucket padding frames.
+        """
+        if valid_latent_length is None or valid_latent_length >= padded_length:
+            yield
+            return
+
+        def forward(original_forward, *args, **kwargs):
+            hidden_states = kwargs["hidden_states"] if "hidden_states" in kwargs else args[0]
+            if hidden_states.shape[1] == padded_length:
+                mask = args[3] if len(args) > 3 else kwargs.get("attention_mask")
+                if isinstance(mask, torch.Tensor):
+                    mask = mask.clone()
+                    mask[:, valid_latent_length:] = 0
+                else:
+                    mask = self._bucket_attention_mask(hidden_states, valid_latent_length)
+                if len(args) > 3:
+                    args = args[:3] + (mask,) + args[4:]
+                else:
+                    kwargs["attention_mask"] = mask
+            return original_forward(*args, **kwargs)
+
+        with wrap_forward(self.model.decoder, forward):
+            yield
+
     def tiled_decode(self, latents, chunk_size=512, overlap=64, offload_wav_to_cpu=True):
         """
         Decode latents using tiling to reduce VRAM usage.
@@ -2409,6 +3211,7 @@ class AceStepHandler:
         upsample_factor = None
         
         for i in tqdm(range(num_steps), desc="Decoding audio chunks"):
+            check_cancelled()
             # Core range in latents
             core_start = i * stride
             core_end = min(core_start + stride, T)
@@ -2486,6 +3289,7 @@ class AceStepHandler:
         
         # Process remaining chunks
         for i in tqdm(range(1, num_steps), desc="Decoding audio chunks"):
+            check_cancelled()
             # Core range in latents
             core_start = i * stride
             core_end = min(core_start + stride, T)
@@ -2724,7 +3528,7 @@ class AceStepHandler:
         audio_duration: Optional[float] = None,
         batch_size: Optional[int] = None,
         src_audio=None,
-        audio_code_string: Union[str, List[str]] = "",
+        audio_code_string: Union[str, torch.Tensor, List[Union[str, torch.Tensor]]] = "",
         repainting_start: float = 0.0,
         repainting_end: Optional[float] = None,
         instruction: str = DEFAULT_DIT_INSTRUCTION,
@@ -2737,11 +3541,27 @@ class AceStepHandler:
         infer_method: str = "ode",
         use_tiled_decode: bool = True,
         timesteps: Optional[List[float]] = None,
+        step_cache_mode: Optional[str] = None,
+        step_cache_interval: int = 2,
+        step_cache_threshold: float = 0.1,
+        step_cache_start_block: Optional[int] = None,
+        lora_adapter: Optional[Union[str, List[Optional[str]]]] = None,
+        lora_scale: Optional[Union[float, List[float]]] = None,
+        record_alignment_attention: bool = False,
         progress=None
     ) -> Dict[str, Any]:
         """
         Main interface for music generation
         
+        lora_adapter / lora_scale select a loaded LoRA adapter (and its scale) for this
+        call only; None keeps the handler's current LoRA state. Lists (one entry per
+        batch item) give every sample its own adapter within the same DiT batch.
+        
+        record_alignment_attention captures the alignment cross-attention during
+        generation (extra_outputs["alignment_attention"]), so LRC and lyric scores can be
+        computed with get_lyric_timestamps_from_recording / get_lyric_scores_from_recording
+        from one shared alignment pass instead of a decoder pass each.
+        
         Returns:
             Dictionary containing:
             - audios: List of audio dictionaries with path, key, params
@@ -2764,10 +3584,10 @@ class AceStepHandler:
                 "error": "Model not fully initialized",
             }
 
-        def _has_audio_codes(v: Union[str, List[str]]) -> bool:
+        def _has_audio_codes(v: Union[str, torch.Tensor, List[Union[str, torch.Tensor]]]) -> bool:
             if isinstance(v, list):
-                return any((x or "").strip() for x in v)
-            return bool(v and str(v).strip())
+                return any(self._has_audio_code_hint(x) for x in v)
+            return self._has_audio_code_hint(v)
 
         # Auto-detect task type based on audio_code_string
         # If audio_code_string is provided and not empty, use cover task
@@ -2865,30 +3685,47 @@ class AceStepHandler:
                 else:
                     audio_code_hints_batch = [audio_code_string] * actual_batch_size
 
+            if isinstance(lora_adapter, list) and len(lora_adapter) != actual_batch_size:
+                raise ValueError(f"Got {len(lora_adapter)} LoRA adapters for batch size {actual_batch_size}")
+            if isinstance(lora_scale, list) and len(lora_scale) != actual_batch_size:
+                raise ValueError(f"Got {len(lora_scale)} LoRA scales for batch size {actual_batch_size}")
             should_return_intermediate = (task_type == "text2music")
-            outputs = self.service_generate(
-                captions=captions_batch,
-                lyrics=lyrics_batch,
-                metas=metas_batch,  # Pass as dict, service will convert to string
-                vocal_languages=vocal_languages_batch,
-                refer_audios=refer_audios,  # Already in List[List[torch.Tensor]] format
-                target_wavs=target_wavs_tensor,  # Shape: [batch_size, 2, frames]
-                infer_steps=inference_steps,
-                guidance_scale=guidance_scale,
-                seed=actual_seed_list,  # Pass list of seeds, one per batch item
-                repainting_start=repainting_start_batch,
-                repainting_end=repainting_end_batch,
-                instructions=instructions_batch,  # Pass instructions to service
-                audio_cover_strength=audio_cover_strength,  # Pass audio cover strength
-                use_adg=use_adg,  # Pass use_adg parameter
-                cfg_interval_start=cfg_interval_start,  # Pass CFG interval start
-                cfg_interval_end=cfg_interval_end,  # Pass CFG interval end
-                shift=shift,  # Pass shift parameter
-                infer_method=infer_method,  # Pass infer method (ode or sde)
-                audio_code_hints=audio_code_hints_batch,  # Pass audio code hints as list
-                return_intermediate=should_return_intermediate,
-                timesteps=timesteps,  # Pass custom timesteps if provided
-            )
+            # CPU mode: one diffusion at a time (it uses all diffusion threads); the previous
+            # request's VAE decode keeps running on the VAE executor meanwhile, with its own
+            # thread count, and every decoder call runs with the diffusion count again
+            with self._diffusion_lock if self.cpu_config is not None else nullcontext(), \
+                    hold_num_threads(self.model.decoder, self.cpu_config.intra_op_threads) \
+                    if self.cpu_config is not None else nullcontext(), \
+                    self._lora_request_context(lora_adapter, lora_scale):
+                outputs = self.service_generate(
+                    captions=captions_batch,
+                    lyrics=lyrics_batch,
+                    metas=metas_batch,  # Pass as dict, service will convert to string
+                    vocal_languages=vocal_languages_batch,
+                    refer_audios=refer_audios,  # Already in List[List[torch.Tensor]] format
+                    target_wavs=target_wavs_tensor,  # Shape: [batch_size, 2, frames]
+                    infer_steps=inference_steps,
+                    guidance_scale=guidance_scale,
+                    seed=actual_seed_list,  # Pass list of seeds, one per batch item
+                    repainting_start=repainting_start_batch,
+                    repainting_end=repainting_end_batch,
+                    instructions=instructions_batch,  # Pass instructions to service
+                    audio_cover_strength=audio_cover_strength,  # Pass audio cover strength
+                    use_adg=use_adg,  # Pass use_adg parameter
+                    cfg_interval_start=cfg_interval_start,  # Pass CFG interval start
+                    cfg_interval_end=cfg_interval_end,  # Pass CFG interval end
+                    shift=shift,  # Pass shift parameter
+                    infer_method=infer_method,  # Pass infer method (ode or sde)
+                    audio_code_hints=audio_code_hints_batch,  # Pass audio code hints as list
+                    return_intermediate=should_return_intermediate,
+                    timesteps=timesteps,  # Pass custom timesteps if provided
+                    step_cache_mode=step_cache_mode,
+                    step_cache_interval=step_cache_interval,
+                    step_cache_threshold=step_cache_threshold,
+                    step_cache_start_block=step_cache_start_block,
+                    record_alignment_attention=record_alignment_attention,
+                    progress=progress,
+                )
             
             logger.info("[generate_music] Model generation completed. Decoding latents...")
             pred_latents = outputs["target_latents"]  # [batch, latent_length, latent_dim]
@@ -2918,13 +3755,19 @@ class AceStepHandler:
                     
                     logger.debug(f"[generate_music] Before VAE decode: allocated={torch.cuda.memory_allocated()/1024**3:.2f}GB, max={torch.cuda.max_memory_allocated()/1024**3:.2f}GB")
                     
-                    if use_tiled_decode:
-                        logger.info("[generate_music] Using tiled VAE decode to reduce VRAM usage...")
-                        pred_wavs = self.tiled_decode(pred_latents_for_decode)  # [batch, channels, samples]
+                    def _vae_decode():
+                        with torch.no_grad():
+                            if use_tiled_decode:
+                                logger.info("[generate_music] Using tiled VAE decode to reduce VRAM usage...")
+                                return self.tiled_decode(pred_latents_for_decode)  # [batch, channels, samples]
+                            return self.vae.decode(pred_latents_for_decode).sample
+
+                    if self._vae_executor is not None:
+                        # CPU mode: decode on the VAE pool's threads, off the diffusion lock
+                        # (the executor carries this job's cancellation token over)
+                        pred_wavs = self._vae_executor.submit(_vae_decode).result()
                     else:
-                        decoder_output = self.vae.decode(pred_latents_for_decode)
-                        pred_wavs = decoder_output.sample
-                        del decoder_output
+                        pred_wavs = _vae_decode()
                     
                     logger.debug(f"[generate_music] After VAE decode: allocated={torch.cuda.memory_allocated()/1024**3:.2f}GB, max={torch.cuda.max_memory_allocated()/1024**3:.2f}GB")
                     
@@ -2988,6 +3831,8 @@ class AceStepHandler:
                 "encoder_attention_mask": encoder_attention_mask.detach().cpu() if encoder_attention_mask is not None else None,
                 "context_latents": context_latents.detach().cpu() if context_latents is not None else None,
                 "lyric_token_idss": lyric_token_idss.detach().cpu() if lyric_token_idss is not None else None,
+                # Recorded alignment cross-attention (already on CPU), when requested
+                "alignment_attention": outputs.get("alignment_attention"),
             }
             
             # Build audios list with tensor data (no file paths, no UUIDs, handled outside)
@@ -3007,6 +3852,8 @@ class AceStepHandler:
                 "error": None,
             }
 
+        except JobCancelled:
+            raise
         except Exception as e:
             error_msg = f"❌ Error: {str(e)}\n{traceback.format_exc()}"
             logger.exception("[generate_music] Generation failed")
@@ -3018,6 +3865,57 @@ class AceStepHandler:
                 "error": str(e),
             }
 
+    def _lyric_token_span(self, lyric_ids: List[int], vocal_language: str) -> Tuple[int, int]:
+        """[start, end) of the pure lyrics inside the lyric prompt tokens (header and <|endoftext|> excluded)."""
+        header_str = f"# Languages\n{vocal_language}\n\n# Lyric\n"
+        start_idx = len(self.text_tokenizer.encode(header_str, add_special_tokens=False))
+        try:
+            end_idx = lyric_ids.index(151643)  # <|endoftext|> token
+        except ValueError:
+            end_idx = len(lyric_ids)
+        return start_idx, end_idx
+
+    def _alignment_cross_attention(
+        self,
+        xt: torch.Tensor,
+        t: torch.Tensor,
+        encoder_hidden_states: torch.Tensor,
+        encoder_attention_mask: torch.Tensor,
+        context_latents: torch.Tensor,
+        custom_layers_config: Dict,
+    ) -> Union[torch.Tensor, str]:
+        """
+        One decoder forward with attention output; returns the selected layers'
+        cross-attention as [Layers, Batch, Heads, Tokens, Frames], or an error message.
+        """
+        with self._load_model_context("model"):
+            decoder = self.model.decoder
+            if hasattr(decoder, 'eval'):
+                decoder.eval()
+            decoder_outputs = decoder(
+                hidden_states=xt,
+                timestep=t,
+                timestep_r=t,
+                attention_mask=torch.ones(xt.shape[0], xt.shape[1], device=xt.device, dtype=xt.dtype),
+                encoder_hidden_states=encoder_hidden_states,
+                use_cache=False,
+                past_key_values=None,
+                encoder_attention_mask=encoder_attention_mask,
+                context_latents=context_latents,
+                output_attentions=True,
+                custom_layers_config=custom_layers_config,
+                enable_early_exit=True
+            )
+            if decoder_outputs[2] is None:
+                return "Model did not return attentions"
+            # Skip None values (layers that didn't return attention)
+            captured_layers_list = [
+                layer_attn.transpose(-1, -2) for layer_attn in decoder_outputs[2] if layer_attn is not None
+            ]
+            if not captured_layers_list:
+                return "No valid attention layers returned"
+            return torch.stack(captured_layers_list)
+
     @torch.no_grad()
     def get_lyric_timestamp(
         self,
@@ -3031,12 +3929,14 @@ class AceStepHandler:
         inference_steps: int = 8,
         seed: int = 42,
         custom_layers_config: Optional[Dict] = None,
+        dtw_band: Optional[float] = None,
     ) -> Dict[str, Any]:
         """
         Generate lyrics timestamps from generated audio latents using cross-attention alignment.
         
         This method adds noise to the final pred_latent and re-infers one step to get
         cross-attention matrices, then uses DTW to align lyrics tokens with audio frames.
+        Returns the result for the first sample; see get_lyric_timestamps for batches.
         
         Args:
             pred_latent: Generated latent tensor [batch, T, D]
@@ -3049,6 +3949,7 @@ class AceStepHandler:
             inference_steps: Number of inference steps (for noise level calculation)
             seed: Random seed for noise generation
             custom_layers_config: Dict mapping layer indices to head indices
+            dtw_band: Sakoe-Chiba band for DTW as a fraction of the frames (None = full DTW)
             
         Returns:
             Dict containing:
@@ -3058,16 +3959,51 @@ class AceStepHandler:
             - success: Whether generation succeeded
             - error: Error message if failed
         """
-        from transformers.cache_utils import EncoderDecoderCache, DynamicCache
+        return self.get_lyric_timestamps(
+            pred_latent=pred_latent[:1],
+            encoder_hidden_states=encoder_hidden_states[:1],
+            encoder_attention_mask=encoder_attention_mask[:1],
+            context_latents=context_latents[:1],
+            lyric_token_ids=lyric_token_ids[:1],
+            total_duration_seconds=total_duration_seconds,
+            vocal_language=vocal_language,
+            inference_steps=inference_steps,
+            seed=seed,
+            custom_layers_config=custom_layers_config,
+            dtw_band=dtw_band,
+        )[0]
+
+    @torch.no_grad()
+    def get_lyric_timestamps(
+        self,
+        pred_latent: torch.Tensor,
+        encoder_hidden_states: torch.Tensor,
+        encoder_attention_mask: torch.Tensor,
+        context_latents: torch.Tensor,
+        lyric_token_ids: Union[torch.Tensor, List[List[int]]],
+        total_duration_seconds: Union[float, List[float]],
+        vocal_language: Union[str, List[str]] = "en",
+        inference_steps: int = 8,
+        seed: int = 42,
+        custom_layers_config: Optional[Dict] = None,
+        dtw_band: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Lyrics timestamps for every sample of a batch: one decoder forward and one batched DTW.
         
+        Args: as get_lyric_timestamp, with batch-sized inputs; total_duration_seconds
+        and vocal_language may be given per sample.
+            
+        Returns:
+            One get_lyric_timestamp-style dict per sample
+        """
+        bsz = pred_latent.shape[0]
+
+        def failure(error: str) -> List[Dict[str, Any]]:
+            return [self._timestamp_failure(error) for _ in range(bsz)]
+
         if self.model is None:
-            return {
-                "lrc_text": "",
-                "sentence_timestamps": [],
-                "token_timestamps": [],
-                "success": False,
-                "error": "Model not initialized"
-            }
+            return failure("Model not initialized")
         
         if custom_layers_config is None:
             custom_layers_config = self.custom_layers_config
@@ -3082,8 +4018,6 @@ class AceStepHandler:
             encoder_attention_mask = encoder_attention_mask.to(device=device, dtype=dtype)
             context_latents = context_latents.to(device=device, dtype=dtype)
             
-            bsz = pred_latent.shape[0]
-            
             # Calculate noise level: t_last = 1.0 / inference_steps
             t_last_val = 1.0 / inference_steps
             t_curr_tensor = torch.tensor([t_last_val] * bsz, device=device, dtype=dtype)
@@ -3100,140 +4034,115 @@ class AceStepHandler:
             # Add noise to pred_latent: xt = t * noise + (1 - t) * x1
             xt = t_last_val * x0 + (1.0 - t_last_val) * x1
 
-            xt_in = xt
-            t_in = t_curr_tensor
-            
-            # Get null condition embedding
-            encoder_hidden_states_in = encoder_hidden_states
-            encoder_attention_mask_in = encoder_attention_mask
-            context_latents_in = context_latents
-            latent_length = x1.shape[1]
-            attention_mask = torch.ones(bsz, latent_length, device=device, dtype=dtype)
-            attention_mask_in = attention_mask
-            past_key_values = None
-            
-            # Run decoder with output_attentions=True
-            with self._load_model_context("model"):
-                decoder = self.model.decoder
-                decoder_outputs = decoder(
-                    hidden_states=xt_in,
-                    timestep=t_in,
-                    timestep_r=t_in,
-                    attention_mask=attention_mask_in,
-                    encoder_hidden_states=encoder_hidden_states_in,
-                    use_cache=False,
-                    past_key_values=past_key_values,
-                    encoder_attention_mask=encoder_attention_mask_in,
-                    context_latents=context_latents_in,
-                    output_attentions=True,
-                    custom_layers_config=custom_layers_config,
-                    enable_early_exit=True
-                )
-                
-                # Extract cross-attention matrices
-                if decoder_outputs[2] is None:
-                    return {
-                        "lrc_text": "",
-                        "sentence_timestamps": [],
-                        "token_timestamps": [],
-                        "success": False,
-                        "error": "Model did not return attentions"
-                    }
-                
-                cross_attns = decoder_outputs[2]  # Tuple of tensors (some may be None)
-                
-                captured_layers_list = []
-                for layer_attn in cross_attns:
-                    # Skip None values (layers that didn't return attention)
-                    if layer_attn is None:
-                        continue
-                    # Only take conditional part (first half of batch)
-                    cond_attn = layer_attn[:bsz]
-                    layer_matrix = cond_attn.transpose(-1, -2)
-                    captured_layers_list.append(layer_matrix)
-                
-                if not captured_layers_list:
-                    return {
-                        "lrc_text": "",
-                        "sentence_timestamps": [],
-                        "token_timestamps": [],
-                        "success": False,
-                        "error": "No valid attention layers returned"
-                    }
-                
-                stacked = torch.stack(captured_layers_list)
-                if bsz == 1:
-                    all_layers_matrix = stacked.squeeze(1)
-                else:
-                    all_layers_matrix = stacked
-            
-            # Process lyric token IDs to extract pure lyrics
-            if isinstance(lyric_token_ids, torch.Tensor):
-                raw_lyric_ids = lyric_token_ids[0].tolist()
-            else:
-                raw_lyric_ids = lyric_token_ids
-            
-            # Parse header to find lyrics start position
-            header_str = f"# Languages\n{vocal_language}\n\n# Lyric\n"
-            header_ids = self.text_tokenizer.encode(header_str, add_special_tokens=False)
-            start_idx = len(header_ids)
+            all_layers_matrix = self._alignment_cross_attention(
+                xt, t_curr_tensor, encoder_hidden_states, encoder_attention_mask, context_latents, custom_layers_config
+            )
+            if isinstance(all_layers_matrix, str):
+                return failure(all_layers_matrix)
+            return self._timestamps_from_attention(
+                all_layers_matrix, lyric_token_ids, total_duration_seconds, vocal_language, custom_layers_config, dtw_band
+            )
             
-            # Find end of lyrics (before endoftext token)
-            try:
-                end_idx = raw_lyric_ids.index(151643)  # <|endoftext|> token
-            except ValueError:
-                end_idx = len(raw_lyric_ids)
+        except Exception as e:
+            error_msg = f"Error generating timestamps: {str(e)}"
+            logger.exception("[get_lyric_timestamp] Failed")
+            return failure(error_msg)
+
+    @torch.no_grad()
+    def get_lyric_timestamps_from_recording(
+        self,
+        alignment_attention: Dict[str, torch.Tensor],
+        lyric_token_ids: Union[torch.Tensor, List[List[int]]],
+        total_duration_seconds: Union[float, List[float]],
+        vocal_language: Union[str, List[str]] = "en",
+        dtw_band: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Lyrics timestamps from cross-attention recorded during generation
+        (generate_music(record_alignment_attention=True)), without another decoder pass.
+        
+        Args:
+            alignment_attention: extra_outputs["alignment_attention"]; uses the "last" step recording
+            Others: as get_lyric_timestamps
             
+        Returns:
+            One get_lyric_timestamp-style dict per sample
+        """
+        recording = (alignment_attention or {}).get("last")
+        if recording is None:
+            return [self._timestamp_failure("No recorded alignment attention") for _ in range(len(lyric_token_ids))]
+        try:
+            return self._timestamps_from_attention(
+                recording.unsqueeze(0), lyric_token_ids, total_duration_seconds, vocal_language,
+                recording_config(recording), dtw_band,
+            )
+        except Exception as e:
+            logger.exception("[get_lyric_timestamps_from_recording] Failed")
+            return [self._timestamp_failure(f"Error generating timestamps: {str(e)}") for _ in range(recording.shape[0])]
+
+    @staticmethod
+    def _timestamp_failure(error: str) -> Dict[str, Any]:
+        return {
+            "lrc_text": "",
+            "sentence_timestamps": [],
+            "token_timestamps": [],
+            "success": False,
+            "error": error
+        }
+
+    def _timestamps_from_attention(
+        self,
+        all_layers_matrix: torch.Tensor,
+        lyric_token_ids: Union[torch.Tensor, List[List[int]]],
+        total_duration_seconds: Union[float, List[float]],
+        vocal_language: Union[str, List[str]],
+        custom_layers_config: Dict,
+        dtw_band: Optional[float],
+    ) -> List[Dict[str, Any]]:
+        """Per-sample timestamps from cross-attention [Layers, Batch, Heads, Tokens, Frames], one batched DTW."""
+        bsz = all_layers_matrix.shape[1]
+        if not isinstance(total_duration_seconds, (list, tuple)):
+            total_duration_seconds = [total_duration_seconds] * bsz
+        if isinstance(vocal_language, str):
+            vocal_language = [vocal_language] * bsz
+        
+        aligner = MusicStampsAligner(self.text_tokenizer)
+        results: List[Optional[Dict[str, Any]]] = [None] * bsz
+        calc_matrices, lyric_ids_list, durations, sample_indices = [], [], [], []
+        for b in range(bsz):
+            raw_lyric_ids = lyric_token_ids[b].tolist() if isinstance(lyric_token_ids[b], torch.Tensor) else list(lyric_token_ids[b])
+            start_idx, end_idx = self._lyric_token_span(raw_lyric_ids, vocal_language[b])
             pure_lyric_ids = raw_lyric_ids[start_idx:end_idx]
-            pure_lyric_matrix = all_layers_matrix[:, :, start_idx:end_idx, :]
-            
-            # Create aligner and generate timestamps
-            aligner = MusicStampsAligner(self.text_tokenizer)
             
             align_info = aligner.stamps_align_info(
-                attention_matrix=pure_lyric_matrix,
+                attention_matrix=all_layers_matrix[:, b, :, start_idx:end_idx, :],
                 lyrics_tokens=pure_lyric_ids,
-                total_duration_seconds=total_duration_seconds,
+                total_duration_seconds=total_duration_seconds[b],
                 custom_config=custom_layers_config,
                 return_matrices=False,
                 violence_level=2.0,
                 medfilt_width=1,
             )
-            
             if align_info.get("calc_matrix") is None:
-                return {
-                    "lrc_text": "",
-                    "sentence_timestamps": [],
-                    "token_timestamps": [],
-                    "success": False,
-                    "error": align_info.get("error", "Failed to process attention matrix")
+                results[b] = self._timestamp_failure(align_info.get("error", "Failed to process attention matrix"))
+                continue
+            calc_matrices.append(align_info["calc_matrix"])
+            lyric_ids_list.append(pure_lyric_ids)
+            durations.append(total_duration_seconds[b])
+            sample_indices.append(b)
+        
+        # Generate timestamps for all samples with one batched DTW
+        if calc_matrices:
+            batch_results = aligner.batch_timestamps_and_lrc(calc_matrices, lyric_ids_list, durations, band=dtw_band)
+            for b, result in zip(sample_indices, batch_results):
+                results[b] = {
+                    "lrc_text": result["lrc_text"],
+                    "sentence_timestamps": result["sentence_timestamps"],
+                    "token_timestamps": result["token_timestamps"],
+                    "success": True,
+                    "error": None
                 }
-            
-            # Generate timestamps
-            result = aligner.get_timestamps_and_lrc(
-                calc_matrix=align_info["calc_matrix"],
-                lyrics_tokens=pure_lyric_ids,
-                total_duration_seconds=total_duration_seconds
-            )
-            
-            return {
-                "lrc_text": result["lrc_text"],
-                "sentence_timestamps": result["sentence_timestamps"],
-                "token_timestamps": result["token_timestamps"],
-                "success": True,
-                "error": None
-            }
-            
-        except Exception as e:
-            error_msg = f"Error generating timestamps: {str(e)}"
-            logger.exception("[get_lyric_timestamp] Failed")
-            return {
-                "lrc_text": "",
-                "sentence_timestamps": [],
-                "token_timestamps": [],
-                "success": False,
-                "error": error_msg
-            }
+        return results
 
     @torch.no_grad()
     def get_lyric_score(
@@ -3247,6 +4156,7 @@ class AceStepHandler:
             inference_steps: int = 8,
             seed: int = 42,
             custom_layers_config: Optional[Dict] = None,
+            dtw_band: Optional[float] = None,
     ) -> Dict[str, Any]:
         """
         Calculate both LM and DiT alignment scores in one pass.
@@ -3254,6 +4164,8 @@ class AceStepHandler:
         - lm_score: Checks structural alignment using pure noise at t=1.0.
         - dit_score: Checks denoising alignment using regressed latents at t=1/steps.
 
+        Returns the result for the first sample; see get_lyric_scores for batches.
+
         Args:
             pred_latent: Generated latent tensor [batch, T, D]
             encoder_hidden_states: Cached encoder hidden states
@@ -3264,6 +4176,7 @@ class AceStepHandler:
             inference_steps: Number of inference steps (for noise level calculation)
             seed: Random seed for noise generation
             custom_layers_config: Dict mapping layer indices to head indices
+            dtw_band: Sakoe-Chiba band for DTW as a fraction of the frames (None = full DTW)
 
         Returns:
             Dict containing:
@@ -3272,15 +4185,49 @@ class AceStepHandler:
             - success: Whether generation succeeded
             - error: Error message if failed
         """
-        from transformers.cache_utils import EncoderDecoderCache, DynamicCache
+        return self.get_lyric_scores(
+            pred_latent=pred_latent[:1],
+            encoder_hidden_states=encoder_hidden_states[:1],
+            encoder_attention_mask=encoder_attention_mask[:1],
+            context_latents=context_latents[:1],
+            lyric_token_ids=lyric_token_ids[:1],
+            vocal_language=vocal_language,
+            inference_steps=inference_steps,
+            seed=seed,
+            custom_layers_config=custom_layers_config,
+            dtw_band=dtw_band,
+        )[0]
+
+    @torch.no_grad()
+    def get_lyric_scores(
+            self,
+            pred_latent: torch.Tensor,
+            encoder_hidden_states: torch.Tensor,
+            encoder_attention_mask: torch.Tensor,
+            context_latents: torch.Tensor,
+            lyric_token_ids: Union[torch.Tensor, List[List[int]]],
+            vocal_language: Union[str, List[str]] = "en",
+            inference_steps: int = 8,
+            seed: int = 42,
+            custom_layers_config: Optional[Dict] = None,
+            dtw_band: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        LM and DiT alignment scores for every sample of a batch: one decoder forward
+        over [noise rows; regressed rows] and one batched DTW over all 2 * batch matrices.
+
+        Args: as get_lyric_score, with batch-sized inputs; vocal_language may be given per sample.
+
+        Returns:
+            One get_lyric_score-style dict per sample
+        """
+        bsz = pred_latent.shape[0]
+
+        def failure(error: str) -> List[Dict[str, Any]]:
+            return [self._score_failure(error) for _ in range(bsz)]
 
         if self.model is None:
-            return {
-                "lm_score": 0.0,
-                "dit_score": 0.0,
-                "success": False,
-                "error": "Model not initialized"
-            }
+            return failure("Model not initialized")
 
         if custom_layers_config is None:
             custom_layers_config = self.custom_layers_config
@@ -3295,8 +4242,6 @@ class AceStepHandler:
             encoder_attention_mask = encoder_attention_mask.to(device=device, dtype=dtype)
             context_latents = context_latents.to(device=device, dtype=dtype)
 
-            bsz = pred_latent.shape[0]
-
             if seed is None:
                 x0 = torch.randn_like(pred_latent)
             else:
@@ -3315,148 +4260,115 @@ class AceStepHandler:
             # Flow Matching Regression: xt = t*x0 + (1-t)*x1
             xt_dit = t_last_val * x0 + (1.0 - t_last_val) * pred_latent
 
-            # Order: [Think_Batch, DiT_Batch]
-            xt_in = torch.cat([xt_lm, xt_dit], dim=0)
-            t_in = torch.cat([t_lm, t_dit], dim=0)
-
-            # Duplicate conditions
-            encoder_hidden_states_in = torch.cat([encoder_hidden_states, encoder_hidden_states], dim=0)
-            encoder_attention_mask_in = torch.cat([encoder_attention_mask, encoder_attention_mask], dim=0)
-            context_latents_in = torch.cat([context_latents, context_latents], dim=0)
-
-            # Prepare Attention Mask
-            latent_length = xt_in.shape[1]
-            attention_mask_in = torch.ones(2 * bsz, latent_length, device=device, dtype=dtype)
-            past_key_values = None
-
-            # Run decoder with output_attentions=True
-            with self._load_model_context("model"):
-                decoder = self.model.decoder
-                if hasattr(decoder, 'eval'):
-                    decoder.eval()
-
-                decoder_outputs = decoder(
-                    hidden_states=xt_in,
-                    timestep=t_in,
-                    timestep_r=t_in,
-                    attention_mask=attention_mask_in,
-                    encoder_hidden_states=encoder_hidden_states_in,
-                    use_cache=False,
-                    past_key_values=past_key_values,
-                    encoder_attention_mask=encoder_attention_mask_in,
-                    context_latents=context_latents_in,
-                    output_attentions=True,
-                    custom_layers_config=custom_layers_config,
-                    enable_early_exit=True
-                )
-
-                # Extract cross-attention matrices
-                if decoder_outputs[2] is None:
-                    return {
-                        "lm_score": 0.0,
-                        "dit_score": 0.0,
-                        "success": False,
-                        "error": "Model did not return attentions"
-                    }
-
-                cross_attns = decoder_outputs[2]  # Tuple of tensors (some may be None)
-
-                captured_layers_list = []
-                for layer_attn in cross_attns:
-                    if layer_attn is None:
-                        continue
-
-                    # Only take conditional part (first half of batch)
-                    layer_matrix = layer_attn.transpose(-1, -2)
-                    captured_layers_list.append(layer_matrix)
-
-                if not captured_layers_list:
-                    return {
-                        "lm_score": 0.0,
-                        "dit_score": 0.0,
-                        "success": False,
-                        "error": "No valid attention layers returned"
-                    }
-
-                stacked = torch.stack(captured_layers_list)
-
-                all_layers_matrix_lm = stacked[:, :bsz, ...]
-                all_layers_matrix_dit = stacked[:, bsz:, ...]
-
-                if bsz == 1:
-                    all_layers_matrix_lm = all_layers_matrix_lm.squeeze(1)
-                    all_layers_matrix_dit = all_layers_matrix_dit.squeeze(1)
-                else:
-                    pass
-
-            # Process lyric token IDs to extract pure lyrics
-            if isinstance(lyric_token_ids, torch.Tensor):
-                raw_lyric_ids = lyric_token_ids[0].tolist()
-            else:
-                raw_lyric_ids = lyric_token_ids
-
-            # Parse header to find lyrics start position
-            header_str = f"# Languages\n{vocal_language}\n\n# Lyric\n"
-            header_ids = self.text_tokenizer.encode(header_str, add_special_tokens=False)
-            start_idx = len(header_ids)
-
-            # Find end of lyrics (before endoftext token)
-            try:
-                end_idx = raw_lyric_ids.index(151643)  # <|endoftext|> token
-            except ValueError:
-                end_idx = len(raw_lyric_ids)
+            # Order: [Think_Batch, DiT_Batch], conditions duplicated
+            stacked = self._alignment_cross_attention(
+                torch.cat([xt_lm, xt_dit], dim=0),
+                torch.cat([t_lm, t_dit], dim=0),
+                torch.cat([encoder_hidden_states, encoder_hidden_states], dim=0),
+                torch.cat([encoder_attention_mask, encoder_attention_mask], dim=0),
+                torch.cat([context_latents, context_latents], dim=0),
+                custom_layers_config,
+            )
+            if isinstance(stacked, str):
+                return failure(stacked)
+            return self._scores_from_attention(
+                stacked[:, :bsz], stacked[:, bsz:], lyric_token_ids, vocal_language, custom_layers_config, dtw_band
+            )
 
-            pure_lyric_ids = raw_lyric_ids[start_idx:end_idx]
-            if start_idx >= all_layers_matrix_lm.shape[-2]:  # Check text dim
-                return {
-                    "lm_score": 0.0,
-                    "dit_score": 0.0,
-                    "success": False,
-                    "error": "Lyrics indices out of bounds"
-                }
+        except Exception as e:
+            error_msg = f"Error generating score: {str(e)}"
+            logger.exception("[get_lyric_score] Failed")
+            return failure(error_msg)
 
-            pure_matrix_lm = all_layers_matrix_lm[..., start_idx:end_idx, :]
-            pure_matrix_dit = all_layers_matrix_dit[..., start_idx:end_idx, :]
+    @torch.no_grad()
+    def get_lyric_scores_from_recording(
+            self,
+            alignment_attention: Dict[str, torch.Tensor],
+            lyric_token_ids: Union[torch.Tensor, List[List[int]]],
+            vocal_language: Union[str, List[str]] = "en",
+            dtw_band: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        LM and DiT alignment scores from cross-attention recorded during generation
+        (generate_music(record_alignment_attention=True)): the "first" step recording
+        (t = 1) gives lm_score and the "last" one (t = 1/steps) dit_score.
 
-            # Create aligner and calculate alignment info
-            aligner = MusicLyricScorer(self.text_tokenizer)
+        Args: as get_lyric_scores, with alignment_attention = extra_outputs["alignment_attention"].
 
-            def calculate_single_score(matrix):
-                """Helper to run aligner on a matrix"""
-                info = aligner.lyrics_alignment_info(
-                    attention_matrix=matrix,
-                    token_ids=pure_lyric_ids,
-                    custom_config=custom_layers_config,
-                    return_matrices=False,
-                    medfilt_width=1,
-                )
-                if info.get("energy_matrix") is None:
-                    return 0.0
+        Returns:
+            One get_lyric_score-style dict per sample
+        """
+        alignment_attention = alignment_attention or {}
+        first, last = alignment_attention.get("first"), alignment_attention.get("last")
+        if first is None or last is None:
+            return [self._score_failure("No recorded alignment attention") for _ in range(len(lyric_token_ids))]
+        try:
+            return self._scores_from_attention(
+                first.unsqueeze(0), last.unsqueeze(0), lyric_token_ids, vocal_language, recording_config(last), dtw_band
+            )
+        except Exception as e:
+            logger.exception("[get_lyric_scores_from_recording] Failed")
+            return [self._score_failure(f"Error generating score: {str(e)}") for _ in range(last.shape[0])]
 
-                res = aligner.calculate_score(
-                    energy_matrix=info["energy_matrix"],
-                    type_mask=info["type_mask"],
-                    path_coords=info["path_coords"],
-                )
-                # Return the final score (check return key)
-                return res.get("lyrics_score", res.get("final_score", 0.0))
+    @staticmethod
+    def _score_failure(error: str) -> Dict[str, Any]:
+        return {"lm_score": 0.0, "dit_score": 0.0, "success": False, "error": error}
 
-            lm_score = calculate_single_score(pure_matrix_lm)
-            dit_score = calculate_single_score(pure_matrix_dit)
+    def _scores_from_attention(
+            self,
+            lm_matrix: torch.Tensor,
+            dit_matrix: torch.Tensor,
+            lyric_token_ids: Union[torch.Tensor, List[List[int]]],
+            vocal_language: Union[str, List[str]],
+            custom_layers_config: Dict,
+            dtw_band: Optional[float],
+    ) -> List[Dict[str, Any]]:
+        """
+        Per-sample LM / DiT scores from cross-attention [Layers, Batch, Heads, Tokens, Frames]
+        at t = 1 and t = 1/steps, one batched DTW over all 2 * batch matrices.
+        """
+        bsz = lm_matrix.shape[1]
+        if isinstance(vocal_language, str):
+            vocal_language = [vocal_language] * bsz
+
+        aligner = MusicLyricScorer(self.text_tokenizer)
+        results: List[Optional[Dict[str, Any]]] = [None] * bsz
+        matrices, token_ids_list, sample_indices = [], [], []
+        for b in range(bsz):
+            raw_lyric_ids = lyric_token_ids[b].tolist() if isinstance(lyric_token_ids[b], torch.Tensor) else list(lyric_token_ids[b])
+            start_idx, end_idx = self._lyric_token_span(raw_lyric_ids, vocal_language[b])
+            if start_idx >= dit_matrix.shape[-2]:  # Check text dim
+                results[b] = self._score_failure("Lyrics indices out of bounds")
+                continue
+            pure_lyric_ids = raw_lyric_ids[start_idx:end_idx]
+            matrices += [lm_matrix[:, b, :, start_idx:end_idx, :], dit_matrix[:, b, :, start_idx:end_idx, :]]
+            token_ids_list += [pure_lyric_ids, pure_lyric_ids]
+            sample_indices.append(b)
+
+        infos = aligner.lyrics_alignment_info_batch(
+            attention_matrices=matrices,
+            token_ids_list=token_ids_list,
+            custom_config=custom_layers_config,
+            medfilt_width=1,
+            band=dtw_band,
+        ) if matrices else []
+
+        def score(info: Dict[str, Any]) -> float:
+            if info.get("energy_matrix") is None:
+                return 0.0
+            res = aligner.calculate_score(
+                energy_matrix=info["energy_matrix"],
+                type_mask=info["type_mask"],
+                path_coords=info["path_coords"],
+            )
+            # Return the final score (check return key)
+            return res.get("lyrics_score", res.get("final_score", 0.0))
 
-            return {
-                "lm_score": lm_score,
-                "dit_score": dit_score,
+        for slot, b in enumerate(sample_indices):
+            results[b] = {
+                "lm_score": score(infos[2 * slot]),
+                "dit_score": score(infos[2 * slot + 1]),
                 "success": True,
                 "error": None
             }
-
-        except Exception as e:
-            error_msg = f"Error generating score: {str(e)}"
-            logger.exception("[get_lyric_score] Failed")
-            return {
-                "lm_score": 0.0,
-                "dit_score": 0.0,
-                "success": False,
-                "error": error_msg
-            }
+        return results
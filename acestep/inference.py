@@ -14,6 +14,7 @@ from dataclasses import dataclass, field, asdict
 from loguru import logger
 
 from acestep.audio_utils import AudioSaver, generate_uuid_from_params
+from acestep.cancellation import JobCancelled, check_cancelled
 
 # HuggingFace Space environment detection
 IS_HUGGINGFACE_SPACE = os.environ.get("SPACE_ID") is not None
@@ -60,6 +61,16 @@ class GenerationParams:
         cfg_interval_start: Start ratio (0.0–1.0) to apply CFG.
         cfg_interval_end: End ratio (0.0–1.0) to apply CFG.
         shift: Timestep shift factor (default 1.0). When != 1.0, applies t = shift * t / (1 + (shift - 1) * t) to timesteps.
+        step_cache_mode: Reuse deep DiT block outputs across diffusion steps: None (off), "interval" or "threshold".
+        step_cache_interval: For "interval": recompute the cached blocks every N steps.
+        step_cache_threshold: For "threshold": recompute once the accumulated relative change of the block input exceeds this.
+        step_cache_start_block: First cached decoder block (None = first third of the blocks always runs).
+        lora_adapter: Name of a loaded LoRA adapter to use for this generation (None = handler's current LoRA state),
+            or a list with one adapter name (or None) per batch item to mix adapters within one batch.
+        lora_scale: LoRA scale for this generation (None = adapter's current scale), or a list per batch item
+            (with a single lora_adapter, that adapter is used for every item at its own scale).
+        record_alignment_attention: Record the lyric-alignment cross-attention during generation
+            (extra_outputs["alignment_attention"]) so LRC and both lyric scores share one alignment pass.
         
         # Task-Specific Parameters
         task_type: Type of generation task. One of: "text2music", "cover", "repaint", "lego", "extract", "complete".
@@ -117,6 +128,15 @@ class GenerationParams:
     # Custom timesteps (parsed from string like "0.97,0.76,0.615,0.5,0.395,0.28,0.18,0.085,0")
     # If provided, overrides inference_steps and shift
     timesteps: Optional[List[float]] = None
+    # Cross-timestep block caching (None disables)
+    step_cache_mode: Optional[str] = None
+    step_cache_interval: int = 2
+    step_cache_threshold: float = 0.1
+    step_cache_start_block: Optional[int] = None
+    # Per-request LoRA adapter selection (None keeps the handler's state)
+    lora_adapter: Optional[Union[str, List[Optional[str]]]] = None
+    lora_scale: Optional[Union[float, List[float]]] = None
+    record_alignment_attention: bool = False
 
     repainting_start: float = 0.0
     repainting_end: float = -1
@@ -308,6 +328,10 @@ def generate_music(
         
     Returns:
         GenerationResult with generated audio files and metadata
+
+    Raises:
+        JobCancelled: the job's cancellation token (acestep/cancellation.py) was
+            cancelled; errors are otherwise reported in the result
     """
     try:
         # Phase 1: LM-based metadata and code generation (if enabled)
@@ -435,8 +459,11 @@ def generate_music(
 
             all_metadata_list = []
             all_audio_codes_list = []
+            # Code tensors straight from the LM token IDs (None entries when unavailable)
+            all_audio_code_ids_list = []
 
             for chunk_idx in range(num_chunks):
+                check_cancelled()
                 chunk_start = chunk_idx * max_inference_batch_size
                 chunk_end = min(chunk_start + max_inference_batch_size, actual_batch_size)
                 chunk_size = chunk_end - chunk_start
@@ -488,11 +515,13 @@ def generate_music(
                     audio_codes_list = result.get("audio_codes", [])
                     all_metadata_list.extend(metadata_list)
                     all_audio_codes_list.extend(audio_codes_list)
+                    all_audio_code_ids_list.extend(result.get("audio_code_ids") or [None] * len(audio_codes_list))
                 else:
                     metadata = result.get("metadata", {})
                     audio_codes = result.get("audio_codes", "")
                     all_metadata_list.append(metadata)
                     all_audio_codes_list.append(audio_codes)
+                    all_audio_code_ids_list.append(result.get("audio_code_ids"))
 
                 # Collect time costs from LM extra_outputs
                 lm_extra = result.get("extra_outputs", {})
@@ -511,11 +540,16 @@ def generate_music(
 
             # Set audio_code_string_to_use based on infer_type
             if infer_type == "llm_dit":
-                # If batch mode, use list; otherwise use single string
+                # Hand the DiT code tensors when every item has them, skipping the
+                # string round trip; the strings are kept for params/saving below
+                lm_audio_codes_for_dit = all_audio_codes_list
+                if all_audio_code_ids_list and all(ids is not None for ids in all_audio_code_ids_list):
+                    lm_audio_codes_for_dit = all_audio_code_ids_list
+                # If batch mode, use list; otherwise use single item
                 if actual_batch_size > 1:
-                    audio_code_string_to_use = all_audio_codes_list
+                    audio_code_string_to_use = lm_audio_codes_for_dit
                 else:
-                    audio_code_string_to_use = all_audio_codes_list[0] if all_audio_codes_list else ""
+                    audio_code_string_to_use = lm_audio_codes_for_dit[0] if lm_audio_codes_for_dit else ""
             else:
                 # For "dit" mode, keep user-provided codes or empty
                 audio_code_string_to_use = params.audio_codes
@@ -553,6 +587,7 @@ def generate_music(
                 dit_input_vocal_language = lm_generated_metadata.get("vocal_language", dit_input_vocal_language)
 
         # Phase 2: DiT music generation
+        check_cancelled()
         # Use seed_for_generation (from config.seed or params.seed) instead of params.seed for actual generation
         result = dit_handler.generate_music(
             captions=dit_input_caption,
@@ -581,6 +616,13 @@ def generate_music(
             shift=params.shift,
             infer_method=params.infer_method,
             timesteps=params.timesteps,
+            step_cache_mode=params.step_cache_mode,
+            step_cache_interval=params.step_cache_interval,
+            step_cache_threshold=params.step_cache_threshold,
+            step_cache_start_block=params.step_cache_start_block,
+            lora_adapter=params.lora_adapter,
+            lora_scale=params.lora_scale,
+            record_alignment_attention=params.record_alignment_attention,
             progress=progress,
         )
 
@@ -635,7 +677,7 @@ def generate_music(
             # Generate UUID for this audio (moved from handler)
             batch_seed = seed_list[idx] if idx < len(seed_list) else seed_list[0] if seed_list else -1
             audio_code_str = lm_generated_audio_codes_list[idx] if (
-                lm_generated_audio_codes_list and idx < len(lm_generated_audio_codes_list)) else audio_code_string_to_use
+                lm_generated_audio_codes_list and idx < len(lm_generated_audio_codes_list)) else params.audio_codes
             if isinstance(audio_code_str, list):
                 audio_code_str = audio_code_str[idx] if idx < len(audio_code_str) else ""
 
@@ -705,6 +747,8 @@ def generate_music(
             error=None,
         )
 
+    except JobCancelled:
+        raise
     except Exception as e:
         logger.exception("Music generation failed")
         return GenerationResult(
@@ -0,0 +1,175 @@
+"""
+Per-job run-time estimates for queue ETAs and admission control.
+
+A single running average treats a 10 s turbo clip and a 240 s base-model track
+with LM thinking and a batch of 8 as the same job. JobCostModel predicts each
+job's run time from its request instead: a linear model over a few work terms
+(DiT steps x audio seconds x batch, LM code generation, source audio encoding,
+LM text calls), fitted online from the run times the server observes. There is
+one fit per DiT model, used once it has seen a few jobs, and a shared fit for
+the rest.
+
+The work terms are strongly correlated in real traffic (a deployment that
+always thinks, or never changes the step count, makes the audio terms
+proportional), so the fit is an exponentially weighted ridge regression pulled
+towards the prior, with coefficients kept non-negative. VAE decode also scales
+with audio seconds and has no term of its own: at a fixed step count it would
+be the same column as the DiT term.
+
+Before any job has finished, every prediction is the configured initial
+average, as before.
+"""
+
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+FEATURE_NAMES = ("overhead", "dit", "lm_codes", "source_audio", "lm_text")
+DEFAULT_BATCH_SIZE = 2  # the API's batch size when a request leaves it unset
+MIN_MODEL_SAMPLES = 5  # jobs a per-model fit needs before it is used
+MIN_SECONDS = 0.5
+RIDGE = 0.1  # pull of each coefficient towards its prior, in units of one job's (x, y)
+
+
+def job_features(req: Any, duration: float) -> List[float]:
+    """Work terms of a GenerateMusicRequest for an output of duration seconds."""
+    batch = req.batch_size or DEFAULT_BATCH_SIZE
+    steps = req.inference_steps or 8
+    audio = batch * duration
+    has_source = bool(req.src_audio_path or req.reference_audio_path or req.audio_code_string) or (
+        req.task_type != "text2music"
+    )
+    lm_text = req.sample_mode or bool(req.sample_query) or req.use_format or (
+        req.thinking and (req.use_cot_caption or req.use_cot_language)
+    )
+    return [
+        1.0,
+        audio * steps / 1000.0,
+        audio / 100.0 if req.thinking else 0.0,
+        duration / 100.0 if has_source else 0.0,
+        1.0 if lm_text else 0.0,
+    ]
+
+
+def _solve(A: List[List[float]], b: List[float]) -> List[float]:
+    """Solve A x = b by Gaussian elimination with partial pivoting (A is small and positive definite)."""
+    n = len(b)
+    M = [row[:] + [v] for row, v in zip(A, b)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(M[r][col]))
+        M[col], M[pivot] = M[pivot], M[col]
+        for r in range(col + 1, n):
+            factor = M[r][col] / M[col][col]
+            for c in range(col, n + 1):
+                M[r][c] -= factor * M[col][c]
+    x = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        x[r] = (M[r][n] - sum(M[r][c] * x[c] for c in range(r + 1, n))) / M[r][r]
+    return x
+
+
+class _RidgeRegression:
+    """
+    Online linear regression with exponential forgetting: minimizes
+    sum_k forgetting^k (y_k - theta.x_k)^2 + ridge * |theta - prior|^2 with theta >= 0.
+    """
+
+    def __init__(self, prior: List[float], forgetting: float = 0.99, ridge: float = RIDGE) -> None:
+        n = len(prior)
+        self.prior = list(prior)
+        self.theta = list(prior)
+        self.forgetting = forgetting
+        self.ridge = ridge
+        self.A = [[0.0] * n for _ in range(n)]  # weighted sum of x x^T
+        self.b = [0.0] * n  # weighted sum of x y
+        self.samples = 0
+
+    def predict(self, x: List[float]) -> float:
+        return sum(t * v for t, v in zip(self.theta, x))
+
+    def update(self, x: List[float], y: float) -> None:
+        n = len(x)
+        for i in range(n):
+            self.b[i] = self.forgetting * self.b[i] + x[i] * y
+            for j in range(n):
+                self.A[i][j] = self.forgetting * self.A[i][j] + x[i] * x[j]
+        self.samples += 1
+        self.theta = self._fit()
+
+    def _fit(self) -> List[float]:
+        # Solve on the free coefficients, pin the ones that come out negative to zero and
+        # re-solve (the free set only shrinks, so at most n solves)
+        free = list(range(len(self.b)))
+        while True:
+            theta = [0.0] * len(self.b)
+            solution = _solve(
+                [[self.A[i][j] + (self.ridge if i == j else 0.0) for j in free] for i in free],
+                [self.b[i] + self.ridge * self.prior[i] for i in free],
+            )
+            for i, value in zip(free, solution):
+                theta[i] = value
+            if all(theta[i] >= 0.0 for i in free):
+                return theta
+            free = [i for i in free if theta[i] > 0.0]
+            if not free:
+                return [0.0] * len(self.b)
+
+
+class JobCostModel:
+    """Predict job run time (seconds) from its request; observe() finished jobs to refit."""
+
+    def __init__(self, initial_seconds: float, window: int = 50, forgetting: float = 0.99) -> None:
+        self.initial_seconds = initial_seconds
+        self.forgetting = forgetting
+        self._prior = [initial_seconds] + [0.0] * (len(FEATURE_NAMES) - 1)
+        self._shared = _RidgeRegression(self._prior, forgetting)
+        self._per_model: Dict[str, _RidgeRegression] = {}
+        # Requests without audio_duration get whatever length the LM / defaults pick; track it
+        self.default_duration = 60.0
+        self._errors: Deque[Tuple[float, float]] = deque(maxlen=window)  # (predicted, actual)
+
+    def _duration(self, req: Any) -> float:
+        if req.audio_duration is not None and float(req.audio_duration) > 0:
+            return float(req.audio_duration)
+        return self.default_duration
+
+    def _fit_for(self, model: Optional[str]) -> _RidgeRegression:
+        fit = self._per_model.get(model or "")
+        return fit if fit is not None and fit.samples >= MIN_MODEL_SAMPLES else self._shared
+
+    def predict(self, req: Any) -> float:
+        x = job_features(req, self._duration(req))
+        return max(MIN_SECONDS, self._fit_for(req.model).predict(x))
+
+    def observe(self, req: Any, seconds: float, duration: Optional[float] = None,
+                predicted: Optional[float] = None) -> None:
+        """Fit one finished job; duration is the generated length when the request left it open."""
+        if req.audio_duration is None or float(req.audio_duration) <= 0:
+            if duration is not None and duration > 0:
+                self.default_duration += 0.1 * (float(duration) - self.default_duration)
+        x = job_features(req, float(duration) if duration else self._duration(req))
+        if predicted is not None:
+            self._errors.append((predicted, seconds))
+        self._shared.update(x, seconds)
+        key = req.model or ""
+        if key not in self._per_model:
+            self._per_model[key] = _RidgeRegression(self._prior, self.forgetting)
+        self._per_model[key].update(x, seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """Prediction error over the last window of finished jobs (predicted at admission vs actual)."""
+        errors = [p - a for p, a in self._errors]
+        n = len(errors)
+        return {
+            "samples": n,
+            "mae_seconds": sum(abs(e) for e in errors) / n if n else None,
+            "bias_seconds": sum(errors) / n if n else None,
+            "mape": sum(abs(p - a) / a for p, a in self._errors if a > 0) / n if n else None,
+            "default_duration": self.default_duration,
+            "models": {
+                name or "default": {
+                    "samples": fit.samples,
+                    "coefficients": dict(zip(FEATURE_NAMES, fit.theta)),
+                }
+                for name, fit in self._per_model.items()
+            },
+        }
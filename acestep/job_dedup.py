@@ -0,0 +1,121 @@
+"""
+Request fingerprints, in-flight deduplication and a result cache for the API server.
+
+Only a request whose output is fixed by its parameters gets a fingerprint: a
+fixed seed (use_random_seed=False, seed >= 0) and a single output (with a batch
+of several, the handler seeds every item after the first at random). The
+fingerprint is a SHA-256 over the canonical JSON of the request fields that
+affect the output (like audio_utils.generate_uuid_from_params), the identity of
+the models that run it (DiT model, LoRA adapter path and scale, LM) and the
+content of input audio files, so a re-uploaded or edited reference track is a
+different request.
+
+RequestMemo maps fingerprints to the job currently generating them, so a
+duplicate submission attaches to that job, and keeps the results of finished
+ones in a bounded LRU cache. All methods run on the server's event loop.
+"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DEFAULT_BATCH_SIZE = 2  # the API's batch size when a request leaves it unset
+
+# Request fields that do not change the generated audio
+_IGNORED_FIELDS = {"priority", "tenant", "constrained_decoding_debug"}
+_FILE_FIELDS = ("reference_audio_path", "src_audio_path")
+
+
+def file_identity(path: str) -> Optional[str]:
+    """SHA-256 of a file's content, None when it cannot be read."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def request_fingerprint(params: Dict[str, Any], identity: Dict[str, Any]) -> Optional[str]:
+    """
+    Fingerprint of a deterministic request (params as stored with the job,
+    identity describing the models that will run it); None when the output is
+    not fixed by the parameters, or an input file cannot be read.
+    """
+    if params.get("use_random_seed", True) or int(params.get("seed", -1)) < 0:
+        return None
+    batch_size = params.get("batch_size")
+    if (batch_size if batch_size is not None else DEFAULT_BATCH_SIZE) != 1:
+        return None
+
+    canonical = {k: v for k, v in params.items() if k not in _IGNORED_FIELDS}
+    for name in _FILE_FIELDS:
+        if canonical.get(name):
+            content = file_identity(canonical[name])
+            if content is None:
+                return None
+            canonical[name] = content
+    payload = json.dumps({"params": canonical, "models": identity}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RequestMemo:
+    """In-flight fingerprint -> job_id, plus an LRU cache of finished fingerprint -> result."""
+
+    def __init__(self, max_results: int = 256) -> None:
+        self.max_results = max_results
+        self._inflight: Dict[str, str] = {}
+        self._job_fingerprints: Dict[str, str] = {}
+        self._results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.counters = {"cache_hits": 0, "inflight_hits": 0, "misses": 0, "evictions": 0, "stale": 0}
+
+    def lookup(
+        self,
+        fingerprint: str,
+        is_valid: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        (job_id generating this fingerprint, None), (None, cached result) or
+        (None, None). is_valid rejects a cached result whose files are gone.
+        """
+        job_id = self._inflight.get(fingerprint)
+        if job_id is not None:
+            self.counters["inflight_hits"] += 1
+            return job_id, None
+        result = self._results.get(fingerprint)
+        if result is not None:
+            if is_valid is None or is_valid(result):
+                self._results.move_to_end(fingerprint)
+                self.counters["cache_hits"] += 1
+                return None, result
+            del self._results[fingerprint]
+            self.counters["stale"] += 1
+        self.counters["misses"] += 1
+        return None, None
+
+    def start(self, fingerprint: str, job_id: str) -> None:
+        """Record that job_id generates fingerprint; later duplicates attach to it."""
+        self._inflight[fingerprint] = job_id
+        self._job_fingerprints[job_id] = fingerprint
+
+    def finish(self, job_id: str, result: Optional[Dict[str, Any]]) -> None:
+        """Job ended: cache its result (None = failed, nothing cached) and release the fingerprint."""
+        fingerprint = self._job_fingerprints.pop(job_id, None)
+        if fingerprint is None:
+            return
+        if self._inflight.get(fingerprint) == job_id:
+            del self._inflight[fingerprint]
+        if result is None or self.max_results <= 0:
+            return
+        self._results[fingerprint] = result
+        self._results.move_to_end(fingerprint)
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"inflight": len(self._inflight), "cached_results": len(self._results), **self.counters}
@@ -0,0 +1,137 @@
+"""
+In-process pub/sub of job progress for the API server's push endpoints.
+
+The queue workers publish what happens to a job: admission and queue position,
+stage transitions (LM sample / format, LM, DiT, VAE decode), diffusion steps,
+LM codes generated, partial results (the caption and metadata the LM settled
+on) and the final result, error or cancellation. Subscribers (one per SSE or
+WebSocket connection) get a snapshot of the job's state so far, then each new
+event, until the job ends.
+
+Every method runs on the server's event loop except publish_threadsafe, which
+the generation thread uses. A subscriber that falls behind loses its oldest
+non-final events (each progress event supersedes the previous one); the final
+event is always delivered. A finished job's snapshot is kept for
+`retain_seconds` so a client that connects just after completion still gets the
+result.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+TERMINAL_EVENTS = ("succeeded", "failed", "cancelled")
+
+
+class JobEventBus:
+    """job_id -> snapshot + subscriber queues."""
+
+    def __init__(self, retain_seconds: float = 300.0, max_backlog: int = 64) -> None:
+        self.retain_seconds = retain_seconds
+        self.max_backlog = max(2, max_backlog)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._snapshots: Dict[str, Dict[str, Any]] = {}
+        self._seq: Dict[str, int] = {}
+        self._finished: Deque[Tuple[float, str]] = deque()  # (finish time, job_id), oldest first
+        self._subscribers: Dict[str, Set["asyncio.Queue[Dict[str, Any]]"]] = {}
+        self.counters = {"published": 0, "dropped": 0}
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Loop that publish_threadsafe hands events to."""
+        self._loop = loop
+
+    def publish(self, job_id: str, event_type: str, **fields: Any) -> Dict[str, Any]:
+        """Record an event: merge fields into the job's snapshot and fan it out."""
+        self._expire()
+        seq = self._seq.get(job_id, 0) + 1
+        self._seq[job_id] = seq
+        event = {"job_id": job_id, "seq": seq, "type": event_type, "time": time.time(), **fields}
+        snapshot = self._snapshots.setdefault(job_id, {"job_id": job_id})
+        snapshot.update(fields)
+        snapshot["seq"] = seq
+        snapshot["updated_at"] = event["time"]
+        if event_type in TERMINAL_EVENTS or event_type in ("queued", "running"):
+            snapshot["status"] = event_type
+        if event_type in TERMINAL_EVENTS:
+            self._finished.append((event["time"], job_id))
+        self.counters["published"] += 1
+        for queue in self._subscribers.get(job_id, ()):
+            self._offer(queue, event)
+        return event
+
+    def publish_threadsafe(self, job_id: str, event_type: str, **fields: Any) -> None:
+        """publish() from a worker thread; dropped when no loop is bound."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(lambda: self.publish(job_id, event_type, **fields))
+
+    def _offer(self, queue: "asyncio.Queue[Dict[str, Any]]", event: Dict[str, Any]) -> None:
+        while queue.full():
+            oldest = queue.get_nowait()
+            if oldest["type"] in TERMINAL_EVENTS:
+                # Cannot happen (nothing follows a final event); keep it regardless
+                queue.put_nowait(oldest)
+                return
+            self.counters["dropped"] += 1
+        queue.put_nowait(event)
+
+    def snapshot(self, job_id: str) -> Optional[Dict[str, Any]]:
+        self._expire()
+        snapshot = self._snapshots.get(job_id)
+        return dict(snapshot) if snapshot is not None else None
+
+    def subscribed_jobs(self) -> List[str]:
+        return [job_id for job_id, queues in self._subscribers.items() if queues]
+
+    def has_subscribers(self, job_id: str) -> bool:
+        return bool(self._subscribers.get(job_id))
+
+    async def subscribe(self, job_id: str, timeout: Optional[float] = None) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Yield the job's snapshot (type "snapshot"; None when the bus has not
+        seen the job, e.g. it runs in another process), then its events until
+        the final one. After the first item, None means `timeout` seconds
+        passed without an event, so the caller can send a heartbeat or check
+        the job store. No event is missed between the two: the subscriber is
+        registered before the snapshot is taken.
+        """
+        queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=self.max_backlog)
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        try:
+            snapshot = self.snapshot(job_id)
+            yield {**snapshot, "type": "snapshot"} if snapshot is not None else None
+            if snapshot is not None and snapshot.get("status") in TERMINAL_EVENTS:
+                return
+            last_seq = snapshot["seq"] if snapshot is not None else 0
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event["seq"] <= last_seq:
+                    continue  # already part of the snapshot
+                last_seq = event["seq"]
+                yield event
+                if event["type"] in TERMINAL_EVENTS:
+                    return
+        finally:
+            queues = self._subscribers.get(job_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[job_id]
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.retain_seconds
+        while self._finished and self._finished[0][0] < cutoff:
+            _, job_id = self._finished.popleft()
+            self._snapshots.pop(job_id, None)
+            self._seq.pop(job_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "jobs": len(self._snapshots),
+            "subscribers": sum(len(q) for q in self._subscribers.values()),
+            **self.counters,
+        }
@@ -0,0 +1,424 @@
+"""
+Fair-share scheduler for the API server's generation queue.
+
+FairScheduler replaces the plain FIFO asyncio.Queue: jobs carry a tenant (API
+client) and a priority class. Classes are served strictly in order
+("interactive" before "batch"). Within a class, tenants share the workers by
+weight using self-clocked weighted fair queuing: a job's finish tag is
+max(class virtual time, tenant's previous tag) + cost / weight, and the lowest
+tag is dispatched next, so one tenant bulk-submitting 200 jobs interleaves with
+everyone else instead of starving them.
+
+Queued jobs can be removed (cancellation) without disturbing the others' order.
+
+Model grouping: jobs may carry a group (the models they need) and the
+scheduler a prefer(group) predicate (are those models loaded?). When the next
+job by tag needs a swap, the lowest-tagged job of its class whose group is
+preferred runs first if its tag is within group_window of the skipped job's,
+so jobs for the loaded models run before a swap and each skipped job waits at
+most about group_window of other work. Positions and ETAs ignore grouping.
+
+Quotas: an optional cap on a tenant's queued jobs (submissions over it are
+rejected with the number of job completions to wait for, which the server turns
+into Retry-After) and on its running jobs (its flows are parked until one of
+its jobs finishes).
+
+A job's cost is its predicted run time in seconds (acestep/job_cost.py; 1.0
+when no estimate is given), so fair shares are shares of worker time. Queue
+positions and the predicted work ahead of a job are prefix counts / sums over
+(class, finish tag, arrival) keys in an order-statistic treap, O(log n) per
+lookup.
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+PRIORITY_CLASSES = ("interactive", "batch")
+DEFAULT_TENANT = "default"
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Parse "tenant:weight,tenant:weight" (e.g. ACESTEP_TENANT_WEIGHTS) into a dict."""
+    weights = {}
+    for item in (spec or "").split(","):
+        name, sep, value = item.strip().rpartition(":")
+        if sep and name.strip():
+            weights[name.strip()] = max(float(value), 1e-6)
+    return weights
+
+
+class SchedulerFull(Exception):
+    """
+    Submission rejected; wait_jobs is how many job completions to wait for before
+    retrying, or wait_seconds when the caller already knows the time.
+    """
+
+    def __init__(self, reason: str, wait_jobs: float = 1.0, wait_seconds: Optional[float] = None) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.wait_jobs = wait_jobs
+        self.wait_seconds = wait_seconds
+
+
+class _Node:
+    __slots__ = ("key", "cost", "priority", "left", "right", "size", "total")
+
+    def __init__(self, key: tuple, cost: float) -> None:
+        self.key = key
+        self.cost = cost
+        self.priority = random.random()
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+        self.size = 1
+        self.total = cost  # cost summed over the subtree
+
+    def update(self) -> None:
+        self.size = 1 + _size(self.left) + _size(self.right)
+        self.total = self.cost + _total(self.left) + _total(self.right)
+
+
+def _size(node: Optional[_Node]) -> int:
+    return node.size if node is not None else 0
+
+
+def _total(node: Optional[_Node]) -> float:
+    return node.total if node is not None else 0.0
+
+
+class _RankTree:
+    """Order-statistic treap over unique keys with a cost each: insert, remove and prefix in O(log n) expected."""
+
+    def __init__(self) -> None:
+        self._root: Optional[_Node] = None
+
+    def __len__(self) -> int:
+        return _size(self._root)
+
+    def _split(self, node: Optional[_Node], key: tuple) -> Tuple[Optional[_Node], Optional[_Node]]:
+        """(keys < key, keys >= key)"""
+        if node is None:
+            return None, None
+        if node.key < key:
+            node.right, right = self._split(node.right, key)
+            node.update()
+            return node, right
+        left, node.left = self._split(node.left, key)
+        node.update()
+        return left, node
+
+    def _merge(self, a: Optional[_Node], b: Optional[_Node]) -> Optional[_Node]:
+        """Merge trees where every key of a < every key of b."""
+        if a is None or b is None:
+            return a or b
+        if a.priority > b.priority:
+            a.right = self._merge(a.right, b)
+            a.update()
+            return a
+        b.left = self._merge(a, b.left)
+        b.update()
+        return b
+
+    def insert(self, key: tuple, cost: float = 0.0) -> None:
+        left, right = self._split(self._root, key)
+        self._root = self._merge(self._merge(left, _Node(key, cost)), right)
+
+    def remove(self, key: tuple) -> None:
+        parent, node = None, self._root
+        path = []
+        while node is not None and node.key != key:
+            path.append(node)
+            parent, node = node, (node.left if key < node.key else node.right)
+        if node is None:
+            return
+        merged = self._merge(node.left, node.right)
+        if parent is None:
+            self._root = merged
+        elif parent.left is node:
+            parent.left = merged
+        else:
+            parent.right = merged
+        for ancestor in reversed(path):
+            ancestor.update()
+
+    def prefix(self, key: tuple) -> Tuple[int, float]:
+        """(number of keys < key, their summed cost)."""
+        count, cost, node = 0, 0.0, self._root
+        while node is not None:
+            if node.key < key:
+                count += _size(node.left) + 1
+                cost += _total(node.left) + node.cost
+                node = node.right
+            else:
+                node = node.left
+        return count, cost
+
+
+@dataclass
+class _Entry:
+    job_id: str
+    item: Any
+    tenant: str
+    key: tuple  # (class rank, finish tag, arrival seq)
+    flow: Tuple[int, str] = field(repr=False)
+    cost: float = 1.0
+    group: Any = None  # hashable, e.g. the models the job needs
+
+
+class FairScheduler:
+    """
+    Weighted fair queue with priority classes and per-tenant quotas (asyncio, single event loop).
+
+    put_nowait() admits or raises SchedulerFull; get() waits for the next
+    dispatchable job and counts it as running for its tenant until task_done().
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 0,
+        weights: Optional[Dict[str, float]] = None,
+        default_weight: float = 1.0,
+        max_queued_per_tenant: int = 0,
+        max_running_per_tenant: int = 0,
+        prefer: Optional[Callable[[Any], bool]] = None,
+        group_window: float = 0.0,
+    ) -> None:
+        self.maxsize = maxsize
+        self.weights = dict(weights or {})
+        self.default_weight = default_weight
+        self.max_queued_per_tenant = max_queued_per_tenant
+        self.max_running_per_tenant = max_running_per_tenant
+        self.prefer = prefer
+        self.group_window = group_window
+        self.grouped = 0  # dispatches that ran a preferred group ahead of the next job by tag
+
+        self._seq = itertools.count()
+        self._flows: Dict[Tuple[int, str], Deque[_Entry]] = {}  # (class rank, tenant) -> FIFO
+        self._last_finish: Dict[Tuple[int, str], float] = {}
+        self._vtime = [0.0] * len(PRIORITY_CLASSES)  # finish tag of the last job dispatched per class
+        self._ready: List[Tuple[tuple, Tuple[int, str]]] = []  # heap of (head key, flow); stale entries skipped
+        self._parked: Dict[str, Set[Tuple[int, str]]] = {}  # tenant at its running cap -> flows
+        self._entries: Dict[str, _Entry] = {}
+        self._ranks = _RankTree()
+        self._queued: Dict[str, int] = {}
+        self._running: Dict[str, int] = {}
+        self._running_jobs: Dict[str, Tuple[str, float, float]] = {}  # job_id -> (tenant, cost, start)
+        self._getters: Deque[asyncio.Future] = deque()
+
+    def weight(self, tenant: str) -> float:
+        return self.weights.get(tenant, self.default_weight)
+
+    def qsize(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, job_id: str) -> bool:
+        """True while job_id is queued or running (between get() and task_done())."""
+        return job_id in self._entries or job_id in self._running_jobs
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= len(self._entries)
+
+    def check(self, tenant: str) -> None:
+        """Raise SchedulerFull if a job from tenant would not be admitted now."""
+        if self.full():
+            raise SchedulerFull("Server busy: queue is full", wait_jobs=1.0)
+        queued = self._queued.get(tenant, 0)
+        if 0 < self.max_queued_per_tenant <= queued:
+            # The tenant's backlog drains at its weighted share of the dispatches
+            backlogged = sum(self.weight(t) for t, n in self._queued.items() if n > 0)
+            share = self.weight(tenant) / max(backlogged, 1e-6)
+            raise SchedulerFull(
+                f"Too many queued jobs for this client ({queued}, limit {self.max_queued_per_tenant})",
+                wait_jobs=(queued - self.max_queued_per_tenant + 1) / share,
+            )
+
+    def put_nowait(self, job_id: str, item: Any, tenant: str = DEFAULT_TENANT,
+                   priority: str = "interactive", cost: float = 1.0, group: Any = None) -> int:
+        """Queue a job; returns its 1-based position. Raises SchedulerFull or ValueError (unknown priority)."""
+        self.check(tenant)
+        flow, finish = self._finish_tag(tenant, priority, cost)
+        self._last_finish[flow] = finish
+        entry = _Entry(job_id, item, tenant, (flow[0], finish, next(self._seq)), flow, cost, group)
+
+        queue = self._flows.setdefault(flow, deque())
+        queue.append(entry)
+        if len(queue) == 1:
+            heapq.heappush(self._ready, (entry.key, flow))
+        self._entries[job_id] = entry
+        self._ranks.insert(entry.key, cost)
+        self._queued[tenant] = self._queued.get(tenant, 0) + 1
+        self._wake(1)
+        return self._ranks.prefix(entry.key)[0] + 1
+
+    def _finish_tag(self, tenant: str, priority: str, cost: float) -> Tuple[Tuple[int, str], float]:
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority '{priority}', expected one of {PRIORITY_CLASSES}")
+        flow = (PRIORITY_CLASSES.index(priority), tenant)
+        return flow, max(self._vtime[flow[0]], self._last_finish.get(flow, 0.0)) + cost / self.weight(tenant)
+
+    def position(self, job_id: str) -> int:
+        """1-based dispatch position under the current policy, 0 when the job is not queued."""
+        entry = self._entries.get(job_id)
+        return self._ranks.prefix(entry.key)[0] + 1 if entry is not None else 0
+
+    def ahead(self, job_id: str) -> Tuple[int, float]:
+        """(queued jobs dispatched before job_id, their summed cost); (0, 0.0) when it is not queued."""
+        entry = self._entries.get(job_id)
+        return self._ranks.prefix(entry.key) if entry is not None else (0, 0.0)
+
+    def preview(self, tenant: str, priority: str = "interactive", cost: float = 1.0) -> Tuple[int, float]:
+        """ahead() for a job that put_nowait() would queue now, without queueing it."""
+        flow, finish = self._finish_tag(tenant, priority, cost)
+        return self._ranks.prefix((flow[0], finish, float("inf")))
+
+    def cost(self, job_id: str) -> Optional[float]:
+        """Cost a queued or running job was submitted with."""
+        entry = self._entries.get(job_id)
+        if entry is not None:
+            return entry.cost
+        running = self._running_jobs.get(job_id)
+        return running[1] if running is not None else None
+
+    def running_remaining(self) -> float:
+        """Predicted cost still to run for the running jobs (elapsed time subtracted, floored at 0)."""
+        now = time.monotonic()
+        return sum(max(0.0, cost - (now - start)) for _, cost, start in self._running_jobs.values())
+
+    def _at_cap(self, tenant: str) -> bool:
+        return 0 < self.max_running_per_tenant <= self._running.get(tenant, 0)
+
+    def _pop_ready(self) -> Optional[_Entry]:
+        while self._ready:
+            key, flow = self._ready[0]
+            queue = self._flows.get(flow)
+            if not queue or queue[0].key != key:
+                heapq.heappop(self._ready)
+                continue  # stale head
+            tenant = flow[1]
+            if self._at_cap(tenant):
+                heapq.heappop(self._ready)
+                self._parked.setdefault(tenant, set()).add(flow)
+                continue
+            entry = queue[0]
+            if self.prefer is not None and self.group_window > 0 and entry.group is not None:
+                entry = self._grouped(entry)
+            # Taking a flow's head leaves its heap entry stale; _unlink pushes the new head
+            self._unlink(entry)
+            self._running[entry.tenant] = self._running.get(entry.tenant, 0) + 1
+            self._running_jobs[entry.job_id] = (entry.tenant, entry.cost, time.monotonic())
+            # A grouped dispatch can run a higher tag first; the virtual time never goes back
+            self._vtime[entry.key[0]] = max(self._vtime[entry.key[0]], entry.key[1])
+            return entry
+        return None
+
+    def _grouped(self, head: _Entry) -> _Entry:
+        """
+        head, or the job to run instead when head's group is not preferred: the
+        lowest tag of head's class with a preferred group, within group_window
+        of head's tag. A linear scan, only made when head would need a swap.
+        """
+        preferred: Dict[Any, bool] = {}
+
+        def ok(group: Any) -> bool:
+            if group not in preferred:
+                preferred[group] = group is not None and bool(self.prefer(group))
+            return preferred[group]
+
+        if ok(head.group):
+            return head
+        best, limit = head, head.key[1] + self.group_window
+        for entry in self._entries.values():
+            if (entry.key[0] == head.key[0] and entry.key[1] <= limit and (best is head or entry.key < best.key)
+                    and not self._at_cap(entry.tenant) and ok(entry.group)):
+                best = entry
+        if best is not head:
+            self.grouped += 1
+        return best
+
+    async def get(self) -> Tuple[str, Any]:
+        """Wait for the next job to dispatch: (job_id, item)."""
+        while True:
+            entry = self._pop_ready()
+            if entry is not None:
+                return entry.job_id, entry.item
+            fut = asyncio.get_running_loop().create_future()
+            self._getters.append(fut)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    self._wake(1)  # pass on a wakeup this getter will not use
+                raise
+            finally:
+                if fut in self._getters:
+                    self._getters.remove(fut)
+
+    def remove(self, job_id: str) -> Optional[Any]:
+        """Drop a queued job (cancellation); returns its item, or None when it is not queued."""
+        entry = self._entries.get(job_id)
+        if entry is None:
+            return None
+        self._unlink(entry)
+        return entry.item
+
+    def _unlink(self, entry: _Entry) -> None:
+        """Take a queued entry out of its flow, the rank tree and the tenant's count."""
+        del self._entries[entry.job_id]
+        queue = self._flows[entry.flow]
+        was_head = queue[0] is entry
+        was_tail = queue[-1] is entry
+        queue.remove(entry)
+        if not queue:
+            del self._flows[entry.flow]
+            self._last_finish.pop(entry.flow, None)
+        else:
+            if was_tail:
+                # The next job of this flow is tagged after the remaining ones, not after the removed one
+                self._last_finish[entry.flow] = queue[-1].key[1]
+            if was_head:
+                heapq.heappush(self._ready, (queue[0].key, entry.flow))
+        self._ranks.remove(entry.key)
+        self._queued[entry.tenant] -= 1
+        if not self._queued[entry.tenant]:
+            del self._queued[entry.tenant]
+
+    def task_done(self, job_id: str) -> None:
+        """Release the running slot of a job returned by get()."""
+        running = self._running_jobs.pop(job_id, None)
+        if running is None:
+            return
+        tenant = running[0]
+        self._running[tenant] -= 1
+        if not self._running[tenant]:
+            del self._running[tenant]
+        for flow in self._parked.pop(tenant, ()):
+            queue = self._flows.get(flow)
+            if queue:
+                heapq.heappush(self._ready, (queue[0].key, flow))
+        self._wake(len(self._getters))
+
+    def _wake(self, n: int) -> None:
+        while n > 0 and self._getters:
+            fut = self._getters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                n -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        tenants = set(self._queued) | set(self._running)
+        by_priority = {name: 0 for name in PRIORITY_CLASSES}
+        for entry in self._entries.values():
+            by_priority[PRIORITY_CLASSES[entry.key[0]]] += 1
+        return {
+            "queued_by_priority": by_priority,
+            "grouped_dispatches": self.grouped,
+            "tenants": {
+                t: {"queued": self._queued.get(t, 0), "running": self._running.get(t, 0), "weight": self.weight(t)}
+                for t in sorted(tenants)
+            },
+        }
@@ -0,0 +1,429 @@
+"""Job stores for the API server.
+
+JobStore keeps job records in a process-local dict (lost on restart).
+SQLiteJobStore persists the same records, plus each job's request params and
+upload temp files, in a SQLite database in WAL mode, so a restarted server can
+re-enqueue the jobs that were still queued and report the ones that were
+running when it died as failed (retryable).
+
+The SQLite store is also the job queue shared by the processes of a split
+deployment (ACESTEP_API_ROLE): HTTP front processes insert queued jobs and
+model-worker processes claim them with claim_next().
+
+Cancellation: request_cancel() moves a queued job straight to "cancelled"; for
+a running job it only sets cancel_requested, and the process running it stops
+the job at its next check point and calls mark_cancelled().
+
+Final statuses stick: mark_running / mark_succeeded / mark_failed /
+mark_cancelled only change a queued or running job and return whether they
+did, so e.g. a result written after the job was cancelled does not overwrite
+"cancelled".
+"""
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+DEFAULT_MAX_AGE_SECONDS = 86400  # completed jobs older than this are cleaned up
+INTERRUPTED_ERROR = "Interrupted by server restart; the job can be resubmitted"
+CANCELLED_ERROR = "Cancelled by request"
+ACTIVE_STATUSES = ("queued", "running")  # the statuses a mark_* transition may leave
+
+
+@dataclass
+class JobRecord:
+    job_id: str
+    status: str  # "queued" | "running" | "succeeded" | "failed" | "cancelled"
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    env: str = "development"
+    params: Optional[Dict[str, Any]] = None  # request parameters, for re-enqueueing after a restart
+    temp_files: List[str] = field(default_factory=list)
+    retryable: bool = False  # failed through no fault of the request (e.g. server restart)
+    worker: Optional[str] = None  # model worker that claimed the job (split deployments)
+    cancel_requested: bool = False  # cancellation asked for while the job was running
+
+
+class JobStore:
+    """In-memory job store (single process, nothing survives a restart)."""
+
+    def __init__(self, max_age_seconds: int = DEFAULT_MAX_AGE_SECONDS) -> None:
+        self._lock = Lock()
+        self._jobs: Dict[str, JobRecord] = {}
+        self._max_age = max_age_seconds
+
+    def create(
+        self,
+        params: Optional[Dict[str, Any]] = None,
+        temp_files: Optional[List[str]] = None,
+        env: str = "development",
+    ) -> JobRecord:
+        return self.create_with_id(str(uuid4()), env=env, params=params, temp_files=temp_files)
+
+    def create_with_id(
+        self,
+        job_id: str,
+        env: str = "development",
+        params: Optional[Dict[str, Any]] = None,
+        temp_files: Optional[List[str]] = None,
+    ) -> JobRecord:
+        """Create job record with specified ID"""
+        rec = JobRecord(
+            job_id=job_id,
+            status="queued",
+            created_at=time.time(),
+            env=env,
+            params=params,
+            temp_files=list(temp_files or []),
+        )
+        self._insert(rec)
+        return rec
+
+    def _insert(self, rec: JobRecord) -> None:
+        with self._lock:
+            self._jobs[rec.job_id] = rec
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _transition(self, job_id: str, **fields: Any) -> bool:
+        """Set fields on a queued or running job; False (nothing changed) once it has finished."""
+        with self._lock:
+            rec = self._jobs[job_id]
+            if rec.status not in ACTIVE_STATUSES:
+                return False
+            for name, value in fields.items():
+                setattr(rec, name, value)
+            return True
+
+    def mark_running(self, job_id: str) -> bool:
+        return self._transition(job_id, status="running", started_at=time.time())
+
+    def mark_succeeded(self, job_id: str, result: Dict[str, Any]) -> bool:
+        return self._transition(job_id, status="succeeded", finished_at=time.time(), result=result, error=None)
+
+    def mark_failed(self, job_id: str, error: str, retryable: bool = False) -> bool:
+        return self._transition(
+            job_id, status="failed", finished_at=time.time(), result=None, error=error, retryable=retryable
+        )
+
+    def mark_cancelled(self, job_id: str, reason: str = CANCELLED_ERROR) -> bool:
+        return self._transition(job_id, status="cancelled", finished_at=time.time(), result=None, error=reason)
+
+    def request_cancel(self, job_id: str) -> Optional[str]:
+        """
+        Cancel a queued job, or flag a running one for its worker to stop.
+        Returns "cancelled", "running" (flagged), the status of a job that
+        already finished, or None for an unknown job.
+        """
+        with self._lock:
+            rec = self._jobs.get(job_id)
+            if rec is None:
+                return None
+            if rec.status == "queued":
+                rec.status = "cancelled"
+                rec.finished_at = time.time()
+                rec.error = CANCELLED_ERROR
+            elif rec.status == "running":
+                rec.cancel_requested = True
+            return rec.status
+
+    def recover(self) -> Tuple[List[JobRecord], List[str]]:
+        """(queued jobs to re-enqueue oldest first, ids of interrupted running jobs); nothing survives in memory."""
+        return [], []
+
+    def cleanup_old_jobs(self, max_age_seconds: Optional[int] = None) -> int:
+        """
+        Clean up completed jobs older than max_age_seconds.
+
+        Only removes jobs with status 'succeeded', 'failed' or 'cancelled'.
+        Jobs that are 'queued' or 'running' are never removed.
+
+        Returns the number of jobs removed.
+        """
+        max_age = max_age_seconds if max_age_seconds is not None else self._max_age
+        now = time.time()
+        removed = 0
+
+        with self._lock:
+            to_remove = []
+            for job_id, rec in self._jobs.items():
+                if rec.status in ("succeeded", "failed", "cancelled"):
+                    finish_time = rec.finished_at or rec.created_at
+                    age = now - finish_time
+                    if age > max_age:
+                        to_remove.append(job_id)
+
+            for job_id in to_remove:
+                del self._jobs[job_id]
+                removed += 1
+
+        return removed
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get statistics about jobs in the store."""
+        with self._lock:
+            stats = {
+                "total": len(self._jobs),
+                "queued": 0,
+                "running": 0,
+                "succeeded": 0,
+                "failed": 0,
+                "cancelled": 0,
+            }
+            for rec in self._jobs.values():
+                if rec.status in stats:
+                    stats[rec.status] += 1
+            return stats
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT,
+    env TEXT NOT NULL DEFAULT 'development',
+    params TEXT,
+    temp_files TEXT,
+    retryable INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_finished ON jobs(status, finished_at);
+"""
+
+_COLUMNS = "job_id, status, created_at, started_at, finished_at, result, error, env, params, temp_files, retryable, worker, cancel_requested"
+
+
+def _dumps(value: Any) -> Optional[str]:
+    return None if value is None else json.dumps(value, ensure_ascii=False)
+
+
+def _loads(value: Optional[str]) -> Any:
+    return None if value is None else json.loads(value)
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Job store persisted in a SQLite database (WAL mode).
+
+    Every status transition is committed before the call returns, so a killed
+    process loses nothing that was acknowledged. One connection is shared by
+    the server's threads behind a lock; other processes may open the same file.
+    """
+
+    def __init__(self, path: str, max_age_seconds: int = DEFAULT_MAX_AGE_SECONDS) -> None:
+        super().__init__(max_age_seconds=max_age_seconds)
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: a commit survives a process kill; only an OS crash can drop the last commits
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if columns and "worker" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN worker TEXT")
+        if columns and "cancel_requested" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0")
+        self._conn.executescript(_SCHEMA)
+        # Every terminal transition sets finished_at; rows written before that did not always
+        self._conn.execute(
+            "UPDATE jobs SET finished_at = created_at "
+            "WHERE status IN ('succeeded', 'failed', 'cancelled') AND finished_at IS NULL"
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql: str, args: tuple = ()) -> int:
+        """Run one statement (autocommit); returns the number of rows changed."""
+        with self._lock:
+            return self._conn.execute(sql, args).rowcount
+
+    def _fetchall(self, sql: str, args: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction taken up front, so concurrent processes serialize on it."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _record(row: tuple) -> JobRecord:
+        return JobRecord(
+            job_id=row[0],
+            status=row[1],
+            created_at=row[2],
+            started_at=row[3],
+            finished_at=row[4],
+            result=_loads(row[5]),
+            error=row[6],
+            env=row[7],
+            params=_loads(row[8]),
+            temp_files=_loads(row[9]) or [],
+            retryable=bool(row[10]),
+            worker=row[11],
+            cancel_requested=bool(row[12]),
+        )
+
+    def _insert(self, rec: JobRecord) -> None:
+        self._execute(
+            f"INSERT OR REPLACE INTO jobs ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (rec.job_id, rec.status, rec.created_at, rec.started_at, rec.finished_at, _dumps(rec.result),
+             rec.error, rec.env, _dumps(rec.params), _dumps(rec.temp_files), int(rec.retryable), rec.worker,
+             int(rec.cancel_requested)),
+        )
+
+    def _transition(self, job_id: str, sql: str, args: tuple) -> bool:
+        """Same as JobStore._transition, as one guarded UPDATE (other processes may finish the job too)."""
+        with self._lock:
+            changed = self._conn.execute(
+                f"UPDATE jobs SET {sql} WHERE job_id = ? AND status IN ({', '.join('?' * len(ACTIVE_STATUSES))})",
+                args + (job_id,) + ACTIVE_STATUSES,
+            ).rowcount
+            if not changed and self._conn.execute("SELECT 1 FROM jobs WHERE job_id = ?", (job_id,)).fetchone() is None:
+                raise KeyError(job_id)
+        return changed > 0
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        rows = self._fetchall(f"SELECT {_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,))
+        return self._record(rows[0]) if rows else None
+
+    def mark_running(self, job_id: str) -> bool:
+        return self._transition(job_id, "status = 'running', started_at = ?", (time.time(),))
+
+    def mark_succeeded(self, job_id: str, result: Dict[str, Any]) -> bool:
+        return self._transition(
+            job_id, "status = 'succeeded', finished_at = ?, result = ?, error = NULL", (time.time(), _dumps(result))
+        )
+
+    def mark_failed(self, job_id: str, error: str, retryable: bool = False) -> bool:
+        return self._transition(
+            job_id,
+            "status = 'failed', finished_at = ?, result = NULL, error = ?, retryable = ?",
+            (time.time(), error, int(retryable)),
+        )
+
+    def mark_cancelled(self, job_id: str, reason: str = CANCELLED_ERROR) -> bool:
+        return self._transition(
+            job_id, "status = 'cancelled', finished_at = ?, result = NULL, error = ?", (time.time(), reason)
+        )
+
+    def request_cancel(self, job_id: str) -> Optional[str]:
+        """Same as JobStore.request_cancel; atomic against claim_next() in other processes."""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            status = row[0]
+            if status == "queued":
+                conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', finished_at = ?, error = ? WHERE job_id = ?",
+                    (time.time(), CANCELLED_ERROR, job_id),
+                )
+                status = "cancelled"
+            elif status == "running":
+                conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE job_id = ?", (job_id,))
+        return status
+
+    def cancel_requested(self, worker: str) -> List[str]:
+        """Ids of worker's running jobs whose cancellation was requested."""
+        rows = self._fetchall(
+            "SELECT job_id FROM jobs WHERE status = 'running' AND worker = ? AND cancel_requested = 1", (worker,)
+        )
+        return [row[0] for row in rows]
+
+    def recover(self, worker: Optional[str] = None) -> Tuple[List[JobRecord], List[str]]:
+        """
+        Fail jobs that were running when the previous process died (retryable): all
+        of them, or only those claimed by worker. Returns the queued jobs, oldest
+        first, to re-enqueue and the failed job ids.
+        """
+        running = "status = 'running'" + ("" if worker is None else " AND worker = ?")
+        args = () if worker is None else (worker,)
+        with self._transaction() as conn:
+            interrupted = [row[0] for row in conn.execute(f"SELECT job_id FROM jobs WHERE {running}", args)]
+            conn.execute(
+                f"UPDATE jobs SET status = 'failed', finished_at = ?, error = ?, retryable = 1 WHERE {running}",
+                (time.time(), INTERRUPTED_ERROR) + args,
+            )
+            rows = conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE status = 'queued' ORDER BY created_at").fetchall()
+        return [self._record(row) for row in rows], interrupted
+
+    def claim_next(self, worker: str) -> Optional[JobRecord]:
+        """Atomically move the oldest queued job to running for worker; None when the queue is empty."""
+        with self._transaction() as conn:
+            row = conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            started_at = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, worker = ? WHERE job_id = ?",
+                (started_at, worker, row[0]),
+            )
+        rec = self._record(row)
+        rec.status, rec.started_at, rec.worker = "running", started_at, worker
+        return rec
+
+    def count_queued(self) -> int:
+        return self._fetchall("SELECT COUNT(*) FROM jobs WHERE status = 'queued'")[0][0]
+
+    def queue_position(self, job_id: str) -> int:
+        """1-based position among queued jobs (oldest first), 0 when the job is not queued."""
+        return self._fetchall(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at <= "
+            "(SELECT created_at FROM jobs WHERE job_id = ? AND status = 'queued')",
+            (job_id,),
+        )[0][0]
+
+    def average_duration(self, window: int) -> Optional[float]:
+        """Mean run time of the last window succeeded jobs, across all processes."""
+        return self._fetchall(
+            "SELECT AVG(finished_at - started_at) FROM (SELECT finished_at, started_at FROM jobs "
+            "WHERE status = 'succeeded' AND started_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?)",
+            (window,),
+        )[0][0]
+
+    def cleanup_old_jobs(self, max_age_seconds: Optional[int] = None) -> int:
+        """Delete succeeded/failed/cancelled jobs finished more than max_age_seconds ago (a range scan of the (status, finished_at) index)."""
+        max_age = max_age_seconds if max_age_seconds is not None else self._max_age
+        cutoff = time.time() - max_age
+        return self._execute(
+            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed', 'cancelled') AND finished_at < ?",
+            (cutoff,),
+        )
+
+    def get_stats(self) -> Dict[str, int]:
+        stats = {"total": 0, "queued": 0, "running": 0, "succeeded": 0, "failed": 0, "cancelled": 0}
+        for status, count in self._fetchall("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+            stats["total"] += count
+            if status in stats:
+                stats[status] += count
+        return stats
@@ -2,6 +2,7 @@
 5Hz LM (Language Model) Handler
 Handles all LM-related operations including initialization and generation
 """
+import atexit
 import os
 import traceback
 import time
@@ -20,6 +21,7 @@ from transformers.generation.logits_process import (
     RepetitionPenaltyLogitsProcessor,
 )
 from acestep.constrained_logits_processor import MetadataConstrainedLogitsProcessor
+from acestep.cancellation import JobCancelled, check_cancelled
 from acestep.constants import DEFAULT_LM_INSTRUCTION, DEFAULT_LM_UNDERSTAND_INSTRUCTION, DEFAULT_LM_INSPIRED_INSTRUCTION, DEFAULT_LM_REWRITE_INSTRUCTION
 from acestep.gpu_config import get_lm_gpu_memory_ratio, get_gpu_memory_gb, get_lm_model_size, get_global_gpu_config
 
@@ -42,6 +44,13 @@ class LLMHandler:
         self.device = "cpu"
         self.dtype = torch.float32
         self.offload_to_cpu = False
+        # nano-vllm speculative decoding (n-gram drafts verified per forward); 0 disables
+        self.num_speculative_tokens = 0
+        self.kv_cache_dtype = "auto"
+        self.last_speculative_stats: Optional[Dict[str, Any]] = None
+        # Generated (completion) token IDs of the last backend call, one list per prompt
+        self.last_output_token_ids: Optional[List[List[int]]] = None
+        self.tokens_generated = 0  # completion tokens over all backend calls, for /metrics
 
         # HuggingFace Space persistent storage support
         if persistent_storage_path is None and self.IS_HUGGINGFACE_SPACE:
@@ -317,6 +326,8 @@ class LLMHandler:
         device: str = "auto",
         offload_to_cpu: bool = False,
         dtype: Optional[torch.dtype] = None,
+        num_speculative_tokens: int = 0,
+        kv_cache_dtype: str = "auto",
     ) -> Tuple[str, bool]:
         """
         Initialize 5Hz LM model
@@ -328,6 +339,10 @@ class LLMHandler:
             device: Device type ("auto", "cuda", or "cpu")
             offload_to_cpu: Whether to offload to CPU
             dtype: Data type (if None, auto-detect based on device)
+            num_speculative_tokens: Draft tokens verified per forward by the vllm
+                backend (n-gram lookup over previous codes). 0 disables.
+            kv_cache_dtype: KV cache storage for the vllm backend: "auto" (model dtype),
+                "int8" or "fp8". 8-bit caches roughly double concurrent sequences.
         
         Returns:
             (status_message, success)
@@ -343,6 +358,8 @@ class LLMHandler:
 
             self.device = device
             self.offload_to_cpu = offload_to_cpu
+            self.num_speculative_tokens = max(0, int(num_speculative_tokens or 0))
+            self.kv_cache_dtype = kv_cache_dtype or "auto"
             # Set dtype based on device: bfloat16 for cuda, float32 for cpu
             if dtype is None:
                 self.dtype = torch.bfloat16 if device in ["cuda", "xpu"] else torch.float32
@@ -441,7 +458,7 @@ class LLMHandler:
             else:
                 self.max_model_len = 4096
             
-            logger.info(f"Initializing 5Hz LM with model: {model_path}, enforce_eager: False, tensor_parallel_size: 1, max_model_len: {self.max_model_len}, gpu_memory_utilization: {gpu_memory_utilization:.3f}")
+            logger.info(f"Initializing 5Hz LM with model: {model_path}, enforce_eager: False, tensor_parallel_size: 1, max_model_len: {self.max_model_len}, gpu_memory_utilization: {gpu_memory_utilization:.3f}, num_speculative_tokens: {self.num_speculative_tokens}, kv_cache_dtype: {self.kv_cache_dtype}")
             start_time = time.time()
             self.llm = LLM(
                 model=model_path,
@@ -450,8 +467,16 @@ class LLMHandler:
                 max_model_len=self.max_model_len,
                 gpu_memory_utilization=gpu_memory_utilization,
                 tokenizer=self.llm_tokenizer,
+                num_speculative_tokens=self.num_speculative_tokens,
+                kv_cache_dtype=self.kv_cache_dtype,
             )
             logger.info(f"5Hz LM initialized successfully in {time.time() - start_time:.2f} seconds")
+            kv_info = getattr(self.llm, "kv_cache_info", None)
+            if kv_info:
+                logger.info(
+                    f"5Hz LM KV cache: {kv_info['num_blocks']} blocks ({kv_info['kv_cache_dtype']}, {kv_info['memory_gb']:.2f} GB), "
+                    f"max concurrent sequences: {kv_info['max_concurrent_seqs']} (CFG uses 2 per request)"
+                )
             self.llm_initialized = True
             self.llm_backend = "vllm"
             return f"✅ 5Hz LM initialized successfully\nModel: {model_path}\nDevice: {device_name}\nGPU Memory Utilization: {gpu_memory_utilization:.3f}\nLow GPU Memory Mode: {low_gpu_memory_mode}"
@@ -556,21 +581,36 @@ class LLMHandler:
                 formatted_prompt_list,
                 sampling_params,
                 unconditional_prompts=unconditional_prompts,
+                stop_check=check_cancelled,
             )
         else:
-            outputs = self.llm.generate(formatted_prompt_list, sampling_params)
+            outputs = self.llm.generate(formatted_prompt_list, sampling_params, stop_check=check_cancelled)
+
+        if getattr(self.llm, "drafter", None) is not None:
+            self.last_speculative_stats = self.llm.spec_stats.as_dict()
+            logger.info(
+                f"Speculative decoding: acceptance rate {self.last_speculative_stats['acceptance_rate']:.3f}, "
+                f"{self.last_speculative_stats['tokens_per_forward']:.2f} tokens/forward"
+            )
 
         # Extract text from outputs
         output_texts = []
+        output_token_ids = []
         for output in outputs:
             if hasattr(output, "outputs") and len(output.outputs) > 0:
                 output_texts.append(output.outputs[0].text)
+                output_token_ids.append(list(getattr(output.outputs[0], "token_ids", None) or []))
             elif hasattr(output, "text"):
                 output_texts.append(output.text)
+                output_token_ids.append(list(getattr(output, "token_ids", None) or []))
             elif isinstance(output, dict) and "text" in output:
                 output_texts.append(output["text"])
+                output_token_ids.append(list(output.get("token_ids") or []))
             else:
                 output_texts.append(str(output))
+                output_token_ids.append([])
+        self.last_output_token_ids = output_token_ids
+        self.tokens_generated += sum(len(ids) for ids in output_token_ids)
 
         # Return single string for single mode, list for batch mode
         return output_texts[0] if not is_batch else output_texts
@@ -738,6 +778,8 @@ class LLMHandler:
         if generated_ids.is_cuda:
             generated_ids = generated_ids.cpu()
         
+        self.last_output_token_ids = [generated_ids.tolist()]
+        self.tokens_generated += len(self.last_output_token_ids[0])
         output_text = self.llm_tokenizer.decode(generated_ids, skip_special_tokens=False)
         return output_text
 
@@ -776,6 +818,7 @@ class LLMHandler:
         # For batch mode, process each item sequentially with different seeds
         if is_batch:
             output_texts = []
+            output_token_ids = []
             for i, formatted_prompt in enumerate(formatted_prompt_list):
                 # Set seed for this item if provided
                 if seeds and i < len(seeds):
@@ -807,7 +850,9 @@ class LLMHandler:
                 )
                 
                 output_texts.append(output_text)
+                output_token_ids.extend(self.last_output_token_ids or [[]])
             
+            self.last_output_token_ids = output_token_ids
             return output_texts
 
         # Single mode: process the formatted prompt
@@ -915,6 +960,8 @@ class LLMHandler:
             Dictionary containing:
                 - metadata: Dict or List[Dict] - Generated metadata
                 - audio_codes: str or List[str] - Generated audio codes
+                - audio_code_ids: torch.Tensor or List[torch.Tensor] - Generated codes as int64
+                  tensors (None when token IDs were unavailable; use audio_codes then)
                 - success: bool - Whether generation succeeded
                 - error: Optional[str] - Error message if failed
                 - extra_outputs: Dict with time_costs and other info
@@ -1054,6 +1101,7 @@ class LLMHandler:
         else:
             logger.info("Phase 2: Generating audio codes...")
         phase2_start = time.time()
+        self.last_speculative_stats = None
         
         # Format metadata as CoT using YAML (matching training format)
         cot_text = self._format_metadata_as_cot(metadata)
@@ -1062,6 +1110,7 @@ class LLMHandler:
         formatted_prompt_with_cot = self.build_formatted_prompt_with_cot(caption, lyrics, cot_text)
         logger.info(f"generate_with_stop_condition: formatted_prompt_with_cot={formatted_prompt_with_cot}")
         
+        check_cancelled()
         progress(0.5, f"Phase 2: Generating audio codes for {actual_batch_size} items...")
         if is_batch:
             # Batch mode: generate codes for all items
@@ -1105,6 +1154,8 @@ class LLMHandler:
                         cot_text=cot_text,
                         seeds=seeds,
                     )
+            except JobCancelled:
+                raise
             except Exception as e:
                 error_msg = f"Error in batch codes generation: {str(e)}"
                 logger.error(error_msg)
@@ -1122,24 +1173,33 @@ class LLMHandler:
                     },
                 }
             
-            # Parse audio codes from each output
+            # Map generated token IDs straight to code tensors; the string form is
+            # only kept for API responses and saved params
+            audio_code_ids_list = self._take_output_audio_codes(len(codes_outputs))
             audio_codes_list = []
             metadata_list = []
-            for output_text in codes_outputs:
-                _, audio_codes_item = self.parse_lm_output(output_text)
+            for i, output_text in enumerate(codes_outputs):
+                if audio_code_ids_list is not None:
+                    audio_codes_item = self.audio_codes_to_string(audio_code_ids_list[i])
+                else:
+                    _, audio_codes_item = self.parse_lm_output(output_text)
                 audio_codes_list.append(audio_codes_item)
                 metadata_list.append(metadata.copy())  # Same metadata for all
             
             phase2_time = time.time() - phase2_start
             
             # Log results
-            codes_counts = [len(codes.split('<|audio_code_')) - 1 if codes else 0 for codes in audio_codes_list]
+            if audio_code_ids_list is not None:
+                codes_counts = [int(ids.numel()) for ids in audio_code_ids_list]
+            else:
+                codes_counts = [len(codes.split('<|audio_code_')) - 1 if codes else 0 for codes in audio_codes_list]
             logger.info(f"Batch Phase 2 completed in {phase2_time:.2f}s. Generated codes: {codes_counts}")
             
             total_time = phase1_time + phase2_time
             return {
                 "metadata": metadata_list,
                 "audio_codes": audio_codes_list,
+                "audio_code_ids": audio_code_ids_list,
                 "success": True,
                 "error": None,
                 "extra_outputs": {
@@ -1150,6 +1210,7 @@ class LLMHandler:
                     },
                     "codes_counts": codes_counts,
                     "total_codes": sum(codes_counts),
+                    "speculative": self.last_speculative_stats,
                 },
             }
         else:
@@ -1196,16 +1257,22 @@ class LLMHandler:
             
             phase2_time = time.time() - phase2_start
             
-            # Parse audio codes from output (metadata should be same as Phase 1)
-            _, audio_codes = self.parse_lm_output(codes_output_text)
-            
-            codes_count = len(audio_codes.split('<|audio_code_')) - 1 if audio_codes else 0
+            # Map generated token IDs straight to a code tensor (metadata is the same as Phase 1)
+            audio_code_ids_list = self._take_output_audio_codes(1)
+            audio_code_ids = audio_code_ids_list[0] if audio_code_ids_list is not None else None
+            if audio_code_ids is not None:
+                audio_codes = self.audio_codes_to_string(audio_code_ids)
+                codes_count = int(audio_code_ids.numel())
+            else:
+                _, audio_codes = self.parse_lm_output(codes_output_text)
+                codes_count = len(audio_codes.split('<|audio_code_')) - 1 if audio_codes else 0
             logger.info(f"Phase 2 completed in {phase2_time:.2f}s. Generated {codes_count} audio codes")
             
             total_time = phase1_time + phase2_time
             return {
                 "metadata": metadata,
                 "audio_codes": audio_codes,
+                "audio_code_ids": audio_code_ids,
                 "success": True,
                 "error": None,
                 "extra_outputs": {
@@ -1215,6 +1282,7 @@ class LLMHandler:
                         "total_time": total_time,
                     },
                     "codes_count": codes_count,
+                    "speculative": self.last_speculative_stats,
                 },
             }
     
@@ -2014,6 +2082,8 @@ class LLMHandler:
             elif hasattr(torch, 'xpu') and torch.xpu.is_available():
                 torch.xpu.empty_cache()
                 torch.xpu.synchronize()
+            if isinstance(e, JobCancelled):
+                raise
             return "", f"❌ Error generating from formatted prompt: {e}"
     
     def _generate_with_constrained_decoding(
@@ -2060,6 +2130,7 @@ class LLMHandler:
         
         with torch.no_grad():
             for step in tqdm(range(max_new_tokens), desc="LLM Constrained Decoding", unit="token"):
+                check_cancelled()
                 # Forward pass
                 outputs = self._forward_pass(model, generated_ids, model_kwargs, past_key_values, use_cache)
                 
@@ -2165,6 +2236,7 @@ class LLMHandler:
         
         with torch.no_grad():
             for step in tqdm(range(max_new_tokens), desc="LLM CFG Generation", unit="token"):
+                check_cancelled()
                 # Forward pass for the entire batch (conditional + unconditional)
                 outputs = self._forward_pass(model, generated_ids, model_kwargs, past_key_values, use_cache)
                 
@@ -2229,6 +2301,76 @@ class LLMHandler:
         # The caller will extract only the conditional output
         return generated_ids
     
+    def kv_cache_usage(self) -> Optional[float]:
+        """Fraction of nano-vllm KV cache blocks in use right now; None for the pt backend or before init."""
+        if self.llm_backend != "vllm" or not self.llm_initialized:
+            return None
+        block_manager = getattr(getattr(self.llm, "scheduler", None), "block_manager", None)
+        if block_manager is None or not block_manager.blocks:
+            return None
+        return len(block_manager.used_block_ids) / len(block_manager.blocks)
+
+    def memory_footprint(self) -> int:
+        """Bytes of the LM weights, plus the KV cache the vllm backend preallocates; 0 before init."""
+        if not self.llm_initialized or self.llm is None:
+            return 0
+        kv_bytes = 0
+        model = self.llm
+        if self.llm_backend == "vllm":
+            model = self.llm.model_runner.model
+            kv_info = getattr(self.llm, "kv_cache_info", None) or {}
+            kv_bytes = int(kv_info.get("memory_gb", 0.0) * 1024**3)
+        return kv_bytes + sum(t.numel() * t.element_size() for t in list(model.parameters()) + list(model.buffers()))
+
+    def offload_model(self):
+        """Move the pt backend's model to host memory; the vllm engine cannot move, unload() it instead."""
+        if self.llm_backend != "pt":
+            raise RuntimeError(f"The {self.llm_backend} backend cannot be offloaded to CPU")
+        self.llm.to("cpu")
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        elif hasattr(torch, "xpu") and torch.xpu.is_available():
+            torch.xpu.empty_cache()
+
+    def restore_model(self):
+        """Undo offload_model() (with offload_to_cpu the model lives on the CPU between calls anyway)."""
+        if self.llm_backend == "pt" and not self.offload_to_cpu:
+            self.llm.to(self.device).to(self.dtype)
+
+    def unload(self):
+        """Free the LM, and for vllm its KV cache and process group; initialize() loads it again."""
+        if self.llm_backend == "vllm" and self.llm is not None:
+            # The engine registers exit() at interpreter shutdown; it must not run twice
+            atexit.unregister(self.llm.exit)
+            self.llm.exit()
+        self.llm = None
+        self.llm_tokenizer = None
+        self.constrained_processor = None
+        self._hf_model_for_scoring = None
+        self.llm_initialized = False
+        self.llm_backend = None
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        elif hasattr(torch, "xpu") and torch.xpu.is_available():
+            torch.xpu.empty_cache()
+        logger.info("5Hz LM unloaded")
+
+    def _take_output_audio_codes(self, expected: int) -> Optional[List[torch.Tensor]]:
+        """Convert the last backend call's token IDs to code tensors, or None to fall back to text parsing."""
+        token_ids, self.last_output_token_ids = self.last_output_token_ids, None
+        if token_ids is None or len(token_ids) != expected:
+            return None
+        if self.constrained_processor is None or self.constrained_processor.audio_code_lookup is None:
+            return None
+        return [self.constrained_processor.token_ids_to_audio_codes(ids) for ids in token_ids]
+
+    @staticmethod
+    def audio_codes_to_string(audio_code_ids: Union[torch.Tensor, List[int]]) -> str:
+        """Serialize code values as <|audio_code_N|> tokens (API responses, saved params)."""
+        if isinstance(audio_code_ids, torch.Tensor):
+            audio_code_ids = audio_code_ids.reshape(-1).tolist()
+        return "".join(f"<|audio_code_{int(code)}|>" for code in audio_code_ids)
+
     def parse_lm_output(self, output_text: str) -> Tuple[Dict[str, Any], str]:
         """
         Parse LM output to extract metadata and audio codes.
@@ -0,0 +1,148 @@
+"""
+Bounded worker pool for synchronous LM requests made by API endpoints.
+
+/format_input used to initialize the LM and run format_sample inside its async
+handler, which blocks the event loop: /health, /query_result and every other
+request stall until the LM call returns. LLMRequestPool runs such calls on a
+dedicated thread instead, behind a small queue of its own (separate from the
+music-generation queue):
+
+- a full queue rejects new requests right away (LLMPoolBusy -> 429);
+- a caller waits at most `timeout` seconds (asyncio.TimeoutError -> 504); the
+  LM call itself cannot be interrupted, its result is dropped;
+- requests that arrive within `batch_window` seconds of each other are
+  dispatched together (up to `max_batch`): setup (e.g. lazy LM
+  initialization) runs once per batch, identical requests run once and share
+  the result, and callers that already gave up are skipped.
+
+The LM's constrained decoder keeps a single FSM state, so a batch runs its
+distinct requests one after another in the worker thread rather than as one
+LM forward.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class LLMPoolBusy(Exception):
+    """The pool's queue is full."""
+
+
+class LLMRequestPool:
+    """
+    Usage:
+        pool = LLMRequestPool(run_one, setup=ensure_llm_ready)
+        await pool.start()
+        result = await pool.submit(payload)  # payload must be hashable
+        await pool.stop()
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[Hashable], Any],
+        setup: Optional[Callable[[], None]] = None,
+        max_queue: int = 16,
+        max_batch: int = 8,
+        batch_window: float = 0.01,
+        timeout: float = 120.0,
+        name: str = "acestep-llm",
+    ) -> None:
+        self.fn = fn
+        self.setup = setup
+        self.max_batch = max(1, max_batch)
+        self.batch_window = batch_window
+        self.timeout = timeout
+        self._queue: "asyncio.Queue[Tuple[Hashable, asyncio.Future]]" = asyncio.Queue(maxsize=max(1, max_queue))
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.avg_call_seconds: Optional[float] = None
+        self.counters = {"requests": 0, "batches": 0, "lm_calls": 0, "coalesced": 0, "rejected": 0, "timeouts": 0}
+
+    async def start(self) -> None:
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def submit(self, payload: Hashable) -> Any:
+        """Run fn(payload) on the pool thread; raises LLMPoolBusy, asyncio.TimeoutError or fn's exception."""
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((payload, fut))
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            raise LLMPoolBusy(f"LM busy: {self._queue.qsize()} requests waiting")
+        self.counters["requests"] += 1
+        try:
+            return await asyncio.wait_for(fut, self.timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise
+
+    async def _collect(self) -> List[Tuple[Hashable, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Callers that timed out or disconnected while queued need no LM call
+        return [(payload, fut) for payload, fut in batch if not fut.done()]
+
+    def _run_batch(self, payloads: List[Hashable]) -> List[Tuple[bool, Any]]:
+        if self.setup is not None:
+            self.setup()
+        results = []
+        for payload in payloads:
+            try:
+                results.append((True, self.fn(payload)))
+            except Exception as e:
+                results.append((False, e))
+        return results
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            waiters: Dict[Hashable, List[asyncio.Future]] = {}
+            for payload, fut in batch:
+                waiters.setdefault(payload, []).append(fut)
+            payloads = list(waiters)
+            self.counters["batches"] += 1
+            self.counters["lm_calls"] += len(payloads)
+            self.counters["coalesced"] += len(batch) - len(payloads)
+            started = time.monotonic()
+            try:
+                results = await loop.run_in_executor(self._executor, self._run_batch, payloads)
+                per_call = (time.monotonic() - started) / len(payloads)
+                self.avg_call_seconds = per_call if self.avg_call_seconds is None else (
+                    0.8 * self.avg_call_seconds + 0.2 * per_call)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                results = [(False, e)] * len(payloads)
+            for payload, (ok, value) in zip(payloads, results):
+                for fut in waiters[payload]:
+                    if fut.done():
+                        continue
+                    if ok:
+                        fut.set_result(value)
+                    else:
+                        fut.set_exception(value)
+
+    def retry_after(self) -> float:
+        """Seconds until the queued requests should have drained."""
+        return self._queue.qsize() * (self.avg_call_seconds or 1.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"queued": self._queue.qsize(), "avg_call_seconds": self.avg_call_seconds, **self.counters}
@@ -0,0 +1,325 @@
+"""
+Registry of named LoRA adapters attached to one PEFT-wrapped DiT decoder.
+
+All adapters live side by side in the same PeftModel: the first load wraps the
+decoder in place (LoRA layers hold references to the original base weights, no
+copy is made), later loads add adapters next to it. Switching the active adapter,
+its scale or enabling/disabling LoRA only walks a precomputed list of LoRA layers,
+so per-request adapter selection costs microseconds instead of a module-tree walk
+or a decoder deepcopy. Unloading the last adapter removes the LoRA layers and
+returns the untouched base decoder.
+
+Optionally, inactive adapters are kept in host memory and moved to the decoder
+device when activated (ACESTEP_LORA_OFFLOAD_INACTIVE).
+
+MixedAdapterBatch (registry.mixed_batch) lets the rows of one decoder batch use
+different adapters, so requests with different LoRAs can share a forward.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import torch
+import torch.nn as nn
+from loguru import logger
+
+from acestep.module_hooks import ForwardWrapperHandle, wrap_forward
+
+
+@dataclass
+class _Adapter:
+    path: str
+    # (LoRA layer, scaling from the adapter config) for every layer this adapter touches
+    layers: List[Tuple[nn.Module, float]] = field(default_factory=list)
+
+
+def _is_lora_layer(module: nn.Module) -> bool:
+    return isinstance(getattr(module, "lora_A", None), nn.ModuleDict) and isinstance(getattr(module, "scaling", None), dict)
+
+
+def _base_device(layer: nn.Module) -> torch.device:
+    return next(layer.get_base_layer().parameters()).device
+
+
+def _adapter_modules(layer: nn.Module, name: str) -> List[nn.Module]:
+    modules = []
+    for attr in getattr(layer, "adapter_layer_names", ("lora_A", "lora_B")):
+        container = getattr(layer, attr, None)
+        if container is not None and name in container:
+            modules.append(container[name])
+    return modules
+
+
+class LoRAAdapterRegistry:
+    """
+    Named LoRA adapters on a single PEFT-wrapped decoder.
+
+    Usage:
+        registry = LoRAAdapterRegistry(dtype=torch.bfloat16)
+        model.decoder = registry.load(model.decoder, "jazz", "/loras/jazz")
+        model.decoder = registry.load(model.decoder, "lofi", "/loras/lofi")
+        registry.activate("jazz", scale=0.8)
+        model.decoder = registry.unload(model.decoder)  # back to the base decoder
+    """
+
+    def __init__(
+        self,
+        dtype: Optional[torch.dtype] = None,
+        max_adapters: int = 4,
+        offload_inactive: bool = False,
+    ):
+        self.dtype = dtype
+        self.max_adapters = max(1, max_adapters)
+        self.offload_inactive = offload_inactive
+        self.adapters: "OrderedDict[str, _Adapter]" = OrderedDict()
+        self.active: Optional[str] = None
+        self.scale = 1.0
+        self.enabled = True
+        self._model = None  # PeftModel wrapping the decoder
+        self._layers: List[nn.Module] = []
+        self._mixed: Optional[Tuple] = None  # ((adapter, scale) per row) while a MixedAdapterBatch is active
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.adapters
+
+    def __len__(self) -> int:
+        return len(self.adapters)
+
+    def state(self) -> Tuple:
+        """(active adapter, scale, enabled); None adapter when nothing is loaded."""
+        return (self.active if self.adapters else None, self.scale, self.enabled)
+
+    def cache_key(self) -> Tuple:
+        """What the decoder computes with: state() plus the per-row (adapter, scale) pairs of an active mixed batch."""
+        return self.state(), self._mixed
+
+    # -- loading ------------------------------------------------------------
+
+    def load(self, decoder: nn.Module, name: str, path: str) -> nn.Module:
+        """Attach the adapter at path under name and activate it; returns the (wrapped) decoder."""
+        from peft import PeftModel
+
+        if name in self.adapters:
+            decoder = self.unload(decoder, name)
+        while len(self.adapters) >= self.max_adapters:
+            evicted = next(n for n in self.adapters if n != self.active) if len(self.adapters) > 1 else self.active
+            logger.info(f"[LoRA] Evicting adapter '{evicted}' (max {self.max_adapters} resident)")
+            decoder = self.unload(decoder, evicted)
+
+        if self._model is None:
+            # Wraps the decoder in place: LoRA layers reference the base weights, nothing is copied
+            self._model = PeftModel.from_pretrained(decoder, path, adapter_name=name, is_trainable=False)
+            self._model.eval()
+        else:
+            self._model.load_adapter(path, adapter_name=name, is_trainable=False)
+        self._layers = [m for m in self._model.modules() if _is_lora_layer(m)]
+
+        adapter = _Adapter(path=path)
+        for layer in self._layers:
+            if name in layer.lora_A:
+                adapter.layers.append((layer, layer.scaling[name]))
+                for module in _adapter_modules(layer, name):
+                    module.to(device=_base_device(layer), dtype=self.dtype).requires_grad_(False)
+        if not adapter.layers:
+            self._discard(name)
+            raise ValueError(f"LoRA adapter '{name}' at {path} matched no decoder layers")
+        self.adapters[name] = adapter
+        logger.info(f"[LoRA] Loaded adapter '{name}' from {path} ({len(adapter.layers)} layers)")
+        self.activate(name, scale=1.0)
+        self.set_enabled(True)
+        return self._model
+
+    def unload(self, decoder: nn.Module, name: Optional[str] = None) -> nn.Module:
+        """Remove one adapter (or all when name is None); returns the decoder to install."""
+        if self._model is None:
+            if name is not None:
+                raise KeyError(f"LoRA adapter '{name}' is not loaded")
+            return decoder
+        if name is not None and name not in self.adapters:
+            raise KeyError(f"LoRA adapter '{name}' is not loaded (loaded: {list(self.adapters)})")
+        names = list(self.adapters) if name is None else [name]
+        if len(names) >= len(self.adapters):
+            # Last adapter: drop the LoRA layers and hand back the original, unmerged decoder
+            base = self._model.unload()
+            self._model = None
+            self._layers = []
+            self.adapters.clear()
+            self.active = None
+            self.scale = 1.0
+            self.enabled = True
+            logger.info("[LoRA] All adapters unloaded, base decoder restored")
+            return base
+        for n in names:
+            if n == self.active:
+                self.activate(next(other for other in self.adapters if other != n))
+            self._model.delete_adapter(n)
+            del self.adapters[n]
+            logger.info(f"[LoRA] Unloaded adapter '{n}'")
+        self._layers = [m for m in self._model.modules() if _is_lora_layer(m)]
+        # delete_adapter re-activates adapters on its own; put the registry's choice back
+        self.activate(self.active, self.scale)
+        return self._model
+
+    def _discard(self, name: str):
+        """Drop an adapter PEFT attached but the registry did not take on (a failed load)."""
+        if not self.adapters:
+            # It was the first adapter: unwrapping undoes the in-place wrap of the caller's decoder
+            self._model.unload()
+            self._model = None
+            self._layers = []
+            return
+        self._model.delete_adapter(name)
+        self._layers = [m for m in self._model.modules() if _is_lora_layer(m)]
+        self.activate(self.active, self.scale)
+
+    # -- switching: O(#LoRA layers) -------------------------------------------
+
+    def activate(self, name: str, scale: Optional[float] = None):
+        """Make name the active adapter (optionally with a new scale)."""
+        if name not in self.adapters:
+            raise KeyError(f"LoRA adapter '{name}' is not loaded (loaded: {list(self.adapters)})")
+        previous = self.active
+        if self.offload_inactive and previous not in (None, name) and previous in self.adapters:
+            self._move(previous, "cpu")
+        if self.offload_inactive:
+            self._move(name)
+        for layer in self._layers:
+            layer.set_adapter(name)
+            for module in _adapter_modules(layer, name):
+                module.requires_grad_(False)
+        self._model.base_model.active_adapter = name
+        self.active = name
+        self.adapters.move_to_end(name)
+        self.set_scale(self.scale if scale is None else scale)
+
+    def set_scale(self, scale: float):
+        """Scale the active adapter relative to its configured alpha / r."""
+        self.scale = scale
+        if self.active is None:
+            return
+        for layer, base_scaling in self.adapters[self.active].layers:
+            layer.scaling[self.active] = base_scaling * scale
+
+    def set_enabled(self, enabled: bool):
+        """Enable or bypass all LoRA layers without unloading anything."""
+        self.enabled = enabled
+        for layer in self._layers:
+            layer.enable_adapters(enabled)
+
+    def _move(self, name: str, device: Optional[str] = None):
+        """Move an adapter's weights to device (default: next to each layer's base weight)."""
+        for layer, _ in self.adapters[name].layers:
+            for module in _adapter_modules(layer, name):
+                module.to(device or _base_device(layer))
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "adapters": {name: adapter.path for name, adapter in self.adapters.items()},
+            "active_adapter": self.active,
+            "scale": self.scale,
+            "enabled": self.enabled,
+        }
+
+    def mixed_batch(self, adapter_names: Sequence[Optional[str]], scales: Optional[Sequence[float]] = None) -> "MixedAdapterBatch":
+        """Context manager running one decoder batch with a different adapter per row."""
+        return MixedAdapterBatch(self, adapter_names, scales)
+
+
+class MixedAdapterBatch:
+    """
+    Per-row LoRA selection inside one decoder forward (segmented LoRA, as in punica / S-LoRA).
+
+    Row i of every decoder call uses adapter_names[i] (None = base model only) at
+    scales[i]. While active, each LoRA layer computes the base projection for the
+    whole batch once, then for each adapter gathers its rows, applies that adapter's
+    low-rank update and scatters it back:
+
+        y = W x;  y[rows_a] += s_rows * scaling_a * B_a(A_a(x[rows_a]))
+
+    Calls whose batch is a multiple of len(adapter_names) (e.g. the [cond; uncond]
+    CFG batch) repeat the row assignment for each chunk. This is the reference
+    implementation; the per-adapter gather/scatter segments are computed once per
+    batch size and shared by all layers.
+    """
+
+    def __init__(self, registry: LoRAAdapterRegistry, adapter_names: Sequence[Optional[str]], scales: Optional[Sequence[float]] = None):
+        if isinstance(adapter_names, str):
+            if scales is None:
+                raise ValueError("a mixed batch needs one adapter name per row, or one name and a list of scales")
+            # One adapter at a different scale per row
+            adapter_names = [adapter_names] * len(scales)
+        unknown = sorted({n for n in adapter_names if n is not None and n not in registry.adapters})
+        if unknown:
+            raise KeyError(f"LoRA adapters not loaded: {unknown} (loaded: {list(registry.adapters)})")
+        scales = [1.0] * len(adapter_names) if scales is None else list(scales)
+        if len(scales) != len(adapter_names):
+            raise ValueError(f"got {len(scales)} LoRA scales for {len(adapter_names)} rows")
+        self.registry = registry
+        self.adapter_names = list(adapter_names)
+        self.scales = scales
+        self.used = list(dict.fromkeys(n for n in adapter_names if n is not None))
+        self._segments: Dict[Tuple[int, torch.device], List[Tuple[str, torch.Tensor, torch.Tensor]]] = {}
+        self._handles = []
+
+    def _segments_for(self, batch: int, device: torch.device):
+        key = (batch, device)
+        segments = self._segments.get(key)
+        if segments is None:
+            rows = len(self.adapter_names)
+            if batch % rows:
+                raise ValueError(f"decoder batch {batch} is not a multiple of the {rows} LoRA row assignments")
+            names = self.adapter_names * (batch // rows)
+            scales = self.scales * (batch // rows)
+            segments = []
+            for name in self.used:
+                index = [i for i, n in enumerate(names) if n == name]
+                segments.append((
+                    name,
+                    torch.tensor(index, device=device),
+                    torch.tensor([scales[i] for i in index], device=device),
+                ))
+            self._segments[key] = segments
+        return segments
+
+    def _wrap_layer(self, layer: nn.Module, base_scaling: Dict[str, float]) -> ForwardWrapperHandle:
+        def forward(original_forward, x, *args, **kwargs):
+            result = layer.base_layer(x, *args, **kwargs)
+            for name, index, row_scales in self._segments_for(x.shape[0], x.device):
+                if name not in base_scaling:
+                    continue
+                lora_A = layer.lora_A[name]
+                rows = x.index_select(0, index).to(lora_A.weight.dtype)
+                delta = layer.lora_B[name](lora_A(layer.lora_dropout[name](rows)))
+                scale = (row_scales * base_scaling[name]).to(delta.dtype).view(-1, *([1] * (delta.dim() - 1)))
+                result = result.index_add(0, index, (delta * scale).to(result.dtype))
+            return result
+
+        return wrap_forward(layer, forward)
+
+    def __enter__(self):
+        registry = self.registry
+        per_layer: Dict[int, Dict[str, float]] = {}
+        for name in self.used:
+            if registry.offload_inactive:
+                registry._move(name)
+            for layer, base_scaling in registry.adapters[name].layers:
+                if getattr(layer, "use_dora", {}).get(name):
+                    raise ValueError(f"LoRA adapter '{name}' uses DoRA, which mixed batches do not support")
+                per_layer.setdefault(id(layer), {})[name] = base_scaling
+        for layer in registry._layers:
+            self._handles.append(self._wrap_layer(layer, per_layer.get(id(layer), {})))
+        registry._mixed = tuple(zip(self.adapter_names, self.scales))
+        return self
+
+    def __exit__(self, *exc):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+        self._segments.clear()
+        registry = self.registry
+        registry._mixed = None
+        if registry.offload_inactive:
+            for name in self.used:
+                if name != registry.active:
+                    registry._move(name, "cpu")
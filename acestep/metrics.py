@@ -0,0 +1,276 @@
+"""
+In-process metrics in the Prometheus text exposition format (version 0.0.4).
+
+The API server serves them at /metrics, so any Prometheus-compatible scraper
+can collect them without a client library or push gateway. Metrics are either
+updated as things happen (Counter.inc, Gauge.set, Histogram.observe, safe from
+any thread) or read at scrape time from a callback, for values that already
+live elsewhere (queue depth, the handlers' cumulative counters).
+
+ServerMetrics is the API server's set: per-stage latency histograms fed from
+each job's time_costs, job outcomes, cache hits / misses, offload bytes, LM
+tokens, queue depth and LM KV cache utilization.
+"""
+
+import math
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# Seconds: from a cache-hit condition encode to a long LM phase 2
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+Labels = Tuple[str, ...]
+# A callback returns the value, or {label values: value} for a labelled metric
+Collect = Callable[[], Union[float, Dict[Labels, float]]]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 collect: Optional[Collect] = None) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, float] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Labels:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Dict[Labels, float]:
+        if self.collect is not None:
+            value = self.collect()
+            return dict(value) if isinstance(value, dict) else {(): float(value)}
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, value in sorted(self.samples().items()):
+            lines.append(f"{self.name}{_label_text(self.labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic total; name it *_total."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Counters only go up")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    """Cumulative buckets plus _sum and _count per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets if not math.isinf(b)))
+        self._series: Dict[Labels, List[float]] = {}  # label values -> bucket counts + [+Inf, sum]
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def snapshot(self, **labels: str) -> Tuple[List[float], float, float]:
+        """(cumulative bucket counts without +Inf, sum, count) of one label set."""
+        with self._lock:
+            series = list(self._series.get(self._key(labels), [0.0] * (len(self.buckets) + 2)))
+        return series[:-2], series[-1], series[-2]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series_items = sorted((key, list(series)) for key, series in self._series.items())
+        for values, series in series_items:
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, values, le)} {_format_value(count)}")
+            labels = _label_text(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(series[-2])}")
+        return lines
+
+
+class MetricsRegistry:
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _add(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                collect: Optional[Collect] = None) -> Counter:
+        return self._add(Counter(name, documentation, labelnames, collect))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              collect: Optional[Collect] = None) -> Gauge:
+        return self._add(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """All metrics in the text exposition format; a failing callback drops only its metric."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# {metric.name} unavailable: {_escape(type(e).__name__)}")
+        return "\n".join(lines) + "\n"
+
+
+# time_costs key (as merged by inference.generate_music) -> stage label
+TIME_COST_STAGES = {
+    "lm_phase1_time": "lm_phase1",
+    "lm_phase2_time": "lm_phase2",
+    "dit_encoder_time_cost": "encode",
+    "dit_prepare_condition_time_cost": "prepare_condition",
+    "dit_model_time_cost": "dit",
+    "dit_vae_decode_time_cost": "vae_decode",
+    "dit_offload_time_cost": "offload",
+}
+
+
+class ServerMetrics(MetricsRegistry):
+    """
+    The API server's metrics: stage and job histograms fed by the queue
+    workers, plus the scrape-time sources registered by attach_sources().
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.stage_seconds = self.histogram(
+            "acestep_stage_seconds", "Time per pipeline stage of a job (stages a job skipped are not observed).",
+            ("stage",),
+        )
+        self.job_seconds = self.histogram(
+            "acestep_job_seconds", "Job run time from start to finish, queue wait excluded.", ("status",),
+        )
+        self.jobs = self.counter("acestep_jobs_total", "Jobs finished by this process.", ("status",))
+
+    def attach_sources(
+        self,
+        handlers: Callable[[], Iterable[Any]],
+        llm_handlers: Callable[[], Iterable[Any]],
+        memo: Any,
+        queue_depth: Callable[[], float],
+        running_jobs: Callable[[], float],
+    ) -> None:
+        """
+        Register the metrics read at scrape time: handlers() yields the DiT
+        handlers (metrics_counters()), llm_handlers() the LM handlers
+        (tokens_generated, kv_cache_usage()), memo is the request dedup
+        RequestMemo.
+        """
+
+        def handler_total(name: str) -> float:
+            return float(sum(h.metrics_counters()[name] for h in handlers()))
+
+        def kv_cache_usage() -> Dict[Labels, float]:
+            # At most one vllm engine is loaded at a time
+            for llm in llm_handlers():
+                usage = llm.kv_cache_usage()
+                if usage is not None:
+                    return {(): usage}
+            return {}
+
+        self.counter(
+            "acestep_cache_hits_total", "Cache hits: DiT condition cache, fixed-seed request deduplication.",
+            ("cache",), collect=lambda: {
+                ("condition",): handler_total("condition_cache_hits"),
+                ("dedup",): float(memo.counters["cache_hits"] + memo.counters["inflight_hits"]),
+            },
+        )
+        self.counter(
+            "acestep_cache_misses_total", "Cache misses: DiT condition cache, fixed-seed request deduplication.",
+            ("cache",), collect=lambda: {
+                ("condition",): handler_total("condition_cache_misses"),
+                ("dedup",): float(memo.counters["misses"]),
+            },
+        )
+        self.counter(
+            "acestep_offload_bytes_total", "Model bytes moved between CPU and accelerator by CPU offload.",
+            collect=lambda: handler_total("offload_bytes"),
+        )
+        self.counter(
+            "acestep_lm_tokens_total", "Tokens generated by the 5Hz LM.",
+            collect=lambda: float(sum(llm.tokens_generated for llm in llm_handlers())),
+        )
+        self.gauge("acestep_queue_depth", "Jobs waiting in the queue.", collect=queue_depth)
+        self.gauge("acestep_running_jobs", "Jobs being generated.", collect=running_jobs)
+        self.gauge(
+            "acestep_lm_kv_cache_utilization", "Fraction of the LM's KV cache blocks in use (vllm backend).",
+            collect=kv_cache_usage,
+        )
+
+    def observe_time_costs(self, time_costs: Dict[str, float]) -> None:
+        """Feed a finished job's time_costs into the stage histograms; zero (skipped) stages are left out."""
+        for key, stage in TIME_COST_STAGES.items():
+            value = time_costs.get(key)
+            if isinstance(value, (int, float)) and value > 0:
+                self.stage_seconds.observe(float(value), stage=stage)
+
+    def observe_queue_wait(self, seconds: float) -> None:
+        self.stage_seconds.observe(max(0.0, seconds), stage="queue_wait")
+
+    def observe_job(self, status: str, seconds: Optional[float] = None) -> None:
+        """Count a finished job; seconds is its run time (None: it never ran, e.g. cancelled while queued)."""
+        self.jobs.inc(status=status)
+        if seconds is not None:
+            self.job_seconds.observe(max(0.0, seconds), status=status)
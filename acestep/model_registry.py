@@ -0,0 +1,372 @@
+"""
+Lazily loaded DiT / LM handlers kept under a memory budget.
+
+The API server registers every model it may serve as a ModelSpec: how to load
+it, how to move it to host memory and back, how to free it. Nothing is loaded
+until a job needs it; ModelRegistry.use() loads (or restores) the models of a
+job and pins them until the job is done. When a load or restore would exceed
+the device budget, the least recently used unpinned models are evicted: moved
+to host memory when the spec can offload and the host budget has room (the
+host's own least recently used models are dropped to make that room), dropped
+otherwise. Bringing an offloaded model back is a host-to-device copy instead
+of a reload from disk.
+
+Budgets are soft: pinned models are never evicted, so when the models in use
+do not fit, the load goes ahead and the excess is evicted as soon as they are
+released. Models sharing an `exclusive` tag (nano-vllm engines, which own the
+process group) are never resident at the same time; loading one waits until
+the other is unpinned and then drops it.
+
+A model's size is the spec's estimate until it has been loaded once, then what
+spec.measure() reports. The job queue asks resident() to run queued jobs for
+loaded models before jobs that need a swap (FairScheduler's group preference).
+"""
+
+import itertools
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+DEVICE, HOST, UNLOADED = "device", "host", "unloaded"
+
+
+class ModelLoadError(RuntimeError):
+    """A model failed to load; raised again for every later use of it."""
+
+
+@dataclass
+class ModelSpec:
+    name: str
+    # Build and initialize the handler on its device; raise on failure
+    load: Callable[[], Any]
+    # Footprint estimate used until the model has been loaded once (0: unknown)
+    size_bytes: int = 0
+    measure: Optional[Callable[[Any], int]] = None
+    # Device -> host and back; without both, evicting the model drops it
+    offload: Optional[Callable[[Any], None]] = None
+    restore: Optional[Callable[[Any], None]] = None
+    release: Optional[Callable[[Any], None]] = None
+    exclusive: Optional[str] = None
+
+
+@dataclass
+class _Model:
+    spec: ModelSpec
+    state: str = UNLOADED
+    handler: Any = None
+    size: int = 0
+    pins: int = 0
+    last_used: int = 0
+    busy: bool = False  # being loaded, moved or dropped
+    uses: int = 0
+    error: Optional[str] = None
+
+
+class ModelRegistry:
+    """
+    Usage:
+        registry = ModelRegistry(device_budget=24 * 2**30, host_budget=64 * 2**30)
+        registry.register(ModelSpec("dit:acestep-v15-turbo", load=..., offload=..., restore=...))
+        with registry.use("dit:acestep-v15-turbo", "lm:acestep-5Hz-lm-1.7B") as (dit, lm):
+            ...
+
+    Budgets are bytes, 0 for no limit. use() takes all of a job's models at
+    once; nesting use() calls in one thread can deadlock on exclusive models.
+    """
+
+    def __init__(
+        self,
+        device_budget: int = 0,
+        host_budget: int = 0,
+        offload_to_host: bool = True,
+        on_event: Optional[Callable[[str, str], None]] = None,
+    ) -> None:
+        self.device_budget = max(0, int(device_budget))
+        self.host_budget = max(0, int(host_budget))
+        self.offload_to_host = offload_to_host
+        self.on_event = on_event  # (action, model name): load, restore, offload, drop, over_budget
+        self.counters = {"loads": 0, "restores": 0, "offloads": 0, "drops": 0, "load_failures": 0}
+        self._models: Dict[str, _Model] = {}
+        self._lock = threading.Condition()
+        self._transition = threading.Lock()  # one load / move / drop at a time
+        self._tick = itertools.count(1)
+
+    def register(self, spec: ModelSpec) -> None:
+        if spec.name in self._models:
+            raise ValueError(f"Model '{spec.name}' is already registered")
+        self._models[spec.name] = _Model(spec, size=max(0, int(spec.size_bytes)))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._models
+
+    def names(self) -> List[str]:
+        return list(self._models)
+
+    def state(self, name: str) -> str:
+        return self._models[name].state
+
+    def error(self, name: str) -> Optional[str]:
+        """Why the model failed to load, None when it has not failed."""
+        return self._models[name].error
+
+    def resident(self, *names: str) -> bool:
+        """True when every named model is on the device (a job for them needs no load or restore)."""
+        with self._lock:
+            return all(self._models[n].state == DEVICE and not self._models[n].busy for n in names if n)
+
+    def get(self, name: str) -> Any:
+        """The loaded handler (on the device or offloaded), None when unloaded; not pinned."""
+        return self._models[name].handler
+
+    # -- pinning ------------------------------------------------------------
+
+    @contextmanager
+    def use(self, *names: Optional[str]) -> Iterator[List[Any]]:
+        """Load the named models (None entries are skipped), pin them for the block, yield their handlers."""
+        wanted = list(dict.fromkeys(n for n in names if n))
+        handlers = self.acquire(wanted)
+        try:
+            yield handlers
+        finally:
+            self.release(wanted)
+
+    def acquire(self, names: Sequence[str]) -> List[Any]:
+        """Make the models resident on the device and pin them; pair with release()."""
+        models = [self._models[n] for n in names]  # KeyError for an unknown model
+        tags = [m.spec.exclusive for m in models if m.spec.exclusive]
+        if len(tags) != len(set(tags)):
+            raise ValueError(f"Models {list(names)} are exclusive with each other")
+        with self._lock:
+            self._raise_failed(models)
+            if all(m.state == DEVICE and not m.busy for m in models):
+                for m in models:
+                    self._pin(m)
+                return [m.handler for m in models]
+
+        pinned: List[_Model] = []
+        try:
+            conflicts = self._begin_transition(models)
+            try:
+                for o in conflicts:
+                    self._drop(o)
+                with self._lock:
+                    self._raise_failed(models)
+                    for m in models:
+                        if m.state == DEVICE:
+                            self._pin(m)  # making room for the others must not evict it
+                            pinned.append(m)
+                keep = {m.spec.name for m in models}
+                for m in models:
+                    if m not in pinned:
+                        self._bring_in(m, keep)
+                        pinned.append(m)
+                self._enforce(keep)
+            finally:
+                self._transition.release()
+        except BaseException:
+            self.release([m.spec.name for m in pinned])
+            raise
+        return [m.handler for m in models]
+
+    def release(self, names: Sequence[str]) -> None:
+        with self._lock:
+            for n in names:
+                m = self._models[n]
+                m.pins = max(0, m.pins - 1)
+                m.last_used = next(self._tick)
+            self._lock.notify_all()
+            over = self._over_budget()
+        if over:
+            # Models loaded over budget while others were pinned: evict the excess now
+            with self._transition:
+                self._enforce(set())
+
+    def _pin(self, m: _Model) -> None:
+        m.pins += 1
+        m.uses += 1
+        m.last_used = next(self._tick)
+
+    def _begin_transition(self, models: Sequence[_Model]) -> List[_Model]:
+        """
+        Take _transition once no model sharing an exclusive tag with models is pinned, and
+        mark the loaded ones busy for the caller to drop. The wait happens outside
+        _transition: a job holding one nano-vllm engine blocks the jobs that need the
+        other, not every load and acquire.
+        """
+        names = {m.spec.name for m in models}
+        tags = {m.spec.exclusive for m in models if m.spec.exclusive}
+
+        def others():
+            return [o for o in self._models.values() if o.spec.name not in names and o.spec.exclusive in tags]
+
+        while True:
+            with self._lock:
+                while any(o.pins for o in others()):
+                    self._lock.wait()
+            self._transition.acquire()
+            with self._lock:
+                if not any(o.pins for o in others()):
+                    conflicts = [o for o in others() if o.state != UNLOADED]
+                    for o in conflicts:
+                        o.busy = True  # keeps acquire()'s fast path off them until dropped
+                    return conflicts
+            # Pinned again between the wait and _transition
+            self._transition.release()
+
+    def _raise_failed(self, models: Sequence[_Model]) -> None:
+        for m in models:
+            if m.error is not None:
+                raise ModelLoadError(f"{m.spec.name}: {m.error}")
+
+    # -- residency changes (caller holds _transition) ------------------------
+
+    def _bring_in(self, m: _Model, keep: set) -> None:
+        """Load or restore m onto the device and pin it (its exclusive rivals are already dropped)."""
+        self._make_room(m.size, keep)
+
+        with self._lock:
+            m.busy = True
+            restoring = m.state == HOST
+        try:
+            if restoring:
+                m.spec.restore(m.handler)
+            else:
+                handler = m.spec.load()
+        except Exception as e:
+            if restoring:
+                # The host copy may be half moved: drop it, the next use loads from disk
+                self._drop(m)
+            else:
+                with self._lock:
+                    m.busy = False
+                    m.error = f"{type(e).__name__}: {e}"
+                    self.counters["load_failures"] += 1
+            raise ModelLoadError(f"{m.spec.name}: {e}") from e
+
+        size = m.size
+        if m.spec.measure is not None:
+            try:
+                size = int(m.spec.measure(m.handler if restoring else handler))
+            except Exception:
+                pass
+        with self._lock:
+            if not restoring:
+                m.handler = handler
+            m.state, m.size, m.busy = DEVICE, max(0, size), False
+            self.counters["restores" if restoring else "loads"] += 1
+            self._pin(m)
+        self._emit("restore" if restoring else "load", m.spec.name)
+
+    def _used(self, state: str, keep: set = frozenset()) -> int:
+        """Bytes in a state; models in keep (being brought onto the device) are not counted."""
+        return sum(m.size for m in self._models.values() if m.state == state and m.spec.name not in keep)
+
+    def _lru(self, state: str, keep: set) -> Optional[_Model]:
+        candidates = [m for m in self._models.values()
+                      if m.state == state and not m.pins and not m.busy and m.spec.name not in keep]
+        return min(candidates, key=lambda m: m.last_used) if candidates else None
+
+    def _make_room(self, need: int, keep: set) -> None:
+        """Evict least recently used unpinned device models until need more bytes fit the device budget."""
+        while self.device_budget:
+            with self._lock:
+                if self._used(DEVICE) + need <= self.device_budget:
+                    return
+                victim = self._lru(DEVICE, keep)
+                if victim is None:
+                    break
+                victim.busy = True
+            self._evict(victim, keep)
+        if self.device_budget:
+            self._emit("over_budget", ",".join(sorted(keep)))
+
+    def _evict(self, m: _Model, keep: set) -> None:
+        """
+        Move m (busy, unpinned, on the device) to the host, or drop it when it
+        cannot go there. Host copies of the models in keep are about to leave
+        the host: they are neither dropped nor counted.
+        """
+        spec = m.spec
+        to_host = (
+            self.offload_to_host and spec.offload is not None and spec.restore is not None
+            and (not self.host_budget or m.size <= self.host_budget)
+        )
+        if to_host:
+            while self.host_budget:
+                with self._lock:
+                    if self._used(HOST, keep) + m.size <= self.host_budget:
+                        break
+                    victim = self._lru(HOST, keep)
+                    if victim is None:
+                        break
+                    victim.busy = True
+                self._drop(victim)
+            with self._lock:
+                to_host = not self.host_budget or self._used(HOST, keep) + m.size <= self.host_budget
+        if to_host:
+            try:
+                spec.offload(m.handler)
+            except Exception:
+                to_host = False
+            else:
+                with self._lock:
+                    m.state, m.busy = HOST, False
+                    self.counters["offloads"] += 1
+                self._emit("offload", spec.name)
+                return
+        self._drop(m)
+
+    def _drop(self, m: _Model) -> None:
+        try:
+            if m.spec.release is not None:
+                m.spec.release(m.handler)
+        finally:
+            with self._lock:
+                m.state, m.handler, m.busy = UNLOADED, None, False
+                self.counters["drops"] += 1
+                self._lock.notify_all()
+            self._emit("drop", m.spec.name)
+
+    def _over_budget(self) -> bool:
+        return bool(
+            (self.device_budget and self._used(DEVICE) > self.device_budget)
+            or (self.host_budget and self._used(HOST) > self.host_budget)
+        )
+
+    def _enforce(self, keep: set) -> None:
+        """Evict until both budgets hold again (as far as unpinned models allow)."""
+        while True:
+            with self._lock:
+                if self.device_budget and self._used(DEVICE) > self.device_budget:
+                    victim, on_device = self._lru(DEVICE, keep), True
+                elif self.host_budget and self._used(HOST) > self.host_budget:
+                    victim, on_device = self._lru(HOST, keep), False
+                else:
+                    return
+                if victim is None:
+                    return
+                victim.busy = True
+            if on_device:
+                self._evict(victim, keep)
+            else:
+                self._drop(victim)
+
+    def _emit(self, action: str, name: str) -> None:
+        if self.on_event is not None:
+            self.on_event(action, name)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "device_budget_bytes": self.device_budget,
+                "host_budget_bytes": self.host_budget,
+                "device_used_bytes": self._used(DEVICE),
+                "host_used_bytes": self._used(HOST),
+                "swaps": self.counters["loads"] + self.counters["restores"],
+                **self.counters,
+                "models": {
+                    name: {"state": m.state, "size_bytes": m.size, "pins": m.pins, "uses": m.uses, "error": m.error}
+                    for name, m in self._models.items()
+                },
+            }
@@ -0,0 +1,114 @@
+"""
+Stackable forward wrappers for decoder modules.
+
+Some per-generation features need to replace a module's forward for the
+duration of one run, which torch's forward hooks cannot do: skip the call
+(step caching), change its inputs and outputs (CFG-interval skipping, attention
+recording) or swap the computation (mixed LoRA batches, progress reporting).
+They all go through wrap_forward, which keeps the wrappers of each module in
+one list and rebuilds the instance forward from it:
+
+    handle = wrap_forward(model.decoder, lambda forward, *args, **kwargs: forward(*args, **kwargs))
+    ...
+    handle.remove()  # or `with wrap_forward(...):`
+
+Wrappers installed later see the earlier ones as their `forward` (the last one
+installed is outermost). Removing a wrapper, in any order, keeps the others in
+place; once the last one is gone the module's own forward (the class forward,
+or an instance forward installed by something else, e.g. accelerate) is back.
+
+Wrappers that act on particular diffusion steps number the decoder calls with
+DiffusionStepTracker, which follows the timestep argument, so a sampler that
+calls the decoder more than once per step (separate cond / uncond passes)
+still has one index per step.
+"""
+
+import functools
+from typing import Any, Callable, Dict, List, Optional
+
+import torch
+import torch.nn as nn
+
+# Instance attribute holding (forward to restore or None, wrappers innermost first)
+_WRAPPERS_ATTR = "_acestep_forward_wrappers"
+
+
+class ForwardWrapperHandle:
+    """Removes one wrap_forward wrapper; usable as a context manager, like torch's hook handles."""
+
+    def __init__(self, module: nn.Module, wrapper: Callable):
+        self.module = module
+        self.wrapper = wrapper
+
+    def remove(self):
+        state = self.module.__dict__.get(_WRAPPERS_ATTR)
+        if state is None:
+            return
+        wrappers: List[Callable] = state[1]
+        for i, wrapper in enumerate(wrappers):
+            if wrapper is self.wrapper:
+                del wrappers[i]
+                break
+        else:
+            return
+        _install(self.module)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.remove()
+
+
+def _install(module: nn.Module):
+    own_forward, wrappers = module.__dict__[_WRAPPERS_ATTR]
+    if not wrappers:
+        del module.__dict__[_WRAPPERS_ATTR]
+        if own_forward is None:
+            module.__dict__.pop("forward", None)
+        else:
+            module.__dict__["forward"] = own_forward
+        return
+    forward = own_forward if own_forward is not None else type(module).forward.__get__(module)
+    for wrapper in wrappers:
+        forward = functools.partial(wrapper, forward)
+    module.__dict__["forward"] = forward
+
+
+def wrap_forward(module: nn.Module, wrapper: Callable) -> ForwardWrapperHandle:
+    """
+    Route module.forward(*args, **kwargs) through wrapper(forward, *args, **kwargs),
+    forward being the module's forward with the previously installed wrappers.
+    """
+    if _WRAPPERS_ATTR not in module.__dict__:
+        module.__dict__[_WRAPPERS_ATTR] = (module.__dict__.get("forward"), [])
+    module.__dict__[_WRAPPERS_ATTR][1].append(wrapper)
+    _install(module)
+    return ForwardWrapperHandle(module, wrapper)
+
+
+def call_timestep(args: tuple, kwargs: Dict[str, Any]) -> Optional[float]:
+    """The timestep of a decoder call (decoder(hidden_states, timestep, ...)), None when it has none."""
+    timestep = kwargs["timestep"] if "timestep" in kwargs else (args[1] if len(args) > 1 else None)
+    if isinstance(timestep, torch.Tensor):
+        return float(timestep.reshape(-1)[0]) if timestep.numel() else None
+    return float(timestep) if isinstance(timestep, (int, float)) else None
+
+
+class DiffusionStepTracker:
+    """
+    Diffusion step index of each decoder call in one generation: it advances when the
+    call's timestep differs from the previous call's (calls without a timestep count one
+    step each), whatever the batch shape of the call.
+    """
+
+    def __init__(self):
+        self.step = -1
+        self._timestep: Optional[float] = None
+
+    def update(self, args: tuple, kwargs: Dict[str, Any]) -> int:
+        timestep = call_timestep(args, kwargs)
+        if timestep is None or timestep != self._timestep:
+            self.step += 1
+            self._timestep = timestep
+        return self.step
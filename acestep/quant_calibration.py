@@ -0,0 +1,292 @@
+"""
+Static int8 (W8A8) quantization for the DiT decoder and the VAE decoder.
+
+Calibration runs representative inputs through the float model and records the
+per-input-channel absmax of every quantizable layer's activations. At load time
+those statistics become static scales: per-channel SmoothQuant factors move
+activation outliers into the weights, the smoothed activation gets one static
+int8 scale per layer, and weights are quantized per output channel. Nothing is
+measured at inference time, so activations need no extra reduction pass.
+
+scripts/calibrate_quantization.py produces the calibration results, gating each
+component on the latent/waveform SNR against the float model, and saves them
+next to the checkpoint (quant_calibration.pt), where
+AceStepHandler.initialize_service(quantization="w8a8_static") applies them.
+
+The quantized layers only pay off where the device has an int8 GEMM
+(torch._int_mm: CUDA, and CPU / XPU depending on the PyTorch build; see
+int8_gemm_supported()). Conv1d layers run as the same GEMM over unfolded input
+windows. Without one, the layers fall back to fp32 arithmetic on the integer
+operands, which is slower and larger than bf16: that path only keeps
+calibration and SNR checks runnable anywhere, and the handler leaves the model
+in float on such devices.
+"""
+
+import math
+import os
+from typing import Callable, Dict, Iterable, Optional
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from loguru import logger
+
+
+CALIBRATION_FILE = "quant_calibration.pt"
+CALIBRATION_VERSION = 1
+QMAX = 127.0
+DEFAULT_SMOOTHING_ALPHA = 0.5
+# Layers narrower than this (embedders, output heads) are sensitive and cheap; keep them in float
+MIN_QUANT_CHANNELS = 16
+# Quality gates against the float model
+MIN_LATENT_SNR_DB = 20.0
+MIN_WAVEFORM_SNR_DB = 20.0
+
+_EPS = 1e-5
+_INT8_GEMM_SUPPORT: Dict[str, bool] = {}
+
+
+def find_quantizable_layers(module: nn.Module) -> Dict[str, nn.Module]:
+    """Linear and (dense, zero-padded) Conv1d layers of module that static int8 applies to."""
+    layers = {}
+    for name, layer in module.named_modules():
+        if isinstance(layer, nn.Linear):
+            in_channels, out_channels = layer.in_features, layer.out_features
+        elif isinstance(layer, nn.Conv1d) and layer.groups == 1 and layer.padding_mode == "zeros" \
+                and not isinstance(layer.padding, str):
+            in_channels, out_channels = layer.in_channels, layer.out_channels
+        else:
+            continue
+        if min(in_channels, out_channels) >= MIN_QUANT_CHANNELS:
+            layers[name] = layer
+    return layers
+
+
+class ActivationObserver:
+    """
+    Record the per-input-channel absmax of every quantizable layer's input.
+
+    Use as a context manager around forward passes of the float model:
+
+        with ActivationObserver(model.decoder) as observer:
+            for batch in batches:
+                model.decoder(batch)
+        act_absmax = observer.absmax
+    """
+
+    def __init__(self, module: nn.Module):
+        self.absmax: Dict[str, torch.Tensor] = {}
+        self._handles = [
+            layer.register_forward_pre_hook(self._make_hook(name, isinstance(layer, nn.Conv1d)))
+            for name, layer in find_quantizable_layers(module).items()
+        ]
+
+    def _make_hook(self, name: str, channels_first: bool):
+        def hook(layer, args):
+            x = args[0].detach()
+            if channels_first:
+                x = x.transpose(1, -1)
+            current = x.reshape(-1, x.shape[-1]).abs().amax(dim=0).float().cpu()
+            previous = self.absmax.get(name)
+            self.absmax[name] = current if previous is None else torch.maximum(previous, current)
+        return hook
+
+    def remove(self):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.remove()
+
+
+def calibrate(module: nn.Module, run_batches: Callable[[], None]) -> Dict[str, torch.Tensor]:
+    """Run run_batches() under an ActivationObserver on module and return the activation absmax."""
+    with torch.no_grad(), ActivationObserver(module) as observer:
+        run_batches()
+    return observer.absmax
+
+
+def _smoothing_factors(act_absmax: torch.Tensor, weight_absmax: torch.Tensor, alpha: float) -> torch.Tensor:
+    """SmoothQuant factors s_j = max|X_j|^alpha / max|W_j|^(1 - alpha), one per input channel."""
+    return (act_absmax.clamp_min(_EPS).pow(alpha) / weight_absmax.clamp_min(_EPS).pow(1 - alpha)).clamp_min(_EPS)
+
+
+def _quantize_weight(weight: torch.Tensor):
+    """Per-output-channel symmetric int8 weights and their scales."""
+    reduce_dims = tuple(range(1, weight.dim()))
+    scale = weight.abs().amax(dim=reduce_dims).clamp_min(_EPS) / QMAX
+    shape = (-1,) + (1,) * (weight.dim() - 1)
+    return torch.round(weight / scale.view(shape)).clamp_(-QMAX, QMAX).to(torch.int8), scale
+
+
+def int8_gemm_supported(device) -> bool:
+    """Whether torch._int_mm runs on device (probed once per device type)."""
+    device_type = torch.device(device).type
+    if device_type not in _INT8_GEMM_SUPPORT:
+        supported = hasattr(torch, "_int_mm")
+        if supported:
+            try:
+                a = torch.ones(32, 32, dtype=torch.int8, device=device)
+                supported = bool((torch._int_mm(a, a) == 32).all())
+            except Exception:
+                supported = False
+        _INT8_GEMM_SUPPORT[device_type] = supported
+    return _INT8_GEMM_SUPPORT[device_type]
+
+
+def _int8_matmul(x_int8: torch.Tensor, weight_int8: torch.Tensor) -> torch.Tensor:
+    """x_int8 [M, K] @ weight_int8 [N, K]^T as float, through torch._int_mm where the device has it."""
+    m, k = x_int8.shape
+    n = weight_int8.shape[0]
+    if k % 8 == 0 and n % 8 == 0 and int8_gemm_supported(x_int8.device):
+        if m <= 16:
+            # _int_mm needs more than 16 rows
+            x_int8 = F.pad(x_int8, (0, 0, 0, 17 - m))
+        return torch._int_mm(x_int8, weight_int8.t())[:m].float()
+    # Integer products summed in fp32: same result up to accumulation rounding
+    return x_int8.float() @ weight_int8.float().t()
+
+
+def _int8_conv1d(x_int8: torch.Tensor, weight_int8: torch.Tensor, stride: int, padding: int,
+                 dilation: int) -> torch.Tensor:
+    """conv1d of int8 x [B, C, L] with int8 weight [O, C, K] as one int8 GEMM over unfolded windows, float [B, O, L']."""
+    batch = x_int8.shape[0]
+    out_channels, in_channels, kernel = weight_int8.shape
+    if padding:
+        x_int8 = F.pad(x_int8, (padding, padding))
+    span = (kernel - 1) * dilation + 1
+    # [B, C, L', span] view -> dilated taps [B, C, L', K] -> rows of (C, K) matching the weight layout
+    windows = x_int8.unfold(2, span, stride)[..., ::dilation]
+    length = windows.shape[2]
+    rows = windows.permute(0, 2, 1, 3).reshape(batch * length, in_channels * kernel)
+    y = _int8_matmul(rows, weight_int8.reshape(out_channels, in_channels * kernel))
+    return y.view(batch, length, out_channels).transpose(1, 2)
+
+
+class _StaticInt8Base(nn.Module):
+
+    def _init_scales(self, weight: torch.Tensor, bias: Optional[torch.Tensor], act_absmax: torch.Tensor,
+                     alpha: float, channel_dims: tuple):
+        weight = weight.detach().float()
+        act_absmax = act_absmax.to(weight.device, torch.float32)
+        smooth = _smoothing_factors(act_absmax, weight.abs().amax(dim=channel_dims), alpha)
+        smooth_shape = [1] * weight.dim()
+        smooth_shape[1] = -1
+        weight_int8, weight_scale = _quantize_weight(weight * smooth.view(smooth_shape))
+        act_scale = (act_absmax / smooth).max().clamp_min(_EPS) / QMAX
+        self.register_buffer("weight_int8", weight_int8)
+        # Dequantizes int8 matmul outputs: act_scale * per-output-channel weight scale
+        self.register_buffer("output_scale", act_scale * weight_scale)
+        # Smoothing and static activation scale folded into one per-channel multiplier
+        self.register_buffer("act_multiplier", 1.0 / (smooth * act_scale))
+        self.register_buffer("bias", None if bias is None else bias.detach().float())
+
+    def _quantize_act(self, x: torch.Tensor, channel_dim: int) -> torch.Tensor:
+        shape = [1] * x.dim()
+        shape[channel_dim] = -1
+        return torch.round(x.float() * self.act_multiplier.view(shape)).clamp_(-QMAX, QMAX)
+
+
+class StaticInt8Linear(_StaticInt8Base):
+    """nn.Linear replacement with int8 weights and a static, smoothed int8 activation scale."""
+
+    def __init__(self, linear: nn.Linear, act_absmax: torch.Tensor, alpha: float = DEFAULT_SMOOTHING_ALPHA):
+        super().__init__()
+        self.in_features, self.out_features = linear.in_features, linear.out_features
+        self._init_scales(linear.weight, linear.bias, act_absmax, alpha, channel_dims=(0,))
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        shape = x.shape
+        x_int8 = self._quantize_act(x.reshape(-1, shape[-1]), channel_dim=-1).to(torch.int8)
+        y = _int8_matmul(x_int8, self.weight_int8) * self.output_scale
+        if self.bias is not None:
+            y = y + self.bias
+        return y.to(x.dtype).view(*shape[:-1], self.out_features)
+
+
+class StaticInt8Conv1d(_StaticInt8Base):
+    """
+    nn.Conv1d replacement with int8 weights and a static, smoothed int8 activation scale.
+
+    PyTorch has no int8 convolution kernel: with an int8 GEMM the input windows
+    are unfolded (kernel-size times the int8 activation) and multiplied in one
+    GEMM, otherwise the integer-valued operands are convolved in fp32.
+    """
+
+    def __init__(self, conv: nn.Conv1d, act_absmax: torch.Tensor, alpha: float = DEFAULT_SMOOTHING_ALPHA):
+        super().__init__()
+        self.stride, self.padding, self.dilation = conv.stride, conv.padding, conv.dilation
+        self._init_scales(conv.weight, conv.bias, act_absmax, alpha, channel_dims=(0, 2))
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        x_q = self._quantize_act(x, channel_dim=1)
+        if int8_gemm_supported(x.device):
+            y = _int8_conv1d(x_q.to(torch.int8), self.weight_int8, self.stride[0], self.padding[0], self.dilation[0])
+        else:
+            y = F.conv1d(x_q, self.weight_int8.float(), None, self.stride, self.padding, self.dilation)
+        y = y * self.output_scale.view(1, -1, 1)
+        if self.bias is not None:
+            y = y + self.bias.view(1, -1, 1)
+        return y.to(x.dtype)
+
+
+def apply_static_int8(module: nn.Module, act_absmax: Dict[str, torch.Tensor],
+                      alpha: float = DEFAULT_SMOOTHING_ALPHA) -> int:
+    """Replace every calibrated layer of module in place; returns the number of layers replaced."""
+    layers = find_quantizable_layers(module)
+    replaced = 0
+    for name, stats in act_absmax.items():
+        layer = layers.get(name)
+        if layer is None:
+            logger.warning(f"[quant_calibration] Calibrated layer {name} not found in model, skipping")
+            continue
+        quant_cls = StaticInt8Linear if isinstance(layer, nn.Linear) else StaticInt8Conv1d
+        parent_name, _, child_name = name.rpartition(".")
+        parent = module.get_submodule(parent_name) if parent_name else module
+        setattr(parent, child_name, quant_cls(layer, stats, alpha))
+        replaced += 1
+    return replaced
+
+
+def save_calibration(checkpoint_path: str, act_absmax: Dict[str, torch.Tensor],
+                     alpha: float = DEFAULT_SMOOTHING_ALPHA, metrics: Optional[Dict[str, float]] = None) -> str:
+    """Save calibration statistics next to the checkpoint; returns the file path."""
+    path = os.path.join(checkpoint_path, CALIBRATION_FILE)
+    torch.save({
+        "version": CALIBRATION_VERSION,
+        "alpha": alpha,
+        "act_absmax": act_absmax,
+        "metrics": metrics or {},
+    }, path)
+    return path
+
+
+def load_calibration(checkpoint_path: str) -> Optional[Dict]:
+    """Load calibration statistics saved next to the checkpoint, or None if there are none."""
+    path = os.path.join(checkpoint_path, CALIBRATION_FILE)
+    if not os.path.exists(path):
+        return None
+    calibration = torch.load(path, map_location="cpu")
+    if calibration.get("version") != CALIBRATION_VERSION:
+        raise ValueError(f"Unsupported calibration file version in {path}: {calibration.get('version')}")
+    return calibration
+
+
+def snr_db(reference: torch.Tensor, test: torch.Tensor) -> float:
+    """Signal-to-noise ratio of test against reference, in dB."""
+    reference = reference.detach().float().cpu()
+    noise = (reference - test.detach().float().cpu()).pow(2).sum().item()
+    signal = reference.pow(2).sum().item()
+    if noise == 0:
+        return math.inf
+    return 10 * math.log10(max(signal, 1e-20) / noise)
+
+
+def mean_snr_db(pairs: Iterable) -> float:
+    """Mean SNR over (reference, test) pairs."""
+    values = [snr_db(reference, test) for reference, test in pairs]
+    return sum(values) / len(values)
@@ -0,0 +1,199 @@
+"""
+Cross-timestep block caching for DiT denoising.
+
+Adjacent diffusion steps produce very similar activations in the deep decoder
+blocks. DiTStepCache wraps a contiguous range of the decoder's repeated blocks
+and, on selected steps, skips them: the hidden state entering the range gets the
+residual the range added on the last step it was computed (h_out = h_in + delta).
+
+Two policies choose the skipped steps:
+  - "interval": recompute the range every `interval` steps, reuse in between.
+  - "threshold": accumulate the relative change of the hidden state entering the
+    range since the last computed step and reuse while it stays below
+    `threshold` (shallow blocks always run, so their output is a free probe).
+
+The first `warmup_steps` steps, the final step and any `compute_steps` (e.g. the
+steps an attention recorder captures) are always computed. Block
+forwards are patched on the instances (no state-dict or module-tree changes), and
+only for the duration of one generation.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import torch
+import torch.nn as nn
+
+from acestep.compile_cache import find_repeated_blocks
+from acestep.module_hooks import DiffusionStepTracker, wrap_forward
+
+
+STEP_CACHE_MODES = ("interval", "threshold")
+
+
+@dataclass
+class StepCacheStats:
+    """Block-level accounting for one generation."""
+    block_calls: int = 0
+    skipped_block_calls: int = 0
+    computed_steps: int = 0
+    skipped_steps: int = 0
+
+    @property
+    def skipped_fraction(self) -> float:
+        """Fraction of repeated-block FLOPs skipped (all blocks cost the same)."""
+        return self.skipped_block_calls / self.block_calls if self.block_calls else 0.0
+
+
+@dataclass
+class _StreamState:
+    """Cache state of one decoder call stream (one input shape / conditioning tensor)."""
+    residual: Optional[torch.Tensor] = None
+    previous_probe: Optional[torch.Tensor] = None
+    accumulated_change: float = 0.0
+    output_tails: Dict[int, Tuple[Any, ...]] = field(default_factory=dict)
+
+
+def _hidden_from_call(args, kwargs) -> torch.Tensor:
+    return args[0] if args else kwargs["hidden_states"]
+
+
+def _hidden_from_output(output) -> torch.Tensor:
+    return output[0] if isinstance(output, (tuple, list)) else output
+
+
+class DiTStepCache:
+    """
+    Skip a range of repeated decoder blocks on selected diffusion steps.
+
+    Usage:
+        with DiTStepCache(model.decoder, mode="interval", interval=2, num_steps=32) as cache:
+            model.generate_audio(...)
+        cache.stats.skipped_fraction
+
+    Decoder calls are grouped into streams by hidden-state shape and the data pointer
+    of encoder_hidden_states, so separate conditional/unconditional forwards keep
+    separate caches. Steps (warmup, interval phase, the final step) are numbered
+    from the calls' timestep and shared by all streams, so a stream that misses
+    steps (e.g. while the CFG skipper changes the batch) still computes the last one.
+    """
+
+    def __init__(
+        self,
+        decoder: nn.Module,
+        mode: str = "interval",
+        interval: int = 2,
+        threshold: float = 0.1,
+        start_block: Optional[int] = None,
+        end_block: Optional[int] = None,
+        warmup_steps: int = 1,
+        num_steps: Optional[int] = None,
+        compute_steps: Iterable[int] = (),
+    ):
+        if mode not in STEP_CACHE_MODES:
+            raise ValueError(f"step cache mode must be one of {STEP_CACHE_MODES}, got {mode!r}")
+        blocks = find_repeated_blocks(decoder)
+        if blocks is None:
+            raise ValueError("No repeated decoder blocks found for step caching")
+        self.decoder = decoder
+        self.blocks = blocks
+        self.mode = mode
+        self.interval = max(1, interval)
+        self.threshold = threshold
+        # Default: keep the first third of the blocks (they feed the probe) and cache the rest
+        self.start_block = len(blocks) // 3 if start_block is None else start_block
+        self.end_block = len(blocks) if end_block is None else end_block
+        if not 0 <= self.start_block < self.end_block <= len(blocks):
+            raise ValueError(f"invalid cached block range [{self.start_block}, {self.end_block}) for {len(blocks)} blocks")
+        self.warmup_steps = warmup_steps
+        self.num_steps = num_steps
+        self.compute_steps = frozenset(compute_steps)
+        self.stats = StepCacheStats()
+        self._streams: Dict[Tuple, _StreamState] = {}
+        self._current: Optional[Tuple[_StreamState, bool, torch.Tensor]] = None
+        self._stream_key: Optional[Tuple] = None
+        self._steps = DiffusionStepTracker()
+        self._step = 0
+        self._handles = []
+
+    # -- policy -------------------------------------------------------------
+
+    def _should_skip(self, state: _StreamState, probe: torch.Tensor) -> bool:
+        step = self._step
+        last_step = self.num_steps is not None and step >= self.num_steps - 1
+        if (state.residual is None or state.residual.shape != probe.shape or step < self.warmup_steps
+                or last_step or step in self.compute_steps):
+            return False
+        if self.mode == "interval":
+            return (step - self.warmup_steps) % self.interval != 0
+        previous = state.previous_probe
+        change = ((probe - previous).abs().mean() / previous.abs().mean().clamp_min(1e-8)).item()
+        state.accumulated_change += change
+        return state.accumulated_change < self.threshold
+
+    # -- patched forwards ---------------------------------------------------
+
+    def _decoder_pre_hook(self, module, args, kwargs):
+        hidden = _hidden_from_call(args, kwargs) if (args or "hidden_states" in kwargs) else None
+        encoder_states = kwargs.get("encoder_hidden_states")
+        self._step = self._steps.update(args, kwargs)
+        self._stream_key = (
+            tuple(hidden.shape) if isinstance(hidden, torch.Tensor) else None,
+            encoder_states.data_ptr() if isinstance(encoder_states, torch.Tensor) else None,
+        )
+
+    def _wrap_block(self, index: int, block: nn.Module):
+        def forward(original_forward, *args, **kwargs):
+            hidden = _hidden_from_call(args, kwargs)
+            if index == self.start_block:
+                state = self._streams.setdefault(self._stream_key, _StreamState())
+                skip = self._should_skip(state, hidden.detach())
+                if self.mode == "threshold":
+                    state.previous_probe = hidden.detach()
+                    if not skip:
+                        state.accumulated_change = 0.0
+                self._current = (state, skip, hidden)
+                if skip:
+                    self.stats.skipped_steps += 1
+                else:
+                    self.stats.computed_steps += 1
+            state, skip, range_input = self._current
+            self.stats.block_calls += 1
+
+            if not skip:
+                output = original_forward(*args, **kwargs)
+                if isinstance(output, (tuple, list)):
+                    state.output_tails[index] = tuple(output[1:])
+                if index == self.end_block - 1:
+                    state.residual = (_hidden_from_output(output) - range_input).detach()
+                return output
+
+            self.stats.skipped_block_calls += 1
+            if index == self.end_block - 1:
+                hidden = range_input + state.residual
+            tail = state.output_tails.get(index)
+            return hidden if tail is None else (hidden,) + tail
+
+        self._handles.append(wrap_forward(block, forward))
+
+    # -- lifecycle ----------------------------------------------------------
+
+    def install(self):
+        self._handles.append(self.decoder.register_forward_pre_hook(self._decoder_pre_hook, with_kwargs=True))
+        for index in range(self.start_block, self.end_block):
+            self._wrap_block(index, self.blocks[index])
+
+    def remove(self):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+        self._streams.clear()
+        self._current = None
+        self._steps = DiffusionStepTracker()
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *exc):
+        self.remove()
@@ -0,0 +1,185 @@
+"""CPU harness for the quantized (int8/fp8) paged KV cache.
+
+Decodes with a tiny random GQA transformer whose attention reads K/V back from a
+paged cache, once with a full-precision cache and once through the same
+quantize-on-store / dequantize-on-read path the engine uses
+(nanovllm/layers/kv_quant.py), and reports logit divergence. Also prints the
+KV capacity (blocks, max concurrent sequences) for a given model shape and
+memory budget. No CUDA or flash-attn required.
+
+    python bench_kv_cache.py --kv-cache-dtype int8
+    python bench_kv_cache.py --kv-cache-dtype fp8 --memory-gb 6 --num-layers-model 28
+"""
+import argparse
+import importlib.util
+import os
+
+import torch
+from torch import nn
+
+
+def load_kv_quant():
+    # Load the module by path: importing the nanovllm package pulls in the CUDA engine
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nanovllm", "layers", "kv_quant.py")
+    spec = importlib.util.spec_from_file_location("nanovllm_kv_quant", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+kv_quant = load_kv_quant()
+
+
+class PagedCache:
+    """One layer's paged K/V cache: [num_blocks, block_size, num_kv_heads, head_dim]."""
+
+    def __init__(self, num_blocks, block_size, num_kv_heads, head_dim, kv_cache_dtype):
+        self.kv_cache_dtype = kv_cache_dtype
+        shape = (num_blocks, block_size, num_kv_heads, head_dim)
+        if kv_cache_dtype == "auto":
+            self.k, self.v = torch.zeros(shape), torch.zeros(shape)
+        else:
+            dtype = kv_quant.kv_cache_torch_dtype(kv_cache_dtype)
+            # One spare block for padded (-1) slots, as in the engine
+            quantized_shape = (num_blocks + 1,) + shape[1:]
+            self.k, self.v = torch.zeros(quantized_shape, dtype=dtype), torch.zeros(quantized_shape, dtype=dtype)
+            self.k_scale, self.v_scale = torch.zeros(quantized_shape[:-1]), torch.zeros(quantized_shape[:-1])
+            self.k_pages, self.v_pages = torch.zeros(shape), torch.zeros(shape)
+
+    def store(self, k, v, slot_mapping):
+        if self.kv_cache_dtype == "auto":
+            self.k.view(-1, *self.k.shape[-2:])[slot_mapping.long()] = k
+            self.v.view(-1, *self.v.shape[-2:])[slot_mapping.long()] = v
+        else:
+            kv_quant.store_quantized_kvcache(k, v, self.k, self.v, self.k_scale, self.v_scale, slot_mapping, self.kv_cache_dtype)
+
+    def read(self, block_table, num_tokens):
+        """Contiguous [num_tokens, num_kv_heads, head_dim] K/V of one sequence."""
+        if self.kv_cache_dtype == "auto":
+            k, v = self.k, self.v
+        else:
+            kv_quant.dequantize_pages(self.k, self.v, self.k_scale, self.v_scale, block_table.unsqueeze(0),
+                                      self.k_pages, self.v_pages)
+            k, v = self.k_pages, self.v_pages
+        pages = block_table.long()
+        k = k[pages].flatten(0, 1)[:num_tokens]
+        v = v[pages].flatten(0, 1)[:num_tokens]
+        return k, v
+
+
+class TinyGQALayer(nn.Module):
+
+    def __init__(self, hidden_size, num_heads, num_kv_heads, head_dim):
+        super().__init__()
+        self.num_heads, self.num_kv_heads, self.head_dim = num_heads, num_kv_heads, head_dim
+        self.norm = nn.LayerNorm(hidden_size)
+        self.q_proj = nn.Linear(hidden_size, num_heads * head_dim)
+        self.k_proj = nn.Linear(hidden_size, num_kv_heads * head_dim)
+        self.v_proj = nn.Linear(hidden_size, num_kv_heads * head_dim)
+        self.o_proj = nn.Linear(num_heads * head_dim, hidden_size)
+        self.mlp = nn.Sequential(nn.LayerNorm(hidden_size), nn.Linear(hidden_size, 4 * hidden_size), nn.GELU(), nn.Linear(4 * hidden_size, hidden_size))
+
+    def forward(self, x, cache: PagedCache, block_table, slot, position):
+        h = self.norm(x)
+        q = self.q_proj(h).view(self.num_heads, self.head_dim)
+        k = self.k_proj(h).view(1, self.num_kv_heads, self.head_dim)
+        v = self.v_proj(h).view(1, self.num_kv_heads, self.head_dim)
+        cache.store(k, v, torch.tensor([slot]))
+        k, v = cache.read(block_table, position + 1)
+        group = self.num_heads // self.num_kv_heads
+        k, v = k.repeat_interleave(group, dim=1), v.repeat_interleave(group, dim=1)
+        scores = torch.einsum("hd,thd->ht", q, k) / self.head_dim ** 0.5
+        o = torch.einsum("ht,thd->hd", scores.softmax(-1), v).reshape(-1)
+        x = x + self.o_proj(o)
+        return x + self.mlp(x)
+
+
+class TinyGQALM(nn.Module):
+
+    def __init__(self, vocab_size, hidden_size, num_layers, num_heads, num_kv_heads, head_dim, max_len):
+        super().__init__()
+        self.embed = nn.Embedding(vocab_size, hidden_size)
+        self.pos = nn.Embedding(max_len, hidden_size)
+        self.layers = nn.ModuleList(TinyGQALayer(hidden_size, num_heads, num_kv_heads, head_dim) for _ in range(num_layers))
+        self.head = nn.Linear(hidden_size, vocab_size)
+
+    @torch.inference_mode()
+    def decode(self, token_ids, caches, block_table, block_size):
+        """Logits after every token, feeding tokens one at a time through the paged caches."""
+        logits = []
+        for position, token_id in enumerate(token_ids):
+            slot = int(block_table[position // block_size]) * block_size + position % block_size
+            x = self.embed.weight[token_id] + self.pos.weight[position]
+            for layer, cache in zip(self.layers, caches):
+                x = layer(x, cache, block_table, slot, position)
+            logits.append(self.head(x))
+        return torch.stack(logits)
+
+
+def logit_divergence(args):
+    torch.manual_seed(args.seed)
+    model = TinyGQALM(args.vocab_size, args.hidden_size, args.num_layers, args.num_heads, args.num_kv_heads,
+                      args.head_dim, args.num_tokens).eval()
+    num_blocks = (args.num_tokens + args.block_size - 1) // args.block_size
+    # Scattered, non-contiguous pages like a real block manager hands out
+    block_table = torch.randperm(2 * num_blocks)[:num_blocks].int()
+    token_ids = torch.randint(0, args.vocab_size, (args.num_tokens,)).tolist()
+
+    def run(kv_cache_dtype):
+        caches = [PagedCache(2 * num_blocks, args.block_size, args.num_kv_heads, args.head_dim, kv_cache_dtype)
+                  for _ in range(args.num_layers)]
+        return model.decode(token_ids, caches, block_table, args.block_size)
+
+    ref = run("auto")
+    out = run(args.kv_cache_dtype)
+    kl = torch.nn.functional.kl_div(out.log_softmax(-1), ref.log_softmax(-1), log_target=True, reduction="none").sum(-1)
+    top1 = (out.argmax(-1) == ref.argmax(-1)).float().mean().item()
+    rel = ((out - ref).norm(dim=-1) / ref.norm(dim=-1)).mean().item()
+    print(f"Logit divergence ({args.kv_cache_dtype} vs full precision, {args.num_tokens} tokens):")
+    print(f"  max |dlogit| {(out - ref).abs().max().item():.4f}, mean relative L2 {rel:.5f}")
+    print(f"  mean KL {kl.mean().item():.2e}, max KL {kl.max().item():.2e}, top-1 agreement {top1:.4f}")
+
+
+def capacity(args):
+    print(f"KV capacity for {args.num_layers_model} layers x {args.num_kv_heads_model} KV heads x {args.head_dim_model} dims, "
+          f"{args.memory_gb:.1f} GB, block size {args.kvcache_block_size}, max_model_len {args.max_model_len}:")
+    for kv_cache_dtype in ("auto", "int8", "fp8"):
+        block_bytes = kv_quant.kv_cache_block_bytes(args.num_layers_model, args.kvcache_block_size, args.num_kv_heads_model,
+                                                    args.head_dim_model, torch.bfloat16, kv_cache_dtype)
+        if kv_cache_dtype != "auto":
+            # The dequantized page buffer attention reads, as budgeted by ModelRunner.allocate_kv_cache
+            block_bytes += kv_quant.kv_dequant_block_bytes(args.kvcache_block_size, args.num_kv_heads_model,
+                                                           args.head_dim_model, torch.bfloat16)
+        num_blocks = int(args.memory_gb * 1024**3) // block_bytes
+        max_seqs = num_blocks * args.kvcache_block_size // args.max_model_len
+        name = "bf16" if kv_cache_dtype == "auto" else kv_cache_dtype
+        print(f"  {name:>4}: {num_blocks} blocks, {max_seqs} concurrent sequences ({max_seqs // 2} CFG requests)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kv-cache-dtype", choices=["int8", "fp8"], default="int8")
+    parser.add_argument("--num-tokens", type=int, default=512)
+    parser.add_argument("--block-size", type=int, default=16)
+    parser.add_argument("--vocab-size", type=int, default=256)
+    parser.add_argument("--hidden-size", type=int, default=128)
+    parser.add_argument("--num-layers", type=int, default=2)
+    parser.add_argument("--num-heads", type=int, default=4)
+    parser.add_argument("--num-kv-heads", type=int, default=2)
+    parser.add_argument("--head-dim", type=int, default=32)
+    # Capacity report: defaults follow the 1.7B 5Hz LM
+    parser.add_argument("--memory-gb", type=float, default=4.0)
+    parser.add_argument("--num-layers-model", type=int, default=28)
+    parser.add_argument("--num-kv-heads-model", type=int, default=8)
+    parser.add_argument("--head-dim-model", type=int, default=128)
+    parser.add_argument("--kvcache-block-size", type=int, default=256)
+    parser.add_argument("--max-model-len", type=int, default=4096)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logit_divergence(args)
+    capacity(args)
+
+
+if __name__ == "__main__":
+    main()
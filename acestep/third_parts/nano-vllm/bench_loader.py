@@ -0,0 +1,127 @@
+"""Cold-start benchmark for the parallel safetensors loader.
+
+Writes a synthetic sharded checkpoint shaped like a Qwen3 decoder (default ~3.4 GB
+of bf16, about the 1.7B 5Hz LM), then times the previous one-tensor-at-a-time
+loader against nanovllm/utils/loader.py with several worker counts. Targets CUDA
+when available, otherwise CPU.
+
+    python bench_loader.py --dir /tmp/synthetic-ckpt --workers 1 4 8
+    sudo python bench_loader.py --dir /tmp/synthetic-ckpt --drop-caches   # true cold start (Linux)
+"""
+import argparse
+import importlib.util
+import os
+import time
+
+import torch
+from torch import nn
+from safetensors import safe_open
+from safetensors.torch import save_file
+
+
+def load_loader():
+    # Load the module by path: importing the nanovllm package pulls in the CUDA engine
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nanovllm", "utils", "loader.py")
+    spec = importlib.util.spec_from_file_location("nanovllm_loader", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+loader = load_loader()
+
+
+def synthetic_shapes(num_layers, hidden_size, intermediate_size, vocab_size):
+    shapes = {"model.embed_tokens.weight": (vocab_size, hidden_size), "model.norm.weight": (hidden_size,)}
+    for i in range(num_layers):
+        prefix = f"model.layers.{i}"
+        for name in ("q_proj", "k_proj", "v_proj", "o_proj"):
+            shapes[f"{prefix}.self_attn.{name}.weight"] = (hidden_size, hidden_size)
+        for name in ("gate_proj", "up_proj"):
+            shapes[f"{prefix}.mlp.{name}.weight"] = (intermediate_size, hidden_size)
+        shapes[f"{prefix}.mlp.down_proj.weight"] = (hidden_size, intermediate_size)
+        shapes[f"{prefix}.input_layernorm.weight"] = (hidden_size,)
+        shapes[f"{prefix}.post_attention_layernorm.weight"] = (hidden_size,)
+    return shapes
+
+
+def write_checkpoint(path, shapes, num_shards):
+    if os.path.isdir(path) and any(f.endswith(".safetensors") for f in os.listdir(path)):
+        return
+    os.makedirs(path, exist_ok=True)
+    names = list(shapes)
+    per_shard = (len(names) + num_shards - 1) // num_shards
+    for shard in range(num_shards):
+        tensors = {name: torch.randn(shapes[name], dtype=torch.bfloat16) for name in names[shard * per_shard:(shard + 1) * per_shard]}
+        save_file(tensors, os.path.join(path, f"model-{shard + 1:05d}-of-{num_shards:05d}.safetensors"))
+
+
+class FlatModel(nn.Module):
+    """Holds one parameter per checkpoint tensor under the same dotted names."""
+
+    def __init__(self, shapes, device):
+        super().__init__()
+        for name, shape in shapes.items():
+            module = self
+            *parents, leaf = name.split(".")
+            for part in parents:
+                if not hasattr(module, part):
+                    module.add_module(part, nn.Module())
+                module = getattr(module, part)
+            module.register_parameter(leaf, nn.Parameter(torch.empty(shape, dtype=torch.bfloat16, device=device), requires_grad=False))
+
+
+def serial_load(model, path):
+    """The previous loader: one tensor at a time, pageable host memory."""
+    for file in sorted(f for f in os.listdir(path) if f.endswith(".safetensors")):
+        with safe_open(os.path.join(path, file), "pt", "cpu") as f:
+            for name in f.keys():
+                model.get_parameter(name).data.copy_(f.get_tensor(name))
+
+
+def drop_caches():
+    os.sync()
+    with open("/proc/sys/vm/drop_caches", "w") as f:
+        f.write("3\n")
+
+
+def timed(fn, device, cold):
+    if cold:
+        drop_caches()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default="/tmp/nanovllm-synthetic-ckpt")
+    parser.add_argument("--num-layers", type=int, default=28)
+    parser.add_argument("--hidden-size", type=int, default=2048)
+    parser.add_argument("--intermediate-size", type=int, default=6144)
+    parser.add_argument("--vocab-size", type=int, default=217204)
+    parser.add_argument("--num-shards", type=int, default=2)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--drop-caches", action="store_true", help="drop the page cache before every run (root, Linux)")
+    args = parser.parse_args()
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    shapes = synthetic_shapes(args.num_layers, args.hidden_size, args.intermediate_size, args.vocab_size)
+    total_bytes = sum(torch.Size(shape).numel() * 2 for shape in shapes.values())
+    write_checkpoint(args.dir, shapes, args.num_shards)
+    model = FlatModel(shapes, device)
+    print(f"Checkpoint: {args.dir}, {len(shapes)} tensors, {total_bytes / 1024**3:.2f} GB, {args.num_shards} shards, device {device}")
+
+    elapsed = timed(lambda: serial_load(model, args.dir), device, args.drop_caches)
+    print(f"  serial (previous loader): {elapsed:.2f}s ({total_bytes / 1024**3 / elapsed:.2f} GB/s)")
+    for workers in args.workers:
+        elapsed = timed(lambda: loader.load_model(model, args.dir, num_workers=workers), device, args.drop_caches)
+        print(f"  parallel, {workers} worker(s): {elapsed:.2f}s ({total_bytes / 1024**3 / elapsed:.2f} GB/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,11 @@ class Config:
     eos: int = -1
     kvcache_block_size: int = 256
     num_kvcache_blocks: int = -1
+    # Speculative decoding: draft tokens verified per target forward (0 disables)
+    num_speculative_tokens: int = 0
+    speculative_ngram_max: int = 3
+    # KV cache storage: "auto" (model dtype), or "int8" / "fp8" with per-token, per-head scales
+    kv_cache_dtype: str = "auto"
 
     def __post_init__(self):
         assert os.path.isdir(self.model)
@@ -24,3 +29,5 @@ class Config:
         self.hf_config = AutoConfig.from_pretrained(self.model)
         self.max_model_len = min(self.max_model_len, self.hf_config.max_position_embeddings)
         assert self.max_num_batched_tokens >= self.max_model_len
+        assert self.num_speculative_tokens >= 0
+        assert self.kv_cache_dtype in ("auto", "int8", "fp8")
@@ -117,3 +117,45 @@ class BlockManager:
             self.hash_to_block_id[h] = last_block.block_id
         else:
             assert last_block.hash == -1
+
+    def _hash_committed_blocks(self, seq: Sequence):
+        # Hash full blocks the same way token-by-token may_append would have by now:
+        # every full block except one that was completed by the last token.
+        block_table = seq.block_table
+        for i in range((len(seq) - 1) // self.block_size):
+            block = self.blocks[block_table[i]]
+            if block.hash != -1:
+                continue
+            token_ids = seq.block(i)
+            prefix = self.blocks[block_table[i - 1]].hash if i > 0 else -1
+            h = self.compute_hash(token_ids, prefix)
+            block.update(h, token_ids)
+            self.hash_to_block_id[h] = block.block_id
+
+    def num_lookahead_blocks(self, seq: Sequence, num_lookahead: int) -> int:
+        needed = (len(seq) + num_lookahead + self.block_size - 1) // self.block_size
+        return max(0, needed - len(seq.block_table))
+
+    def reserve_lookahead(self, seq: Sequence, num_lookahead: int):
+        """Make room for KV of `num_lookahead` speculative tokens past the end of seq."""
+        self._hash_committed_blocks(seq)
+        for _ in range(self.num_lookahead_blocks(seq, num_lookahead)):
+            block_id = self.free_block_ids[0]
+            self._allocate_block(block_id)
+            seq.block_table.append(block_id)
+
+    def release_lookahead(self, seq: Sequence):
+        """Return blocks reserved for rejected speculative tokens once seq has grown.
+
+        Leaves the table covering len(seq) - 1 tokens, exactly as after a normal
+        decode step, so the next may_append behaves as usual.
+        """
+        block_table = seq.block_table
+        num_committed_blocks = (len(seq) - 1 + self.block_size - 1) // self.block_size
+        while len(block_table) > num_committed_blocks:
+            block_id = block_table.pop()
+            block = self.blocks[block_id]
+            block.ref_count -= 1
+            assert block.ref_count == 0 and block.hash == -1
+            self._deallocate_block(block_id)
+        self._hash_committed_blocks(seq)
@@ -1,6 +1,7 @@
 import atexit
 from dataclasses import fields
 from time import perf_counter
+from typing import Callable
 from tqdm.auto import tqdm
 from transformers import AutoTokenizer
 import torch.multiprocessing as mp
@@ -10,6 +11,7 @@ from nanovllm.sampling_params import SamplingParams
 from nanovllm.engine.sequence import Sequence
 from nanovllm.engine.scheduler import Scheduler
 from nanovllm.engine.model_runner import ModelRunner
+from nanovllm.engine.speculative import NgramDrafter, SpeculativeStats
 
 
 class LLMEngine:
@@ -35,6 +37,15 @@ class LLMEngine:
             self.tokenizer = AutoTokenizer.from_pretrained(config.model, use_fast=True)
         config.eos = self.tokenizer.eos_token_id
         self.scheduler = Scheduler(config)
+        # Optional speculative decoding: a custom Drafter (e.g. DraftModelDrafter) or
+        # n-gram prompt lookup when num_speculative_tokens > 0
+        self.drafter = kwargs.get("drafter", None)
+        if self.drafter is None and config.num_speculative_tokens > 0:
+            self.drafter = NgramDrafter(config.num_speculative_tokens, config.speculative_ngram_max)
+        # Draft distributions are only needed on rank 0 and are too large for the shm channel
+        self.pass_draft_probs = config.tensor_parallel_size == 1
+        self.spec_stats = SpeculativeStats()
+        self.kv_cache_info = self.model_runner.kv_cache_info()
         atexit.register(self.exit)
 
     def exit(self):
@@ -71,14 +82,44 @@ class LLMEngine:
             seq = Sequence(prompt, sampling_params)
             self.scheduler.add(seq)
 
+    def _propose_drafts(self, seqs: list[Sequence]):
+        """Draft tokens for one decode step, or (None, None) to decode normally."""
+        is_cfg_batch = seqs[0].cfg_scale > 1.0 and seqs[0].paired_seq is not None
+        target_seqs = seqs[:len(seqs) // 2] if is_cfg_batch else seqs
+        proposals = [self.drafter.propose(seq) for seq in target_seqs]
+        # Sequences advance in lockstep, so the batch verifies the shortest draft
+        num_draft = min(len(draft) for draft, _ in proposals)
+        if num_draft == 0 or not self.scheduler.reserve_lookahead(seqs, num_draft):
+            return None, None
+        draft_token_ids = [draft[:num_draft] for draft, _ in proposals]
+        draft_probs = None
+        if self.pass_draft_probs and any(probs is not None for _, probs in proposals):
+            draft_probs = [probs[:num_draft] if probs is not None else None for _, probs in proposals]
+        return draft_token_ids, draft_probs
+
     def step(self):
         seqs, is_prefill = self.scheduler.schedule()
-        token_ids = self.model_runner.call("run", seqs, is_prefill)
+        draft_token_ids = draft_probs = None
+        if not is_prefill and self.drafter is not None:
+            draft_token_ids, draft_probs = self._propose_drafts(seqs)
+        num_targets = len([s for s in seqs if not s.is_unconditional])
+        if draft_token_ids is not None:
+            token_ids, num_accepted = self.model_runner.call("run_speculative", seqs, draft_token_ids, draft_probs)
+            num_emitted = sum(len(t) for t in token_ids)
+            self.spec_stats.num_verify_steps += 1
+            self.spec_stats.num_draft_tokens += sum(len(d) for d in draft_token_ids)
+            self.spec_stats.num_accepted_tokens += num_accepted
+        else:
+            token_ids = self.model_runner.call("run", seqs, is_prefill)
+            num_emitted = num_targets
+        if not is_prefill:
+            self.spec_stats.num_seq_forwards += num_targets
+            self.spec_stats.num_emitted_tokens += num_emitted
         self.scheduler.postprocess(seqs, token_ids)
         # Only output conditional sequences (unconditional sequences are just for CFG computation)
         output_seqs = [seq for seq in seqs if seq.is_finished and (seq.cfg_scale <= 1.0 or not seq.is_unconditional)]
         outputs = [(seq.seq_id, seq.completion_token_ids) for seq in output_seqs]
-        num_tokens = sum(len(seq) for seq in seqs) if is_prefill else -len([s for s in seqs if not s.is_unconditional])
+        num_tokens = sum(len(seq) for seq in seqs) if is_prefill else -num_emitted
         return outputs, num_tokens
 
     def is_finished(self):
@@ -108,7 +149,13 @@ class LLMEngine:
         sampling_params: SamplingParams | list[SamplingParams],
         use_tqdm: bool = True,
         unconditional_prompts: list[str] | list[list[int]] | None = None,
+        stop_check: Callable[[], None] | None = None,
     ) -> list[str]:
+        """
+        stop_check, when given, is called before every engine step; an exception
+        it raises (e.g. the caller's job was cancelled) aborts generation and
+        frees the KV cache blocks of all sequences before propagating.
+        """
         # Clean up any residual state from previous interrupted generations
         # This prevents 'deque index out of range' errors from accumulated block leaks
         if not self.is_finished():
@@ -122,10 +169,13 @@ class LLMEngine:
             unconditional_prompts = [None] * len(prompts)
         for prompt, sp, uncond_prompt in zip(prompts, sampling_params, unconditional_prompts):
             self.add_request(prompt, sp, uncond_prompt)
+        self.spec_stats.reset()
         outputs = {}
         prefill_throughput = decode_throughput = 0.
         try:
             while not self.is_finished():
+                if stop_check is not None:
+                    stop_check()
                 t = perf_counter()
                 output, num_tokens = self.step()
                 if use_tqdm:
@@ -133,10 +183,13 @@ class LLMEngine:
                         prefill_throughput = num_tokens / (perf_counter() - t)
                     else:
                         decode_throughput = -num_tokens / (perf_counter() - t)
-                    pbar.set_postfix({
+                    postfix = {
                         "Prefill": f"{int(prefill_throughput)}tok/s",
                         "Decode": f"{int(decode_throughput)}tok/s",
-                    })
+                    }
+                    if self.drafter is not None:
+                        postfix["Accept"] = f"{self.spec_stats.acceptance_rate:.2f}"
+                    pbar.set_postfix(postfix)
                 for seq_id, token_ids in output:
                     outputs[seq_id] = token_ids
                     if use_tqdm:
@@ -7,8 +7,10 @@ import sys
 
 from nanovllm.config import Config
 from nanovllm.engine.sequence import Sequence
+from nanovllm.engine.speculative import accept_drafts
 from nanovllm.models.qwen3 import Qwen3ForCausalLM
 from nanovllm.layers.sampler import Sampler
+from nanovllm.layers.kv_quant import DEQUANT_CHUNK_BYTES, kv_cache_block_bytes, kv_cache_torch_dtype, kv_dequant_block_bytes
 from nanovllm.utils.context import set_context, get_context, reset_context
 from nanovllm.utils.loader import load_model
 
@@ -203,7 +205,8 @@ class ModelRunner:
         current = torch.cuda.memory_stats()["allocated_bytes.all.current"]
         num_kv_heads = hf_config.num_key_value_heads // self.world_size
         head_dim = getattr(hf_config, "head_dim", hf_config.hidden_size // hf_config.num_attention_heads)
-        block_bytes = 2 * hf_config.num_hidden_layers * self.block_size * num_kv_heads * head_dim * self.dtype.itemsize
+        block_bytes = kv_cache_block_bytes(
+            hf_config.num_hidden_layers, self.block_size, num_kv_heads, head_dim, self.dtype, config.kv_cache_dtype)
         
         # Calculate available memory for KV cache
         # After warmup_model, empty_cache has been called, so current represents model memory only
@@ -214,6 +217,12 @@ class ModelRunner:
         # Ensure we have positive memory available
         if available_for_kv_cache <= 0:
             available_for_kv_cache = free * 0.5  # Fallback to 50% of free memory
+        quantized = config.kv_cache_dtype != "auto"
+        if quantized:
+            # The spare block padded (-1) slots are written to and the chunked dequantization's fp32 transient
+            available_for_kv_cache -= block_bytes + 2 * DEQUANT_CHUNK_BYTES
+            # Attention reads a model-dtype page buffer (one layer's worth, shared by all layers)
+            block_bytes += kv_dequant_block_bytes(self.block_size, num_kv_heads, head_dim, self.dtype)
         
         config.num_kvcache_blocks = max(1, int(available_for_kv_cache) // block_bytes)
         if config.num_kvcache_blocks <= 0:
@@ -223,13 +232,51 @@ class ModelRunner:
                 f"Available for KV: {available_for_kv_cache / 1024**3:.2f} GB, "
                 f"Block size: {block_bytes / 1024**2:.2f} MB"
             )
-        self.kv_cache = torch.empty(2, hf_config.num_hidden_layers, config.num_kvcache_blocks, self.block_size, num_kv_heads, head_dim)
+        kv_shape = (2, hf_config.num_hidden_layers, config.num_kvcache_blocks, self.block_size, num_kv_heads, head_dim)
+        if not quantized:
+            self.kv_cache = torch.empty(kv_shape)
+            self.kv_scale = self.kv_pages = None
+        else:
+            # One spare block at the end takes the writes of padded (-1) slots
+            quantized_shape = kv_shape[:2] + (config.num_kvcache_blocks + 1,) + kv_shape[3:]
+            # Zero-filled so unwritten slots dequantize to finite values (masked, but still loaded)
+            self.kv_cache = torch.zeros(quantized_shape, dtype=kv_cache_torch_dtype(config.kv_cache_dtype))
+            self.kv_scale = torch.zeros(quantized_shape[:-1], dtype=torch.float32)
+            self.kv_pages = torch.zeros((2,) + kv_shape[2:])
         layer_id = 0
         for module in self.model.modules():
             if hasattr(module, "k_cache") and hasattr(module, "v_cache"):
                 module.k_cache = self.kv_cache[0, layer_id]
                 module.v_cache = self.kv_cache[1, layer_id]
+                if self.kv_scale is not None:
+                    module.k_scale = self.kv_scale[0, layer_id]
+                    module.v_scale = self.kv_scale[1, layer_id]
+                    module.k_pages, module.v_pages = self.kv_pages[0], self.kv_pages[1]
+                    module.kv_cache_dtype = config.kv_cache_dtype
                 layer_id += 1
+        if self.rank == 0:
+            info = self.kv_cache_info()
+            print(
+                f"[nanovllm] KV cache: {info['num_blocks']} blocks ({info['kv_cache_dtype']}, {info['memory_gb']:.2f} GB), "
+                f"max concurrent sequences at {info['max_model_len']} tokens: {info['max_concurrent_seqs']}"
+            )
+
+    def kv_cache_info(self) -> dict:
+        config = self.config
+        num_tokens = config.num_kvcache_blocks * self.block_size
+        num_bytes = self.kv_cache.numel() * self.kv_cache.element_size()
+        if self.kv_scale is not None:
+            num_bytes += self.kv_scale.numel() * self.kv_scale.element_size()
+            num_bytes += self.kv_pages.numel() * self.kv_pages.element_size()
+        return {
+            "kv_cache_dtype": config.kv_cache_dtype if config.kv_cache_dtype != "auto" else str(self.dtype).replace("torch.", ""),
+            "num_blocks": config.num_kvcache_blocks,
+            "num_tokens": num_tokens,
+            "memory_gb": num_bytes / 1024**3,
+            "max_model_len": config.max_model_len,
+            # Full-length sequences; a CFG request holds two
+            "max_concurrent_seqs": num_tokens // config.max_model_len,
+        }
 
     def prepare_block_tables(self, seqs: list[Sequence]):
         max_len = max(len(seq.block_table) for seq in seqs)
@@ -295,6 +342,38 @@ class ModelRunner:
         set_context(False, slot_mapping=slot_mapping, context_lens=context_lens, block_tables=block_tables)
         return input_ids, positions
 
+    def prepare_verify(self, seqs: list[Sequence], draft_token_ids: list[list[int]]):
+        """Score [last_token] + draft for every seq in one prefill-style forward
+        over the paged KV cache (the prefix-cache attention path)."""
+        input_ids = []
+        positions = []
+        cu_seqlens_q = [0]
+        cu_seqlens_k = [0]
+        max_seqlen_q = 0
+        max_seqlen_k = 0
+        slot_mapping = []
+        for seq, draft in zip(seqs, draft_token_ids):
+            start = len(seq) - 1
+            seqlen_q = len(draft) + 1
+            seqlen_k = start + seqlen_q
+            input_ids.append(seq.last_token)
+            input_ids.extend(draft)
+            positions.extend(range(start, seqlen_k))
+            cu_seqlens_q.append(cu_seqlens_q[-1] + seqlen_q)
+            cu_seqlens_k.append(cu_seqlens_k[-1] + seqlen_k)
+            max_seqlen_q = max(seqlen_q, max_seqlen_q)
+            max_seqlen_k = max(seqlen_k, max_seqlen_k)
+            for pos in range(start, seqlen_k):
+                slot_mapping.append(seq.block_table[pos // self.block_size] * self.block_size + pos % self.block_size)
+        block_tables = self.prepare_block_tables(seqs)
+        input_ids = torch.tensor(input_ids, dtype=torch.int64, pin_memory=True).cuda(non_blocking=True)
+        positions = torch.tensor(positions, dtype=torch.int64, pin_memory=True).cuda(non_blocking=True)
+        cu_seqlens_q = torch.tensor(cu_seqlens_q, dtype=torch.int32, pin_memory=True).cuda(non_blocking=True)
+        cu_seqlens_k = torch.tensor(cu_seqlens_k, dtype=torch.int32, pin_memory=True).cuda(non_blocking=True)
+        slot_mapping = torch.tensor(slot_mapping, dtype=torch.int32, pin_memory=True).cuda(non_blocking=True)
+        set_context(True, cu_seqlens_q, cu_seqlens_k, max_seqlen_q, max_seqlen_k, slot_mapping, None, block_tables, all_logits=True)
+        return input_ids, positions
+
     def prepare_sample(self, seqs: list[Sequence], is_cfg_batch: bool = False):
         """Optimized sample preparation using pre-allocated buffers."""
         if is_cfg_batch:
@@ -526,6 +605,73 @@ class ModelRunner:
             else:
                 return None
 
+    @staticmethod
+    def _apply_repetition_penalty(logits: torch.Tensor, token_ids: list[int], penalty: float) -> torch.Tensor:
+        if penalty == 1.0 or not token_ids:
+            return logits
+        token_mask = torch.zeros(logits.shape[-1], dtype=torch.bool, device=logits.device)
+        token_mask[torch.tensor(token_ids, device=logits.device)] = True
+        penalty_scores = torch.where(logits < 0, logits * penalty, logits / penalty)
+        return torch.where(token_mask, penalty_scores, logits)
+
+    def run_speculative(
+        self,
+        seqs: list[Sequence],
+        draft_token_ids: list[list[int]],
+        draft_probs: list[torch.Tensor | None] | None = None,
+    ) -> tuple[list[list[int]], int] | None:
+        """Verify k draft tokens per sequence with a single target forward.
+
+        draft_token_ids holds one equal-length draft per conditional (or plain)
+        sequence; CFG unconditional sequences score the same draft as their pair.
+        Positions are accepted left to right (see `accept_drafts`) against the
+        CFG-combined, repetition-penalized, constrained distribution, so output
+        matches token-by-token decoding in distribution.
+
+        Returns (accepted token lists, number of accepted draft tokens).
+        """
+        is_cfg_batch = seqs[0].cfg_scale > 1.0 and seqs[0].paired_seq is not None
+        num_target = len(seqs) // 2 if is_cfg_batch else len(seqs)
+        target_seqs = seqs[:num_target]
+        all_drafts = draft_token_ids + draft_token_ids if is_cfg_batch else draft_token_ids
+
+        input_ids, positions = self.prepare_verify(seqs, all_drafts)
+        sample_params = self.prepare_sample(seqs, is_cfg_batch=is_cfg_batch) if self.rank == 0 else None
+        logits_all = self.run_model(input_ids, positions, True)
+        reset_context()
+        if self.rank != 0:
+            return None
+
+        temperatures, cfg_scales, top_ks, top_ps, repetition_penalties = sample_params
+        num_draft = len(draft_token_ids[0])
+        logits_all = logits_all.view(len(seqs), num_draft + 1, -1)
+        logits_cond = logits_all[:num_target]
+        logits_uncond = logits_all[num_target:] if is_cfg_batch else None
+
+        def position_probs(j: int, accepted: list[list[int]]) -> torch.Tensor:
+            rows = logits_cond[:, j].clone()
+            if repetition_penalties is not None:
+                for i, seq in enumerate(target_seqs):
+                    rows[i] = self._apply_repetition_penalty(
+                        rows[i], seq.completion_token_ids + accepted[i], repetition_penalties[i].item()
+                    )
+            if is_cfg_batch:
+                rows_uncond = logits_uncond[:, j]
+                rows = rows_uncond + cfg_scales.unsqueeze(1) * (rows - rows_uncond)
+            for i, seq in enumerate(target_seqs):
+                if seq.logits_processor is not None:
+                    seq_input_ids = torch.tensor([seq.token_ids + accepted[i]], device=rows.device)
+                    rows[i:i+1] = seq.logits_processor(seq_input_ids, rows[i:i+1].clone())
+            return self.sampler.compute_probs(rows, temperatures, top_ks, top_ps)
+
+        return accept_drafts(
+            position_probs,
+            draft_token_ids,
+            draft_probs,
+            eos=self.config.eos,
+            update_state=target_seqs[0].logits_processor_update_state,
+        )
+
     @torch.inference_mode()
     def capture_cudagraph(self):
         config = self.config
@@ -178,12 +178,27 @@ class Scheduler:
         self.running.extendleft(reversed(scheduled_seqs))
         return scheduled_seqs, False
 
+    def reserve_lookahead(self, seqs: list[Sequence], num_lookahead: int) -> bool:
+        """Reserve KV slots for speculative tokens on all scheduled decode seqs, or none."""
+        block_manager = self.block_manager
+        needed = sum(block_manager.num_lookahead_blocks(seq, num_lookahead) for seq in seqs)
+        if len(block_manager.free_block_ids) < needed:
+            return False
+        for seq in seqs:
+            block_manager.reserve_lookahead(seq, num_lookahead)
+        return True
+
     def preempt(self, seq: Sequence):
         seq.status = SequenceStatus.WAITING
         self.block_manager.deallocate(seq)
         self.waiting.appendleft(seq)
 
-    def postprocess(self, seqs: list[Sequence], token_ids: list[int]) -> list[bool]:
+    def _is_seq_finished(self, seq: Sequence, token_id: int) -> bool:
+        return (not seq.ignore_eos and token_id == self.eos) or seq.num_completion_tokens == seq.max_tokens
+
+    def postprocess(self, seqs: list[Sequence], token_ids: list[int] | list[list[int]]) -> list[bool]:
+        """Append sampled tokens. Each entry of token_ids is either one token or,
+        after a speculative verify step, the list of tokens accepted for that seq."""
         # Check if this is a CFG batch
         is_cfg_batch = False
         if len(seqs) > 0 and seqs[0].cfg_scale > 1.0 and seqs[0].paired_seq is not None:
@@ -200,31 +215,44 @@ class Scheduler:
             uncond_seqs = seqs[num_cond:]
             
             # Apply the same sampled token to both conditional and unconditional sequences
-            for i, (cond_seq, uncond_seq, token_id) in enumerate(zip(cond_seqs, uncond_seqs, token_ids)):
-                cond_seq.append_token(token_id)
-                uncond_seq.append_token(token_id)  # Same token for unconditional
-                
-                # Check if either sequence is finished
-                cond_finished = ((not cond_seq.ignore_eos and token_id == self.eos) or 
-                                cond_seq.num_completion_tokens == cond_seq.max_tokens)
-                uncond_finished = ((not uncond_seq.ignore_eos and token_id == self.eos) or 
-                                  uncond_seq.num_completion_tokens == uncond_seq.max_tokens)
-                
-                if cond_finished or uncond_finished:
-                    # Mark both as finished
-                    cond_seq.status = SequenceStatus.FINISHED
-                    uncond_seq.status = SequenceStatus.FINISHED
-                    self.block_manager.deallocate(cond_seq)
-                    self.block_manager.deallocate(uncond_seq)
-                    if cond_seq in self.running:
-                        self.running.remove(cond_seq)
-                    if uncond_seq in self.running:
-                        self.running.remove(uncond_seq)
+            for i, (cond_seq, uncond_seq, seq_token_ids) in enumerate(zip(cond_seqs, uncond_seqs, token_ids)):
+                is_speculative = isinstance(seq_token_ids, list)
+                if not is_speculative:
+                    seq_token_ids = [seq_token_ids]
+                for token_id in seq_token_ids:
+                    cond_seq.append_token(token_id)
+                    uncond_seq.append_token(token_id)  # Same token for unconditional
+                    
+                    # Check if either sequence is finished
+                    cond_finished = self._is_seq_finished(cond_seq, token_id)
+                    uncond_finished = self._is_seq_finished(uncond_seq, token_id)
+                    
+                    if cond_finished or uncond_finished:
+                        # Mark both as finished
+                        cond_seq.status = SequenceStatus.FINISHED
+                        uncond_seq.status = SequenceStatus.FINISHED
+                        self.block_manager.deallocate(cond_seq)
+                        self.block_manager.deallocate(uncond_seq)
+                        if cond_seq in self.running:
+                            self.running.remove(cond_seq)
+                        if uncond_seq in self.running:
+                            self.running.remove(uncond_seq)
+                        break
+                if is_speculative and not cond_seq.is_finished:
+                    self.block_manager.release_lookahead(cond_seq)
+                    self.block_manager.release_lookahead(uncond_seq)
         else:
             # Normal batch
-            for seq, token_id in zip(seqs, token_ids):
-                seq.append_token(token_id)
-                if (not seq.ignore_eos and token_id == self.eos) or seq.num_completion_tokens == seq.max_tokens:
-                    seq.status = SequenceStatus.FINISHED
-                    self.block_manager.deallocate(seq)
-                    self.running.remove(seq)
+            for seq, seq_token_ids in zip(seqs, token_ids):
+                is_speculative = isinstance(seq_token_ids, list)
+                if not is_speculative:
+                    seq_token_ids = [seq_token_ids]
+                for token_id in seq_token_ids:
+                    seq.append_token(token_id)
+                    if self._is_seq_finished(seq, token_id):
+                        seq.status = SequenceStatus.FINISHED
+                        self.block_manager.deallocate(seq)
+                        self.running.remove(seq)
+                        break
+                if is_speculative and not seq.is_finished:
+                    self.block_manager.release_lookahead(seq)
@@ -0,0 +1,199 @@
+from dataclasses import dataclass
+from typing import Callable, TYPE_CHECKING
+
+import torch
+from torch import nn
+
+if TYPE_CHECKING:
+    # Kept out of the runtime imports so this module loads without the CUDA engine
+    from nanovllm.engine.sequence import Sequence
+
+
+@dataclass
+class SpeculativeStats:
+    num_verify_steps: int = 0
+    num_draft_tokens: int = 0
+    num_accepted_tokens: int = 0
+    # Counted per conditional sequence, so CFG pairs count once
+    num_seq_forwards: int = 0
+    num_emitted_tokens: int = 0
+
+    @property
+    def acceptance_rate(self) -> float:
+        return self.num_accepted_tokens / self.num_draft_tokens if self.num_draft_tokens else 0.0
+
+    @property
+    def tokens_per_forward(self) -> float:
+        return self.num_emitted_tokens / self.num_seq_forwards if self.num_seq_forwards else 0.0
+
+    def reset(self):
+        self.num_verify_steps = self.num_draft_tokens = self.num_accepted_tokens = 0
+        self.num_seq_forwards = self.num_emitted_tokens = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "verify_steps": self.num_verify_steps,
+            "draft_tokens": self.num_draft_tokens,
+            "accepted_tokens": self.num_accepted_tokens,
+            "acceptance_rate": self.acceptance_rate,
+            "tokens_per_forward": self.tokens_per_forward,
+        }
+
+
+class Drafter:
+    """Proposes up to `num_tokens` continuation tokens for a sequence.
+
+    `propose` returns the draft tokens and, optionally, the drafter's own
+    distribution for each of them as a [len(draft), vocab_size] tensor.
+    When no distribution is returned the draft is treated as deterministic
+    (one-hot), which is what n-gram lookup produces.
+    """
+
+    def __init__(self, num_tokens: int):
+        assert num_tokens > 0
+        self.num_tokens = num_tokens
+
+    def propose(self, seq: "Sequence") -> tuple[list[int], torch.Tensor | None]:
+        raise NotImplementedError
+
+
+class NgramDrafter(Drafter):
+    """Prompt-lookup drafter over the tokens a sequence has already generated.
+
+    Audio codes repeat whenever the music does (choruses, loops), so the
+    continuation of the most recent earlier occurrence of the current suffix
+    is a free and often correct guess.
+    """
+
+    def __init__(self, num_tokens: int, max_ngram: int = 3, min_ngram: int = 1, search_window: int = 2048):
+        super().__init__(num_tokens)
+        assert 1 <= min_ngram <= max_ngram
+        self.max_ngram = max_ngram
+        self.min_ngram = min_ngram
+        self.search_window = search_window
+
+    def propose(self, seq: "Sequence") -> tuple[list[int], None]:
+        return self.lookup(seq.completion_token_ids[-self.search_window:]), None
+
+    def lookup(self, tokens: list[int]) -> list[int]:
+        n_tokens = len(tokens)
+        for n in range(min(self.max_ngram, n_tokens - 1), self.min_ngram - 1, -1):
+            suffix = tokens[-n:]
+            # Most recent earlier match wins; it is the likeliest to continue
+            for start in range(n_tokens - n - 1, -1, -1):
+                if tokens[start:start + n] == suffix:
+                    follow = tokens[start + n:start + n + self.num_tokens]
+                    if follow:
+                        return follow
+        return []
+
+
+class DraftModelDrafter(Drafter):
+    """Autoregressive drafter backed by a small causal LM.
+
+    `model` is any module mapping [1, T] token ids to [1, T, vocab] logits
+    (or an output object with a `.logits` attribute, e.g. a transformers
+    model). The full context is re-encoded for every draft token, which is
+    only cheap for tiny draft models.
+    """
+
+    def __init__(self, model: nn.Module, num_tokens: int, temperature: float = 1.0, max_context: int = 1024):
+        super().__init__(num_tokens)
+        self.model = model
+        self.temperature = temperature
+        self.max_context = max_context
+
+    @torch.inference_mode()
+    def propose(self, seq: "Sequence") -> tuple[list[int], torch.Tensor]:
+        device = next(self.model.parameters()).device
+        context = seq.token_ids[-self.max_context:]
+        input_ids = torch.tensor([context], dtype=torch.int64, device=device)
+        draft, draft_probs = [], []
+        for _ in range(self.num_tokens):
+            out = self.model(input_ids)
+            logits = getattr(out, "logits", out)[0, -1].float()
+            probs = torch.softmax(logits / self.temperature, dim=-1)
+            token = int(sample_from_probs(probs))
+            draft.append(token)
+            draft_probs.append(probs)
+            input_ids = torch.cat([input_ids, input_ids.new_tensor([[token]])], dim=1)[:, -self.max_context:]
+        return draft, torch.stack(draft_probs)
+
+
+def sample_from_probs(probs: torch.Tensor) -> torch.Tensor:
+    # Same exponential-race trick as Sampler, equivalent to multinomial
+    return probs.div(torch.empty_like(probs).exponential_(1).clamp_min_(1e-10)).argmax(dim=-1)
+
+
+def verify_draft_token(
+    target_probs: torch.Tensor,
+    draft_token: int,
+    draft_probs: torch.Tensor | None = None,
+) -> tuple[bool, int]:
+    """Speculative-sampling acceptance test for a single position.
+
+    Accepts `draft_token` with probability min(1, p(x) / q(x)) and otherwise
+    resamples from the residual max(0, p - q), so the emitted token is
+    distributed exactly as `target_probs` regardless of the drafter.
+    """
+    if draft_probs is not None:
+        draft_probs = draft_probs.to(target_probs.device)
+    p = target_probs[draft_token]
+    q = draft_probs[draft_token] if draft_probs is not None else p.new_tensor(1.0)
+    if q > 0 and torch.rand((), device=p.device) * q <= p:
+        return True, draft_token
+    if draft_probs is not None:
+        residual = (target_probs - draft_probs).clamp_min_(0)
+    else:
+        residual = target_probs.clone()
+        residual[draft_token] = 0
+    total = residual.sum()
+    if total <= 0:
+        # Draft and target agree everywhere the target has mass
+        return False, int(sample_from_probs(target_probs))
+    return False, int(sample_from_probs(residual / total))
+
+
+def accept_drafts(
+    position_probs: Callable[[int, list[list[int]]], torch.Tensor],
+    draft_token_ids: list[list[int]],
+    draft_probs: list[torch.Tensor | None] | None = None,
+    eos: int = -1,
+    update_state: Callable[[int], None] | None = None,
+) -> tuple[list[list[int]], int]:
+    """Walk draft positions left to right for a batch of equal-length drafts.
+
+    `position_probs(j, accepted)` returns the [batch, vocab] target distribution
+    at draft position j given the tokens accepted so far; it is called lazily so
+    stateful constraints only ever see accepted prefixes. Every sequence emits
+    the same number of tokens: the step stops at the first position where any
+    sequence rejects, samples EOS or uses the bonus token after the last draft.
+    Truncating a sequence that accepted further is still an exact sample, and
+    lockstep keeps the shared constrained-decoding state (advanced once per
+    position via `update_state`, from the first sequence) consistent with
+    token-by-token decoding.
+
+    Returns (tokens emitted per sequence, number of accepted draft tokens).
+    """
+    num_seqs = len(draft_token_ids)
+    num_draft = len(draft_token_ids[0])
+    accepted = [[] for _ in range(num_seqs)]
+    num_accepted = 0
+    for j in range(num_draft + 1):
+        probs = position_probs(j, accepted)
+        stop = j == num_draft
+        for i in range(num_seqs):
+            if j < num_draft:
+                q = draft_probs[i][j] if draft_probs is not None and draft_probs[i] is not None else None
+                ok, token_id = verify_draft_token(probs[i], draft_token_ids[i][j], q)
+                num_accepted += ok
+                stop |= not ok
+            else:
+                token_id = int(sample_from_probs(probs[i]))
+            stop |= token_id == eos
+            accepted[i].append(token_id)
+        if update_state is not None:
+            update_state(accepted[0][-1])
+        if stop:
+            break
+    return accepted, num_accepted
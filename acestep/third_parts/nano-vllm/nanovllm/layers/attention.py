@@ -5,6 +5,7 @@ import triton.language as tl
 
 from flash_attn import flash_attn_varlen_func, flash_attn_with_kvcache
 from nanovllm.utils.context import get_context
+from nanovllm.layers.kv_quant import store_quantized_kvcache, dequantize_pages
 
 
 @triton.jit
@@ -55,21 +56,34 @@ class Attention(nn.Module):
         self.scale = scale
         self.num_kv_heads = num_kv_heads
         self.k_cache = self.v_cache = torch.tensor([])
+        # Per-token, per-head scales and the shared dequantized page buffers; only set for an int8/fp8 cache
+        self.k_scale = self.v_scale = torch.tensor([])
+        self.k_pages = self.v_pages = torch.tensor([])
+        self.kv_cache_dtype = "auto"
 
     def forward(self, q: torch.Tensor, k: torch.Tensor, v: torch.Tensor):
         context = get_context()
         k_cache, v_cache = self.k_cache, self.v_cache
+        block_tables = context.block_tables
+        quantized = self.kv_cache_dtype != "auto"
         if k_cache.numel() and v_cache.numel():
-            store_kvcache(k, v, k_cache, v_cache, context.slot_mapping)
+            if quantized:
+                store_quantized_kvcache(k, v, k_cache, v_cache, self.k_scale, self.v_scale, context.slot_mapping, self.kv_cache_dtype)
+            else:
+                store_kvcache(k, v, k_cache, v_cache, context.slot_mapping)
+            if quantized and block_tables is not None:
+                # flash-attn only reads fp16/bf16 pages: dequantize the pages this batch uses
+                dequantize_pages(k_cache, v_cache, self.k_scale, self.v_scale, block_tables, self.k_pages, self.v_pages)
+                k_cache, v_cache = self.k_pages, self.v_pages
         if context.is_prefill:
-            if context.block_tables is not None:    # prefix cache
+            if block_tables is not None:    # prefix cache
                 k, v = k_cache, v_cache
             o = flash_attn_varlen_func(q, k, v,
                                        max_seqlen_q=context.max_seqlen_q, cu_seqlens_q=context.cu_seqlens_q,
                                        max_seqlen_k=context.max_seqlen_k, cu_seqlens_k=context.cu_seqlens_k,
-                                       softmax_scale=self.scale, causal=True, block_table=context.block_tables)
+                                       softmax_scale=self.scale, causal=True, block_table=block_tables)
         else:    # decode
             o = flash_attn_with_kvcache(q.unsqueeze(1), k_cache, v_cache,
-                                        cache_seqlens=context.context_lens, block_table=context.block_tables, 
+                                        cache_seqlens=context.context_lens, block_table=block_tables, 
                                         softmax_scale=self.scale, causal=True)
         return o
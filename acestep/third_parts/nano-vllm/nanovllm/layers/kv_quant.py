@@ -0,0 +1,111 @@
+import torch
+
+
+# Max representable magnitude of each 8-bit cache format
+_QMAX = {"int8": 127.0, "fp8": 448.0}
+
+# fp32 working set of one dequantization chunk: the only transient on top of the
+# dequantized page buffer, reserved when the cache is sized
+DEQUANT_CHUNK_BYTES = 64 * 1024**2
+
+
+def kv_cache_torch_dtype(kv_cache_dtype: str) -> torch.dtype:
+    if kv_cache_dtype == "int8":
+        return torch.int8
+    if kv_cache_dtype == "fp8":
+        assert hasattr(torch, "float8_e4m3fn"), "fp8 KV cache needs a PyTorch build with float8_e4m3fn"
+        return torch.float8_e4m3fn
+    raise ValueError(f"unsupported kv_cache_dtype: {kv_cache_dtype!r}")
+
+
+def kv_cache_block_bytes(
+    num_layers: int,
+    block_size: int,
+    num_kv_heads: int,
+    head_dim: int,
+    model_dtype: torch.dtype,
+    kv_cache_dtype: str = "auto",
+) -> int:
+    """Bytes of one paged KV block across all layers, K and V, including scales."""
+    if kv_cache_dtype == "auto":
+        per_head = head_dim * model_dtype.itemsize
+    else:
+        # 1 byte per element plus one fp32 scale per cached token and head
+        per_head = head_dim + 4
+    return 2 * num_layers * block_size * num_kv_heads * per_head
+
+
+def kv_dequant_block_bytes(block_size: int, num_kv_heads: int, head_dim: int, model_dtype: torch.dtype) -> int:
+    """Bytes per cache block of the dequantized K/V page buffer (one layer's worth, shared by all layers)."""
+    return 2 * block_size * num_kv_heads * head_dim * model_dtype.itemsize
+
+
+def quantize_kv(x: torch.Tensor, kv_cache_dtype: str) -> tuple[torch.Tensor, torch.Tensor]:
+    """Symmetric absmax quantization of [N, num_kv_heads, head_dim] with one scale per token and head."""
+    x = x.float()
+    scale = x.abs().amax(dim=-1).clamp_min(1e-6) / _QMAX[kv_cache_dtype]
+    y = x / scale.unsqueeze(-1)
+    if kv_cache_dtype == "int8":
+        y = y.round_().clamp_(-127, 127)
+    return y.to(kv_cache_torch_dtype(kv_cache_dtype)), scale
+
+
+def dequantize_kv(q: torch.Tensor, scale: torch.Tensor, dtype: torch.dtype) -> torch.Tensor:
+    return q.float().mul_(scale.unsqueeze(-1)).to(dtype)
+
+
+def _bytes(t: torch.Tensor) -> torch.Tensor:
+    # Indexing kernels are not implemented for float8 on every backend; 1-byte views always work
+    return t.view(torch.uint8)
+
+
+def store_quantized_kvcache(
+    key: torch.Tensor,
+    value: torch.Tensor,
+    k_cache: torch.Tensor,
+    v_cache: torch.Tensor,
+    k_scale: torch.Tensor,
+    v_scale: torch.Tensor,
+    slot_mapping: torch.Tensor,
+    kv_cache_dtype: str,
+):
+    """Quantize-on-store counterpart of store_kvcache for 8-bit caches.
+
+    Caches are [num_blocks, block_size, num_kv_heads, head_dim], scales are
+    [num_blocks, block_size, num_kv_heads]. The last block is never handed out:
+    slots of -1 are written there instead of being filtered out, which keeps
+    every shape static so the store can be captured in a CUDA graph.
+    """
+    num_kv_heads, head_dim = k_cache.shape[-2:]
+    spare_slot = k_cache.shape[0] * k_cache.shape[1] - 1
+    slots = torch.where(slot_mapping >= 0, slot_mapping, spare_slot).long()
+    for x, cache, scale in ((key, k_cache, k_scale), (value, v_cache, v_scale)):
+        q, s = quantize_kv(x, kv_cache_dtype)
+        _bytes(cache).view(-1, num_kv_heads, head_dim)[slots] = _bytes(q)
+        scale.view(-1, num_kv_heads)[slots] = s
+
+
+def dequantize_pages(
+    k_cache: torch.Tensor,
+    v_cache: torch.Tensor,
+    k_scale: torch.Tensor,
+    v_scale: torch.Tensor,
+    block_tables: torch.Tensor,
+    k_pages: torch.Tensor,
+    v_pages: torch.Tensor,
+):
+    """Dequantize the pages referenced by `block_tables` into k_pages / v_pages.
+
+    The page buffers have the cache's block layout in the model dtype, so each
+    page lands at its own block id and `block_tables` drops unchanged into the
+    flash-attn paged kernels. Pages are converted a chunk at a time, which
+    bounds the fp32 transient to DEQUANT_CHUNK_BYTES; padding entries (-1) read
+    page 0, which is never attended to.
+    """
+    block_ids = block_tables.clamp_min(0).long().flatten()
+    chunk = max(1, DEQUANT_CHUNK_BYTES // (4 * k_cache[0].numel()))
+    for cache, scale, pages in ((k_cache, k_scale, k_pages), (v_cache, v_scale, v_pages)):
+        data = _bytes(cache)
+        for start in range(0, block_ids.numel(), chunk):
+            ids = block_ids[start:start + chunk]
+            pages[ids] = dequantize_kv(data[ids].view(cache.dtype), scale[ids], pages.dtype)
@@ -1,4 +1,6 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
 import torch
 from torch import nn
@@ -40,31 +42,110 @@ def _get_parameter_safe(model: nn.Module, weight_name: str):
     return None
 
 
-def load_model(model: nn.Module, path: str):
+# Per-thread pinned staging buffer and copy stream, reused across tensors
+_staging = threading.local()
+
+
+def _to_device(tensor: torch.Tensor, device: torch.device) -> torch.Tensor:
+    """Copy a CPU tensor to `device` through this thread's pinned buffer (CUDA) or return it as is."""
+    if device.type != "cuda":
+        return tensor
+    nbytes = tensor.numel() * tensor.element_size()
+    buffer = getattr(_staging, "buffer", None)
+    if buffer is None or buffer.numel() < nbytes:
+        buffer = _staging.buffer = torch.empty(max(nbytes, 1), dtype=torch.uint8, device="cpu", pin_memory=True)
+    staged = buffer[:nbytes].view(tensor.dtype).view(tensor.shape)
+    staged.copy_(tensor)
+    return staged.to(device, non_blocking=True)
+
+
+def _copy_stream(device: torch.device):
+    if device.type != "cuda":
+        return None
+    streams = getattr(_staging, "streams", None)
+    if streams is None:
+        streams = _staging.streams = {}
+    if device not in streams:
+        streams[device] = torch.cuda.Stream(device)
+    return streams[device]
+
+
+def _load_weight(model: nn.Module, packed_modules_mapping: dict, weight_name: str, get_tensor):
+    for k in packed_modules_mapping:
+        if k in weight_name:
+            v, shard_id = packed_modules_mapping[k]
+            param_name = weight_name.replace(k, v)
+            param = _get_parameter_safe(model, param_name)
+            if param is None:
+                print(f"[loader] Warning: Parameter not found: {param_name}")
+                return
+            weight_loader = getattr(param, "weight_loader")
+            weight_loader(param, _to_device(get_tensor(weight_name), param.device), shard_id)
+            return
+    param = _get_parameter_safe(model, weight_name)
+    if param is None:
+        print(f"[loader] Warning: Parameter not found: {weight_name}")
+        return
+    weight_loader = getattr(param, "weight_loader", default_weight_loader)
+    weight_loader(param, _to_device(get_tensor(weight_name), param.device))
+
+
+def _load_shard_part(model: nn.Module, packed_modules_mapping: dict, file: str, weight_names: list[str], device: torch.device):
+    # safe_open memory-maps the shard; each worker opens its own handle
+    stream = _copy_stream(device)
+    with safe_open(file, "pt", "cpu") as f:
+        if stream is None:
+            for weight_name in weight_names:
+                _load_weight(model, packed_modules_mapping, weight_name, f.get_tensor)
+            return
+        with torch.cuda.stream(stream):
+            for weight_name in weight_names:
+                _load_weight(model, packed_modules_mapping, weight_name, f.get_tensor)
+                # The staging buffer is reused by the next tensor
+                stream.synchronize()
+
+
+def load_model(model: nn.Module, path: str, num_workers: int | None = None):
+    """Load safetensors shards from `path` into `model`.
+
+    Shards are memory-mapped and split across a thread pool; on CUDA each
+    worker streams tensors through its own pinned staging buffer and copy
+    stream, so disk reads, host copies and H2D transfers of different tensors
+    overlap. `num_workers` defaults to NANOVLLM_LOAD_WORKERS or min(8, cpus).
+    """
     packed_modules_mapping = getattr(model, "packed_modules_mapping", {})
-    safetensor_files = glob(os.path.join(path, "*.safetensors"))
+    safetensor_files = sorted(glob(os.path.join(path, "*.safetensors")))
 
     if not safetensor_files:
         raise FileNotFoundError(f"No .safetensors files found in {path}")
 
+    if num_workers is None:
+        num_workers = int(os.environ.get("NANOVLLM_LOAD_WORKERS", min(8, os.cpu_count() or 1)))
+    num_workers = max(1, num_workers)
+    param = next(model.parameters(), None)
+    device = param.device if param is not None else torch.device("cpu")
+    if device.type == "cuda":
+        # Parameters may still be written by kernels queued on the default stream
+        torch.cuda.current_stream(device).synchronize()
+
+    tasks = []
     for file in safetensor_files:
         with safe_open(file, "pt", "cpu") as f:
-            for weight_name in f.keys():
-                for k in packed_modules_mapping:
-                    if k in weight_name:
-                        v, shard_id = packed_modules_mapping[k]
-                        param_name = weight_name.replace(k, v)
-                        param = _get_parameter_safe(model, param_name)
-                        if param is None:
-                            print(f"[loader] Warning: Parameter not found: {param_name}")
-                            continue
-                        weight_loader = getattr(param, "weight_loader")
-                        weight_loader(param, f.get_tensor(weight_name), shard_id)
-                        break
-                else:
-                    param = _get_parameter_safe(model, weight_name)
-                    if param is None:
-                        print(f"[loader] Warning: Parameter not found: {weight_name}")
-                        continue
-                    weight_loader = getattr(param, "weight_loader", default_weight_loader)
-                    weight_loader(param, f.get_tensor(weight_name))
+            weight_names = list(f.keys())
+        if not weight_names:
+            continue  # an empty shard has nothing to load (and would give a zero slice step)
+        # Contiguous slices keep each worker's reads mostly sequential within the shard
+        num_parts = min(num_workers, len(weight_names))
+        part_size = (len(weight_names) + num_parts - 1) // num_parts
+        for i in range(0, len(weight_names), part_size):
+            tasks.append((file, weight_names[i:i + part_size]))
+
+    if num_workers == 1:
+        for file, weight_names in tasks:
+            _load_shard_part(model, packed_modules_mapping, file, weight_names, device)
+        return
+    with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="nanovllm-loader") as executor:
+        futures = [executor.submit(_load_shard_part, model, packed_modules_mapping, file, weight_names, device)
+                   for file, weight_names in tasks]
+        for future in futures:
+            future.result()
@@ -0,0 +1,137 @@
+"""
+Split-deployment check for the API server (ACESTEP_API_ROLE=front / worker).
+
+Starts N HTTP-only front processes (uvicorn workers) on a temporary SQLite job
+store, plus a stub model worker in this process that claims jobs with
+SQLiteJobStore.claim_next, "generates" for --job-seconds and marks them
+succeeded, the way a real ACESTEP_API_ROLE=worker process does. While jobs run,
+client threads poll /query_result and /v1/stats; the script reports poll latency
+(p50 / p99) and checks that every submitted job finishes exactly once.
+
+Run it with --processes 1 and --processes 4 to compare poll latency under load.
+
+    python scripts/bench_api_processes.py --processes 4 --jobs 40 --pollers 32 --duration 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.job_store import SQLiteJobStore
+
+
+def post(url, payload, timeout=10.0):
+    req = urllib.request.Request(url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read())
+
+
+def wait_healthy(base_url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/health", timeout=1.0):
+                return True
+        except Exception:
+            time.sleep(0.2)
+    return False
+
+
+def stub_worker(path, job_seconds, stop, finished):
+    store = SQLiteJobStore(path)
+    while not stop.is_set():
+        rec = store.claim_next("bench-worker")
+        if rec is None:
+            time.sleep(0.05)
+            continue
+        time.sleep(job_seconds)
+        store.mark_succeeded(rec.job_id, {"audio_paths": [], "prompt": rec.params.get("prompt")})
+        finished.append(rec.job_id)
+    store.close()
+
+
+def poller(base_url, task_ids, stop, latencies, errors):
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            if i % 4 == 3:
+                with urllib.request.urlopen(f"{base_url}/v1/stats", timeout=10.0) as resp:
+                    resp.read()
+            else:
+                post(f"{base_url}/query_result", {"task_id_list": [task_ids[i % len(task_ids)]]})
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            errors.append(1)
+        i += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4, help="front (HTTP-only) processes")
+    parser.add_argument("--port", type=int, default=8031)
+    parser.add_argument("--jobs", type=int, default=40)
+    parser.add_argument("--job-seconds", type=float, default=0.2)
+    parser.add_argument("--pollers", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    args = parser.parse_args()
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            ACESTEP_JOB_STORE="sqlite",
+            ACESTEP_JOB_STORE_PATH=os.path.join(tmp, "jobs.sqlite3"),
+            ACESTEP_QUEUE_MAXSIZE=str(max(200, args.jobs)),
+        )
+        env.pop("ACESTEP_API_KEY", None)
+        front = subprocess.Popen(
+            [sys.executable, "-m", "acestep.api_server", "--role", "front", "--processes", str(args.processes),
+             "--port", str(args.port)],
+            env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        try:
+            if not wait_healthy(base_url, 60):
+                print("FAIL (front processes did not come up)")
+                sys.exit(1)
+            task_ids = [post(f"{base_url}/release_task", {"prompt": f"song {i}"})["data"]["task_id"] for i in range(args.jobs)]
+            print(f"submitted {len(task_ids)} jobs to {args.processes} front process(es)")
+
+            stop, finished, latencies, errors = threading.Event(), [], [], []
+            threads = [threading.Thread(target=stub_worker, args=(env["ACESTEP_JOB_STORE_PATH"], args.job_seconds, stop, finished))]
+            threads += [threading.Thread(target=poller, args=(base_url, task_ids, stop, latencies, errors)) for _ in range(args.pollers)]
+            for t in threads:
+                t.start()
+            deadline = time.time() + args.duration
+            while time.time() < deadline and len(finished) < len(task_ids):
+                time.sleep(0.1)
+            time.sleep(min(1.0, max(0.0, deadline - time.time())))
+            stop.set()
+            for t in threads:
+                t.join()
+
+            results = post(f"{base_url}/query_result", {"task_id_list": task_ids})["data"]
+            done = sum(1 for r in results if r.get("status") == 1)
+        finally:
+            front.terminate()
+            front.wait(timeout=30)
+
+    latencies.sort()
+    p50 = statistics.median(latencies) if latencies else float("nan")
+    p99 = latencies[int(0.99 * (len(latencies) - 1))] if latencies else float("nan")
+    print(f"polls: {len(latencies)} ok, {len(errors)} errors; p50 {p50 * 1e3:.1f} ms, p99 {p99 * 1e3:.1f} ms")
+    ok = len(finished) == len(set(finished)) == len(task_ids) and done == len(task_ids) and not errors
+    print(f"jobs: {len(finished)} claimed, {len(set(finished))} unique, {done} reported succeeded")
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Steps/s of CFG sampling strategies for base (non-turbo) models, with a stand-in DiT.
+
+The stand-in decoder has the ACE-Step decoder call signature (hidden_states,
+timestep, encoder_hidden_states, ... -> tuple) and random weights. For batch
+sizes 1 and 4 it times:
+  - separate: conditional and unconditional forwards per step
+  - fused:    one [cond; uncond] forward per step
+  - fused + interval skip: fused loop wrapped in acestep/cfg_interval.py's
+    CFGIntervalSkipper, so steps outside the CFG interval run cond-only
+and checks that the skipper's latents match a reference loop that applies
+guidance only inside the interval.
+
+    python scripts/bench_cfg.py --steps 32 --cfg-interval 0.0 0.5
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.cfg_interval import CFGIntervalSkipper, cfg_step_in_interval
+
+
+class Block(nn.Module):
+    def __init__(self, dim, num_heads):
+        super().__init__()
+        self.num_heads = num_heads
+        self.norm1, self.norm2, self.norm3 = nn.LayerNorm(dim), nn.LayerNorm(dim), nn.LayerNorm(dim)
+        self.qkv = nn.Linear(dim, 3 * dim)
+        self.cross_q = nn.Linear(dim, dim)
+        self.cross_kv = nn.Linear(dim, 2 * dim)
+        self.proj = nn.Linear(dim, dim)
+        self.cross_proj = nn.Linear(dim, dim)
+        self.mlp = nn.Sequential(nn.Linear(dim, 4 * dim), nn.GELU(), nn.Linear(4 * dim, dim))
+
+    def _heads(self, x):
+        return x.view(x.shape[0], x.shape[1], self.num_heads, -1).transpose(1, 2)
+
+    def forward(self, h, temb, context):
+        q, k, v = self.qkv(self.norm1(h) + temb).chunk(3, dim=-1)
+        h = h + self.proj(F.scaled_dot_product_attention(self._heads(q), self._heads(k), self._heads(v)).transpose(1, 2).flatten(2))
+        k, v = self.cross_kv(context).chunk(2, dim=-1)
+        attn = F.scaled_dot_product_attention(self._heads(self.cross_q(self.norm2(h))), self._heads(k), self._heads(v))
+        h = h + self.cross_proj(attn.transpose(1, 2).flatten(2))
+        return h + self.mlp(self.norm3(h))
+
+
+class StandInDecoder(nn.Module):
+    def __init__(self, latent_dim, dim, num_layers, num_heads):
+        super().__init__()
+        self.proj_in = nn.Linear(latent_dim, dim)
+        self.time_embed = nn.Linear(1, dim)
+        self.layers = nn.ModuleList(Block(dim, num_heads) for _ in range(num_layers))
+        self.proj_out = nn.Linear(dim, latent_dim)
+
+    def forward(self, hidden_states, timestep, encoder_hidden_states, encoder_attention_mask=None):
+        temb = self.time_embed(timestep.view(-1, 1, 1))
+        h = self.proj_in(hidden_states)
+        for layer in self.layers:
+            h = layer(h, temb, encoder_hidden_states)
+        return (self.proj_out(h), None)
+
+
+def guided(v_cond, v_uncond, scale):
+    return v_uncond + scale * (v_cond - v_uncond)
+
+
+@torch.inference_mode()
+def sample(decoder, x, cond, uncond, args, strategy):
+    timesteps = torch.linspace(1.0, 0.0, args.steps + 1)
+    batch = x.shape[0]
+    for step, (t, t_next) in enumerate(zip(timesteps[:-1], timesteps[1:])):
+        in_interval = cfg_step_in_interval(step, args.steps, *args.cfg_interval)
+        if strategy == "separate":
+            v_cond = decoder(x, timestep=t.expand(batch), encoder_hidden_states=cond)[0]
+            v_uncond = decoder(x, timestep=t.expand(batch), encoder_hidden_states=uncond)[0]
+        elif strategy == "reference":
+            v_cond = decoder(x, timestep=t.expand(batch), encoder_hidden_states=cond)[0]
+            v_uncond = decoder(x, timestep=t.expand(batch), encoder_hidden_states=uncond)[0] if in_interval else v_cond
+        else:
+            v = decoder(torch.cat([x, x]), timestep=t.expand(2 * batch),
+                        encoder_hidden_states=torch.cat([cond, uncond]))[0]
+            v_cond, v_uncond = v.chunk(2)
+        v = guided(v_cond, v_uncond, args.guidance_scale) if in_interval else v_cond
+        x = x + (t_next - t) * v
+    return x
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=32)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--cfg-interval", type=float, nargs=2, default=[0.0, 0.5])
+    parser.add_argument("--guidance-scale", type=float, default=7.0)
+    parser.add_argument("--frames", type=int, default=750, help="latent frames (750 = 30 s)")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--num-layers", type=int, default=8)
+    parser.add_argument("--num-heads", type=int, default=8)
+    parser.add_argument("--latent-dim", type=int, default=64)
+    parser.add_argument("--context-tokens", type=int, default=256)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    decoder = StandInDecoder(args.latent_dim, args.dim, args.num_layers, args.num_heads).to(device).eval()
+    print(f"Stand-in DiT {args.num_layers}x{args.dim} on {device}, {args.frames} frames, {args.steps} steps, "
+          f"CFG interval {args.cfg_interval}")
+
+    def timed(fn):
+        if device == "cuda":
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        out = fn()
+        if device == "cuda":
+            torch.cuda.synchronize()
+        return out, time.perf_counter() - start
+
+    for batch in args.batch_sizes:
+        x = torch.randn(batch, args.frames, args.latent_dim, device=device)
+        cond = torch.randn(batch, args.context_tokens, args.dim, device=device)
+        # Unconditional rows: one null embedding broadcast over the sequence, as for CFG dropout
+        uncond = torch.randn(1, 1, args.dim, device=device).expand_as(cond).contiguous()
+        sample(decoder, x, cond, uncond, argparse.Namespace(**{**vars(args), "steps": 1}), "fused")  # warmup
+
+        results = {}
+        for strategy in ("separate", "fused"):
+            results[strategy] = timed(lambda: sample(decoder, x, cond, uncond, args, strategy))[1]
+        with CFGIntervalSkipper(decoder, cond, args.steps, *args.cfg_interval) as skipper:
+            skipped_latents, results["fused + interval skip"] = timed(lambda: sample(decoder, x, cond, uncond, args, "fused"))
+        reference = sample(decoder, x, cond, uncond, args, "reference")
+        max_diff = (skipped_latents - reference).abs().max().item()
+
+        print(f"  batch {batch}:")
+        for name, elapsed in results.items():
+            print(f"    {name:<22} {args.steps / elapsed:7.2f} steps/s")
+        print(f"    uncond skipped on {skipper.skipped_steps}/{args.steps} steps, "
+              f"max |diff| vs cond-only-outside-interval reference {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
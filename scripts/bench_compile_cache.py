@@ -0,0 +1,113 @@
+"""
+Cold-start benchmark for the shape-bucketed torch.compile path and its persistent cache.
+
+Starts the DiT service with compile_model=True in a fresh process twice: first with
+an empty compile cache, then reusing the cache the first run saved. Each run reports
+model load time, warmup time over the requested buckets, the latency of the first
+request after warmup, and dynamo/inductor counters (graphs compiled, FX graph cache
+hits/misses). A final run with an off-bucket duration checks that it does not recompile.
+
+    python scripts/bench_compile_cache.py --config-path acestep-v15-turbo --buckets 30 60
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_once(args):
+    """One service start: load, warm up, time a first request, print a JSON result line."""
+    sys.path.insert(0, project_root)
+    from acestep.handler import AceStepHandler
+    from acestep.compile_cache import get_compile_counters
+
+    handler = AceStepHandler()
+    start = time.time()
+    status, ok = handler.initialize_service(
+        project_root=project_root,
+        config_path=args.config_path,
+        device=args.device,
+        compile_model=True,
+    )
+    if not ok:
+        raise SystemExit(status)
+    load_time = time.time() - start
+
+    start = time.time()
+    handler.warmup(buckets=args.buckets)
+    warmup_time = time.time() - start
+    counters_after_warmup = get_compile_counters()
+
+    # Off-bucket duration: pads up to the next bucket, so no new graphs should appear
+    start = time.time()
+    handler.generate_music(
+        captions="first request",
+        lyrics="[Instrumental]",
+        inference_steps=args.inference_steps,
+        use_random_seed=False,
+        seed=1,
+        audio_duration=args.first_request_duration,
+        progress=lambda *a, **kw: None,
+    )
+    first_request_time = time.time() - start
+
+    print(json.dumps({
+        "load_s": load_time,
+        "warmup_s": warmup_time,
+        "first_request_s": first_request_time,
+        "counters_after_warmup": counters_after_warmup,
+        "counters_after_first_request": get_compile_counters(),
+    }))
+
+
+def spawn(args, cache_dir):
+    env = dict(os.environ, ACESTEP_COMPILE_CACHE_DIR=cache_dir)
+    cmd = [sys.executable, os.path.abspath(__file__), "--child",
+           "--config-path", args.config_path, "--device", args.device,
+           "--inference-steps", str(args.inference_steps),
+           "--first-request-duration", str(args.first_request_duration),
+           "--buckets", *map(str, args.buckets)]
+    output = subprocess.run(cmd, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def report(name, result):
+    print(f"{name}:")
+    print(f"  load {result['load_s']:.1f}s, warmup {result['warmup_s']:.1f}s, first request {result['first_request_s']:.2f}s")
+    print(f"  after warmup:        {result['counters_after_warmup']}")
+    print(f"  after first request: {result['counters_after_first_request']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config-path", default="acestep-v15-turbo")
+    parser.add_argument("--device", default="auto")
+    parser.add_argument("--buckets", type=int, nargs="+", default=[30, 60], help="durations (s) to warm up")
+    parser.add_argument("--first-request-duration", type=int, default=47, help="should fall inside a warmed bucket")
+    parser.add_argument("--inference-steps", type=int, default=8)
+    parser.add_argument("--cache-dir", default=None, help="compile cache root (default: a temporary directory)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_once(args)
+        return
+
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix="acestep-compile-cache-")
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    try:
+        report("Cold start (empty compile cache)", spawn(args, cache_dir))
+        report("Warm start (reused compile cache)", spawn(args, cache_dir))
+    finally:
+        if args.cache_dir is None:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+CPU benchmark for the DiT execution mode, using random weights at realistic shapes.
+
+Builds a stand-in DiT decoder (self-attention + cross-attention + SwiGLU MLP blocks
+through SDPA, default sized like the v1.5 turbo DiT) and a stand-in Oobleck-style VAE
+decoder, then reports:
+  1. seconds per diffusion step (CFG batch) for fp32, bf16 and dynamic int8 linears
+     with the thread settings from acestep/cpu_config.py (ACESTEP_CPU_* variables);
+  2. wall time of several requests run back to back versus pipelined, where one
+     request's VAE decode runs on the VAE executor while the next one diffuses.
+
+    python scripts/bench_cpu_dit.py --duration 30 --steps 8
+    ACESTEP_CPU_NUMA_NODE=0 ACESTEP_CPU_VAE_THREADS=8 python scripts/bench_cpu_dit.py --precisions int8
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.cpu_config import (
+    apply_cpu_execution_config,
+    create_vae_executor,
+    get_cpu_execution_config,
+    quantize_linear_dynamic_int8,
+)
+
+
+class Attention(nn.Module):
+    def __init__(self, dim, num_heads):
+        super().__init__()
+        self.num_heads = num_heads
+        self.q = nn.Linear(dim, dim, bias=False)
+        self.kv = nn.Linear(dim, 2 * dim, bias=False)
+        self.o = nn.Linear(dim, dim, bias=False)
+
+    def forward(self, x, context=None):
+        b, n, d = x.shape
+        context = x if context is None else context
+        q = self.q(x).view(b, n, self.num_heads, -1).transpose(1, 2)
+        k, v = self.kv(context).view(b, context.shape[1], 2, self.num_heads, -1).permute(2, 0, 3, 1, 4)
+        out = F.scaled_dot_product_attention(q, k, v)
+        return self.o(out.transpose(1, 2).reshape(b, n, d))
+
+
+class Block(nn.Module):
+    def __init__(self, dim, num_heads, intermediate_size):
+        super().__init__()
+        self.norm1, self.norm2, self.norm3 = nn.LayerNorm(dim), nn.LayerNorm(dim), nn.LayerNorm(dim)
+        self.self_attn = Attention(dim, num_heads)
+        self.cross_attn = Attention(dim, num_heads)
+        self.gate_up = nn.Linear(dim, 2 * intermediate_size, bias=False)
+        self.down = nn.Linear(intermediate_size, dim, bias=False)
+
+    def forward(self, x, context):
+        x = x + self.self_attn(self.norm1(x))
+        x = x + self.cross_attn(self.norm2(x), context)
+        gate, up = self.gate_up(self.norm3(x)).chunk(2, dim=-1)
+        return x + self.down(F.silu(gate) * up)
+
+
+class StandInDiT(nn.Module):
+    def __init__(self, args):
+        super().__init__()
+        self.patch_size = args.patch_size
+        self.proj_in = nn.Linear(args.latent_dim * 3 * args.patch_size, args.hidden_size)
+        self.layers = nn.ModuleList(Block(args.hidden_size, args.num_heads, args.intermediate_size)
+                                    for _ in range(args.num_layers))
+        self.proj_out = nn.Linear(args.hidden_size, args.latent_dim * args.patch_size)
+
+    def forward(self, x, context):
+        b, t, c = x.shape
+        h = self.proj_in(x.reshape(b, t // self.patch_size, c * self.patch_size))
+        for layer in self.layers:
+            h = layer(h, context)
+        return self.proj_out(h).reshape(b, t, -1)
+
+
+class StandInVAEDecoder(nn.Module):
+    """Oobleck-like: 1920x upsampling in 5 stages with dilated residual convs."""
+
+    def __init__(self, latent_dim=64, channels=128, strides=(2, 4, 4, 6, 10), multipliers=(16, 8, 4, 2, 1)):
+        super().__init__()
+        layers = [nn.Conv1d(latent_dim, channels * multipliers[0], 7, padding=3)]
+        for i, stride in enumerate(strides):
+            in_ch = channels * multipliers[i]
+            out_ch = channels * multipliers[i + 1] if i + 1 < len(multipliers) else channels
+            layers += [nn.ELU(), nn.ConvTranspose1d(in_ch, out_ch, 2 * stride, stride=stride, padding=stride // 2 + stride % 2,
+                                                    output_padding=stride % 2)]
+            layers += [nn.Sequential(nn.ELU(), nn.Conv1d(out_ch, out_ch, 7, padding=3 * d, dilation=d)) for d in (1, 3, 9)]
+        layers += [nn.ELU(), nn.Conv1d(channels, 2, 7, padding=3)]
+        self.net = nn.Sequential(*layers)
+
+    def forward(self, z):
+        return torch.tanh(self.net(z))
+
+
+def build_dit(args, precision):
+    torch.manual_seed(0)
+    model = StandInDiT(args).eval()
+    if precision == "bf16":
+        model = model.to(torch.bfloat16)
+    elif precision == "int8":
+        quantize_linear_dynamic_int8(model)
+    return model
+
+
+def diffusion(model, args, dtype, steps=None):
+    frames = int(args.duration * 25) // args.patch_size * args.patch_size
+    # CFG: conditional and unconditional rows in one batch
+    x = torch.randn(2 * args.batch_size, frames, args.latent_dim * 3, dtype=dtype)
+    context = torch.randn(2 * args.batch_size, args.encoder_len, args.hidden_size, dtype=dtype)
+    with torch.inference_mode():
+        for _ in range(steps or args.steps):
+            v = model(x, context)
+            x = torch.cat([x[..., :args.latent_dim] - 0.1 * v, x[..., args.latent_dim:]], dim=-1)
+    return x[:args.batch_size, :, :args.latent_dim].float()
+
+
+def decode(vae, latents):
+    with torch.inference_mode():
+        return vae(latents.transpose(1, 2))
+
+
+def bench_precisions(args):
+    print(f"DiT {args.num_layers}x{args.hidden_size}, {args.duration:.0f}s audio, batch {args.batch_size} (+CFG), "
+          f"{torch.get_num_threads()} threads:")
+    for precision in args.precisions:
+        model = build_dit(args, precision)
+        dtype = torch.bfloat16 if precision == "bf16" else torch.float32
+        diffusion(model, args, dtype, steps=1)  # warmup
+        start = time.perf_counter()
+        diffusion(model, args, dtype)
+        elapsed = time.perf_counter() - start
+        print(f"  {precision:>4}: {elapsed / args.steps:.3f}s/step, {elapsed:.2f}s for {args.steps} steps")
+
+
+def bench_pipeline(args, config):
+    precision = args.precisions[0]
+    model = build_dit(args, precision)
+    dtype = torch.bfloat16 if precision == "bf16" else torch.float32
+    vae = StandInVAEDecoder().eval()
+    executor = create_vae_executor(config)
+    diffusion_lock = threading.Lock()
+
+    def request(vae_on_executor):
+        with diffusion_lock:
+            latents = diffusion(model, args, dtype)
+        if vae_on_executor:
+            return executor.submit(decode, vae, latents).result()
+        return decode(vae, latents)
+
+    decode(vae, diffusion(model, args, dtype, steps=1))  # warmup
+    start = time.perf_counter()
+    for _ in range(args.num_requests):
+        request(vae_on_executor=False)
+    serial = time.perf_counter() - start
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=request, args=(True,)) for _ in range(args.num_requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pipelined = time.perf_counter() - start
+    executor.shutdown()
+    print(f"{args.num_requests} requests ({precision}, VAE pool {config.vae_threads} threads): "
+          f"back to back {serial:.2f}s, pipelined {pipelined:.2f}s ({serial / pipelined:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--precisions", nargs="+", choices=["fp32", "bf16", "int8"], default=["int8", "bf16", "fp32"])
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--steps", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--num-requests", type=int, default=3)
+    parser.add_argument("--hidden-size", type=int, default=2048)
+    parser.add_argument("--num-layers", type=int, default=24)
+    parser.add_argument("--num-heads", type=int, default=16)
+    parser.add_argument("--intermediate-size", type=int, default=6144)
+    parser.add_argument("--latent-dim", type=int, default=64)
+    parser.add_argument("--patch-size", type=int, default=2)
+    parser.add_argument("--encoder-len", type=int, default=512)
+    parser.add_argument("--skip-pipeline", action="store_true")
+    args = parser.parse_args()
+
+    config = get_cpu_execution_config()
+    apply_cpu_execution_config(config)
+    bench_precisions(args)
+    if not args.skip_pipeline:
+        bench_pipeline(args, config)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Equivalence and timing harness for the batched / banded DTW in acestep/dit_alignment_score.py.
+
+Builds synthetic lyric-alignment cost matrices (a noisy, roughly monotonic
+token-to-frame attention path, like the processed cross-attention of a song) and:
+  1. checks dtw_batch (numba kernel and the torch wavefront) returns exactly the
+     dtw_cpu path for unbanded input, including ties on quantized costs;
+  2. times dtw_cpu per sample versus dtw_batch, with and without a Sakoe-Chiba
+     band, for 4-minute songs (25 Hz frames), and reports how often the banded
+     path equals the full one.
+
+    python scripts/bench_dtw.py --duration 240 --tokens 400 --batch-size 4 --band 0.1
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.dit_alignment_score import dtw_batch, dtw_cpu
+
+
+def synthetic_cost(tokens, frames, rng, noise=0.3):
+    """Negative attention energy around a random monotonic token->frame path."""
+    boundaries = np.sort(rng.choice(np.arange(1, frames), size=tokens - 1, replace=False))
+    centers = (np.concatenate([[0], boundaries]) + np.concatenate([boundaries, [frames]])) / 2
+    widths = np.maximum(np.diff(np.concatenate([[0], boundaries, [frames]])), 4) / 2
+    grid = np.arange(frames)[None, :]
+    energy = np.exp(-0.5 * ((grid - centers[:, None]) / widths[:, None]) ** 2)
+    energy += noise * rng.random((tokens, frames))
+    return -energy
+
+
+def same_path(a, b):
+    return a[0].shape == b[0].shape and np.array_equal(a[0], b[0]) and np.array_equal(a[1], b[1])
+
+
+def check_equivalence(rng, device):
+    cases = [(5, 7), (30, 200), (64, 64), (120, 900)]
+    mats = [synthetic_cost(n, m, rng) for n, m in cases]
+    # Quantized costs produce ties, which must break exactly like dtw_cpu
+    mats += [np.round(synthetic_cost(n, m, rng), 1) for n, m in cases]
+    mats += [m.astype(np.float32) for m in mats[:2]]
+    reference = [dtw_cpu(m) for m in mats]
+    failures = 0
+    for name, kwargs in (("numba", {}), (f"torch/{device}", {"device": device})):
+        paths = dtw_batch(mats, **kwargs)
+        bad = [i for i, (p, r) in enumerate(zip(paths, reference)) if not same_path(p, (r[0], r[1]))]
+        failures += len(bad)
+        print(f"  dtw_batch[{name}] vs dtw_cpu on {len(mats)} matrices: {'identical' if not bad else f'MISMATCH at {bad}'}")
+    return failures
+
+
+def timed(fn, repeat=3):
+    fn()  # warmup / JIT
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=240.0, help="song length in seconds")
+    parser.add_argument("--tokens", type=int, default=400)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--band", type=float, default=0.1)
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print("Equivalence:")
+    failures = check_equivalence(rng, args.device)
+
+    frames = int(args.duration * 25)
+    mats = [synthetic_cost(args.tokens, frames, rng) for _ in range(args.batch_size)]
+    print(f"Timing: {args.batch_size} x [{args.tokens} tokens, {frames} frames]")
+    t_loop = timed(lambda: [dtw_cpu(m) for m in mats])
+    print(f"  dtw_cpu, one call per sample:   {t_loop * 1e3:8.1f} ms")
+    t_batch = timed(lambda: dtw_batch(mats))
+    print(f"  dtw_batch (numba):              {t_batch * 1e3:8.1f} ms")
+    t_band = timed(lambda: dtw_batch(mats, band=args.band))
+    print(f"  dtw_batch (numba, band {args.band}):   {t_band * 1e3:8.1f} ms")
+    t_dev = timed(lambda: dtw_batch(mats, band=args.band, device=args.device), repeat=1)
+    print(f"  dtw_batch ({args.device}, band {args.band}): {t_dev * 1e3:8.1f} ms")
+
+    full = dtw_batch(mats)
+    banded = dtw_batch(mats, band=args.band)
+    agree = sum(same_path(f, b) for f, b in zip(full, banded))
+    print(f"  banded path == full path for {agree}/{len(mats)} samples")
+
+    print("PASS" if not failures else f"FAIL ({failures} mismatches)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Event-loop responsiveness with /format_input-style LM calls (acestep/llm_pool.py).
+
+A stub LM sleeps for --lm-seconds per call (like a GPU call, it releases the
+GIL). Client coroutines send --requests format requests, --distinct of them
+different, while a /health-style probe wakes every 20 ms and records how late
+it runs. Two modes:
+
+  inline  the LM call runs inside the async handler (the old /format_input)
+  pool    the handler awaits LLMRequestPool.submit
+
+The script prints probe lateness (p50 / p99 / max), total time and LM calls,
+then checks that a full pool queue rejects and a slow call times out.
+
+    python scripts/bench_format_pool.py --requests 16 --distinct 4 --lm-seconds 0.2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.llm_pool import LLMPoolBusy, LLMRequestPool
+
+PROBE_INTERVAL = 0.02
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+async def probe(stop, lateness):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        due = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lateness.append(loop.time() - due)
+
+
+async def run(mode, args):
+    calls = []
+
+    def stub_lm(payload):
+        calls.append(payload)
+        time.sleep(args.lm_seconds)
+        return f"formatted {payload}"
+
+    pool = LLMRequestPool(stub_lm, max_queue=args.requests, batch_window=0.01, timeout=60.0)
+    await pool.start()
+
+    async def handler(i):
+        payload = ("caption", f"lyrics {i % args.distinct}")
+        if mode == "inline":
+            return stub_lm(payload)
+        return await pool.submit(payload)
+
+    stop, lateness = asyncio.Event(), []
+    probe_task = asyncio.create_task(probe(stop, lateness))
+    await asyncio.sleep(0.1)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(handler(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(0.1)
+    stop.set()
+    await probe_task
+    await pool.stop()
+
+    ok = all(r == f"formatted {('caption', f'lyrics {i % args.distinct}')}" for i, r in enumerate(results))
+    ms = [v * 1000 for v in lateness]
+    print(f"{mode:>6}: probe late p50 {statistics.median(ms):7.1f} ms  p99 {percentile(ms, 0.99):7.1f} ms  "
+          f"max {max(ms):7.1f} ms | {args.requests} requests in {elapsed:5.2f}s, {len(calls)} LM calls, "
+          f"results {'ok' if ok else 'WRONG'}")
+    return max(ms), ok
+
+
+async def limits():
+    def slow(payload):
+        time.sleep(0.3)
+        return payload
+
+    pool = LLMRequestPool(slow, max_queue=2, max_batch=1, batch_window=0.0, timeout=0.1)
+    await pool.start()
+    tasks = [asyncio.create_task(pool.submit(0))]
+    await asyncio.sleep(0.02)  # the dispatcher took it; the next two fill the queue
+    tasks += [asyncio.create_task(pool.submit(i)) for i in (1, 2)]
+    await asyncio.sleep(0)
+    try:
+        await pool.submit(99)
+        busy = False
+    except LLMPoolBusy:
+        busy = True
+    outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    timed_out = all(isinstance(o, asyncio.TimeoutError) for o in outcomes)
+    await pool.stop()
+    stats = pool.stats()
+    print(f"limits: full queue -> {'LLMPoolBusy' if busy else 'accepted'}, 0.3s call with 0.1s timeout -> "
+          f"{'TimeoutError' if timed_out else outcomes}, stats {stats}")
+    return busy and timed_out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--distinct", type=int, default=4)
+    parser.add_argument("--lm-seconds", type=float, default=0.2)
+    args = parser.parse_args()
+
+    inline_max, inline_ok = asyncio.run(run("inline", args))
+    pool_max, pool_ok = asyncio.run(run("pool", args))
+    limits_ok = asyncio.run(limits())
+    passed = inline_ok and pool_ok and limits_ok and pool_max < args.lm_seconds * 1000 / 2
+    print("PASS" if passed else "FAIL")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Calibrate static int8 (W8A8) quantization for the VAE decoder and the DiT decoder.
+
+Consumes the latents written by scripts/prepare_vae_calibration_data.py:
+  - VAE: decodes calibration latents through the float VAE while recording
+    per-channel activation ranges, then compares waveforms of held-out latents
+    decoded by the float and the quantized decoder.
+  - DiT: runs text2music generations for a set of prompts while recording
+    activation ranges of the DiT decoder across all diffusion steps, then
+    compares final latents of held-out prompts (same seeds) against float.
+
+Each component's statistics are saved next to its checkpoint (quant_calibration.pt)
+only if its SNR passes the gate; load them with quantization="w8a8_static".
+
+    python scripts/prepare_vae_calibration_data.py
+    python scripts/calibrate_quantization.py --config-path acestep-v15-turbo
+"""
+import argparse
+import os
+import sys
+
+import torch
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+from acestep.handler import AceStepHandler
+from acestep.quant_calibration import (
+    DEFAULT_SMOOTHING_ALPHA,
+    MIN_LATENT_SNR_DB,
+    MIN_WAVEFORM_SNR_DB,
+    apply_static_int8,
+    calibrate,
+    mean_snr_db,
+    save_calibration,
+)
+
+DEFAULT_PROMPTS = [
+    "upbeat pop song with bright synths and punchy drums",
+    "slow acoustic folk ballad with fingerpicked guitar",
+    "heavy metal with distorted guitars and double bass drums",
+    "lo-fi hip hop beat with jazzy piano chords",
+    "orchestral film score with strings and brass",
+    "deep house track with a rolling bassline",
+    "solo piano, classical, gentle and melancholic",
+    "reggae groove with offbeat guitar skank",
+    "ambient electronic soundscape with evolving pads",
+    "funk with slap bass and tight horn section",
+]
+
+
+def calibrate_vae(handler, latents, args):
+    vae = handler.vae
+    device = next(vae.parameters()).device
+    dtype = next(vae.parameters()).dtype
+    num_eval = min(args.num_eval_latents, max(1, len(latents) // 5))
+    calib, held_out = latents[:-num_eval], latents[-num_eval:]
+
+    def decode(latent):
+        with torch.no_grad():
+            return vae.decode(latent.to(device, dtype)).sample.float().cpu()
+
+    references = [decode(latent) for latent in held_out]
+    act_absmax = calibrate(vae.decoder, lambda: [decode(latent) for latent in calib])
+    apply_static_int8(vae.decoder, act_absmax, args.alpha)
+    snr = mean_snr_db(zip(references, (decode(latent) for latent in held_out)))
+    print(f"VAE: {len(act_absmax)} layers calibrated on {len(calib)} latents, waveform SNR {snr:.2f} dB "
+          f"(gate {args.min_waveform_snr_db} dB)")
+    return act_absmax, {"waveform_snr_db": snr}, snr >= args.min_waveform_snr_db
+
+
+def calibrate_dit(handler, prompts, args):
+    def generate(prompt, seed):
+        result = handler.generate_music(
+            captions=prompt,
+            lyrics="[Instrumental]",
+            inference_steps=args.inference_steps,
+            use_random_seed=False,
+            seed=seed,
+            audio_duration=args.duration,
+            progress=lambda *a, **kw: None,
+        )
+        if not result["success"]:
+            raise RuntimeError(result["error"])
+        return result["extra_outputs"]["pred_latents"]
+
+    num_eval = min(args.num_eval_prompts, max(1, len(prompts) // 5))
+    calib, held_out = prompts[:-num_eval], prompts[-num_eval:]
+    decoder = getattr(handler.model, "decoder", handler.model)
+    references = [generate(prompt, 1000 + i) for i, prompt in enumerate(held_out)]
+    act_absmax = calibrate(decoder, lambda: [generate(prompt, i) for i, prompt in enumerate(calib)])
+    apply_static_int8(decoder, act_absmax, args.alpha)
+    snr = mean_snr_db(zip(references, (generate(prompt, 1000 + i) for i, prompt in enumerate(held_out))))
+    print(f"DiT: {len(act_absmax)} layers calibrated on {len(calib)} prompts, latent SNR {snr:.2f} dB "
+          f"(gate {args.min_latent_snr_db} dB)")
+    return act_absmax, {"latent_snr_db": snr}, snr >= args.min_latent_snr_db
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config-path", default="acestep-v15-turbo")
+    parser.add_argument("--device", default="auto")
+    parser.add_argument("--calibration-data", default=os.path.join(project_root, "data", "calibration_latents.pt"))
+    parser.add_argument("--prompts-file", default=None, help="one DiT calibration prompt per line")
+    parser.add_argument("--components", nargs="+", choices=["vae", "dit"], default=["vae", "dit"])
+    parser.add_argument("--alpha", type=float, default=DEFAULT_SMOOTHING_ALPHA, help="SmoothQuant migration strength")
+    parser.add_argument("--duration", type=float, default=30.0, help="DiT calibration audio duration (s)")
+    parser.add_argument("--inference-steps", type=int, default=8)
+    parser.add_argument("--num-eval-latents", type=int, default=4)
+    parser.add_argument("--num-eval-prompts", type=int, default=2)
+    parser.add_argument("--min-waveform-snr-db", type=float, default=MIN_WAVEFORM_SNR_DB)
+    parser.add_argument("--min-latent-snr-db", type=float, default=MIN_LATENT_SNR_DB)
+    parser.add_argument("--force", action="store_true", help="save even if the SNR gate fails")
+    args = parser.parse_args()
+
+    handler = AceStepHandler()
+    status, ok = handler.initialize_service(project_root=project_root, config_path=args.config_path, device=args.device)
+    if not ok:
+        raise SystemExit(status)
+    checkpoint_dir = os.path.join(handler._get_project_root(), "checkpoints")
+
+    results = {}
+    if "vae" in args.components:
+        if not os.path.exists(args.calibration_data):
+            raise SystemExit(f"{args.calibration_data} not found; run scripts/prepare_vae_calibration_data.py first")
+        latents = torch.load(args.calibration_data)
+        results["vae"] = (os.path.join(checkpoint_dir, "vae"),) + calibrate_vae(handler, latents, args)
+    if "dit" in args.components:
+        prompts = DEFAULT_PROMPTS
+        if args.prompts_file:
+            with open(args.prompts_file, encoding="utf-8") as f:
+                prompts = [line.strip() for line in f if line.strip()]
+        results["dit"] = (os.path.join(checkpoint_dir, args.config_path),) + calibrate_dit(handler, prompts, args)
+
+    failed = False
+    for component, (checkpoint_path, act_absmax, metrics, passed) in results.items():
+        if passed or args.force:
+            path = save_calibration(checkpoint_path, act_absmax, args.alpha, metrics)
+            print(f"Saved {component} calibration to {path}" + ("" if passed else " (gate failed, --force)"))
+        else:
+            failed = True
+            print(f"Not saving {component} calibration: SNR below gate")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Harness for recording alignment cross-attention during generation (acestep/attention_capture.py).
+
+Runs a fused-CFG flow-matching loop on a small stand-in DiT decoder (ACE-Step
+decoder call signature, returns per-layer cross-attention [rows, heads, frames,
+tokens] as output [2] when output_attentions is set) and checks that:
+  1. the recorder does not change the generated latents;
+  2. the "first" recording equals the configured heads of a separate attention
+     forward on the first step's input, and the "last" one (record_final) those
+     of the post-generation pass on the final latent re-noised at t = 1/steps;
+and reports the recorded bytes against the full attention output of that pass.
+
+    python scripts/check_attention_capture.py --steps 8 --frames 750 --tokens 200
+"""
+import argparse
+import os
+import sys
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.attention_capture import CrossAttentionRecorder
+
+CUSTOM_LAYERS_CONFIG = {1: [0, 3], 2: [1], 3: [2, 3]}
+
+
+class Block(nn.Module):
+    def __init__(self, dim, num_heads):
+        super().__init__()
+        self.num_heads = num_heads
+        self.norm1, self.norm2 = nn.LayerNorm(dim), nn.LayerNorm(dim)
+        self.qkv = nn.Linear(dim, 3 * dim)
+        self.cross_q = nn.Linear(dim, dim)
+        self.cross_kv = nn.Linear(dim, 2 * dim)
+        self.proj = nn.Linear(dim, dim)
+        self.cross_proj = nn.Linear(dim, dim)
+
+    def _heads(self, x):
+        return x.view(x.shape[0], x.shape[1], self.num_heads, -1).transpose(1, 2)
+
+    def forward(self, h, temb, context, output_attentions):
+        q, k, v = self.qkv(self.norm1(h) + temb).chunk(3, dim=-1)
+        h = h + self.proj(F.scaled_dot_product_attention(self._heads(q), self._heads(k), self._heads(v)).transpose(1, 2).flatten(2))
+        q = self._heads(self.cross_q(self.norm2(h)))
+        k, v = (self._heads(t) for t in self.cross_kv(context).chunk(2, dim=-1))
+        weights = torch.softmax(q @ k.transpose(-1, -2) / q.shape[-1] ** 0.5, dim=-1)  # [rows, heads, frames, tokens]
+        h = h + self.cross_proj((weights @ v).transpose(1, 2).flatten(2))
+        return h, (weights if output_attentions else None)
+
+
+class StandInDecoder(nn.Module):
+    def __init__(self, latent_dim, dim, num_layers, num_heads):
+        super().__init__()
+        self.proj_in = nn.Linear(latent_dim, dim)
+        self.time_embed = nn.Linear(1, dim)
+        self.layers = nn.ModuleList(Block(dim, num_heads) for _ in range(num_layers))
+        self.proj_out = nn.Linear(dim, latent_dim)
+
+    def forward(self, hidden_states, timestep, encoder_hidden_states, output_attentions=False, custom_layers_config=None,
+                **kwargs):
+        temb = self.time_embed(timestep.view(-1, 1, 1))
+        h = self.proj_in(hidden_states)
+        attentions = []
+        for layer in self.layers:
+            h, attn = layer(h, temb, encoder_hidden_states, output_attentions)
+            attentions.append(attn)
+        return (self.proj_out(h), None, tuple(attentions) if output_attentions else None)
+
+
+@torch.inference_mode()
+def sample(decoder, noise, cond, uncond, steps, guidance_scale, step_inputs=None):
+    timesteps = torch.linspace(1.0, 0.0, steps + 1)
+    x = noise
+    batch = x.shape[0]
+    for t, t_next in zip(timesteps[:-1], timesteps[1:]):
+        if step_inputs is not None:
+            step_inputs.append((x.clone(), t.expand(batch).clone()))
+        v = decoder(torch.cat([x, x]), timestep=t.expand(2 * batch), encoder_hidden_states=torch.cat([cond, uncond]))[0]
+        v_cond, v_uncond = v.chunk(2)
+        x = x + (t_next - t) * (v_uncond + guidance_scale * (v_cond - v_uncond))
+    return x
+
+
+def separate_pass_heads(decoder, x, t, cond):
+    """The post-generation pass: full attention output, then the aligner's head selection."""
+    attentions = decoder(x, timestep=t, encoder_hidden_states=cond, output_attentions=True)[2]
+    stacked = torch.stack([a.transpose(-1, -2) for a in attentions if a is not None])  # [Layers, Batch, Heads, Tokens, Frames]
+    heads = [stacked[layer_idx, :, head_idx] for layer_idx, head_indices in CUSTOM_LAYERS_CONFIG.items() for head_idx in head_indices]
+    full_bytes = sum(a.numel() * a.element_size() for a in attentions if a is not None)
+    return torch.stack(heads, dim=1), full_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=2)
+    parser.add_argument("--frames", type=int, default=750, help="latent frames (750 = 30 s)")
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--num-layers", type=int, default=6)
+    parser.add_argument("--num-heads", type=int, default=8)
+    parser.add_argument("--latent-dim", type=int, default=64)
+    parser.add_argument("--guidance-scale", type=float, default=7.0)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    decoder = StandInDecoder(args.latent_dim, args.dim, args.num_layers, args.num_heads).eval()
+    noise = torch.randn(args.batch_size, args.frames, args.latent_dim)
+    cond = torch.randn(args.batch_size, args.tokens, args.dim)
+    uncond = torch.randn(1, 1, args.dim).expand_as(cond).contiguous()
+    failures = 0
+
+    step_inputs = []
+    reference = sample(decoder, noise, cond, uncond, args.steps, args.guidance_scale, step_inputs)
+    with CrossAttentionRecorder(decoder, CUSTOM_LAYERS_CONFIG, args.batch_size, args.steps) as recorder:
+        recorded = sample(decoder, noise, cond, uncond, args.steps, args.guidance_scale)
+    diff = (recorded - reference).abs().max().item()
+    failures += diff > 1e-5
+    print(f"latents with recorder vs without: max |diff| {diff:.2e} {'ok' if diff <= 1e-5 else 'FAIL'}")
+
+    with torch.inference_mode():
+        mask = torch.ones(args.batch_size, args.tokens)
+        recorder.record_final(recorded, cond, mask, torch.zeros_like(recorded))
+        t_last = 1.0 / args.steps
+        renoise = torch.randn(recorded.shape, generator=torch.Generator().manual_seed(42))
+        final_input = (t_last * renoise + (1.0 - t_last) * recorded, torch.full((args.batch_size,), t_last))
+        for name, inputs in (("first", step_inputs[0]), ("last", final_input)):
+            expected, full_bytes = separate_pass_heads(decoder, *inputs, cond)
+            recording = recorder.recordings[name]
+            diff = (recording - expected).abs().max().item()
+            failures += recording.shape != expected.shape or diff > 1e-5
+            print(f"  '{name}' recording {tuple(recording.shape)} vs separate pass: max |diff| {diff:.2e} "
+                  f"{'ok' if diff <= 1e-5 else 'FAIL'}")
+
+    recorded_mb = recorder.recorded_bytes / 2**20
+    print(f"memory: recordings {recorded_mb:.2f} MB for 2 steps; one separate attention pass returns "
+          f"{full_bytes / 2**20:.2f} MB (cond rows), the fused CFG step returned {recorder.full_attention_bytes / 2**20:.2f} MB "
+          f"before reduction")
+    print("PASS" if not failures else f"FAIL ({failures} checks)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+CPU check that batched audio-code detokenization matches per-item decoding.
+
+Builds a random-weight stand-in for the DiT model's quantizer + detokenizer (same
+interfaces and the same per-code windowed expansion as the real detokenizer), then
+compares AceStepHandler._decode_audio_codes_to_latents_batch against decoding each
+hint on its own, and checks that repeated hints are served from the cache.
+
+    python scripts/check_batched_code_decoding.py --batch-size 8
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+import torch.nn as nn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.handler import AceStepHandler
+
+
+class StandInQuantizer(nn.Module):
+    def __init__(self, codebook_size, dim):
+        super().__init__()
+        self.num_quantizers = 1
+        self.codebook = nn.Embedding(codebook_size, dim)
+
+    def get_output_from_indices(self, indices):
+        # indices: [B, T_5Hz, num_quantizers]
+        return self.codebook(indices[..., 0])
+
+
+class StandInDetokenizer(nn.Module):
+    """Expands each 5Hz code to `pool_window` 25Hz frames, attending only within the window."""
+
+    def __init__(self, dim, pool_window=5, num_layers=2):
+        super().__init__()
+        self.pool_window = pool_window
+        self.embed = nn.Linear(dim, dim)
+        self.special_tokens = nn.Parameter(torch.randn(1, 1, pool_window, dim))
+        layer = nn.TransformerEncoderLayer(dim, nhead=4, dim_feedforward=2 * dim, batch_first=True)
+        self.layers = nn.TransformerEncoder(layer, num_layers)
+        self.proj_out = nn.Linear(dim, dim)
+
+    def forward(self, x):
+        batch_size, num_codes, dim = x.shape
+        x = self.embed(x).unsqueeze(2).repeat(1, 1, self.pool_window, 1) + self.special_tokens
+        x = self.layers(x.reshape(batch_size * num_codes, self.pool_window, dim))
+        return self.proj_out(x).reshape(batch_size, num_codes * self.pool_window, dim)
+
+
+class StandInModel(nn.Module):
+    def __init__(self, codebook_size, dim):
+        super().__init__()
+        self.tokenizer = nn.Module()
+        self.tokenizer.quantizer = StandInQuantizer(codebook_size, dim)
+        self.detokenizer = StandInDetokenizer(dim)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--min-codes", type=int, default=50)
+    parser.add_argument("--max-codes", type=int, default=600)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    handler = AceStepHandler()
+    handler.model = StandInModel(64000, args.dim).eval()
+
+    # Mix of tensor and serialized string hints, with one repeated hint and one empty hint
+    hints = []
+    for i in range(args.batch_size):
+        codes = torch.randint(0, 64000, (int(torch.randint(args.min_codes, args.max_codes + 1, ())),))
+        hints.append(codes if i % 2 == 0 else "".join(f"<|audio_code_{c}|>" for c in codes.tolist()))
+    if args.batch_size > 2:
+        hints[-1] = hints[0]
+        hints[-2] = None
+
+    start = time.time()
+    expected = []
+    for hint in hints:
+        handler._code_latents_cache.clear()
+        expected.append(handler._decode_audio_codes_to_latents(hint))
+    per_item_time = time.time() - start
+
+    handler._code_latents_cache.clear()
+    start = time.time()
+    batched = handler._decode_audio_codes_to_latents_batch(hints)
+    batched_time = time.time() - start
+
+    max_diff = 0.0
+    for i, (ref, out) in enumerate(zip(expected, batched)):
+        if ref is None or out is None:
+            assert ref is None and out is None, f"item {i}: presence mismatch"
+            continue
+        assert ref.shape == out.shape, f"item {i}: shape {tuple(out.shape)} != {tuple(ref.shape)}"
+        max_diff = max(max_diff, (ref - out).abs().max().item())
+    assert max_diff < 1e-4, f"batched decoding diverged: max abs diff {max_diff:.3e}"
+
+    cached = handler._decode_audio_codes_to_latents_batch(hints)
+    assert all(a is b for a, b in zip(cached, batched) if a is not None), "repeated hints were not served from cache"
+
+    print(f"Items: {len(hints)}, max abs diff vs per-item: {max_diff:.3e}")
+    print(f"Per-item: {per_item_time * 1000:.1f} ms, batched: {batched_time * 1000:.1f} ms")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
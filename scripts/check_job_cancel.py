@@ -0,0 +1,234 @@
+"""
+Checks for job cancellation (acestep/cancellation.py, FairScheduler.remove,
+JobStore.request_cancel) with stub generation jobs, no models needed.
+
+  1. removing queued jobs from the fair scheduler frees their queue slots and
+     tenant quota, shifts the positions of the jobs behind them and keeps the
+     dispatch order of the rest;
+  2. queue workers shaped like the API server's run stub jobs that step like
+     the LM / diffusion loops and hold "KV blocks" from a shared pool; a running
+     job cancelled mid-way stops within a step, returns its blocks, and its
+     worker takes the next job; a cancelled queued job never runs;
+  3. the SQLite store: a queued job cancelled from one connection is never
+     claimed by another, a running job is flagged for its worker, and a
+     database from before the cancel_requested column is migrated;
+  4. both stores: once a job is cancelled, a late mark_running / succeeded /
+     failed changes nothing and returns False.
+
+    python scripts/check_job_cancel.py
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.cancellation import CancellationToken, JobCancelled, cancellation_scope, check_cancelled
+from acestep.job_scheduler import FairScheduler, SchedulerFull
+from acestep.job_store import CANCELLED_ERROR, JobStore, SQLiteJobStore
+
+STEP_SECONDS = 0.01
+failures = 0
+
+
+def check(name, ok):
+    global failures
+    failures += not ok
+    print(f"  {name}: {'ok' if ok else 'FAIL'}")
+
+
+async def scheduler_slots():
+    print("Scheduler:")
+    q = FairScheduler(maxsize=6, max_queued_per_tenant=3)
+    for i in range(3):
+        q.put_nowait(f"a{i}", i, tenant="a")
+        q.put_nowait(f"b{i}", i, tenant="b")
+    order_before = ["a0", "b0", "a1", "b1", "a2", "b2"]
+    try:
+        q.check("a")
+        admitted = True
+    except SchedulerFull:
+        admitted = False
+    check("full tenant rejected before cancelling", not admitted)
+
+    position_b2 = q.position("b2")
+    removed = [q.remove("a1"), q.remove("b0"), q.remove("a2")]
+    check(f"remove returns the items {removed}", removed == [1, 0, 2])
+    check("unknown or already removed job -> None", q.remove("a1") is None and q.remove("zz") is None)
+    check(f"positions shift ({position_b2} -> {q.position('b2')})", q.position("b2") == position_b2 - 3)
+    q.check("a")
+    check("quota and queue slots freed", q.qsize() == 3 and q.stats()["tenants"]["a"]["queued"] == 1)
+
+    q.put_nowait("a3", 3, tenant="a")
+    dispatched = []
+    while q.qsize():
+        job_id, _ = await q.get()
+        dispatched.append(job_id)
+        q.task_done(job_id)
+    expected = [j for j in order_before if j not in ("a1", "b0", "a2")]
+    check(f"remaining jobs keep their order {dispatched}", [j for j in dispatched if j != "a3"] == expected
+          and "a3" in dispatched)
+
+
+class BlockPool:
+    """Stands in for the LM engine's KV cache block manager."""
+
+    def __init__(self, blocks):
+        self.free = blocks
+        self.lock = threading.Lock()
+
+    def allocate(self, n):
+        with self.lock:
+            assert self.free >= n, "block leak"
+            self.free -= n
+
+    def deallocate(self, n):
+        with self.lock:
+            self.free += n
+
+
+def stub_generate(pool, steps, log):
+    """An LM decode loop (blocks held, released on any exception like LLMEngine.generate), then diffusion steps."""
+    pool.allocate(4)
+    try:
+        for _ in range(steps):
+            check_cancelled()
+            time.sleep(STEP_SECONDS)
+            log["lm_steps"] += 1
+    except Exception:
+        pool.deallocate(4)
+        raise
+    pool.deallocate(4)
+    for _ in range(steps):
+        check_cancelled()
+        time.sleep(STEP_SECONDS)
+        log["dit_steps"] += 1
+    return "audio"
+
+
+async def running_jobs():
+    print("Running jobs:")
+    q = FairScheduler()
+    pool = BlockPool(8)
+    tokens, outcomes, logs, started = {}, {}, {}, {}
+
+    async def queue_worker():
+        loop = asyncio.get_running_loop()
+        while True:
+            job_id, steps = await q.get()
+            token = tokens.setdefault(job_id, CancellationToken())
+            log = logs[job_id] = {"lm_steps": 0, "dit_steps": 0}
+            started[job_id] = time.monotonic()
+
+            def run():
+                with cancellation_scope(token):
+                    return stub_generate(pool, steps, log)
+
+            try:
+                outcomes[job_id] = await loop.run_in_executor(None, run)
+            except JobCancelled as e:
+                outcomes[job_id] = f"cancelled: {e}"
+            finally:
+                q.task_done(job_id)
+                tokens.pop(job_id, None)
+
+    for job_id in ("long", "queued-cancel", "next"):
+        q.put_nowait(job_id, 200 if job_id == "long" else 5)
+    worker = asyncio.create_task(queue_worker())
+    await asyncio.sleep(STEP_SECONDS * 10)
+
+    check("queued job dropped", q.remove("queued-cancel") == 5)
+    cancelled_at = time.monotonic()
+    tokens["long"].cancel("client went away")
+    while "next" not in outcomes:
+        await asyncio.sleep(STEP_SECONDS)
+    worker.cancel()
+
+    stopped_after = started["next"] - cancelled_at
+    check(f"running job stopped in {stopped_after * 1000:.0f} ms (< 5 steps)", stopped_after < STEP_SECONDS * 5)
+    check(f"outcome '{outcomes['long']}'", outcomes["long"] == "cancelled: client went away")
+    check(f"stopped mid-LM after {logs['long']['lm_steps']} of 200 steps, no diffusion",
+          logs["long"]["lm_steps"] < 50 and logs["long"]["dit_steps"] == 0)
+    check("KV blocks returned", pool.free == 8)
+    check("cancelled queued job never ran", "queued-cancel" not in logs)
+    check("next job ran to completion", outcomes["next"] == "audio")
+
+    check_cancelled()  # no token bound on this thread: no-op
+    check("tokens released", not tokens)
+
+
+def sqlite_store():
+    print("SQLite store:")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "jobs.db")
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE jobs (job_id TEXT PRIMARY KEY, status TEXT NOT NULL, created_at REAL NOT NULL, "
+            "started_at REAL, finished_at REAL, result TEXT, error TEXT, env TEXT NOT NULL DEFAULT 'development', "
+            "params TEXT, temp_files TEXT, retryable INTEGER NOT NULL DEFAULT 0, worker TEXT)"
+        )
+        conn.execute("INSERT INTO jobs (job_id, status, created_at) VALUES ('old', 'queued', 0)")
+        conn.commit()
+        conn.close()
+
+        front, worker = SQLiteJobStore(path), SQLiteJobStore(path)
+        check("pre-existing database migrated", front.get("old").cancel_requested is False)
+        first = front.create(params={})
+        second = front.create(params={})
+        check("queued job cancelled at once", front.request_cancel("old") == "cancelled")
+        claimed = worker.claim_next("w1")
+        check(f"claim skips the cancelled job ({claimed.job_id == first.job_id})", claimed.job_id == first.job_id)
+
+        check("running job flagged", front.request_cancel(first.job_id) == "running")
+        check("worker sees the request", worker.cancel_requested("w1") == [first.job_id]
+              and worker.cancel_requested("w2") == [])
+        check("running job cancelled", worker.mark_cancelled(first.job_id))
+        rec = front.get(first.job_id)
+        check("marked cancelled", rec.status == "cancelled" and rec.finished_at is not None)
+        late = [worker.mark_succeeded(first.job_id, {"audio_paths": []}), worker.mark_failed(first.job_id, "boom"),
+                worker.mark_running(first.job_id), worker.mark_cancelled(first.job_id, "again")]
+        rec = front.get(first.job_id)
+        check(f"late transitions refused {late}", late == [False] * 4 and rec.status == "cancelled"
+              and rec.result is None and rec.error == CANCELLED_ERROR)
+        try:
+            worker.mark_failed("missing", "boom")
+            check("unknown job raises KeyError", False)
+        except KeyError:
+            check("unknown job raises KeyError", True)
+        check("finished job left alone", front.request_cancel(first.job_id) == "cancelled"
+              and front.request_cancel("missing") is None)
+        check("flag cleared from the worker's view", worker.cancel_requested("w1") == [])
+
+        stats = front.get_stats()
+        check(f"stats {stats}", stats["cancelled"] == 2 and stats["queued"] == 1)
+        time.sleep(0.01)
+        removed = front.cleanup_old_jobs(max_age_seconds=0)
+        check(f"cleanup removes cancelled jobs ({removed})", removed == 2 and front.get(second.job_id) is not None)
+        front.close()
+        worker.close()
+
+
+def memory_store():
+    print("In-memory store:")
+    store = JobStore()
+    rec = store.create()
+    check("queued -> running -> cancelled", store.mark_running(rec.job_id) and store.mark_cancelled(rec.job_id))
+    late = [store.mark_succeeded(rec.job_id, {"audio_paths": []}), store.mark_failed(rec.job_id, "boom")]
+    check(f"late transitions refused {late}", late == [False, False] and store.get(rec.job_id).status == "cancelled"
+          and store.get(rec.job_id).result is None)
+
+
+def main():
+    asyncio.run(scheduler_slots())
+    asyncio.run(running_jobs())
+    sqlite_store()
+    memory_store()
+    print("PASS" if not failures else f"FAIL ({failures} checks)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
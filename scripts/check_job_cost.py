@@ -0,0 +1,110 @@
+"""
+Checks for the per-job run-time model (acestep/job_cost.py).
+
+Feeds JobCostModel synthetic finished jobs whose run times follow known
+per-term costs plus noise, and checks:
+
+  1. with varied requests, the fit recovers the true coefficients;
+  2. with collinear work terms (every job thinks, steps never change, so the
+     DiT and LM-codes terms are proportional), coefficients stay finite and
+     non-negative and predictions stay accurate, with no help from MIN_SECONDS;
+  3. a per-model fit is used only after MIN_MODEL_SAMPLES jobs.
+
+    python scripts/check_job_cost.py
+"""
+import math
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.job_cost import FEATURE_NAMES, MIN_MODEL_SAMPLES, MIN_SECONDS, JobCostModel, job_features
+
+TRUE_COSTS = {"overhead": 2.0, "dit": 0.6, "lm_codes": 6.0, "source_audio": 5.0, "lm_text": 1.5}
+failures = 0
+
+
+def check(name, ok):
+    global failures
+    failures += not ok
+    print(f"  {name}: {'ok' if ok else 'FAIL'}")
+
+
+def request(rng, model="turbo", vary=True):
+    return SimpleNamespace(
+        model=model,
+        batch_size=rng.choice([1, 2, 4, 8]) if vary else 2,
+        inference_steps=rng.choice([8, 16, 32, 50]) if vary else 8,
+        audio_duration=rng.choice([10, 30, 60, 120, 240]),
+        thinking=rng.random() < 0.5 if vary else True,
+        src_audio_path=None,
+        reference_audio_path="ref.wav" if vary and rng.random() < 0.3 else None,
+        audio_code_string="",
+        task_type="text2music",
+        sample_mode=False,
+        sample_query="",
+        use_format=vary and rng.random() < 0.3,
+        use_cot_caption=False,
+        use_cot_language=False,
+    )
+
+
+def run_time(req, rng, noise=0.05):
+    x = job_features(req, float(req.audio_duration))
+    seconds = sum(TRUE_COSTS[name] * v for name, v in zip(FEATURE_NAMES, x))
+    return seconds * (1.0 + rng.gauss(0.0, noise))
+
+
+def relative_error(model, reqs, rng):
+    errors = [abs(model.predict(r) - run_time(r, rng, noise=0.0)) / run_time(r, rng, noise=0.0) for r in reqs]
+    return sum(errors) / len(errors)
+
+
+def main():
+    print("Varied requests:")
+    rng = random.Random(0)
+    model = JobCostModel(initial_seconds=10.0)
+    for _ in range(300):
+        req = request(rng)
+        model.observe(req, run_time(req, rng))
+    coefficients = model.stats()["models"]["turbo"]["coefficients"]
+    off = {name: abs(coefficients[name] - cost) / cost for name, cost in TRUE_COSTS.items()}
+    check(f"coefficients recovered within 15% {coefficients}", max(off.values()) < 0.15)
+    check("predictions within 5%", relative_error(model, [request(rng) for _ in range(100)], rng) < 0.05)
+
+    print("Collinear requests (always thinking, fixed steps and batch):")
+    rng = random.Random(1)
+    model = JobCostModel(initial_seconds=10.0)
+    for _ in range(300):
+        req = request(rng, vary=False)
+        model.observe(req, run_time(req, rng, noise=0.2))
+    coefficients = model.stats()["models"]["turbo"]["coefficients"]
+    check(f"finite, non-negative coefficients {coefficients}",
+          all(math.isfinite(v) and v >= 0.0 for v in coefficients.values()))
+    check("no coefficient blows up", max(coefficients.values()) < 100.0)
+    reqs = [request(rng, vary=False) for _ in range(100)]
+    check("predictions within 10%", relative_error(model, reqs, rng) < 0.10)
+    shortest = min(model.predict(r) for r in reqs)
+    check(f"shortest prediction {shortest:.2f}s not held up by MIN_SECONDS", shortest > MIN_SECONDS)
+
+    print("Per-model fit:")
+    rng = random.Random(2)
+    model = JobCostModel(initial_seconds=10.0)
+    for _ in range(50):
+        req = request(rng)
+        model.observe(req, run_time(req, rng))
+    slow = request(rng, model="base")
+    unseen = SimpleNamespace(**{**vars(slow), "model": "unseen"})  # always predicted by the shared fit
+    for _ in range(MIN_MODEL_SAMPLES - 1):
+        model.observe(slow, 3.0 * run_time(slow, rng))
+    check("shared fit until enough jobs", model.predict(slow) == model.predict(unseen))
+    model.observe(slow, 3.0 * run_time(slow, rng))
+    check("per-model fit after", model.predict(slow) > 1.5 * model.predict(unseen))
+
+    print("PASS" if not failures else f"FAIL ({failures} checks)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
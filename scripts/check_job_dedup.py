@@ -0,0 +1,132 @@
+"""
+Checks for request fingerprints and RequestMemo (acestep/job_dedup.py).
+
+  1. seed randomization: random seeds, seed -1 and batches of several outputs
+     get no fingerprint; a fixed seed with one output does, independent of
+     tenant / priority, and a different model, LoRA or input audio content
+     changes it;
+  2. concurrent duplicates: many identical submissions racing on one event
+     loop (the API's release path: fingerprint off-loop, lookup, enqueue)
+     start one generation and all attach to it; a later repeat is served from
+     the cache and a failed job caches nothing;
+  3. eviction: the result cache keeps the most recently used entries and drops
+     results whose files are gone.
+
+    python scripts/check_job_dedup.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.job_dedup import RequestMemo, request_fingerprint
+
+BASE = {"prompt": "lofi piano", "lyrics": "", "seed": 42, "use_random_seed": False, "batch_size": 1,
+        "inference_steps": 8, "reference_audio_path": None, "src_audio_path": None,
+        "priority": "interactive", "tenant": "alice"}
+MODELS = {"dit": "acestep-v15-turbo", "lm": "acestep-5Hz-lm-0.6B"}
+
+failures = 0
+
+
+def check(name, ok):
+    global failures
+    failures += not ok
+    print(f"  {name}: {'ok' if ok else 'FAIL'}")
+
+
+def seed_randomization(tmp):
+    print("Fingerprints:")
+    fp = request_fingerprint(BASE, MODELS)
+    check("fixed seed, one output -> fingerprint", fp is not None)
+    check("random seed -> none", request_fingerprint({**BASE, "use_random_seed": True}, MODELS) is None)
+    check("seed -1 -> none", request_fingerprint({**BASE, "seed": -1}, MODELS) is None)
+    check("default batch (2, rest seeded at random) -> none", request_fingerprint({**BASE, "batch_size": None}, MODELS) is None)
+    check("tenant / priority ignored", request_fingerprint({**BASE, "tenant": "bob", "priority": "batch"}, MODELS) == fp)
+    check("other DiT model differs", request_fingerprint(BASE, {**MODELS, "dit": "acestep-v15-base"}) != fp)
+    lora = {**MODELS, "lora": {"path": "/loras/jazz", "scale": 1.0}}
+    check("LoRA adapter differs", request_fingerprint(BASE, lora) not in (fp, None))
+    check("LoRA scale differs", request_fingerprint(BASE, {**lora, "lora": {"path": "/loras/jazz", "scale": 0.5}})
+          != request_fingerprint(BASE, lora))
+
+    a, b = os.path.join(tmp, "a.wav"), os.path.join(tmp, "b.wav")
+    for path in (a, b):
+        with open(path, "wb") as f:
+            f.write(b"RIFF same bytes")
+    with_a = request_fingerprint({**BASE, "reference_audio_path": a}, MODELS)
+    check("same audio content under another path -> same", with_a == request_fingerprint({**BASE, "reference_audio_path": b}, MODELS))
+    with open(b, "wb") as f:
+        f.write(b"RIFF edited")
+    check("edited audio -> different", request_fingerprint({**BASE, "reference_audio_path": b}, MODELS) != with_a)
+    check("unreadable audio -> none", request_fingerprint({**BASE, "src_audio_path": a + ".missing"}, MODELS) is None)
+
+
+async def concurrent_duplicates():
+    print("Concurrent duplicates:")
+    memo = RequestMemo(max_results=8)
+    generations = []
+    queue = asyncio.Queue()
+
+    async def submit(i):
+        fp = await asyncio.to_thread(request_fingerprint, BASE, MODELS)
+        job_id, cached = memo.lookup(fp)
+        if job_id is not None:
+            return job_id
+        if cached is not None:
+            return "cached"
+        job_id = f"job-{i}"
+        memo.start(fp, job_id)
+        await queue.put(job_id)
+        return job_id
+
+    async def worker(fail):
+        job_id = await queue.get()
+        generations.append(job_id)
+        await asyncio.sleep(0.05)
+        memo.finish(job_id, None if fail else {"audio_paths": [], "job": job_id})
+
+    ids = await asyncio.gather(*(submit(i) for i in range(50)))
+    await worker(fail=False)
+    check(f"50 racing submissions -> {len(generations)} generation, {len(set(ids))} task id",
+          len(generations) == 1 and len(set(ids)) == 1)
+    check("repeat after completion served from cache", await submit(99) == "cached")
+    stats = memo.stats()
+    check(f"counters {stats}", stats["inflight_hits"] == 49 and stats["cache_hits"] == 1 and stats["inflight"] == 0)
+
+    memo = RequestMemo(max_results=8)
+    first = await submit(0)
+    await worker(fail=True)
+    check("failed job caches nothing; resubmission runs again", await submit(1) == "job-1" and first == "job-0")
+
+
+def eviction():
+    print("Eviction:")
+    memo = RequestMemo(max_results=2)
+    for name in ("a", "b"):
+        memo.start(name, name)
+        memo.finish(name, {"audio_paths": [name]})
+    memo.lookup("a")  # a is now the most recently used
+    memo.start("c", "c")
+    memo.finish("c", {"audio_paths": ["c"]})
+    check("least recently used evicted", memo.lookup("b") == (None, None) and memo.lookup("a")[1] is not None)
+    check("eviction counted", memo.stats()["evictions"] == 1 and memo.stats()["cached_results"] == 2)
+    check("result with missing files dropped", memo.lookup("c", is_valid=lambda r: False) == (None, None)
+          and memo.stats()["stale"] == 1 and memo.stats()["cached_results"] == 1)
+    off = RequestMemo(max_results=0)
+    off.start("x", "x")
+    off.finish("x", {"audio_paths": []})
+    check("max_results=0 disables the cache", off.lookup("x") == (None, None))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_randomization(tmp)
+    asyncio.run(concurrent_duplicates())
+    eviction()
+    print("PASS" if not failures else f"FAIL ({failures} checks)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Checks for the job progress pub/sub (acestep/job_events.py).
+
+  1. a generation thread publishes stage / step events while the loop publishes
+     queue positions; a subscriber that joins mid-job gets a snapshot, then every
+     later event in order, ending with the result;
+  2. a subscriber that never reads loses old progress events but still gets the
+     final one;
+  3. a finished job's snapshot is served to late subscribers until it expires;
+     a job the bus never saw yields None first (the API then reads the store).
+
+    python scripts/check_job_events.py
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.job_events import JobEventBus
+
+failures = 0
+
+
+def check(name, ok):
+    global failures
+    failures += not ok
+    print(f"  {name}: {'ok' if ok else 'FAIL'}")
+
+
+async def ordering():
+    print("Ordering:")
+    bus = JobEventBus()
+    bus.bind(asyncio.get_running_loop())
+    bus.publish("job", "queued", queue_position=3)
+    bus.publish("job", "queued", queue_position=2)
+
+    received = []
+
+    async def watch():
+        async for event in bus.subscribe("job", timeout=1.0):
+            received.append(event)
+
+    watcher = asyncio.create_task(watch())
+    await asyncio.sleep(0)
+
+    def generate():
+        for step in range(1, 9):
+            bus.publish_threadsafe("job", "progress", stage="dit", diffusion_step=step, diffusion_steps=8)
+            time.sleep(0.002)
+
+    bus.publish("job", "running", queue_position=0)
+    await asyncio.to_thread(generate)
+    bus.publish("job", "succeeded", result={"audio_paths": ["a.mp3"]})
+    await asyncio.wait_for(watcher, 2.0)
+
+    types = [e["type"] for e in received]
+    check(f"snapshot first ({received[0].get('queue_position')=})", types[0] == "snapshot" and received[0]["queue_position"] == 2)
+    steps = [e["diffusion_step"] for e in received if e["type"] == "progress"]
+    check(f"thread events in order before the result {steps}", steps == list(range(1, 9)) and types[-1] == "succeeded")
+    seqs = [e["seq"] for e in received]
+    check("sequence numbers increase", seqs == sorted(seqs) and len(set(seqs)) == len(seqs))
+    check("unsubscribed after the final event", not bus.has_subscribers("job"))
+
+
+async def slow_subscriber():
+    print("Slow subscriber:")
+    bus = JobEventBus(max_backlog=4)
+    bus.publish("job", "running")
+    stream = bus.subscribe("job")
+    first = await stream.__anext__()
+    for step in range(100):
+        bus.publish("job", "progress", diffusion_step=step)
+    bus.publish("job", "succeeded", result={})
+    rest = [event async for event in stream if event is not None]
+    check(f"snapshot, then {len(rest)} of 101 events", first["type"] == "snapshot" and len(rest) == 4)
+    check("final event kept", rest[-1]["type"] == "succeeded" and bus.stats()["dropped"] == 97)
+
+
+async def retention():
+    print("Retention:")
+    bus = JobEventBus(retain_seconds=0.05)
+    bus.publish("job", "succeeded", result={"audio_paths": []})
+    late = [event async for event in bus.subscribe("job")]
+    check("late subscriber gets the final snapshot only", len(late) == 1 and late[0]["status"] == "succeeded")
+    await asyncio.sleep(0.1)
+    bus.publish("other", "queued")
+    check("expired after retain_seconds", bus.snapshot("job") is None)
+    unknown = bus.subscribe("never-seen", timeout=0.01)
+    check("unknown job yields None first", await unknown.__anext__() is None)
+    check("then None on timeout", await unknown.__anext__() is None)
+    await unknown.aclose()
+    check("closing unsubscribes", not bus.has_subscribers("never-seen"))
+
+
+def main():
+    asyncio.run(ordering())
+    asyncio.run(slow_subscriber())
+    asyncio.run(retention())
+    print("PASS" if not failures else f"FAIL ({failures} checks)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
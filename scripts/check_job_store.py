@@ -0,0 +1,105 @@
+"""
+Kill-and-restart check for the SQLite job store (acestep/job_store.py), on a local file.
+
+A child process opens the store, submits jobs and moves them through queued /
+running / succeeded / failed, then is SIGKILLed mid-run. The parent reopens
+the same file, as a restarted API server would, and checks that:
+  1. every acknowledged transition survived the kill;
+  2. recover() returns the queued jobs oldest first, with their request params
+     and temp files, and marks the running job failed-retryable;
+  3. cleanup_old_jobs removes only finished jobs, with a range scan of the
+     (status, finished_at) index.
+
+    python scripts/check_job_store.py
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.job_store import INTERRUPTED_ERROR, SQLiteJobStore
+
+QUEUED = ["queued-1", "queued-2", "queued-3"]
+
+
+def child(path):
+    store = SQLiteJobStore(path)
+    store.create_with_id("done", params={"prompt": "done"})
+    store.mark_running("done")
+    store.mark_succeeded("done", {"audio_paths": ["/tmp/a.mp3"]})
+    store.create_with_id("broken", params={"prompt": "broken"})
+    store.mark_running("broken")
+    store.mark_failed("broken", "Traceback: boom")
+    store.create_with_id("running", params={"prompt": "running"})
+    store.mark_running("running")
+    for i, job_id in enumerate(QUEUED):
+        store.create_with_id(job_id, params={"prompt": f"song {i}", "seed": i}, temp_files=[f"/tmp/ref_{i}.wav"])
+    print("ready", flush=True)
+    time.sleep(60)  # killed here, mid-"generation"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+        return
+
+    failures = 0
+
+    def check(name, ok):
+        nonlocal failures
+        failures += not ok
+        print(f"  {name}: {'ok' if ok else 'FAIL'}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "jobs.sqlite3")
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child", path], stdout=subprocess.PIPE, text=True)
+        assert proc.stdout.readline().strip() == "ready"
+        os.kill(proc.pid, signal.SIGKILL)
+        proc.wait()
+        print(f"child killed with signal {-proc.returncode}; reopening {path}")
+
+        store = SQLiteJobStore(path)
+        done = store.get("done")
+        check("succeeded job and result survived", done.status == "succeeded" and done.result == {"audio_paths": ["/tmp/a.mp3"]})
+        check("failed job kept its error", store.get("broken").status == "failed" and not store.get("broken").retryable)
+
+        recovered, interrupted = store.recover()
+        check("queued jobs recovered oldest first", [r.job_id for r in recovered] == QUEUED)
+        check("request params and temp files restored",
+              all(r.params == {"prompt": f"song {i}", "seed": i} and r.temp_files == [f"/tmp/ref_{i}.wav"]
+                  for i, r in enumerate(recovered)))
+        running = store.get("running")
+        check("interrupted running job marked failed-retryable",
+              interrupted == ["running"] and running.status == "failed" and running.retryable and running.error == INTERRUPTED_ERROR)
+        again, interrupted = store.recover()
+        check("recover() is idempotent", [r.job_id for r in again] == QUEUED and not interrupted)
+        check("stats", store.get_stats() == {"total": 6, "queued": 3, "running": 0, "succeeded": 1, "failed": 2, "cancelled": 0})
+
+        plan = store._fetchall(
+            "EXPLAIN QUERY PLAN DELETE FROM jobs WHERE status IN ('succeeded', 'failed', 'cancelled') "
+            "AND finished_at < ?", (0.0,)
+        )
+        check("cleanup query is a range scan of the (status, finished_at) index",
+              any("idx_jobs_status_finished" in str(row) and "finished_at<" in str(row) for row in plan))
+        check("every finished job has finished_at",
+              not store._fetchall("SELECT job_id FROM jobs WHERE status != 'queued' AND finished_at IS NULL"))
+        check("cleanup keeps recent finished jobs", store.cleanup_old_jobs() == 0)
+        time.sleep(0.01)
+        removed = store.cleanup_old_jobs(max_age_seconds=0)
+        check(f"cleanup removed {removed} finished jobs, kept queued",
+              removed == 3 and store.get_stats() == {"total": 3, "queued": 3, "running": 0, "succeeded": 0, "failed": 0, "cancelled": 0})
+        store.close()
+
+    print("PASS" if not failures else f"FAIL ({failures} checks)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+CPU harness for the multi-adapter LoRA registry (acestep/lora_registry.py).
+
+Saves a few random LoRA adapters for a tiny random-weight decoder, attaches them
+all to one decoder through LoRAAdapterRegistry and checks, for every adapter and
+a few scales, that the registry's output matches a freshly built copy of the
+decoder with that adapter merged in. Also checks that the base weights are never
+copied and that unloading restores the base decoder exactly, and times adapter
+switches. Runs mixed-adapter batches (one adapter and scale per row,
+including a doubled CFG-style batch) against running each row separately.
+Finally checks that unloading an unknown name raises without touching the
+loaded adapters, and that an adapter matching no LoRA layers (an IA3 adapter)
+is rejected and leaves the base decoder unwrapped.
+
+    python scripts/check_lora_registry.py
+"""
+import argparse
+import copy
+import os
+import sys
+import tempfile
+import time
+
+import torch
+import torch.nn as nn
+from peft import IA3Config, LoraConfig, PeftModel, get_peft_model
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.lora_registry import LoRAAdapterRegistry
+
+
+class Block(nn.Module):
+    def __init__(self, dim):
+        super().__init__()
+        self.norm = nn.LayerNorm(dim)
+        self.q_proj = nn.Linear(dim, dim)
+        self.k_proj = nn.Linear(dim, dim)
+        self.v_proj = nn.Linear(dim, dim)
+        self.o_proj = nn.Linear(dim, dim)
+
+    def forward(self, x):
+        h = self.norm(x)
+        attn = torch.softmax(self.q_proj(h) @ self.k_proj(h).transpose(1, 2) / h.shape[-1] ** 0.5, dim=-1)
+        return x + self.o_proj(attn @ self.v_proj(h))
+
+
+class TinyDecoder(nn.Module):
+    def __init__(self, dim, num_layers):
+        super().__init__()
+        self.layers = nn.ModuleList(Block(dim) for _ in range(num_layers))
+
+    def forward(self, x):
+        for layer in self.layers:
+            x = layer(x)
+        return x
+
+
+def save_random_adapter(base, path, rank, target_modules, seed):
+    torch.manual_seed(seed)
+    config = LoraConfig(r=rank, lora_alpha=2 * rank, target_modules=target_modules, lora_dropout=0.0)
+    peft_model = get_peft_model(copy.deepcopy(base), config)
+    with torch.no_grad():
+        for name, param in peft_model.named_parameters():
+            if "lora_B" in name:
+                param.normal_(std=0.05)
+    peft_model.save_pretrained(path)
+
+
+def merged_reference(base, path, scale):
+    model = PeftModel.from_pretrained(copy.deepcopy(base), path)
+    for module in model.modules():
+        if isinstance(getattr(module, "scaling", None), dict):
+            for name in module.scaling:
+                module.scaling[name] *= scale
+    return model.merge_and_unload().eval()
+
+
+@torch.no_grad()
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--num-layers", type=int, default=4)
+    parser.add_argument("--switches", type=int, default=1000)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    base = TinyDecoder(args.dim, args.num_layers).eval()
+    x = torch.randn(2, 16, args.dim)
+    base_out = base(x)
+    specs = {
+        "attn": (8, ["q_proj", "v_proj"]),
+        "full": (4, ["q_proj", "k_proj", "v_proj", "o_proj"]),
+        "out": (2, ["o_proj"]),
+    }
+    failures = 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {}
+        for seed, (name, (rank, targets)) in enumerate(specs.items()):
+            paths[name] = os.path.join(tmp, name)
+            save_random_adapter(base, paths[name], rank, targets, seed)
+
+        decoder = copy.deepcopy(base)
+        base_ptrs = {n: p.data_ptr() for n, p in decoder.named_parameters()}
+        registry = LoRAAdapterRegistry(max_adapters=len(specs))
+        for name, path in paths.items():
+            decoder = registry.load(decoder, name, path)
+
+        wrapped_ptrs = {n.split("base_model.model.")[-1].replace(".base_layer", ""): p.data_ptr()
+                        for n, p in decoder.named_parameters() if "lora_" not in n}
+        copied = [n for n, ptr in base_ptrs.items() if wrapped_ptrs.get(n) != ptr]
+        print(f"base weights shared with the wrapped decoder: {'yes' if not copied else f'NO ({copied[:3]})'}")
+        failures += bool(copied)
+
+        for name, path in paths.items():
+            for scale in (1.0, 0.5, 0.0):
+                registry.activate(name, scale)
+                diff = (decoder(x) - merged_reference(base, path, scale)(x)).abs().max().item()
+                ok = diff < 1e-5
+                failures += not ok
+                print(f"  {name:<5} scale {scale:.1f}: max |diff| vs merged {diff:.2e} {'ok' if ok else 'FAIL'}")
+
+        registry.set_enabled(False)
+        diff = (decoder(x) - base_out).abs().max().item()
+        failures += diff > 1e-6
+        print(f"disabled adapters vs base: max |diff| {diff:.2e}")
+        registry.set_enabled(True)
+
+        names = list(paths)
+        start = time.perf_counter()
+        for i in range(args.switches):
+            registry.activate(names[i % len(names)], scale=1.0)
+        print(f"adapter switch: {(time.perf_counter() - start) / args.switches * 1e6:.1f} us "
+              f"({len(registry._layers)} LoRA layers)")
+
+        row_adapters = ["attn", None, "full", "out", "attn", "full"]
+        row_scales = [1.0, 1.0, 0.5, 1.0, 0.25, 1.0]
+        xs = torch.randn(len(row_adapters), 16, args.dim)
+        expected = []
+        for row, (name, scale) in enumerate(zip(row_adapters, row_scales)):
+            if name is None:
+                registry.set_enabled(False)
+            else:
+                registry.activate(name, scale)
+            expected.append(decoder(xs[row:row + 1]))
+            registry.set_enabled(True)
+        expected = torch.cat(expected)
+        outside_key = registry.cache_key()
+        with registry.mixed_batch(row_adapters, row_scales):
+            mixed = decoder(xs)
+            doubled = decoder(torch.cat([xs, xs]))
+            mixed_key = registry.cache_key()
+        with registry.mixed_batch(row_adapters[::-1], row_scales[::-1]):
+            reordered_key = registry.cache_key()
+        ok = len({outside_key, mixed_key, reordered_key}) == 3 and registry.cache_key() == outside_key
+        failures += not ok
+        print(f"cache key covers the row assignment: {'ok' if ok else 'FAIL'}")
+        for name, out in (("mixed batch", mixed), ("mixed batch x2 (CFG layout)", doubled)):
+            diff = (out - expected.repeat(out.shape[0] // len(row_adapters), 1, 1)).abs().max().item()
+            failures += diff > 1e-5
+            print(f"{name}: max |diff| vs per-row adapters {diff:.2e} {'ok' if diff <= 1e-5 else 'FAIL'}")
+
+        registry.activate("full", 1.0)
+        start = time.perf_counter()
+        for _ in range(20):
+            for row, name in enumerate(row_adapters):
+                if name is None:
+                    continue
+                registry.activate(name, row_scales[row])
+                decoder(xs[row:row + 1])
+        sequential = (time.perf_counter() - start) / 20
+        start = time.perf_counter()
+        with registry.mixed_batch(row_adapters, row_scales):
+            for _ in range(20):
+                decoder(xs)
+        batched = (time.perf_counter() - start) / 20
+        print(f"{len(row_adapters)} rows: switch + forward per row {sequential * 1e3:.2f} ms, "
+              f"one mixed batch {batched * 1e3:.2f} ms")
+
+        loaded = list(registry.adapters)
+        try:
+            registry.unload(decoder, "missing")
+            rejected = False
+        except KeyError:
+            rejected = True
+        ok = rejected and list(registry.adapters) == loaded
+        failures += not ok
+        print(f"unload unknown adapter: {'KeyError, adapters kept' if ok else 'FAIL'}")
+
+        decoder = registry.unload(decoder, "attn")
+        decoder = registry.unload(decoder)
+        diff = (decoder(x) - base_out).abs().max().item()
+        restored = type(decoder) is TinyDecoder and diff == 0.0
+        failures += not restored
+        print(f"unload all: base decoder restored {'exactly' if restored else f'with max |diff| {diff:.2e}'}")
+
+        ia3_path = os.path.join(tmp, "ia3")
+        get_peft_model(copy.deepcopy(base), IA3Config(target_modules=["q_proj"], feedforward_modules=[])).save_pretrained(ia3_path)
+        try:
+            registry.load(decoder, "ia3", ia3_path)
+            rejected = False
+        except ValueError:
+            rejected = True
+        ok = (rejected and registry._model is None and not len(registry)
+              and not any("ia3" in n for n, _ in decoder.named_parameters())
+              and (decoder(x) - base_out).abs().max().item() == 0.0)
+        failures += not ok
+        print(f"adapter matching no LoRA layers: {'rejected, base decoder unwrapped' if ok else 'FAIL'}")
+
+    print("PASS" if not failures else f"FAIL ({failures} checks)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
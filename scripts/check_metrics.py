@@ -0,0 +1,203 @@
+"""
+Checks for the /metrics exposition (acestep/metrics.py) with stub handlers.
+
+Stub jobs run through a FairScheduler worker that records metrics the way the
+API server's queue workers do (queue wait, the time_costs of a finished job,
+its outcome), while stub DiT / LM handlers count condition cache lookups,
+offload bytes and LM tokens. The script then scrapes the registry (the body
+/metrics returns), parses the text format and checks:
+
+  1. every line is valid exposition syntax, each metric has HELP and TYPE;
+  2. histogram buckets are cumulative and +Inf == _count, _sum adds up;
+  3. stage histograms saw each stage a job ran (skipped stages are absent);
+  4. counters and gauges match the stub handlers, the queue and the dedup memo.
+
+    python scripts/check_metrics.py
+"""
+import asyncio
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.job_dedup import RequestMemo
+from acestep.job_scheduler import FairScheduler
+from acestep.metrics import ServerMetrics
+
+SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*\})? (\S+)$')
+failures = 0
+
+
+def check(name, ok):
+    global failures
+    failures += not ok
+    print(f"  {name}: {'ok' if ok else 'FAIL'}")
+
+
+class StubDiTHandler:
+    def __init__(self):
+        self.hits = self.misses = self.offload_bytes = 0
+
+    def generate(self, cached, offload):
+        if cached:
+            self.hits += 1
+        else:
+            self.misses += 1
+        if offload:
+            self.offload_bytes += 2 * 3_000_000_000  # load + offload of a 3 GB DiT
+        return {
+            "encoder_time_cost": 0.0 if cached else 0.12,
+            "model_time_cost": 1.4,
+            "vae_decode_time_cost": 0.6,
+            "offload_time_cost": 0.9 if offload else 0.0,
+        }
+
+    def metrics_counters(self):
+        return {"condition_cache_hits": self.hits, "condition_cache_misses": self.misses,
+                "offload_bytes": self.offload_bytes}
+
+
+class StubLLMHandler:
+    def __init__(self):
+        self.tokens_generated = 0
+        self.used_blocks, self.total_blocks = 0, 64
+
+    def generate(self, codes):
+        self.used_blocks = 16
+        self.tokens_generated += 40 + codes
+        return {"phase1_time": 0.8, "phase2_time": codes / 50, "total_time": 0.8 + codes / 50}
+
+    def kv_cache_usage(self):
+        return self.used_blocks / self.total_blocks
+
+
+def parse(text):
+    """{(name, frozenset(labels)): value} plus the HELP / TYPE names; raises on a malformed line."""
+    samples, helps, types = {}, set(), {}
+    for line in text.strip().split("\n"):
+        if line.startswith("# HELP "):
+            helps.add(line.split()[2])
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split()
+            types[name] = kind
+            continue
+        match = SAMPLE_RE.match(line)
+        if not match:
+            raise ValueError(f"bad line: {line!r}")
+        labels = frozenset(re.findall(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"', match.group(2) or ""))
+        samples[(match.group(1), labels)] = float(match.group(3))
+    return samples, helps, types
+
+
+async def run_jobs(metrics, dit, llm, q, jobs):
+    enqueued = {}
+    for job_id, spec in jobs:
+        q.put_nowait(job_id, spec)
+        enqueued[job_id] = time.time()
+    for _ in jobs:
+        job_id, spec = await q.get()
+        metrics.observe_queue_wait(time.time() - enqueued[job_id])
+        t0 = time.time()
+        try:
+            if spec.get("fail"):
+                raise RuntimeError("stub failure")
+            time_costs = {}
+            if spec.get("thinking"):
+                time_costs.update({f"lm_{k}": v for k, v in llm.generate(spec["codes"]).items()})
+                llm.used_blocks = 0
+            time_costs.update({f"dit_{k}": v for k, v in dit.generate(spec["cached"], spec["offload"]).items()})
+            metrics.observe_time_costs(time_costs)
+            metrics.observe_job("succeeded", time.time() - t0)
+        except RuntimeError:
+            metrics.observe_job("failed", time.time() - t0)
+        finally:
+            q.task_done(job_id)
+        await asyncio.sleep(0.01)
+
+
+async def main_async():
+    metrics = ServerMetrics()
+    dit, llm, memo, q = StubDiTHandler(), StubLLMHandler(), RequestMemo(), FairScheduler()
+    metrics.attach_sources(
+        handlers=lambda: [dit],
+        llm_handlers=lambda: [llm],
+        memo=memo,
+        queue_depth=lambda: float(q.qsize()),
+        running_jobs=lambda: float(sum(t["running"] for t in q.stats()["tenants"].values())),
+    )
+    memo.lookup("a")
+    memo.start("a", "job-a")
+    memo.lookup("a")  # in-flight duplicate
+    jobs = [
+        ("j1", {"thinking": True, "codes": 500, "cached": False, "offload": True}),
+        ("j2", {"thinking": True, "codes": 250, "cached": True, "offload": False}),
+        ("j3", {"thinking": False, "cached": True, "offload": False}),
+        ("j4", {"fail": True}),
+    ]
+    await run_jobs(metrics, dit, llm, q, jobs)
+    q.put_nowait("waiting-1", {})
+    q.put_nowait("waiting-2", {})
+    llm.used_blocks = 8
+
+    text = metrics.render()
+    print("Exposition:")
+    try:
+        samples, helps, types = parse(text)
+        check(f"{len(text.splitlines())} lines parse", True)
+    except ValueError as e:
+        check(str(e), False)
+        return
+    families = {name for name, _ in samples}
+    families = {re.sub(r"_(bucket|sum|count)$", "", n) if types.get(re.sub(r"_(bucket|sum|count)$", "", n)) == "histogram" else n
+                for n in families}
+    check("HELP and TYPE for every metric", families <= helps and families <= set(types))
+
+    def value(name, **labels):
+        return samples.get((name, frozenset(labels.items())))
+
+    print("Histograms:")
+    ok = True
+    for stage in ("queue_wait", "lm_phase1", "lm_phase2", "encode", "dit", "vae_decode", "offload"):
+        buckets = sorted(
+            (float(dict(labels)["le"]), v) for (name, labels), v in samples.items()
+            if name == "acestep_stage_seconds_bucket" and dict(labels)["stage"] == stage
+        )
+        counts = [v for _, v in buckets]
+        ok &= counts == sorted(counts) and buckets[-1][0] == float("inf")
+        ok &= counts[-1] == value("acestep_stage_seconds_count", stage=stage)
+    check("buckets cumulative, +Inf == _count", ok)
+    expected_counts = {"queue_wait": 4, "lm_phase1": 2, "lm_phase2": 2, "encode": 1, "dit": 3, "vae_decode": 3, "offload": 1}
+    counts = {stage: value("acestep_stage_seconds_count", stage=stage) for stage in expected_counts}
+    check(f"stage counts {counts}", counts == expected_counts)
+    check("skipped stages absent", value("acestep_stage_seconds_count", stage="prepare_condition") is None)
+    check("dit _sum", abs(value("acestep_stage_seconds_sum", stage="dit") - 3 * 1.4) < 1e-9)
+    check("lm_phase2 in the (5, 10] bucket once",
+          value("acestep_stage_seconds_bucket", stage="lm_phase2", le="5.0") == 1
+          and value("acestep_stage_seconds_bucket", stage="lm_phase2", le="10.0") == 2)
+
+    print("Counters and gauges:")
+    check("jobs by outcome", value("acestep_jobs_total", status="succeeded") == 3
+          and value("acestep_jobs_total", status="failed") == 1)
+    check("condition cache hits / misses", value("acestep_cache_hits_total", cache="condition") == 2
+          and value("acestep_cache_misses_total", cache="condition") == 1)
+    check("dedup hits / misses", value("acestep_cache_hits_total", cache="dedup") == 1
+          and value("acestep_cache_misses_total", cache="dedup") == 1)
+    check("offload bytes", value("acestep_offload_bytes_total") == 6e9)
+    check("LM tokens", value("acestep_lm_tokens_total") == 40 + 500 + 40 + 250)
+    check("queue depth / running", value("acestep_queue_depth") == 2 and value("acestep_running_jobs") == 0)
+    check("KV cache utilization", value("acestep_lm_kv_cache_utilization") == 0.125)
+    llm.kv_cache_usage = lambda: None
+    check("no KV sample for the pt backend", "acestep_lm_kv_cache_utilization 0" not in metrics.render()
+          and parse(metrics.render())[0].get(("acestep_lm_kv_cache_utilization", frozenset())) is None)
+
+
+def main():
+    asyncio.run(main_async())
+    print("PASS" if not failures else f"FAIL ({failures} checks)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Checks for the lazy model registry (acestep/model_registry.py) and the job
+queue's model grouping, with fake handlers that only track where their bytes
+are, no models needed.
+
+  1. models load on first use, LRU unpinned models are moved to host memory
+     (or dropped when they cannot be) to fit the device budget, and the host's
+     own LRU models are dropped to fit the host budget;
+  2. budgets are soft: models pinned by running jobs are never evicted, the
+     excess goes once they are released;
+  3. exclusive models (nano-vllm engines) are never resident together: the
+     second waits for the first to be released, which is then dropped, while
+     loads of other models go ahead;
+  4. a failed load is remembered, a failed restore falls back to a disk load;
+  5. a recorded request trace replayed through FairScheduler: preferring jobs
+     for the resident models (group_window) takes fewer swaps than tag order,
+     without delaying any job by more than the window.
+
+    python scripts/check_model_registry.py
+"""
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.job_scheduler import FairScheduler
+from acestep.model_registry import DEVICE, HOST, UNLOADED, ModelLoadError, ModelRegistry, ModelSpec
+
+GB = 1024**3
+failures = 0
+
+
+def check(name, ok):
+    global failures
+    failures += not ok
+    print(f"  {name}: {'ok' if ok else 'FAIL'}")
+
+
+class FakeHandler:
+    def __init__(self, name, size_gb):
+        self.name, self.size, self.where = name, int(size_gb * GB), "device"
+
+    def footprint(self):
+        return self.size
+
+    def offload(self):
+        self.where = "host"
+
+    def restore(self):
+        self.where = "device"
+
+    def unload(self):
+        self.where = None
+
+
+def spec(name, size_gb, movable=True, exclusive=None, fail_load=False, estimate_gb=None, loads=None):
+    def load():
+        if loads is not None:
+            loads.append(name)
+        if fail_load:
+            raise RuntimeError("checkpoint not found")
+        return FakeHandler(name, size_gb)
+
+    return ModelSpec(
+        name, load, size_bytes=int((size_gb if estimate_gb is None else estimate_gb) * GB),
+        measure=FakeHandler.footprint,
+        offload=FakeHandler.offload if movable else None,
+        restore=FakeHandler.restore if movable else None,
+        release=FakeHandler.unload, exclusive=exclusive,
+    )
+
+
+def make_registry(device_gb, host_gb, specs, offload_to_host=True):
+    events = []
+    registry = ModelRegistry(int(device_gb * GB), int(host_gb * GB), offload_to_host,
+                             on_event=lambda action, name: events.append(f"{action} {name}"))
+    for s in specs:
+        registry.register(s)
+    return registry, events
+
+
+def use(registry, *names):
+    with registry.use(*names) as handlers:
+        return handlers
+
+
+def eviction():
+    print("Eviction:")
+    registry, events = make_registry(10, 6, [
+        spec("dit:a", 4), spec("dit:b", 4), spec("dit:c", 4), spec("lm:vllm", 3, movable=False),
+    ])
+    check("nothing loaded until used", all(registry.state(n) == UNLOADED for n in registry.names()))
+    (a,) = use(registry, "dit:a")
+    use(registry, "dit:b")
+    check("a and b fit", events == ["load dit:a", "load dit:b"])
+    use(registry, "dit:c")
+    check(f"LRU a offloaded for c {events[2:]}", events[2:] == ["offload dit:a", "load dit:c"]
+          and a.where == "host" and registry.state("dit:a") == HOST)
+    use(registry, "dit:b")  # b is now most recent
+    use(registry, "dit:a")
+    check(f"a restored, LRU c offloaded next to a's host copy {events[4:]}",
+          events[4:] == ["offload dit:c", "restore dit:a"] and a.where == "device")
+    del events[:]
+    use(registry, "lm:vllm")
+    check(f"host full: its LRU c dropped for b {events}",
+          events == ["drop dit:c", "offload dit:b", "load lm:vllm"] and registry.state("dit:c") == UNLOADED)
+    del events[:]
+    use(registry, "dit:a")  # already resident: no event, but the LM is now least recent
+    use(registry, "dit:c")
+    check(f"drop-only LM is dropped, not offloaded {events}",
+          events == ["drop lm:vllm", "load dit:c"] and registry.state("lm:vllm") == UNLOADED)
+    stats = registry.stats()
+    check(f"budgets hold: device {stats['device_used_bytes'] / GB:.0f} GB, host {stats['host_used_bytes'] / GB:.0f} GB",
+          stats["device_used_bytes"] <= 10 * GB and stats["host_used_bytes"] <= 6 * GB)
+    check(f"swaps {stats['swaps']} = loads {stats['loads']} + restores {stats['restores']}",
+          stats["swaps"] == 6 and stats["loads"] == 5 and stats["restores"] == 1)
+
+    registry, events = make_registry(10, 0, [spec("dit:a", 6), spec("dit:b", 6)], offload_to_host=False)
+    use(registry, "dit:a")
+    use(registry, "dit:b")
+    check("offload_to_host=False drops", events == ["load dit:a", "drop dit:a", "load dit:b"])
+
+    registry, events = make_registry(10, 0, [spec("dit:a", 8, estimate_gb=2), spec("dit:b", 4)])
+    use(registry, "dit:a")
+    check("measured size replaces the estimate", registry.stats()["models"]["dit:a"]["size_bytes"] == 8 * GB)
+    use(registry, "dit:b")
+    check("and drives eviction", events == ["load dit:a", "offload dit:a", "load dit:b"])
+
+
+def soft_budget():
+    print("Soft budget:")
+    registry, events = make_registry(10, 0, [spec("dit:a", 4), spec("dit:b", 4), spec("lm:x", 4)])
+    with registry.use("dit:a", "lm:x"):
+        with registry.use("dit:b"):  # a second worker's job while the first runs
+            pinned = registry.stats()
+            check(f"pinned models kept, {pinned['device_used_bytes'] / GB:.0f} GB over a 10 GB budget",
+                  pinned["device_used_bytes"] == 12 * GB and "over_budget dit:b" in events)
+            check("resident() sees all three", registry.resident("dit:a", "lm:x", "dit:b"))
+    check(f"excess evicted on release {events[-1:]}", registry.stats()["device_used_bytes"] <= 10 * GB
+          and events[-1] == "offload dit:b")
+    check("most recently released kept", registry.state("dit:a") == DEVICE and registry.state("lm:x") == DEVICE)
+
+
+def exclusive():
+    print("Exclusive:")
+    registry, events = make_registry(0, 0, [
+        spec("lm:small", 2, movable=False, exclusive="nanovllm"),
+        spec("lm:large", 5, movable=False, exclusive="nanovllm"),
+        spec("dit:a", 4),
+    ])
+    try:
+        use(registry, "lm:small", "lm:large")
+        check("one job asking for both rejected", False)
+    except ValueError:
+        check("one job asking for both rejected", True)
+
+    order = []
+    holding = threading.Event()
+
+    def first():
+        with registry.use("lm:small", "dit:a"):
+            holding.set()
+            time.sleep(0.1)
+            order.append("small done")
+
+    def second():
+        holding.wait()
+        with registry.use("lm:large"):
+            order.append(f"large in, small {registry.state('lm:small')}")
+
+    threads = [threading.Thread(target=first), threading.Thread(target=second)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    check(f"second waits, first dropped {order}", order == ["small done", f"large in, small {UNLOADED}"])
+    check("unrelated models stay", registry.state("dit:a") == DEVICE)
+
+    registry, events = make_registry(0, 0, [
+        spec("lm:small", 2, movable=False, exclusive="nanovllm"),
+        spec("lm:large", 5, movable=False, exclusive="nanovllm"),
+        spec("dit:a", 4),
+    ])
+    holding, done = threading.Event(), threading.Event()
+
+    def engine_job():
+        with registry.use("lm:small"):
+            holding.set()
+            done.wait(5)
+
+    def waiting_job():
+        holding.wait()
+        with registry.use("lm:large"):
+            pass
+
+    def other_job():
+        with registry.use("dit:a"):
+            pass
+        with registry.use("lm:small"):
+            pass
+
+    jobs = [threading.Thread(target=engine_job), threading.Thread(target=waiting_job)]
+    for t in jobs:
+        t.start()
+    holding.wait()
+    time.sleep(0.05)  # the lm:large job is now waiting for lm:small's release
+    other = threading.Thread(target=other_job)
+    other.start()
+    other.join(2)
+    check("other loads and acquires go ahead while an exclusive load waits", not other.is_alive())
+    done.set()
+    for t in jobs + [other]:
+        t.join()
+    check("the waiting engine loads after", registry.state("lm:large") == DEVICE
+          and registry.state("lm:small") == UNLOADED)
+
+
+def failures_remembered():
+    print("Failures:")
+    loads = []
+    registry, _ = make_registry(0, 0, [spec("dit:broken", 4, fail_load=True, loads=loads), spec("dit:a", 4)])
+    for _ in range(2):
+        try:
+            use(registry, "dit:a", "dit:broken")
+        except ModelLoadError:
+            pass
+    stats = registry.stats()
+    check("load attempted once", loads == ["dit:broken"] and stats["load_failures"] == 1)
+    check("error reported", "checkpoint not found" in (registry.error("dit:broken") or ""))
+    check("other model unpinned", stats["models"]["dit:a"]["pins"] == 0)
+
+    loads = []
+    registry, events = make_registry(5, 0, [spec("dit:a", 4, loads=loads), spec("dit:b", 4, loads=loads)])
+    (a,) = use(registry, "dit:a")
+    use(registry, "dit:b")
+
+    def broken_restore(handler):
+        raise RuntimeError("device lost")
+
+    registry._models["dit:a"].spec.restore = broken_restore
+    try:
+        use(registry, "dit:a")
+        check("failed restore raises", False)
+    except ModelLoadError:
+        check("failed restore raises", True)
+    check("host copy dropped, not marked failed", registry.state("dit:a") == UNLOADED and a.where is None
+          and registry.error("dit:a") is None)
+    use(registry, "dit:a")
+    check("next use reloads from disk", loads == ["dit:a", "dit:b", "dit:a"])
+
+
+def trace(seed=7, jobs=60):
+    """Requests as (job id, models): mostly the default DiT, some jobs with an LM, bursts of another DiT."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(jobs):
+        dit = "dit:turbo" if rng.random() < 0.6 else rng.choice(["dit:base", "dit:sft"])
+        models = (dit, "lm:1.7B") if rng.random() < 0.4 else (dit,)
+        out.append((f"job-{i:02d}", models))
+    return out
+
+
+async def replay(requests, group_window):
+    """One queue worker (the API server's shape) on a device that fits one DiT and the LM."""
+    registry, _ = make_registry(14, 8, [spec(n, 5) for n in ("dit:turbo", "dit:base", "dit:sft")]
+                                + [spec("lm:1.7B", 4)])
+    q = FairScheduler(prefer=lambda models: registry.resident(*models), group_window=group_window)
+    tenants = ["alice", "bob", "carol"]
+    for i, (job_id, models) in enumerate(requests):
+        q.put_nowait(job_id, models, tenant=tenants[i % 3], group=models)
+    order = []
+    while q.qsize():
+        job_id, models = await q.get()
+        with registry.use(*models):
+            order.append(job_id)
+        q.task_done(job_id)
+    return order, registry.stats()["swaps"], q.stats()["grouped_dispatches"]
+
+
+def grouping():
+    print("Grouping (recorded trace, 3 DiTs + 1 LM, device fits one DiT + LM):")
+    requests = trace()
+    plain, plain_swaps, plain_grouped = asyncio.run(replay(requests, group_window=0))
+    grouped, grouped_swaps, dispatches = asyncio.run(replay(requests, group_window=6))
+    print(f"    swaps: tag order {plain_swaps}, grouped {grouped_swaps} ({dispatches} grouped dispatches)")
+    check("tag order never groups", plain_grouped == 0)
+    check("grouping saves swaps", grouped_swaps < plain_swaps)
+    check("every job ran once", sorted(grouped) == sorted(plain) == sorted(j for j, _ in requests))
+    # Unit costs over 3 equal tenants: a window of 6 is at most about 6 * 3 dispatches of delay
+    delay = max(grouped.index(j) - plain.index(j) for j in plain)
+    check(f"max delay {delay} dispatches (window bound 18)", delay <= 18)
+
+
+def main():
+    eviction()
+    soft_budget()
+    exclusive()
+    failures_remembered()
+    grouping()
+    print("PASS" if not failures else f"FAIL ({failures} checks)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
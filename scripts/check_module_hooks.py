@@ -0,0 +1,83 @@
+"""
+Checks the stackable forward wrappers (acestep/module_hooks.py) that step
+caching, CFG-interval skipping, attention recording, mixed LoRA batches and
+progress reporting install on the decoder: later wrappers are outermost,
+removing one in any order keeps the others, and the module's own forward
+(class or instance, e.g. an accelerate hook) is back once all are gone.
+
+    python scripts/check_module_hooks.py
+"""
+import os
+import sys
+
+import torch
+import torch.nn as nn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.module_hooks import wrap_forward
+
+failures = 0
+
+
+def check(name, ok):
+    global failures
+    failures += not ok
+    print(f"  {name}: {'ok' if ok else 'FAIL'}")
+
+
+def tagger(calls, tag):
+    def wrapper(forward, *args, **kwargs):
+        calls.append(tag)
+        return forward(*args, **kwargs)
+    return wrapper
+
+
+def main():
+    torch.manual_seed(0)
+    module = nn.Linear(4, 4)
+    x = torch.randn(2, 4)
+    expected = module(x)
+
+    print("Stacking:")
+    calls = []
+    a = wrap_forward(module, tagger(calls, "a"))
+    b = wrap_forward(module, tagger(calls, "b"))
+    c = wrap_forward(module, tagger(calls, "c"))
+    out = module(x)
+    check(f"last installed runs first {calls}", calls == ["c", "b", "a"] and torch.equal(out, expected))
+    b.remove()
+    del calls[:]
+    module(x)
+    check(f"middle removed, others kept {calls}", calls == ["c", "a"])
+    a.remove()
+    a.remove()
+    del calls[:]
+    module(x)
+    check(f"removing twice is a no-op {calls}", calls == ["c"])
+    c.remove()
+    check("class forward back", "forward" not in module.__dict__ and torch.equal(module(x), expected))
+
+    print("Context manager and skipping wrappers:")
+    with wrap_forward(module, lambda forward, *args, **kwargs: torch.zeros(2, 4)):
+        check("wrapper may skip the call", torch.equal(module(x), torch.zeros(2, 4)))
+    check("removed on exit", "forward" not in module.__dict__)
+
+    print("Instance forward installed by someone else:")
+    calls = []
+
+    def own_forward(*args, **kwargs):
+        calls.append("own")
+        return nn.Linear.forward(module, *args, **kwargs)
+
+    module.forward = own_forward
+    with wrap_forward(module, tagger(calls, "a")):
+        module(x)
+    check(f"wrapped {calls}", calls == ["a", "own"])
+    check("restored after", module.__dict__.get("forward") is own_forward)
+
+    print("PASS" if not failures else f"FAIL ({failures} checks)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
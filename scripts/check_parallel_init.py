@@ -0,0 +1,119 @@
+"""
+Checks AceStepHandler's component loading (initialize_service) on tiny
+random-weight checkpoints: a small transformers model standing in for the DiT
+(loaded through the same from_pretrained call, with a silence latent), a small
+Oobleck VAE and a small text encoder with a word-level tokenizer.
+
+The weight files are read in parallel (_prefetch_weight_files) and the modules
+built one after another (_load_components). Each round's parameters and
+buffers must match a plain serial load of the same checkpoints in name, dtype,
+device and value, with no parameter left on the meta device.
+
+    python scripts/check_parallel_init.py [--device cpu|cuda|xpu] [--rounds 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import torch
+from diffusers.models import AutoencoderOobleck
+from tokenizers import Tokenizer, models
+from transformers import PreTrainedTokenizerFast, Qwen3Config, Qwen3Model
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.handler import AceStepHandler
+
+failures = 0
+
+
+def check(name, ok):
+    global failures
+    failures += not ok
+    print(f"  {name}: {'ok' if ok else 'FAIL'}")
+
+
+def tiny_qwen3(path, seed):
+    torch.manual_seed(seed)
+    config = Qwen3Config(vocab_size=64, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+                         num_attention_heads=4, num_key_value_heads=2, head_dim=8)
+    Qwen3Model(config).save_pretrained(path, safe_serialization=True)
+
+
+def write_checkpoints(root):
+    dit_path, vae_path, text_path = (os.path.join(root, name) for name in ("dit", "vae", "text_encoder"))
+    tiny_qwen3(dit_path, seed=0)
+    torch.save(torch.randn(1, 8, 16), os.path.join(dit_path, "silence_latent.pt"))
+    torch.manual_seed(1)
+    AutoencoderOobleck(
+        encoder_hidden_size=8, downsampling_ratios=[2, 2], channel_multiples=[1, 2],
+        decoder_channels=8, decoder_input_channels=4, audio_channels=2,
+    ).save_pretrained(vae_path, safe_serialization=True)
+    tiny_qwen3(text_path, seed=2)
+    vocab = {"[UNK]": 0, "[PAD]": 1, "music": 2}
+    PreTrainedTokenizerFast(
+        tokenizer_object=Tokenizer(models.WordLevel(vocab, unk_token="[UNK]")), unk_token="[UNK]", pad_token="[PAD]",
+    ).save_pretrained(text_path)
+    return dit_path, vae_path, text_path
+
+
+def new_handler(device):
+    handler = AceStepHandler()
+    handler.device = device
+    handler.dtype = torch.bfloat16 if device in ("cuda", "xpu") else torch.float32
+    handler.quantization = None  # set by initialize_service
+    return handler
+
+
+def tensors(handler):
+    out = {}
+    for component, module in (("dit", handler.model), ("vae", handler.vae), ("text", handler.text_encoder)):
+        for name, t in list(module.named_parameters()) + list(module.named_buffers()):
+            out[f"{component}.{name}"] = t.detach()
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        paths = write_checkpoints(root)
+        dit_path, vae_path, text_path = paths
+
+        serial = new_handler(args.device)
+        serial.model, serial.silence_latent = serial._load_dit_model(dit_path, args.device, "sdpa", False)
+        serial.vae = serial._load_vae(vae_path, args.device, False)
+        serial.text_tokenizer, serial.text_encoder = serial._load_text_encoder(text_path, args.device)
+        reference = tensors(serial)
+
+        print("Prefetch:")
+        expected = sum(os.path.getsize(os.path.join(d, f)) for d in paths for f in os.listdir(d)
+                       if f.endswith(".safetensors"))
+        read = AceStepHandler._prefetch_weight_files(list(paths), num_workers=4, chunk_bytes=4096)
+        check(f"read {read} of {expected} weight bytes in 4 KB chunks", read == expected)
+        check("no weight files -> 0", AceStepHandler._prefetch_weight_files([os.path.join(root, "missing")]) == 0)
+
+        print(f"Parallel reads + serial build vs serial load ({args.rounds} rounds, {len(reference)} tensors):")
+        for i in range(args.rounds):
+            handler = new_handler(args.device)
+            handler._load_components(dit_path, vae_path, text_path, args.device, "sdpa", False)
+            loaded = tensors(handler)
+            mismatched = [
+                name for name, t in reference.items()
+                if name not in loaded or loaded[name].dtype != t.dtype or loaded[name].device != t.device
+                or loaded[name].is_meta or not torch.equal(loaded[name].cpu(), t.cpu())
+            ]
+            check(f"round {i + 1}: names, dtypes, devices, values match (mismatched: {mismatched[:3]})",
+                  not mismatched and set(loaded) == set(reference))
+            check(f"round {i + 1}: silence latent", torch.equal(handler.silence_latent.cpu(), serial.silence_latent.cpu())
+                  and handler.silence_latent.dtype == serial.silence_latent.dtype)
+
+    print("PASS" if not failures else f"FAIL ({failures} checks)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
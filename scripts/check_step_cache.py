@@ -0,0 +1,125 @@
+"""
+CPU harness for cross-timestep block caching (acestep/step_cache.py).
+
+Runs a flow-matching Euler sampler over a small random-weight DiT (timestep-
+modulated transformer blocks with cross-attention) once without caching and
+once per caching policy, then reports the share of decoder FLOPs skipped and
+the latent MSE / SNR against the uncached trajectory.
+
+    python scripts/check_step_cache.py --steps 32
+    python scripts/check_step_cache.py --steps 8 --intervals 2 --thresholds 0.05 0.1
+"""
+import argparse
+import os
+import sys
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.quant_calibration import snr_db
+from acestep.step_cache import DiTStepCache
+
+
+class Block(nn.Module):
+    def __init__(self, dim, num_heads):
+        super().__init__()
+        self.num_heads = num_heads
+        self.norm1, self.norm2, self.norm3 = nn.LayerNorm(dim), nn.LayerNorm(dim), nn.LayerNorm(dim)
+        self.modulation = nn.Linear(dim, 2 * dim)
+        self.qkv = nn.Linear(dim, 3 * dim)
+        self.proj = nn.Linear(dim, dim)
+        self.cross_q = nn.Linear(dim, dim)
+        self.cross_kv = nn.Linear(dim, 2 * dim)
+        self.cross_proj = nn.Linear(dim, dim)
+        self.mlp = nn.Sequential(nn.Linear(dim, 4 * dim), nn.GELU(), nn.Linear(4 * dim, dim))
+
+    def _heads(self, x):
+        return x.view(x.shape[0], x.shape[1], self.num_heads, -1).transpose(1, 2)
+
+    def forward(self, hidden_states, temb, encoder_hidden_states):
+        scale, shift = self.modulation(temb).unsqueeze(1).chunk(2, dim=-1)
+        h = self.norm1(hidden_states) * (1 + scale) + shift
+        q, k, v = self.qkv(h).chunk(3, dim=-1)
+        attn = F.scaled_dot_product_attention(self._heads(q), self._heads(k), self._heads(v))
+        hidden_states = hidden_states + self.proj(attn.transpose(1, 2).flatten(2))
+        q = self._heads(self.cross_q(self.norm2(hidden_states)))
+        k, v = (self._heads(t) for t in self.cross_kv(encoder_hidden_states).chunk(2, dim=-1))
+        attn = F.scaled_dot_product_attention(q, k, v)
+        hidden_states = hidden_states + self.cross_proj(attn.transpose(1, 2).flatten(2))
+        return (hidden_states + self.mlp(self.norm3(hidden_states)),)
+
+
+class StandInDecoder(nn.Module):
+    def __init__(self, latent_dim, dim, num_layers, num_heads):
+        super().__init__()
+        self.proj_in = nn.Linear(latent_dim, dim)
+        self.time_embed = nn.Sequential(nn.Linear(1, dim), nn.SiLU(), nn.Linear(dim, dim))
+        self.layers = nn.ModuleList(Block(dim, num_heads) for _ in range(num_layers))
+        self.proj_out = nn.Linear(dim, latent_dim)
+
+    def forward(self, hidden_states, timestep, encoder_hidden_states):
+        temb = self.time_embed(timestep.view(-1, 1))
+        h = self.proj_in(hidden_states)
+        for layer in self.layers:
+            h = layer(h, temb, encoder_hidden_states)[0]
+        return self.proj_out(h)
+
+
+@torch.inference_mode()
+def sample(decoder, noise, context, steps):
+    timesteps = torch.linspace(1.0, 0.0, steps + 1)
+    x = noise
+    for t, t_next in zip(timesteps[:-1], timesteps[1:]):
+        v = decoder(x, timestep=t.expand(x.shape[0]), encoder_hidden_states=context)
+        x = x + (t_next - t) * v
+    return x
+
+
+def block_flops(block, tokens, context_tokens, dim):
+    matmul = 2 * tokens * sum(p.numel() for n, p in block.named_parameters() if n.endswith("weight") and p.dim() == 2)
+    attention = 4 * tokens * tokens * dim + 4 * tokens * context_tokens * dim
+    return matmul + attention
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=32)
+    parser.add_argument("--frames", type=int, default=250)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--num-layers", type=int, default=12)
+    parser.add_argument("--num-heads", type=int, default=4)
+    parser.add_argument("--latent-dim", type=int, default=64)
+    parser.add_argument("--context-tokens", type=int, default=128)
+    parser.add_argument("--intervals", type=int, nargs="+", default=[2, 3])
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.05, 0.1, 0.2])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    decoder = StandInDecoder(args.latent_dim, args.dim, args.num_layers, args.num_heads).eval()
+    noise = torch.randn(1, args.frames, args.latent_dim)
+    context = torch.randn(1, args.context_tokens, args.dim)
+    reference = sample(decoder, noise, context, args.steps)
+
+    per_block = block_flops(decoder.layers[0], args.frames, args.context_tokens, args.dim)
+    total_flops = args.steps * args.num_layers * per_block
+    print(f"Stand-in DiT: {args.num_layers} blocks x {args.dim}, {args.frames} frames, {args.steps} steps, "
+          f"{total_flops / 1e9:.1f} GFLOPs in decoder blocks")
+
+    policies = [dict(mode="interval", interval=i) for i in args.intervals]
+    policies += [dict(mode="threshold", threshold=t) for t in args.thresholds]
+    for policy in policies:
+        with DiTStepCache(decoder, num_steps=args.steps, **policy) as cache:
+            latents = sample(decoder, noise, context, args.steps)
+        mse = F.mse_loss(latents, reference).item()
+        skipped = cache.stats.skipped_block_calls * per_block
+        name = ", ".join(f"{k}={v}" for k, v in policy.items())
+        print(f"  {name:<26} skipped {cache.stats.skipped_steps:>3}/{args.steps} steps, "
+              f"{skipped / 1e9:6.1f} GFLOPs ({skipped / total_flops:5.1%}), "
+              f"latent MSE {mse:.2e}, SNR {snr_db(reference, latents):.1f} dB")
+
+
+if __name__ == "__main__":
+    main()
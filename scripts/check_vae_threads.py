@@ -0,0 +1,75 @@
+"""
+Checks the CPU-mode thread counts (acestep/cpu_config.py): a VAE job runs with
+the VAE thread count, a decoder wrapped with hold_num_threads runs every call
+with the diffusion count even after a VAE job ran in between, and VAE jobs run
+under the submitting thread's cancellation token.
+
+    python scripts/check_vae_threads.py
+"""
+import os
+import sys
+
+import torch
+import torch.nn as nn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acestep.cancellation import CancellationToken, JobCancelled, cancellation_scope, check_cancelled
+from acestep.cpu_config import CPUExecutionConfig, create_vae_executor, hold_num_threads
+
+failures = 0
+
+
+def check(name, ok):
+    global failures
+    failures += not ok
+    print(f"  {name}: {'ok' if ok else 'FAIL'}")
+
+
+def main():
+    config = CPUExecutionConfig(precision="fp32", intra_op_threads=3, inter_op_threads=1, vae_threads=1, cpus=None)
+    torch.set_num_threads(config.intra_op_threads)
+    executor = create_vae_executor(config)
+
+    decoder = nn.Linear(8, 8)
+    seen = []
+    decoder.register_forward_pre_hook(lambda module, args: seen.append(torch.get_num_threads()))
+    x = torch.randn(4, 8)
+
+    print("VAE executor and diffusion:")
+    with hold_num_threads(decoder, config.intra_op_threads):
+        for i in range(3):
+            inside = executor.submit(torch.get_num_threads).result()
+            decoder(x)
+            check(f"step {i + 1}: VAE job {inside} threads, decoder call {seen[-1]} threads",
+                  inside == config.vae_threads and seen[-1] == config.intra_op_threads)
+
+        def fail():
+            raise RuntimeError("decode failed")
+
+        try:
+            executor.submit(fail).result()
+        except RuntimeError:
+            pass
+        decoder(x)
+        check("diffusion count after a failing job", seen[-1] == config.intra_op_threads)
+    check("decoder forward unwrapped on exit", "forward" not in decoder.__dict__)
+    y = torch.randn(64, 64)
+    check("decode result passed through", torch.equal(executor.submit(torch.mm, y, y).result(), y @ y))
+
+    print("Cancellation:")
+    check("no token outside a scope", executor.submit(check_cancelled).exception() is None)
+    token = CancellationToken()
+    with cancellation_scope(token):
+        check("live token", executor.submit(check_cancelled).exception() is None)
+        token.cancel()
+        check("cancelled token reaches the VAE thread",
+              isinstance(executor.submit(check_cancelled).exception(), JobCancelled))
+    check("not left bound on the VAE thread", executor.submit(check_cancelled).exception() is None)
+    executor.shutdown()
+
+    print("PASS" if not failures else f"FAIL ({failures} checks)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()